@@ -0,0 +1,173 @@
+# agregacao.py - Agregação de leituras por intervalo de tempo (gráficos)
+
+from datetime import datetime
+
+from sqlalchemy import select, func
+
+from extensions import db
+from models import Leitura
+
+SENSORES = ('temperatura', 'umidade', 'pressao')
+
+# Intervalo da API → unidade do date_trunc / formato do strftime (SQLite)
+INTERVALOS = {
+    'minuto': ('minute', '%Y-%m-%d %H:%M:00'),
+    'hora': ('hour', '%Y-%m-%d %H:00:00'),
+    'dia': ('day', '%Y-%m-%d 00:00:00')
+}
+SEGUNDOS_INTERVALO = {'minuto': 60, 'hora': 3600, 'dia': 86400}
+
+# Com intervalo=auto, escolhe o menor intervalo que gere até este número de pontos
+MAXIMO_PONTOS_AUTO = 500
+
+
+def truncar_data(data, intervalo):
+    """Início do intervalo que contém `data` (equivalente ao date_trunc)"""
+    if intervalo == 'minuto':
+        return data.replace(second=0, microsecond=0)
+    if intervalo == 'hora':
+        return data.replace(minute=0, second=0, microsecond=0)
+    return data.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def expressao_truncamento(intervalo):
+    """
+    Expressão SQL que trunca data_inicial no intervalo (date_trunc no
+    PostgreSQL, strftime no SQLite). None se o banco não tiver equivalente.
+    """
+    unidade, formato = INTERVALOS[intervalo]
+    dialeto = db.engine.dialect.name
+    if dialeto == 'postgresql':
+        return func.date_trunc(unidade, Leitura.data_inicial)
+    if dialeto == 'sqlite':
+        return func.strftime(formato, Leitura.data_inicial)
+    return None
+
+
+def _filtros(lote, data_inicio, data_fim):
+    filtros = [Leitura.data_inicial.isnot(None)]
+    if lote:
+        filtros.append(Leitura.lote == lote)
+    if data_inicio:
+        filtros.append(Leitura.data_inicial >= data_inicio)
+    if data_fim:
+        filtros.append(Leitura.data_inicial <= data_fim)
+    return filtros
+
+
+def escolher_intervalo(lote=None, data_inicio=None, data_fim=None):
+    """Escolhe minuto/hora/dia conforme o período coberto pelas leituras"""
+    minimo, maximo = db.session.execute(
+        select(func.min(Leitura.data_inicial), func.max(Leitura.data_inicial))
+        .where(*_filtros(lote, data_inicio, data_fim))
+    ).one()
+    if minimo is None:
+        return 'hora'
+    if isinstance(minimo, str):
+        minimo, maximo = datetime.fromisoformat(minimo), datetime.fromisoformat(maximo)
+
+    duracao = (maximo - minimo).total_seconds()
+    for intervalo in ('minuto', 'hora'):
+        if duracao / SEGUNDOS_INTERVALO[intervalo] <= MAXIMO_PONTOS_AUTO:
+            return intervalo
+    return 'dia'
+
+
+def _ponto(inicio, quantidade, valores):
+    """Monta o item da resposta a partir de (min, media, max) de cada sensor"""
+    ponto = {
+        'inicio': inicio.isoformat() if isinstance(inicio, datetime) else inicio,
+        'quantidade': quantidade
+    }
+    for sensor, (minimo, media, maximo) in zip(SENSORES, valores):
+        ponto[sensor] = {
+            'min': minimo,
+            'media': round(media, 3) if media is not None else None,
+            'max': maximo
+        }
+    return ponto
+
+
+def _agregar_sql(expressao_intervalo, filtros):
+    colunas = [expressao_intervalo.label('inicio'), func.count().label('quantidade')]
+    for sensor in SENSORES:
+        coluna = getattr(Leitura, sensor)
+        colunas += [func.min(coluna), func.avg(coluna), func.max(coluna)]
+
+    consulta = (select(*colunas).where(*filtros)
+                .group_by(expressao_intervalo).order_by(expressao_intervalo))
+
+    pontos = []
+    for linha in db.session.execute(consulta):
+        inicio = linha[0]
+        if isinstance(inicio, str):
+            inicio = datetime.fromisoformat(inicio)
+        valores = [linha[2 + 3 * i: 5 + 3 * i] for i in range(len(SENSORES))]
+        pontos.append(_ponto(inicio, linha[1], valores))
+    return pontos
+
+
+def agregar_em_python(linhas, intervalo):
+    """
+    Agregação em uma passada sobre linhas (data_inicial, temperatura,
+    umidade, pressao) já ordenadas por data. Usada quando o banco não tem
+    função de truncamento de data conhecida.
+    """
+    pontos = []
+    atual = None
+    acumulado = None
+
+    def fechar():
+        valores = []
+        for contagem, soma, minimo, maximo in acumulado['sensores']:
+            valores.append((minimo, soma / contagem if contagem else None, maximo))
+        pontos.append(_ponto(atual, acumulado['quantidade'], valores))
+
+    for data, *medidas in linhas:
+        inicio = truncar_data(data, intervalo)
+        if inicio != atual:
+            if atual is not None:
+                fechar()
+            atual = inicio
+            acumulado = {'quantidade': 0, 'sensores': [[0, 0.0, None, None] for _ in SENSORES]}
+
+        acumulado['quantidade'] += 1
+        for estado, valor in zip(acumulado['sensores'], medidas):
+            if valor is None:
+                continue
+            estado[0] += 1
+            estado[1] += valor
+            estado[2] = valor if estado[2] is None else min(estado[2], valor)
+            estado[3] = valor if estado[3] is None else max(estado[3], valor)
+
+    if atual is not None:
+        fechar()
+    return pontos
+
+
+def agregar_leituras(lote=None, intervalo='auto', data_inicio=None, data_fim=None):
+    """
+    Min/média/máx de temperatura, umidade e pressão por intervalo de tempo.
+    Retorna (intervalo_usado, pontos). O cálculo é feito no banco
+    (date_trunc no PostgreSQL, strftime no SQLite); outros bancos usam a
+    agregação em Python sobre um cursor do servidor.
+    """
+    if intervalo == 'auto':
+        intervalo = escolher_intervalo(lote, data_inicio, data_fim)
+    if intervalo not in INTERVALOS:
+        raise ValueError(f"intervalo deve ser um de: auto, {', '.join(INTERVALOS)}")
+
+    filtros = _filtros(lote, data_inicio, data_fim)
+    expressao = expressao_truncamento(intervalo)
+    if expressao is not None:
+        return intervalo, _agregar_sql(expressao, filtros)
+
+    resultado = db.session.execute(
+        select(Leitura.data_inicial, *[getattr(Leitura, s) for s in SENSORES])
+        .where(*filtros).order_by(Leitura.data_inicial)
+        .execution_options(yield_per=1000)
+    )
+    try:
+        return intervalo, agregar_em_python(resultado, intervalo)
+    finally:
+        resultado.close()
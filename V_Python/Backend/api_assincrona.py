@@ -0,0 +1,481 @@
+# api_assincrona.py - Modo ASGI: login e leituras (POST/GET/stream) em asyncio, demais rotas no Flask
+
+import contextlib
+import json
+import time
+from datetime import datetime
+from functools import wraps
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select, update
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route, Mount
+from werkzeug.http import http_date, parse_date, parse_etags
+
+from auth_cache import verificar_token_assincrono
+from banco import criar_engine_assincrono
+from cache import cache
+from compressao import CompressaoASGI, compressao
+from dispositivos import indice_dispositivos
+from eventos_leituras import eventos_leituras, stream_sse_assincrono
+from idempotencia import origem_requisicao, registrar_lote_assincrono
+from ingestao import validar_leituras
+from ingestao_binaria import TIPO_CONTEUDO as TIPO_LEITURAS_BINARIO, decodificar_leituras, quantidade_leituras
+from leituras_utils import (
+    ORDENACAO, TAMANHO_LOTE_STREAM, consulta_leituras, consulta_pagina, montar_pagina,
+    consulta_desde, montar_desde, decodificar_watermark, serializar_leitura, bloco_json,
+    tag_cache_leituras, tags_alteracao_leituras, incrementar_versoes_leituras_assincrono
+)
+from log_writer import log_writer
+from logging_utils import registrar_log_atividade, log_login_attempt, log_crud_operation
+from metricas import metricas
+from models import User, Leitura
+from rollups import calcular_parciais, comando_upsert_rollups
+from senhas import verificador_senhas, LoginRecusado
+from versoes_tabelas import consulta_versao, validadores, nao_modificado
+
+# Corpos de POST /api/leituras acima deste tamanho são decodificados e
+# validados no threadpool, sem bloquear o loop
+LIMITE_CORPO_NO_LOOP = 64 * 1024
+
+CABECALHOS_CORS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+    'Access-Control-Allow-Methods': 'GET,PUT,POST,DELETE,OPTIONS'
+}
+
+
+def _tipo_conteudo(request):
+    """request.mimetype do Flask"""
+    return request.headers.get('content-type', '').split(';')[0].strip().lower()
+
+
+def _e_json(request):
+    """Mesmo critério de request.is_json do Flask"""
+    tipo = _tipo_conteudo(request)
+    return tipo == 'application/json' or (tipo.startswith('application/') and tipo.endswith('+json'))
+
+
+def _inteiro(valor):
+    """request.args.get(..., type=int) do Flask: None se ausente ou inválido"""
+    try:
+        return int(valor) if valor is not None else None
+    except ValueError:
+        return None
+
+
+def _dados_requisicao(request, endpoint):
+    """Colunas do log de auditoria preenchidas a partir do request do Starlette"""
+    return {
+        'endpoint': endpoint,
+        'metodo_http': request.method,
+        'ip_address': request.headers.get('x-real-ip') or (request.client.host if request.client else None),
+        'user_agent': request.headers.get('user-agent', '')
+    }
+
+
+def _decodificar_e_validar(corpo, limite, lotes_permitidos=None, binario=False):
+    """
+    Corpo JSON ou quadro binário (ingestao_binaria) → (quantidade, (linhas,
+    rejeitadas)); sem validar acima de `limite` itens
+    """
+    if binario:
+        quantidade = quantidade_leituras(corpo)
+        if quantidade > limite:
+            return quantidade, None
+        return quantidade, decodificar_leituras(corpo, lotes_permitidos)
+    dados = json.loads(corpo)
+    if not isinstance(dados, list):
+        dados = [dados]
+    if len(dados) > limite:
+        return len(dados), None
+    return len(dados), validar_leituras(dados, lotes_permitidos)
+
+
+class ApiAssincrona:
+    """
+    Rotas de tráfego dos dispositivos atendidas em asyncio (uvicorn), com
+    SQLAlchemy assíncrono (asyncpg/aiosqlite) sobre os mesmos modelos,
+    validação, cache de tokens, rollups, feed SSE e auditoria do Flask.
+    Conexões lentas (ESP32 com Wi-Fi ruim) só ocupam uma corrotina: um
+    processo mantém milhares delas, e o banco continua limitado pelo pool
+    DB_POOL_SIZE + DB_MAX_OVERFLOW. As demais rotas seguem no app Flask,
+    montado como fallback WSGI (ASGI_THREADS_WSGI threads).
+
+    Respostas, códigos de status, ETags e registros de auditoria são os
+    mesmos do Flask. Não há perfil de SQL por requisição nessas rotas.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.engine = None
+
+    # ---------------------------------------------------------------- infraestrutura
+
+    @contextlib.asynccontextmanager
+    async def ciclo_de_vida(self, app):
+        # Um engine por processo, criado já no worker (depois do fork)
+        self.engine = criar_engine_assincrono(self.config)
+        try:
+            yield
+        finally:
+            await self.engine.dispose()
+
+    async def _auditar(self, funcao, *args, **kwargs):
+        """
+        Registra a auditoria. Com LOG_ASYNC é só um put na fila do
+        log_writer; sem ele a gravação síncrona vai para o threadpool.
+        """
+        if log_writer.habilitado and log_writer.app is not None:
+            funcao(*args, **kwargs)
+            return
+        await run_in_threadpool(self._com_contexto, funcao, *args, **kwargs)
+
+    def _com_contexto(self, funcao, *args, **kwargs):
+        with self.flask_app.app_context():
+            funcao(*args, **kwargs)
+
+    def _rota(self, regra, endpoint):
+        """Métricas por rota e cabeçalhos CORS (after_request do Flask)"""
+        def decorator(f):
+            @wraps(f)
+            async def decorated(request):
+                inicio = time.perf_counter()
+                request.state.endpoint = endpoint
+                resposta = await f(request)
+                resposta.headers.update(CABECALHOS_CORS)
+                metricas.registrar_requisicao(regra, request.method, resposta.status_code,
+                                              time.perf_counter() - inicio)
+                return resposta
+            return decorated
+        return decorator
+
+    def _protegida(self, acao, aceita_dispositivo=False):
+        """token_required (ou token_ou_chave_dispositivo) + log_activity do Flask"""
+        def decorator(f):
+            @wraps(f)
+            async def decorated(request):
+                if aceita_dispositivo and 'x-api-key' in request.headers:
+                    usuario = await indice_dispositivos.verificar_assincrono(request.headers['x-api-key'],
+                                                                             self.engine)
+                    if not usuario:
+                        return JSONResponse({'message': 'API key is invalid!'}, 401)
+                    return await self._auditada(acao, f, request, usuario)
+
+                if 'authorization' not in request.headers:
+                    return JSONResponse({'message': 'Token is missing!'}, 401)
+                partes = request.headers['authorization'].split()
+                if not (len(partes) == 2 and partes[0].lower() == 'bearer'):
+                    return JSONResponse({'message': 'Authorization header must be Bearer token!'}, 401)
+                try:
+                    usuario = await verificar_token_assincrono(partes[1], self.config['JWT_SECRET_KEY'],
+                                                               self.engine)
+                except Exception:
+                    usuario = None
+                if not usuario:
+                    return JSONResponse({'message': 'Token is invalid!'}, 401)
+                return await self._auditada(acao, f, request, usuario)
+            return decorated
+        return decorator
+
+    async def _auditada(self, acao, f, request, usuario):
+        """log_activity do Flask em volta do handler já autenticado"""
+        inicio = datetime.utcnow()
+        detalhes = {'funcao': f.__name__, 'timestamp': inicio.isoformat()}
+        if request.query_params:
+            detalhes['parametros_url'] = dict(request.query_params)
+        try:
+            resposta = await f(request, usuario)
+        except Exception as e:
+            await self._auditar(
+                registrar_log_atividade, usuario=usuario, acao=f'ERRO: {acao}',
+                detalhes=json.dumps({'erro': str(e), 'funcao': f.__name__, 'parametros': detalhes},
+                                    default=str),
+                status_code=500, duracao=datetime.utcnow() - inicio,
+                requisicao=_dados_requisicao(request, request.state.endpoint)
+            )
+            raise
+        if getattr(request.state, 'quantidade_itens', None) is not None:
+            detalhes['quantidade_itens'] = request.state.quantidade_itens
+        await self._auditar(
+            registrar_log_atividade, usuario=usuario, acao=acao,
+            detalhes=json.dumps(detalhes, default=str), status_code=resposta.status_code,
+            duracao=datetime.utcnow() - inicio,
+            requisicao=_dados_requisicao(request, request.state.endpoint)
+        )
+        return resposta
+
+    # ---------------------------------------------------------------- login
+
+    async def login(self, request):
+        """POST /api/login (verificação da senha no pool de senhas.py, aguardada no threadpool)"""
+        requisicao = _dados_requisicao(request, 'api_login')
+        try:
+            dados = await request.json()
+        except ValueError:
+            dados = None
+
+        if not isinstance(dados, dict) or not dados.get('username') or not dados.get('password'):
+            await self._auditar(log_login_attempt, '', False, 'campos_faltando', requisicao=requisicao)
+            return JSONResponse({'message': 'Missing username or password!'}, 400)
+
+        try:
+            verificador_senhas.admitir(requisicao['ip_address'], dados['username'])
+            async with self.engine.connect() as conexao:
+                linha = (await conexao.execute(
+                    select(User.id, User.username, User.password_hash, User.is_admin)
+                    .where(User.username == dados['username'])
+                )).first()
+            senha_correta, novo_hash = (
+                await run_in_threadpool(verificador_senhas.verificar, linha.password_hash, dados['password'])
+                if linha else (False, None)
+            )
+        except LoginRecusado as e:
+            await self._auditar(log_login_attempt, dados['username'], False, e.motivo, requisicao=requisicao)
+            return JSONResponse({'message': e.mensagem}, e.status_code,
+                                headers={'Retry-After': str(e.retry_after)})
+
+        if not senha_correta:
+            verificador_senhas.registrar_falha(dados['username'])
+            await self._auditar(log_login_attempt, dados['username'], False, 'credenciais_invalidas',
+                                requisicao=requisicao)
+            return JSONResponse({'message': 'Invalid username or password!'}, 401)
+
+        if novo_hash:
+            async with self.engine.begin() as conexao:
+                await conexao.execute(update(User).where(User.id == linha.id).values(password_hash=novo_hash))
+
+        # Instância transitória (fora de sessão) só para reaproveitar os métodos do modelo
+        user = User(id=linha.id, username=linha.username, is_admin=linha.is_admin)
+        token = user.generate_auth_token(self.config['JWT_SECRET_KEY'])
+        await self._auditar(log_login_attempt, dados['username'], True, requisicao=requisicao)
+        return JSONResponse({
+            'token': token,
+            'user': {'id': user.id, 'username': user.username, 'is_admin': user.is_admin}
+        }, 200)
+
+    # ---------------------------------------------------------------- leituras
+
+    async def criar_leituras(self, request, current_user):
+        """POST /api/leituras: mesma validação e gravação de api_criar_leitura"""
+        requisicao = _dados_requisicao(request, 'api_criar_leitura')
+        try:
+            binario = _tipo_conteudo(request) == TIPO_LEITURAS_BINARIO
+            if not binario and not _e_json(request):
+                return JSONResponse({'message': f'O corpo da requisição deve ser JSON ou '
+                                                f'{TIPO_LEITURAS_BINARIO}'}, 400)
+
+            corpo = await request.body()
+            limite = self.config.get('INGESTAO_MAX_ITENS', 20000)
+            lotes_permitidos = getattr(current_user, 'lotes', None)
+            if len(corpo) > LIMITE_CORPO_NO_LOOP:
+                quantidade, validacao = await run_in_threadpool(_decodificar_e_validar, corpo, limite,
+                                                                lotes_permitidos, binario)
+            else:
+                quantidade, validacao = _decodificar_e_validar(corpo, limite, lotes_permitidos, binario)
+            request.state.quantidade_itens = quantidade
+
+            if validacao is None:
+                return JSONResponse({'message': f'Máximo de {limite} leituras por requisição'}, 413)
+            linhas, rejeitadas = validacao
+
+            try:
+                sequenciado = origem_requisicao(request.headers, current_user)
+            except ValueError as e:
+                return JSONResponse({'message': str(e)}, 400)
+            sequencias, duplicadas = None, 0
+
+            if linhas or sequenciado is not None:
+                async with self.engine.begin() as conexao:
+                    if sequenciado is not None:
+                        # Descarta as leituras já recebidas, com o índice travado até o commit
+                        linhas, rejeitadas, sequencias, duplicadas = await registrar_lote_assincrono(
+                            conexao, *sequenciado, quantidade, linhas, rejeitadas,
+                            self.config.get('IDEMPOTENCIA_MAX_FAIXAS', 64))
+                    if linhas:
+                        # INSERT executemany (insertmanyvalues no asyncpg)
+                        await conexao.execute(Leitura.__table__.insert(), linhas)
+                        if self.config.get('ROLLUPS_HABILITADOS', True):
+                            registros = calcular_parciais(linhas)
+                            comando = comando_upsert_rollups(conexao.dialect.name)
+                            if registros and comando is not None:
+                                await conexao.execute(comando, registros)
+                        await incrementar_versoes_leituras_assincrono(conexao, (l.get('lote') for l in linhas))
+
+            if not linhas and duplicadas and not rejeitadas:
+                metricas.registrar_ingestao(0, 0, duplicadas)
+                return JSONResponse({
+                    'message': 'Lote já recebido',
+                    'quantidade': 0,
+                    'aceitas': 0,
+                    'rejeitadas': 0,
+                    'duplicadas': duplicadas,
+                    'erros': [],
+                    'sequencias': sequencias
+                }, 200)
+
+            if not linhas:
+                metricas.registrar_ingestao(0, len(rejeitadas), duplicadas)
+                await self._auditar(log_crud_operation, current_user, 'leituras', 'CREATE_FAILED',
+                                    dados={'rejeitadas': len(rejeitadas)}, requisicao=requisicao)
+                resposta = {
+                    'message': 'Nenhuma leitura válida',
+                    'quantidade': 0,
+                    'aceitas': 0,
+                    'rejeitadas': len(rejeitadas),
+                    'erros': rejeitadas
+                }
+                if sequencias is not None:
+                    resposta.update(duplicadas=duplicadas, sequencias=sequencias)
+                return JSONResponse(resposta, 400)
+
+            metricas.registrar_ingestao(len(linhas), len(rejeitadas), duplicadas)
+            cache.invalidar(*tags_alteracao_leituras(l.get('lote') for l in linhas))
+            await eventos_leituras.publicar_assincrono(self.engine, linhas)
+
+            await self._auditar(log_crud_operation, current_user, 'leituras', 'CREATE_BATCH',
+                                dados={'quantidade': len(linhas), 'rejeitadas': len(rejeitadas),
+                                       'duplicadas': duplicadas},
+                                requisicao=requisicao)
+            resposta = {
+                'message': f'{len(linhas)} leituras criadas com sucesso',
+                'quantidade': len(linhas),
+                'aceitas': len(linhas),
+                'rejeitadas': len(rejeitadas),
+                'erros': rejeitadas
+            }
+            if sequencias is not None:
+                resposta.update(duplicadas=duplicadas, sequencias=sequencias)
+            return JSONResponse(resposta, 201)
+
+        except Exception as e:
+            await self._auditar(log_crud_operation, current_user, 'leituras', 'CREATE_FAILED',
+                                dados={'erro': str(e)}, requisicao=requisicao)
+            return JSONResponse({'message': f'Erro ao processar os dados: {str(e)}'}, 400)
+
+    async def listar_leituras(self, request, current_user):
+        """GET /api/leituras: lista, página por cursor, delta (since_id/since) ou stream"""
+        parametros = request.query_params
+        lote = parametros.get('lote')
+        limite = _inteiro(parametros.get('limite')) or _inteiro(parametros.get('limit'))
+        cursor = parametros.get('cursor')
+        stream = parametros.get('stream', '').lower() in ('1', 'true')
+        since_id = parametros.get('since_id')
+        since = parametros.get('since')
+
+        # ETag/Last-Modified iguais aos do Flask: contador do lote + parâmetros
+        async with self.engine.connect() as conexao:
+            linha = (await conexao.execute(consulta_versao(tag_cache_leituras(lote)))).first()
+        versao, alterado_em = (linha.versao, linha.alterado_em) if linha else (0, None)
+        etag, ultima_alteracao = validadores(versao, alterado_em, 'leituras', sorted(parametros.multi_items()))
+
+        def responder(resposta):
+            resposta.headers['ETag'] = f'"{etag}"'
+            if ultima_alteracao is not None:
+                resposta.headers['Last-Modified'] = http_date(ultima_alteracao)
+            resposta.headers['Cache-Control'] = 'private, no-cache'
+            return resposta
+
+        if nao_modificado(etag, ultima_alteracao, parse_etags(request.headers.get('if-none-match')),
+                          parse_date(request.headers.get('if-modified-since'))):
+            return responder(Response(status_code=304))
+
+        consulta = consulta_leituras(lote)
+        limite_maximo = self.config.get('LEITURAS_LIMITE_MAXIMO', 5000)
+
+        if since_id is not None or since is not None:
+            try:
+                since_id = int(since_id) if since_id is not None else None
+                since = decodificar_watermark(since) if since_id is None else None
+                if since_id is None and since is None:
+                    raise ValueError
+            except ValueError:
+                return JSONResponse({'message': 'since_id deve ser inteiro e since uma data ISO 8601 ou um watermark'}, 400)
+            limite = min(max(limite or limite_maximo, 1), limite_maximo)
+            async with self.engine.connect() as conexao:
+                linhas = (await conexao.execute(consulta_desde(consulta, limite, since_id, since))).all()
+            itens, watermark, mais = montar_desde(linhas, limite, since_id, since)
+            return responder(JSONResponse({'itens': itens, 'watermark': watermark, 'mais': mais,
+                                           'limite': limite}))
+
+        if limite or cursor:
+            limite = min(max(limite or self.config.get('LEITURAS_LIMITE_PADRAO', 500), 1), limite_maximo)
+            try:
+                comando = consulta_pagina(consulta, limite, cursor)
+            except ValueError as e:
+                return JSONResponse({'message': str(e)}, 400)
+            async with self.engine.connect() as conexao:
+                linhas = (await conexao.execute(comando)).all()
+            itens, proximo_cursor = montar_pagina(linhas, limite)
+            return responder(JSONResponse({'itens': itens, 'proximo_cursor': proximo_cursor,
+                                           'limite': limite}))
+
+        if stream:
+            return responder(StreamingResponse(self._stream_json(consulta), media_type='application/json'))
+
+        async with self.engine.connect() as conexao:
+            linhas = (await conexao.execute(consulta.order_by(*ORDENACAO))).all()
+        return responder(JSONResponse([serializar_leitura(l) for l in linhas]))
+
+    async def _stream_json(self, consulta):
+        """stream_leituras_json com cursor do servidor no AsyncConnection"""
+        async with self.engine.connect() as conexao:
+            resultado = await conexao.stream(
+                consulta.order_by(*ORDENACAO).execution_options(yield_per=TAMANHO_LOTE_STREAM)
+            )
+            yield '['
+            separador = ''
+            async for particao in resultado.partitions():
+                yield separador + bloco_json(particao)
+                separador = ','
+            yield ']'
+
+    async def stream_leituras(self, request, current_user):
+        """GET /api/leituras/stream: feed SSE sem uma thread por conexão"""
+        assinatura = eventos_leituras.assinar(request.query_params.get('lote'), assincrona=True)
+        if assinatura is None:
+            return JSONResponse({'message': 'Limite de conexões do feed atingido, tente novamente'}, 503)
+
+        corpo = stream_sse_assincrono(assinatura,
+                                      duracao_maxima=self.config.get('SSE_DURACAO_MAXIMA', 110),
+                                      intervalo_ping=self.config.get('SSE_INTERVALO_PING', 15))
+        # A tarefa de fundo remove a assinatura mesmo se o corpo nunca for iterado
+        return StreamingResponse(corpo, media_type='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }, background=BackgroundTask(eventos_leituras.cancelar, assinatura))
+
+    # ---------------------------------------------------------------- aplicação
+
+    def rotas(self):
+        return [
+            Route('/api/login', self._rota('/api/login', 'api_login')(self.login), methods=['POST']),
+            Route('/api/leituras',
+                  self._rota('/api/leituras', 'api_criar_leitura')(
+                      self._protegida('CRIAR_LEITURAS', aceita_dispositivo=True)(self.criar_leituras)),
+                  methods=['POST']),
+            Route('/api/leituras',
+                  self._rota('/api/leituras', 'api_listar_leituras')(
+                      self._protegida('LISTAR_LEITURAS')(self.listar_leituras)),
+                  methods=['GET']),
+            Route('/api/leituras/stream',
+                  self._rota('/api/leituras/stream', 'api_stream_leituras')(
+                      self._protegida('STREAM_LEITURAS')(self.stream_leituras)),
+                  methods=['GET']),
+            # Todo o resto (inclusive OPTIONS/CORS, /metrics, Swagger e páginas) no Flask
+            Mount('/', app=WSGIMiddleware(self.flask_app, workers=self.config.get('ASGI_THREADS_WSGI', 10)))
+        ]
+
+
+def criar_app_asgi(flask_app):
+    """Aplicação ASGI (Starlette) com as rotas assíncronas na frente do `flask_app`"""
+    api = ApiAssincrona(flask_app)
+    aplicacao = Starlette(routes=api.rotas(), lifespan=api.ciclo_de_vida,
+                          middleware=[Middleware(CompressaoASGI, compressao=compressao)])
+    aplicacao.state.api = api
+    return aplicacao
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, g
+from flask import Flask, request, jsonify, render_template, redirect, url_for, g, Response, stream_with_context, send_file
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from werkzeug.security import generate_password_hash
@@ -11,6 +11,8 @@ from extensions import db, migrate
 import secrets
 import os
 import json
+import click
+import hashlib
 
 from sqlalchemy.sql import text
 from datetime import timedelta
@@ -24,7 +26,35 @@ from logging_utils import (
     log_acesso_tela, log_crud_operation, registrar_log_atividade
 )
 
-from models import User, Item, Leitura, Parametro, Log
+from models import User, Item, Leitura, Parametro, Log, RelatorioJob, Dispositivo
+from log_writer import log_writer
+from ingestao import validar_leituras, inserir_leituras, converter_data
+from ingestao_binaria import TIPO_CONTEUDO as TIPO_LEITURAS_BINARIO, decodificar_leituras, quantidade_leituras
+from idempotencia import origem_requisicao, registrar_lote
+from auth_cache import token_cache, verificar_token, invalidar_usuario
+from banco import configurar_banco
+from cache import cache
+from metricas import metricas
+from perfil_sql import perfil_sql
+from compressao import compressao
+from versoes_tabelas import incrementar_versao, resposta_versionada, versao_tabela, validadores, nao_modificado
+from relatorio_jobs import fila_relatorios
+from senhas import verificador_senhas, LoginRecusado
+from dispositivos import indice_dispositivos, gerar_chave, validar_escopo
+from eventos_leituras import eventos_leituras, stream_sse
+from exportacao import (
+    consulta_exportacao, stream_leituras_csv, exportar_leituras_colunar, FORMATOS_COLUNARES
+)
+from agregacao import agregar_leituras
+from rollups import (
+    GRANULARIDADES, atualizar_rollups, recalcular_intervalo, reconstruir_rollups,
+    agregar_por_rollups, resumo_leituras
+)
+from leituras_utils import (
+    ORDENACAO, consulta_leituras, pagina_leituras, serializar_leitura, stream_leituras_json, filtros_relatorio,
+    leituras_desde, decodificar_watermark, tag_cache_leituras, tags_alteracao_leituras,
+    incrementar_versoes_leituras
+)
 
 # Obtenha o caminho absoluto do diretório onde app.py está (Backend/)
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -112,6 +142,12 @@ SWAGGER_TEMPLATE = {
             "name": "Authorization",
             "in": "header",
             "description": "Token de autorização JWT. Formato: 'Bearer {seu_token_jwt_aqui}'"
+        },
+        "ApiKey": {
+            "type": "apiKey",
+            "name": "X-API-Key",
+            "in": "header",
+            "description": "Chave de API de um dispositivo (apenas POST /api/leituras)"
         }
     },
     "tags": [
@@ -142,6 +178,10 @@ SWAGGER_TEMPLATE = {
         {
             "name": "Relatórios",
             "description": "Geração de relatórios em PDF"
+        },
+        {
+            "name": "Dispositivos",
+            "description": "Chaves de API dos controladores de incubadora"
         }
     ],
     "definitions": {
@@ -210,7 +250,18 @@ app.config.from_object(Config)
 swagger = Swagger(app, config=SWAGGER_CONFIG, template=SWAGGER_TEMPLATE)
 
 db.init_app(app)
+configurar_banco(app)
 migrate.init_app(app, db)
+cache.init_app(app)
+log_writer.init_app(app)
+token_cache.configurar(app)
+verificador_senhas.init_app(app)
+indice_dispositivos.configurar(app)
+fila_relatorios.init_app(app)
+eventos_leituras.init_app(app)
+metricas.init_app(app)
+perfil_sql.init_app(app)
+compressao.init_app(app)
 
 # ==================== MIDDLEWARES E DECORADORES ====================
 
@@ -264,7 +315,8 @@ def token_required(f):
             return jsonify({'message': 'Token is missing!'}), 401
         
         try:
-            current_user = User.verify_auth_token(token, app.config['JWT_SECRET_KEY'])
+            # Usuário leve (id, username, is_admin) vindo do cache de tokens
+            current_user = verificar_token(token, app.config['JWT_SECRET_KEY'])
             if not current_user:
                 return jsonify({'message': 'Token is invalid!'}), 401
             
@@ -278,6 +330,26 @@ def token_required(f):
     
     return decorated
 
+def token_ou_chave_dispositivo(f):
+    """token_required que também aceita a chave de API de um dispositivo (X-API-Key)"""
+    com_token = token_required(f)
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        chave = request.headers.get('X-API-Key')
+        if chave is None:
+            return com_token(*args, **kwargs)
+        
+        # Índice em memória: sem JWT e sem consulta à tabela users
+        dispositivo = indice_dispositivos.verificar(chave)
+        if not dispositivo:
+            return jsonify({'message': 'API key is invalid!'}), 401
+        
+        g.current_user = dispositivo
+        return f(dispositivo, *args, **kwargs)
+    
+    return decorated
+
 # ==================== ROTAS DE PÁGINAS (TEMPLATES) ====================
 
 @app.route('/')
@@ -428,7 +500,9 @@ def api_register():
             }
         },
         400: {'description': 'Campos obrigatórios não informados'},
-        401: {'description': 'Credenciais inválidas'}
+        401: {'description': 'Credenciais inválidas'},
+        429: {'description': 'Limite de tentativas do IP ou de falhas do usuário (ver Retry-After)'},
+        503: {'description': 'Verificações de senha esgotadas no momento (ver Retry-After)'}
     }
 })
 def api_login():
@@ -439,12 +513,26 @@ def api_login():
         log_login_attempt('', False, 'campos_faltando')
         return jsonify({'message': 'Missing username or password!'}), 400
     
-    user = User.query.filter_by(username=data['username']).first()
+    try:
+        verificador_senhas.admitir(request.environ.get('HTTP_X_REAL_IP', request.remote_addr),
+                                   data['username'])
+        user = User.query.filter_by(username=data['username']).first()
+        # Hash verificado no pool de processos; novo_hash se o fator de trabalho mudou
+        senha_correta, novo_hash = (verificador_senhas.verificar(user.password_hash, data['password'])
+                                    if user else (False, None))
+    except LoginRecusado as e:
+        log_login_attempt(data['username'], False, e.motivo)
+        return jsonify({'message': e.mensagem}), e.status_code, {'Retry-After': str(e.retry_after)}
     
-    if not user or not user.check_password(data['password']):
+    if not senha_correta:
+        verificador_senhas.registrar_falha(data['username'])
         log_login_attempt(data['username'], False, 'credenciais_invalidas')
         return jsonify({'message': 'Invalid username or password!'}), 401
     
+    if novo_hash:
+        user.password_hash = novo_hash
+        db.session.commit()
+    
     token = user.generate_auth_token(app.config['JWT_SECRET_KEY'])
     log_login_attempt(data['username'], True)
     
@@ -476,62 +564,135 @@ def api_logout(current_user):
     return jsonify({'message': 'Logout realizado com sucesso'}), 200
 
 @app.route('/api/leituras', methods=['POST'])
-@token_required
+@token_ou_chave_dispositivo
 @log_activity("CRIAR_LEITURAS")
 @swag_from({
     'tags': ['Leituras'],
     'summary': 'Criar leituras',
-    'description': 'Criar novas leituras de embrião (suporte a múltiplas leituras)',
-    'security': [{'Bearer': []}],
-    'parameters': [{
-        'name': 'body',
-        'in': 'body',
-        'required': True,
-        'schema': {
-            'oneOf': [
-                {'$ref': '#/definitions/Leitura'},
-                {'type': 'array', 'items': {'$ref': '#/definitions/Leitura'}}
-            ]
-        }
-    }],
+    'description': 'Criar novas leituras de embrião (suporte a múltiplas leituras). Com a chave de '
+                   'um dispositivo (X-API-Key), leituras de lotes fora do escopo dele são rejeitadas. '
+                   f'Além de JSON, aceita o quadro binário compacto {TIPO_LEITURAS_BINARIO} '
+                   '(formato descrito em ingestao_binaria.py). Com X-Sequencia o lote é idempotente: '
+                   'leituras já recebidas da mesma origem são descartadas e a resposta traz as faixas '
+                   'recebidas e todas as já gravadas da origem (ver idempotencia.py)',
+    'consumes': ['application/json', TIPO_LEITURAS_BINARIO],
+    'security': [{'Bearer': []}, {'ApiKey': []}],
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'oneOf': [
+                    {'$ref': '#/definitions/Leitura'},
+                    {'type': 'array', 'items': {'$ref': '#/definitions/Leitura'}}
+                ]
+            }
+        },
+        {'name': 'X-Sequencia', 'in': 'header', 'type': 'integer', 'required': False,
+         'description': 'Número de sequência da primeira leitura do lote (as demais seguem em ordem)'},
+        {'name': 'X-Dispositivo', 'in': 'header', 'type': 'string', 'required': False,
+         'description': 'Identificador do dispositivo; obrigatório com X-Sequencia e token JWT'}
+    ],
     'responses': {
-        201: {'description': 'Leituras criadas com sucesso'},
+        200: {'description': 'Lote já recebido: todas as leituras eram duplicadas'},
+        201: {'description': 'Leituras criadas com sucesso (itens inválidos são listados em "erros")'},
         400: {'description': 'Dados inválidos'},
+        413: {'description': 'Lote excede INGESTAO_MAX_ITENS leituras'},
         401: {'description': 'Token inválido ou ausente'}
     }
 })
 def api_criar_leitura(current_user):
     """Criar novas leituras de embrião (suporte a múltiplas leituras)"""
     try:
-        if not request.is_json:
-            return jsonify({'message': 'O corpo da requisição deve ser JSON'}), 400
-            
-        data = request.get_json()
-        
-        if not isinstance(data, list):
-            data = [data]
-        
-        leituras = []
-        for item in data:
-            nova = Leitura(
-                umidade=item.get('umidade'),
-                temperatura=item.get('temperatura'),
-                pressao=item.get('pressao'),
-                lote=item.get('lote'),
-                data_inicial=item.get('data_inicial'),
-                data_final=item.get('data_final')
-            )
-            leituras.append(nova)
+        limite = app.config.get('INGESTAO_MAX_ITENS', 20000)
+        lotes_permitidos = getattr(current_user, 'lotes', None)
+
+        if request.mimetype == TIPO_LEITURAS_BINARIO:
+            # Quadro binário das placas: decodificado em colunas, sem parser JSON
+            corpo = request.get_data()
+            quantidade = quantidade_leituras(corpo)
+            if quantidade > limite:
+                return jsonify({'message': f'Máximo de {limite} leituras por requisição'}), 413
+            linhas, rejeitadas = decodificar_leituras(corpo, lotes_permitidos)
+        elif request.is_json:
+            data = request.get_json()
+
+            if not isinstance(data, list):
+                data = [data]
+
+            quantidade = len(data)
+            if quantidade > limite:
+                return jsonify({'message': f'Máximo de {limite} leituras por requisição'}), 413
+
+            # Validação em uma passada
+            linhas, rejeitadas = validar_leituras(data, lotes_permitidos)
+        else:
+            return jsonify({'message': f'O corpo da requisição deve ser JSON ou {TIPO_LEITURAS_BINARIO}'}), 400
+
+        # Reenvio idempotente (X-Sequencia): descarta as leituras já recebidas
+        # da mesma origem, com o índice travado até o commit
+        try:
+            sequenciado = origem_requisicao(request.headers, current_user)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        sequencias, duplicadas = None, 0
+        if sequenciado is not None:
+            linhas, rejeitadas, sequencias, duplicadas = registrar_lote(
+                *sequenciado, quantidade, linhas, rejeitadas, app.config.get('IDEMPOTENCIA_MAX_FAIXAS', 64))
+            if not linhas:
+                db.session.commit()
+                if duplicadas and not rejeitadas:
+                    metricas.registrar_ingestao(0, 0, duplicadas)
+                    return jsonify({
+                        'message': 'Lote já recebido',
+                        'quantidade': 0,
+                        'aceitas': 0,
+                        'rejeitadas': 0,
+                        'duplicadas': duplicadas,
+                        'erros': [],
+                        'sequencias': sequencias
+                    }), 200
+
+        if not linhas:
+            metricas.registrar_ingestao(0, len(rejeitadas), duplicadas)
+            log_crud_operation(current_user, 'leituras', 'CREATE_FAILED',
+                              dados={'rejeitadas': len(rejeitadas)})
+            resposta = {
+                'message': 'Nenhuma leitura válida',
+                'quantidade': 0,
+                'aceitas': 0,
+                'rejeitadas': len(rejeitadas),
+                'erros': rejeitadas
+            }
+            if sequencias is not None:
+                resposta.update(duplicadas=duplicadas, sequencias=sequencias)
+            return jsonify(resposta), 400
         
-        db.session.add_all(leituras)
+        # INSERT em massa (COPY no PostgreSQL)
+        inserir_leituras(linhas)
+        if app.config.get('ROLLUPS_HABILITADOS', True):
+            atualizar_rollups(linhas)
+        incrementar_versoes_leituras(l.get('lote') for l in linhas)
         db.session.commit()
+        metricas.registrar_ingestao(len(linhas), len(rejeitadas), duplicadas)
+        cache.invalidar(*tags_alteracao_leituras(l.get('lote') for l in linhas))
+        eventos_leituras.publicar(linhas)
         
-        log_crud_operation(current_user, 'leituras', 'CREATE_BATCH', dados={'quantidade': len(leituras)})
+        log_crud_operation(current_user, 'leituras', 'CREATE_BATCH',
+                          dados={'quantidade': len(linhas), 'rejeitadas': len(rejeitadas),
+                                 'duplicadas': duplicadas})
         
-        return jsonify({
-            'message': f'{len(leituras)} leituras criadas com sucesso',
-            'quantidade': len(leituras)
-        }), 201
+        resposta = {
+            'message': f'{len(linhas)} leituras criadas com sucesso',
+            'quantidade': len(linhas),
+            'aceitas': len(linhas),
+            'rejeitadas': len(rejeitadas),
+            'erros': rejeitadas
+        }
+        if sequencias is not None:
+            resposta.update(duplicadas=duplicadas, sequencias=sequencias)
+        return jsonify(resposta), 201
         
     except Exception as e:
         db.session.rollback()
@@ -544,47 +705,217 @@ def api_criar_leitura(current_user):
 @swag_from({
     'tags': ['Leituras'],
     'summary': 'Listar leituras',
-    'description': 'Listar leituras de embriões com filtro opcional por lote',
+    'description': 'Listar leituras de embriões com filtro opcional por lote. '
+                   'Com "limite" e/ou "cursor" a resposta é paginada por cursor (keyset); '
+                   'com "stream=true" o array é enviado em streaming; com "since_id" ou '
+                   '"since" apenas as leituras novas. Respostas levam ETag (If-None-Match → 304).',
     'security': [{'Bearer': []}],
-    'parameters': [{
-        'name': 'lote',
-        'in': 'query',
-        'type': 'string',
-        'required': False,
-        'description': 'Filtrar por lote específico',
-        'example': 'LOTE_001'
-    }],
+    'parameters': [
+        {
+            'name': 'lote',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Filtrar por lote específico',
+            'example': 'LOTE_001'
+        },
+        {'name': 'limite', 'in': 'query', 'type': 'integer', 'required': False,
+         'description': 'Tamanho da página (alias: limit)'},
+        {'name': 'cursor', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Valor de "proximo_cursor" da página anterior'},
+        {'name': 'stream', 'in': 'query', 'type': 'boolean', 'required': False,
+         'description': 'Envia o array completo em streaming (cursor do servidor)'},
+        {'name': 'since_id', 'in': 'query', 'type': 'integer', 'required': False,
+         'description': 'Apenas leituras com id maior (delta); devolve {itens, watermark, mais}'},
+        {'name': 'since', 'in': 'query', 'type': 'string', 'format': 'date-time', 'required': False,
+         'description': 'Delta por data: uma data ISO 8601 na primeira chamada, depois o '
+                        '"watermark" devolvido ("<data_inicial>|<id>")'},
+        {'name': 'If-None-Match', 'in': 'header', 'type': 'string', 'required': False,
+         'description': 'ETag da resposta anterior; 304 se nada mudou no lote'}
+    ],
     'responses': {
         200: {
-            'description': 'Lista de leituras',
+            'description': 'Lista de leituras (array) ou página {itens, proximo_cursor, limite}',
             'schema': {
                 'type': 'array',
                 'items': {'$ref': '#/definitions/Leitura'}
             }
         },
+        304: {'description': 'Nada mudou desde o ETag informado'},
+        400: {'description': 'Cursor ou watermark inválido'},
         401: {'description': 'Token inválido ou ausente'}
     }
 })
 def api_listar_leituras(current_user):
     """Listar todas as leituras de embriões"""
     lote = request.args.get('lote')
+    limite = request.args.get('limite', type=int) or request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    stream = request.args.get('stream', '').lower() in ('1', 'true')
+    since_id = request.args.get('since_id')
+    since = request.args.get('since')
     
-    query = Leitura.query
+    # ETag/Last-Modified: contador de alterações do lote (versoes_tabelas) +
+    # parâmetros da requisição. Se o cliente já tem essa versão, responde 304
+    # sem consultar as leituras.
+    versao, alterado_em = versao_tabela(tag_cache_leituras(lote))
+    etag, ultima_alteracao = validadores(versao, alterado_em, 'leituras',
+                                         sorted(request.args.items(multi=True)))
     
-    if lote:
-        query = query.filter(Leitura.lote == lote)
+    def responder(resposta):
+        resposta.set_etag(etag)
+        if ultima_alteracao is not None:
+            resposta.last_modified = ultima_alteracao
+        resposta.headers['Cache-Control'] = 'private, no-cache'
+        return resposta
     
-    leituras = query.order_by(Leitura.data_inicial.desc()).all()
+    if nao_modificado(etag, ultima_alteracao, request.if_none_match, request.if_modified_since):
+        return responder(Response(status=304))
     
-    return jsonify([{
-        'id': l.id,
-        'umidade': l.umidade,
-        'temperatura': l.temperatura,
-        'pressao': l.pressao,
-        'lote': l.lote,
-        'data_inicial': l.data_inicial.isoformat() if l.data_inicial else None,
-        'data_final': l.data_final.isoformat() if l.data_final else None
-    } for l in leituras]), 200
+    consulta = consulta_leituras(lote)
+    limite_maximo = app.config.get('LEITURAS_LIMITE_MAXIMO', 5000)
+    
+    # Delta incremental a partir do watermark do cliente (since_id ou since)
+    if since_id is not None or since is not None:
+        try:
+            since_id = int(since_id) if since_id is not None else None
+            since = decodificar_watermark(since) if since_id is None else None
+            if since_id is None and since is None:
+                raise ValueError
+        except ValueError:
+            return jsonify({'message': 'since_id deve ser inteiro e since uma data ISO 8601 ou um watermark'}), 400
+        limite = min(max(limite or limite_maximo, 1), limite_maximo)
+        itens, watermark, mais = leituras_desde(consulta, limite, since_id, since)
+        return responder(jsonify({
+            'itens': itens,
+            'watermark': watermark,
+            'mais': mais,
+            'limite': limite
+        }))
+    
+    # Paginação por cursor (keyset) em (data_inicial, id)
+    if limite or cursor:
+        limite = min(max(limite or app.config.get('LEITURAS_LIMITE_PADRAO', 500), 1), limite_maximo)
+        try:
+            itens, proximo_cursor = pagina_leituras(consulta, limite, cursor)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        return responder(jsonify({
+            'itens': itens,
+            'proximo_cursor': proximo_cursor,
+            'limite': limite
+        }))
+    
+    # Array completo enviado em streaming a partir do cursor do servidor
+    if stream:
+        return responder(Response(stream_with_context(stream_leituras_json(consulta)),
+                                  status=200, mimetype='application/json'))
+    
+    leituras = db.session.execute(consulta.order_by(*ORDENACAO)).all()
+    
+    return responder(jsonify([serializar_leitura(l) for l in leituras]))
+
+@app.route('/api/leituras/stream', methods=['GET'])
+@token_required
+@log_activity("STREAM_LEITURAS")
+@swag_from({
+    'tags': ['Leituras'],
+    'summary': 'Feed de novas leituras (SSE)',
+    'description': 'Server-Sent Events com as leituras ingeridas a partir da conexão '
+                   '(evento "leituras": {lote, leituras, omitidas}). Quando "omitidas" > 0 '
+                   'o cliente deve recarregar os agregados. A conexão é encerrada após '
+                   'SSE_DURACAO_MAXIMA segundos e o cliente reconecta. Servido apenas nos '
+                   'perfis gthread, gevent e asgi do gunicorn; no sync responde 503.',
+    'security': [{'Bearer': []}],
+    'parameters': [
+        {'name': 'lote', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Recebe apenas as leituras deste lote'}
+    ],
+    'produces': ['text/event-stream'],
+    'responses': {
+        200: {'description': 'Fluxo text/event-stream'},
+        503: {'description': 'Limite de conexões do feed atingido ou feed desligado (perfil sync)'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_stream_leituras(current_user):
+    """Feed SSE de novas leituras"""
+    if not app.config.get('SSE_HABILITADO', True):
+        # Worker sync: a conexão prenderia o processo inteiro até o timeout
+        return jsonify({'message': 'Feed de leituras indisponível neste servidor',
+                        'feed_desabilitado': True}), 503
+    assinatura = eventos_leituras.assinar(request.args.get('lote'))
+    if assinatura is None:
+        return jsonify({'message': 'Limite de conexões do feed atingido, tente novamente'}), 503
+    
+    corpo = stream_sse(assinatura,
+                       duracao_maxima=app.config.get('SSE_DURACAO_MAXIMA', 110),
+                       intervalo_ping=app.config.get('SSE_INTERVALO_PING', 15))
+    resposta = Response(corpo, status=200, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Garante a remoção da assinatura mesmo se o corpo nunca for iterado
+    resposta.call_on_close(lambda: eventos_leituras.cancelar(assinatura))
+    return resposta
+
+@app.route('/api/leituras/agregado', methods=['GET'])
+@token_required
+@log_activity("AGREGAR_LEITURAS")
+@swag_from({
+    'tags': ['Leituras'],
+    'summary': 'Leituras agregadas por intervalo',
+    'description': 'Mínimo, média e máximo de temperatura, umidade e pressão por intervalo '
+                   'de tempo (minuto, hora ou dia), calculados no banco. Com intervalo=auto '
+                   'o servidor escolhe o intervalo para manter o número de pontos pequeno. '
+                   'Hora e dia são lidos da tabela de rollups.',
+    'security': [{'Bearer': []}],
+    'parameters': [
+        {'name': 'lote', 'in': 'query', 'type': 'string', 'required': False},
+        {'name': 'intervalo', 'in': 'query', 'type': 'string', 'required': False,
+         'enum': ['auto', 'minuto', 'hora', 'dia'], 'default': 'auto'},
+        {'name': 'data_inicio', 'in': 'query', 'type': 'string', 'format': 'date-time', 'required': False},
+        {'name': 'data_fim', 'in': 'query', 'type': 'string', 'format': 'date-time', 'required': False}
+    ],
+    'responses': {
+        200: {'description': 'Pontos agregados {intervalo, pontos: [{inicio, quantidade, temperatura, umidade, pressao}]}'},
+        400: {'description': 'Parâmetros inválidos'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_agregar_leituras(current_user):
+    """Leituras agregadas por intervalo de tempo (para gráficos)"""
+    lote = request.args.get('lote')
+    intervalo = request.args.get('intervalo', 'auto')
+    data_inicio = request.args.get('data_inicio')
+    data_fim = request.args.get('data_fim')
+    
+    try:
+        if data_inicio:
+            data_inicio = datetime.datetime.fromisoformat(data_inicio)
+        if data_fim:
+            data_fim_texto = data_fim
+            data_fim = datetime.datetime.fromisoformat(data_fim)
+            if len(data_fim_texto) == 10:
+                data_fim = data_fim.replace(hour=23, minute=59, second=59)
+        
+        
+        def calcular():
+            if intervalo in GRANULARIDADES and app.config.get('ROLLUPS_HABILITADOS', True):
+                return {'intervalo': intervalo,
+                        'pontos': agregar_por_rollups(lote, intervalo, data_inicio, data_fim)}
+            intervalo_usado, pontos = agregar_leituras(lote, intervalo, data_inicio, data_fim)
+            return {'intervalo': intervalo_usado, 'pontos': pontos}
+        
+        # Invalidado pelas escritas de leituras do lote; o TTL cobre os demais workers
+        chave = hashlib.sha1(repr((lote, intervalo, data_inicio, data_fim)).encode()).hexdigest()
+        resultado = cache.obter_ou_calcular(f'agregado:{chave}', calcular,
+                                            ttl=app.config.get('CACHE_TTL_AGREGADOS', 60),
+                                            tags=(tag_cache_leituras(lote),))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    return jsonify(resultado), 200
 
 @app.route('/api/leituras/<int:leitura_id>', methods=['PUT'])
 @token_required
@@ -617,15 +948,30 @@ def api_atualizar_leitura(current_user, leitura_id):
         'pressao': leitura.pressao,
         'lote': leitura.lote
     }
+    # Intervalo de origem, antes de qualquer campo ser alterado
+    lote_anterior, data_anterior = leitura.lote, leitura.data_inicial
+    
+    try:
+        data_inicial = converter_data(data.get('data_inicial', leitura.data_inicial))
+        data_final = converter_data(data.get('data_final', leitura.data_final))
+    except ValueError:
+        return jsonify({'message': 'Datas devem estar no formato ISO 8601'}), 400
     
     leitura.umidade = data.get('umidade', leitura.umidade)
     leitura.temperatura = data.get('temperatura', leitura.temperatura)
     leitura.pressao = data.get('pressao', leitura.pressao)
     leitura.lote = data.get('lote', leitura.lote)
-    leitura.data_inicial = data.get('data_inicial', leitura.data_inicial)
-    leitura.data_final = data.get('data_final', leitura.data_final)
+    leitura.data_inicial = data_inicial
+    leitura.data_final = data_final
 
+    if app.config.get('ROLLUPS_HABILITADOS', True):
+        db.session.flush()
+        # Recalcula os intervalos de origem e de destino da leitura
+        recalcular_intervalo(lote_anterior, data_anterior)
+        recalcular_intervalo(leitura.lote, leitura.data_inicial)
+    incrementar_versoes_leituras([lote_anterior, leitura.lote])
     db.session.commit()
+    cache.invalidar(*tags_alteracao_leituras([lote_anterior, leitura.lote]))
     
     log_crud_operation(current_user, 'leituras', 'UPDATE', leitura_id, 
                       dados={'anteriores': dados_anteriores, 'novos': data})
@@ -659,8 +1005,14 @@ def api_deletar_leitura(current_user, leitura_id):
         'temperatura': leitura.temperatura
     }
     
+    lote_anterior, data_anterior = leitura.lote, leitura.data_inicial
     db.session.delete(leitura)
+    if app.config.get('ROLLUPS_HABILITADOS', True):
+        db.session.flush()
+        recalcular_intervalo(lote_anterior, data_anterior)
+    incrementar_versoes_leituras([lote_anterior])
     db.session.commit()
+    cache.invalidar(*tags_alteracao_leituras([lote_anterior]))
     
     log_crud_operation(current_user, 'leituras', 'DELETE', leitura_id, dados=dados_leitura)
     
@@ -709,6 +1061,7 @@ def api_criar_parametro(current_user):
             estagio_ovo=data.get('estagio_ovo')
         )
         db.session.add(novo_parametro)
+        incrementar_versao('parametros')
         db.session.commit()
         
         log_crud_operation(current_user, 'parametros', 'CREATE', novo_parametro.id, 
@@ -733,6 +1086,7 @@ def api_criar_parametro(current_user):
     'security': [{'Bearer': []}],
     'responses': {
         200: {'description': 'Lista de empresas'},
+        304: {'description': 'Nada mudou desde o ETag/Last-Modified informado'},
         403: {'description': 'Acesso negado (apenas administradores)'},
         401: {'description': 'Token inválido ou ausente'}
     }
@@ -742,8 +1096,11 @@ def api_get_empresas(current_user):
     if not current_user.is_admin:
         return jsonify({'message': 'Acesso negado!'}), 403
     
-    empresas = db.session.query(Parametro.empresa).distinct().all()
-    return jsonify([e[0] for e in empresas if e[0]]), 200
+    def listar_empresas():
+        empresas = db.session.query(Parametro.empresa).distinct().all()
+        return [e[0] for e in empresas if e[0]]
+    
+    return resposta_versionada('parametros', 'empresas', {}, listar_empresas)
 
 @app.route('/api/lotes', methods=['GET'])
 @token_required
@@ -756,6 +1113,7 @@ def api_get_empresas(current_user):
     'parameters': [{'name': 'empresa', 'in': 'query', 'type': 'string', 'required': False}],
     'responses': {
         200: {'description': 'Lista de lotes'},
+        304: {'description': 'Nada mudou desde o ETag/Last-Modified informado'},
         401: {'description': 'Token inválido ou ausente'}
     }
 })
@@ -763,12 +1121,13 @@ def api_get_lotes(current_user):
     """Obter lista de todos os lotes (ou filtrado por empresa)"""
     empresa = request.args.get('empresa')
     
-    query = db.session.query(Parametro.lote).distinct()
-    if empresa:
-        query = query.filter_by(empresa=empresa)
+    def listar_lotes():
+        query = db.session.query(Parametro.lote).distinct()
+        if empresa:
+            query = query.filter_by(empresa=empresa)
+        return [l[0] for l in query.all() if l[0]]
     
-    lotes = query.all()
-    return jsonify([l[0] for l in lotes if l[0]]), 200
+    return resposta_versionada('parametros', 'lotes', {'empresa': empresa}, listar_lotes)
 
 @app.route('/api/parametros', methods=['GET'])
 @token_required
@@ -784,6 +1143,7 @@ def api_get_lotes(current_user):
     ],
     'responses': {
         200: {'description': 'Parâmetros encontrados'},
+        304: {'description': 'Nada mudou desde o ETag/Last-Modified informado'},
         400: {'description': 'Empresa e lote são obrigatórios'},
         403: {'description': 'Acesso negado (apenas administradores)'},
         401: {'description': 'Token inválido ou ausente'}
@@ -800,9 +1160,12 @@ def api_get_parametros(current_user):
     if not empresa or not lote:
         return jsonify({'message': 'Empresa e lote são obrigatórios'}), 400
 
-    parametros = Parametro.query.filter_by(empresa=empresa, lote=lote).all()
+    def buscar_parametros():
+        parametros = Parametro.query.filter_by(empresa=empresa, lote=lote).all()
+        return [p.to_dict() for p in parametros]
 
-    return jsonify([p.to_dict() for p in parametros]), 200
+    return resposta_versionada('parametros', 'parametros', {'empresa': empresa, 'lote': lote},
+                               buscar_parametros)
 
 @app.route('/api/parametros/<int:id>', methods=['PUT'])
 @token_required
@@ -853,6 +1216,7 @@ def api_atualizar_parametro(current_user, id):
         if 'estagio_ovo' in data:
             parametro.estagio_ovo = data.get('estagio_ovo')
 
+        incrementar_versao('parametros')
         db.session.commit()
         
         log_parametro_alteracao(current_user, id, dados_anteriores, parametro.to_dict(), 'UPDATE')
@@ -913,6 +1277,56 @@ def api_get_logs(current_user):
     
     return jsonify([log.to_dict() for log in logs]), 200
 
+@app.route('/api/cache/estatisticas', methods=['GET'])
+@token_required
+@swag_from({
+    'tags': ['Logs'],
+    'summary': 'Estatísticas de cache',
+    'description': 'Acertos, falhas e erros do cache compartilhado (por grupo de chave) e do '
+                   'cache de tokens deste worker (apenas administradores)',
+    'security': [{'Bearer': []}],
+    'responses': {
+        200: {'description': 'Estatísticas {cache, tokens}'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_estatisticas_cache(current_user):
+    """Estatísticas dos caches do processo"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    return jsonify({
+        'cache': cache.estatisticas(),
+        'tokens': token_cache.estatisticas()
+    }), 200
+
+@app.route('/api/perfil-sql/lentas', methods=['GET'])
+@token_required
+@swag_from({
+    'tags': ['Logs'],
+    'summary': 'Requisições mais lentas (perfil de SQL)',
+    'description': 'Requisições amostradas pelo perfil de SQL (PERFIL_SQL_HABILITADO) com maior '
+                   'duração neste worker: comandos executados, tempo, local de chamada e comandos '
+                   'repetidos (suspeitas de N+1). Apenas administradores.',
+    'security': [{'Bearer': []}],
+    'parameters': [
+        {'name': 'limite', 'in': 'query', 'type': 'integer', 'required': False}
+    ],
+    'responses': {
+        200: {'description': 'Estatísticas do perfil e lista {requisicoes}'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_perfil_sql_lentas(current_user):
+    """Requisições amostradas mais lentas do worker"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    return jsonify(dict(perfil_sql.estatisticas(),
+                        requisicoes=perfil_sql.mais_lentas(request.args.get('limite', type=int)))), 200
+
 @app.route('/api/usuarios', methods=['GET'])
 @token_required
 @log_activity("LISTAR_USUARIOS")
@@ -968,18 +1382,9 @@ def api_relatorio_leituras(current_user):
     data_inicio = request.args.get('data_inicio')
     data_fim = request.args.get('data_fim')
     
-    query = Leitura.query
+    query = Leitura.query.filter(*filtros_relatorio(lote, data_inicio, data_fim))
     
-    if lote:
-        query = query.filter(Leitura.lote == lote)
-    if data_inicio:
-        query = query.filter(Leitura.data_inicial >= data_inicio)
-    if data_fim:
-        data_fim_obj = datetime.datetime.strptime(data_fim, '%Y-%m-%d')
-        data_fim_obj = data_fim_obj.replace(hour=23, minute=59, second=59)
-        query = query.filter(Leitura.data_inicial <= data_fim_obj)
-    
-    leituras = query.order_by(Leitura.data_inicial.desc()).all()
+    leituras = query.order_by(Leitura.data_inicial.desc().nulls_last()).all()
     
     return jsonify([{
         'id': l.id,
@@ -991,6 +1396,127 @@ def api_relatorio_leituras(current_user):
         'data_final': l.data_final.isoformat() if l.data_final else None
     } for l in leituras]), 200
 
+@app.route('/api/relatorio/leituras.csv', methods=['GET'])
+@token_required
+@log_activity("EXPORTAR_LEITURAS_CSV")
+@swag_from({
+    'tags': ['Relatórios'],
+    'summary': 'Exportar leituras CSV',
+    'description': 'Exportar leituras em CSV enviado em streaming, com os mesmos filtros de '
+                   '/api/relatorio/leituras (apenas administradores)',
+    'security': [{'Bearer': []}],
+    'parameters': [
+        {'name': 'lote', 'in': 'query', 'type': 'string', 'required': False},
+        {'name': 'data_inicio', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False},
+        {'name': 'data_fim', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False}
+    ],
+    'produces': ['text/csv'],
+    'responses': {
+        200: {'description': 'Arquivo CSV'},
+        400: {'description': 'Datas inválidas'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_exportar_leituras_csv(current_user):
+    """Exportar leituras em CSV (streaming)"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    try:
+        filtros = filtros_relatorio(request.args.get('lote'), request.args.get('data_inicio'),
+                                    request.args.get('data_fim'))
+    except ValueError:
+        return jsonify({'message': 'data_fim deve estar no formato AAAA-MM-DD'}), 400
+    
+    return Response(stream_with_context(stream_leituras_csv(consulta_exportacao(filtros))),
+                    status=200, mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename="leituras_embryotech.csv"'})
+
+@app.route('/api/relatorio/leituras.<any(parquet, arrow):formato>', methods=['GET'])
+@token_required
+@log_activity("EXPORTAR_LEITURAS_COLUNAR")
+@swag_from({
+    'tags': ['Relatórios'],
+    'summary': 'Exportar leituras Parquet/Arrow',
+    'description': 'Exportar leituras em formato colunar (Parquet ou Arrow IPC, compressão zstd), '
+                   'com os mesmos filtros de /api/relatorio/leituras (apenas administradores)',
+    'security': [{'Bearer': []}],
+    'parameters': [
+        {'name': 'formato', 'in': 'path', 'type': 'string', 'enum': ['parquet', 'arrow'], 'required': True},
+        {'name': 'lote', 'in': 'query', 'type': 'string', 'required': False},
+        {'name': 'data_inicio', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False},
+        {'name': 'data_fim', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False}
+    ],
+    'produces': ['application/vnd.apache.parquet', 'application/vnd.apache.arrow.file'],
+    'responses': {
+        200: {'description': 'Arquivo Parquet ou Arrow'},
+        400: {'description': 'Datas inválidas'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        500: {'description': 'pyarrow não instalado'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_exportar_leituras_colunar(current_user, formato):
+    """Exportar leituras em Parquet ou Arrow IPC"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    try:
+        filtros = filtros_relatorio(request.args.get('lote'), request.args.get('data_inicio'),
+                                    request.args.get('data_fim'))
+    except ValueError:
+        return jsonify({'message': 'data_fim deve estar no formato AAAA-MM-DD'}), 400
+    
+    try:
+        arquivo = exportar_leituras_colunar(consulta_exportacao(filtros), formato)
+    except ImportError:
+        return jsonify({'message': 'Biblioteca pyarrow não instalada. Execute: pip install pyarrow'}), 500
+    
+    return send_file(arquivo, mimetype=FORMATOS_COLUNARES[formato], as_attachment=True,
+                     download_name=f'leituras_embryotech.{formato}')
+
+@app.route('/api/relatorio/leituras/resumo', methods=['GET'])
+@token_required
+@log_activity("RELATORIO_LEITURAS_RESUMO")
+@swag_from({
+    'tags': ['Relatórios'],
+    'summary': 'Resumo estatístico de leituras',
+    'description': 'Quantidade, média, desvio padrão, mínimo e máximo de cada sensor no período, '
+                   'calculados a partir dos rollups diários (apenas administradores)',
+    'security': [{'Bearer': []}],
+    'parameters': [
+        {'name': 'lote', 'in': 'query', 'type': 'string', 'required': False},
+        {'name': 'data_inicio', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False},
+        {'name': 'data_fim', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False}
+    ],
+    'responses': {
+        200: {'description': 'Resumo {quantidade, temperatura, umidade, pressao}'},
+        400: {'description': 'Datas inválidas'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_relatorio_leituras_resumo(current_user):
+    """Resumo estatístico das leituras do período"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    lote = request.args.get('lote')
+    data_inicio = request.args.get('data_inicio')
+    data_fim = request.args.get('data_fim')
+    
+    try:
+        if data_inicio:
+            data_inicio = datetime.datetime.strptime(data_inicio, '%Y-%m-%d')
+        if data_fim:
+            data_fim = datetime.datetime.strptime(data_fim, '%Y-%m-%d')
+            data_fim = data_fim.replace(hour=23, minute=59, second=59)
+    except ValueError:
+        return jsonify({'message': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+    
+    return jsonify(resumo_leituras(lote, data_inicio or None, data_fim or None)), 200
+
 @app.route('/api/relatorio/auditoria/pdf', methods=['GET'])
 @token_required
 @log_activity("EXPORTAR_AUDITORIA_PDF")
@@ -1018,97 +1544,18 @@ def api_exportar_auditoria_pdf(current_user):
         return jsonify({'message': 'Acesso negado!'}), 403
     
     try:
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib import colors
-        from reportlab.lib.units import cm
-        import io
-        
-        usuario_id = request.args.get('usuario_id', type=int)
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
+        from relatorios_pdf import relatorio_auditoria
         
-        query = Log.query
-        if usuario_id:
-            query = query.filter(Log.usuario_id == usuario_id)
-        if data_inicio:
-            query = query.filter(Log.data_hora >= data_inicio)
-        if data_fim:
-            query = query.filter(Log.data_hora <= data_fim)
-        
-        logs = query.order_by(Log.data_hora.desc()).limit(500).all()
-        
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=cm, leftMargin=cm, 
-                               topMargin=cm, bottomMargin=cm)
-        
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'TitleStyle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            textColor=colors.HexColor('#25691b'),
-            alignment=1,
-            spaceAfter=20
+        arquivo = relatorio_auditoria(
+            usuario_id=request.args.get('usuario_id', type=int),
+            data_inicio=request.args.get('data_inicio'),
+            data_fim=request.args.get('data_fim'),
+            maximo=app.config.get('RELATORIO_PDF_MAX_LINHAS', 1000000)
         )
         
-        elements = []
-        
-        title = Paragraph("Relatório de Auditoria - Embryotech", title_style)
-        elements.append(title)
-        
-        info_text = f"Gerado em: {datetime.datetime.now().strftime('%d/%m/%Y às %H:%M')}<br/>"
-        info_text += f"Total de registros: {len(logs)}<br/>"
-        if usuario_id:
-            usuario = User.query.get(usuario_id)
-            info_text += f"Filtrado por usuário: {usuario.username if usuario else 'N/A'}<br/>"
-        if data_inicio:
-            info_text += f"Data início: {data_inicio}<br/>"
-        if data_fim:
-            info_text += f"Data fim: {data_fim}<br/>"
-        
-        info_para = Paragraph(info_text, styles['Normal'])
-        elements.append(info_para)
-        elements.append(Spacer(1, 20))
-        
-        if logs:
-            data = [['Data/Hora', 'Usuário', 'Ação', 'IP', 'Status']]
-            
-            for log in logs:
-                data.append([
-                    log.data_hora.strftime('%d/%m/%Y %H:%M') if log.data_hora else '-',
-                    log.usuario_nome or 'Anônimo',
-                    log.acao[:50] + ('...' if len(log.acao) > 50 else ''),
-                    log.ip_address or '-',
-                    str(log.status_code) if log.status_code else '-'
-                ])
-            
-            table = Table(data, colWidths=[3*cm, 2.5*cm, 4*cm, 2.5*cm, 1.5*cm])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#25691b')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            elements.append(table)
-        else:
-            elements.append(Paragraph("Nenhum registro encontrado para os filtros selecionados.", styles['Normal']))
-        
-        doc.build(elements)
-        buffer.seek(0)
-        
-        return buffer.getvalue(), 200, {
-            'Content-Type': 'application/pdf',
-            'Content-Disposition': 'attachment; filename="auditoria_embryotech.pdf"'
-        }
+        # O arquivo temporário é enviado em blocos e fechado ao fim da resposta
+        return send_file(arquivo, mimetype='application/pdf', as_attachment=True,
+                         download_name='auditoria_embryotech.pdf')
         
     except ImportError:
         return jsonify({'message': 'Biblioteca reportlab não instalada. Execute: pip install reportlab'}), 500
@@ -1142,104 +1589,144 @@ def api_exportar_leituras_pdf(current_user):
         return jsonify({'message': 'Acesso negado!'}), 403
     
     try:
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib import colors
-        from reportlab.lib.units import cm
-        import io
-        
-        lote = request.args.get('lote')
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
-        
-        query = Leitura.query
-        if lote:
-            query = query.filter(Leitura.lote == lote)
-        if data_inicio:
-            query = query.filter(Leitura.data_inicial >= data_inicio)
-        if data_fim:
-            data_fim_obj = datetime.datetime.strptime(data_fim, '%Y-%m-%d')
-            data_fim_obj = data_fim_obj.replace(hour=23, minute=59, second=59)
-            query = query.filter(Leitura.data_inicial <= data_fim_obj)
+        from relatorios_pdf import relatorio_leituras
         
-        leituras = query.order_by(Leitura.data_inicial.desc()).limit(1000).all()
-        
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=cm, leftMargin=cm, 
-                               topMargin=cm, bottomMargin=cm)
-        
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'TitleStyle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            textColor=colors.HexColor('#25691b'),
-            alignment=1,
-            spaceAfter=20
+        arquivo = relatorio_leituras(
+            lote=request.args.get('lote'),
+            data_inicio=request.args.get('data_inicio'),
+            data_fim=request.args.get('data_fim'),
+            maximo=app.config.get('RELATORIO_PDF_MAX_LINHAS', 1000000)
         )
         
-        elements = []
-        
-        title = Paragraph("Relatório de Leituras - Embryotech", title_style)
-        elements.append(title)
-        
-        info_text = f"Gerado em: {datetime.datetime.now().strftime('%d/%m/%Y às %H:%M')}<br/>"
-        info_text += f"Total de registros: {len(leituras)}<br/>"
-        if lote:
-            info_text += f"Filtrado por lote: {lote}<br/>"
-        if data_inicio:
-            info_text += f"Data início: {data_inicio}<br/>"
-        if data_fim:
-            info_text += f"Data fim: {data_fim}<br/>"
-        
-        info_para = Paragraph(info_text, styles['Normal'])
-        elements.append(info_para)
-        elements.append(Spacer(1, 20))
-        
-        if leituras:
-            data = [['Data/Hora', 'Lote', 'Temp.(°C)', 'Umid.(%)', 'Pressão(hPa)']]
-            
-            for leitura in leituras:
-                data.append([
-                    leitura.data_inicial.strftime('%d/%m/%Y %H:%M') if leitura.data_inicial else '-',
-                    leitura.lote or '-',
-                    f"{leitura.temperatura:.1f}" if leitura.temperatura else '-',
-                    f"{leitura.umidade:.1f}" if leitura.umidade else '-',
-                    f"{leitura.pressao:.1f}" if leitura.pressao else '-'
-                ])
-            
-            table = Table(data, colWidths=[3*cm, 3*cm, 2*cm, 2*cm, 2*cm])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#25691b')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            elements.append(table)
-        else:
-            elements.append(Paragraph("Nenhum registro encontrado para os filtros selecionados.", styles['Normal']))
-        
-        doc.build(elements)
-        buffer.seek(0)
-        
-        return buffer.getvalue(), 200, {
-            'Content-Type': 'application/pdf',
-            'Content-Disposition': 'attachment; filename="leituras_embryotech.pdf"'
-        }
+        return send_file(arquivo, mimetype='application/pdf', as_attachment=True,
+                         download_name='leituras_embryotech.pdf')
         
     except ImportError:
         return jsonify({'message': 'Biblioteca reportlab não instalada. Execute: pip install reportlab'}), 500
     except Exception as e:
         return jsonify({'message': f'Erro ao gerar PDF: {str(e)}'}), 500
 
+@app.route('/api/relatorio/jobs', methods=['POST'])
+@token_required
+@log_activity("CRIAR_JOB_RELATORIO")
+@swag_from({
+    'tags': ['Relatórios'],
+    'summary': 'Gerar relatório em segundo plano',
+    'description': 'Enfileira a geração de um relatório PDF (leituras, auditoria ou usuarios). '
+                   'Acompanhe em GET /api/relatorio/jobs/{id} (apenas administradores)',
+    'security': [{'Bearer': []}],
+    'parameters': [{
+        'name': 'body',
+        'in': 'body',
+        'required': True,
+        'schema': {
+            'type': 'object',
+            'required': ['tipo'],
+            'properties': {
+                'tipo': {'type': 'string', 'enum': ['leituras', 'auditoria', 'usuarios']},
+                'parametros': {
+                    'type': 'object',
+                    'description': 'Mesmos filtros do endpoint PDF síncrono '
+                                   '(lote, usuario_id, data_inicio, data_fim, tipo)'
+                }
+            }
+        }
+    }],
+    'responses': {
+        202: {'description': 'Job criado'},
+        400: {'description': 'Tipo ou parâmetros inválidos'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_criar_job_relatorio(current_user):
+    """Enfileirar a geração de um relatório PDF"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    parametros = data.get('parametros') or {}
+    if not isinstance(parametros, dict):
+        return jsonify({'message': 'parametros deve ser um objeto'}), 400
+    
+    try:
+        job = fila_relatorios.enfileirar(data.get('tipo'), parametros, current_user.id)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    resposta = job.to_dict()
+    resposta['url'] = url_for('api_status_job_relatorio', job_id=job.id)
+    return jsonify(resposta), 202
+
+@app.route('/api/relatorio/jobs/<job_id>', methods=['GET'])
+@token_required
+@swag_from({
+    'tags': ['Relatórios'],
+    'summary': 'Status do job de relatório',
+    'description': 'Status do job (pendente, processando, concluido, erro ou expirado); '
+                   'quando concluído inclui o link de download (apenas administradores)',
+    'security': [{'Bearer': []}],
+    'parameters': [{'name': 'job_id', 'in': 'path', 'type': 'string', 'required': True}],
+    'responses': {
+        200: {'description': 'Status do job'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        404: {'description': 'Job não encontrado'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_status_job_relatorio(current_user, job_id):
+    """Consultar o status de um job de relatório"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    job = db.session.get(RelatorioJob, job_id)
+    if not job:
+        return jsonify({'message': 'Job não encontrado'}), 404
+    
+    resposta = job.to_dict()
+    if job.status == 'concluido':
+        resposta['download'] = url_for('api_baixar_job_relatorio', job_id=job.id)
+    return jsonify(resposta), 200
+
+@app.route('/api/relatorio/jobs/<job_id>/arquivo', methods=['GET'])
+@token_required
+@log_activity("BAIXAR_JOB_RELATORIO")
+@swag_from({
+    'tags': ['Relatórios'],
+    'summary': 'Baixar relatório gerado',
+    'description': 'Download do PDF de um job concluído (apenas administradores)',
+    'security': [{'Bearer': []}],
+    'parameters': [{'name': 'job_id', 'in': 'path', 'type': 'string', 'required': True}],
+    'produces': ['application/pdf'],
+    'responses': {
+        200: {'description': 'Arquivo PDF'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        404: {'description': 'Job não encontrado'},
+        409: {'description': 'Relatório ainda não concluído'},
+        410: {'description': 'Relatório expirado'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_baixar_job_relatorio(current_user, job_id):
+    """Baixar o PDF de um job concluído"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    job = db.session.get(RelatorioJob, job_id)
+    if not job:
+        return jsonify({'message': 'Job não encontrado'}), 404
+    if job.status == 'expirado':
+        return jsonify({'message': 'Relatório expirado, gere novamente'}), 410
+    if job.status != 'concluido':
+        return jsonify({'message': f'Relatório ainda não disponível (status: {job.status})'}), 409
+    
+    caminho = fila_relatorios.caminho_arquivo(job)
+    if not os.path.exists(caminho):
+        return jsonify({'message': 'Relatório expirado, gere novamente'}), 410
+    
+    return send_file(caminho, mimetype='application/pdf', as_attachment=True,
+                     download_name=f'{job.tipo}_embryotech.pdf')
+
 @app.route('/api/usuarios/<int:user_id>/senha', methods=['PUT'])
 @token_required
 @log_activity("ALTERAR_SENHA_USUARIO")
@@ -1289,6 +1776,7 @@ def api_alterar_senha_usuario(current_user, user_id):
     try:
         usuario.set_password(nova_senha)
         db.session.commit()
+        invalidar_usuario(user_id)
         
         log_crud_operation(current_user, 'users', 'UPDATE_PASSWORD', user_id, 
                           dados={'usuario_alterado': usuario.username})
@@ -1347,6 +1835,7 @@ def api_alterar_privilegios_usuario(current_user, user_id):
     try:
         usuario.is_admin = is_admin
         db.session.commit()
+        invalidar_usuario(user_id)
         
         acao = 'PROMOVER_ADMIN' if is_admin else 'REMOVER_ADMIN'
         log_crud_operation(current_user, 'users', acao, user_id, 
@@ -1357,6 +1846,236 @@ def api_alterar_privilegios_usuario(current_user, user_id):
         db.session.rollback()
         return jsonify({'message': f'Erro ao alterar privilégios: {str(e)}'}), 500
 
+@app.route('/api/dispositivos', methods=['GET'])
+@token_required
+@log_activity("LISTAR_DISPOSITIVOS")
+@swag_from({
+    'tags': ['Dispositivos'],
+    'summary': 'Listar dispositivos',
+    'description': 'Listar dispositivos cadastrados, sem as chaves (apenas administradores)',
+    'security': [{'Bearer': []}],
+    'responses': {
+        200: {'description': 'Lista de dispositivos'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_listar_dispositivos(current_user):
+    """Listar dispositivos"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    dispositivos = Dispositivo.query.order_by(Dispositivo.nome).all()
+    return jsonify([d.to_dict() for d in dispositivos]), 200
+
+@app.route('/api/dispositivos', methods=['POST'])
+@token_required
+@log_activity("CRIAR_DISPOSITIVO")
+@swag_from({
+    'tags': ['Dispositivos'],
+    'summary': 'Cadastrar dispositivo',
+    'description': 'Cadastrar um dispositivo e gerar a chave de API dele, exibida apenas nesta resposta. '
+                   'A chave só permite enviar leituras (POST /api/leituras) dos lotes informados e '
+                   'dos lotes das salas informadas (apenas administradores)',
+    'security': [{'Bearer': []}],
+    'parameters': [{
+        'name': 'body',
+        'in': 'body',
+        'required': True,
+        'schema': {
+            'type': 'object',
+            'required': ['nome'],
+            'properties': {
+                'nome': {'type': 'string', 'example': 'incubadora-03'},
+                'lotes': {'type': 'array', 'items': {'type': 'string'}, 'example': ['LOTE_2024_05']},
+                'salas': {'type': 'array', 'items': {'type': 'integer'}, 'example': [3]}
+            }
+        }
+    }],
+    'responses': {
+        201: {'description': 'Dispositivo cadastrado; "chave" deve ser gravada na placa'},
+        400: {'description': 'Dados inválidos ou nome já cadastrado'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_criar_dispositivo(current_user):
+    """Cadastrar dispositivo e gerar chave de API"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    nome = data.get('nome')
+    if not isinstance(nome, str) or not nome.strip() or len(nome) > 80:
+        return jsonify({'message': 'nome é obrigatório (até 80 caracteres)'}), 400
+    try:
+        lotes, salas = validar_escopo(data.get('lotes'), data.get('salas'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if Dispositivo.query.filter_by(nome=nome).first():
+        return jsonify({'message': 'Já existe um dispositivo com este nome'}), 400
+    
+    chave = gerar_chave()
+    dispositivo = Dispositivo(
+        nome=nome,
+        prefixo_chave=chave[:12],
+        chave_hash=indice_dispositivos.hash_chave(chave),
+        lotes=json.dumps(lotes),
+        salas=json.dumps(salas),
+        criado_por=current_user.id
+    )
+    try:
+        db.session.add(dispositivo)
+        incrementar_versao('dispositivos')
+        db.session.commit()
+        indice_dispositivos.invalidar()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Erro ao cadastrar dispositivo: {str(e)}'}), 400
+    
+    log_crud_operation(current_user, 'dispositivos', 'CREATE', dispositivo.id,
+                      dados={'nome': nome, 'lotes': lotes, 'salas': salas})
+    
+    return jsonify(dict(dispositivo.to_dict(), chave=chave)), 201
+
+@app.route('/api/dispositivos/<int:dispositivo_id>', methods=['PUT'])
+@token_required
+@log_activity("ATUALIZAR_DISPOSITIVO")
+@swag_from({
+    'tags': ['Dispositivos'],
+    'summary': 'Atualizar dispositivo',
+    'description': 'Alterar o escopo (lotes/salas) ou revogar/reativar a chave com "ativo" '
+                   '(apenas administradores). Vale em todos os workers em até '
+                   'DISPOSITIVOS_INTERVALO_VERIFICACAO segundos',
+    'security': [{'Bearer': []}],
+    'parameters': [
+        {'name': 'dispositivo_id', 'in': 'path', 'type': 'integer', 'required': True},
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'lotes': {'type': 'array', 'items': {'type': 'string'}},
+                    'salas': {'type': 'array', 'items': {'type': 'integer'}},
+                    'ativo': {'type': 'boolean'}
+                }
+            }
+        }
+    ],
+    'responses': {
+        200: {'description': 'Dispositivo atualizado'},
+        400: {'description': 'Dados inválidos'},
+        404: {'description': 'Dispositivo não encontrado'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_atualizar_dispositivo(current_user, dispositivo_id):
+    """Alterar escopo ou revogar dispositivo"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    dispositivo = db.session.get(Dispositivo, dispositivo_id)
+    if not dispositivo:
+        return jsonify({'message': 'Dispositivo não encontrado'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    dados_anteriores = dispositivo.to_dict()
+    try:
+        if 'lotes' in data or 'salas' in data:
+            lotes, salas = validar_escopo(data.get('lotes', dados_anteriores['lotes']),
+                                          data.get('salas', dados_anteriores['salas']))
+            dispositivo.lotes = json.dumps(lotes)
+            dispositivo.salas = json.dumps(salas)
+        if 'ativo' in data:
+            dispositivo.ativo = bool(data['ativo'])
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    incrementar_versao('dispositivos')
+    db.session.commit()
+    indice_dispositivos.invalidar()
+    
+    log_crud_operation(current_user, 'dispositivos', 'UPDATE', dispositivo_id,
+                      dados={'anterior': dados_anteriores, 'novo': dispositivo.to_dict()})
+    
+    return jsonify(dispositivo.to_dict()), 200
+
+@app.route('/api/dispositivos/<int:dispositivo_id>/chave', methods=['POST'])
+@token_required
+@log_activity("ROTACIONAR_CHAVE_DISPOSITIVO")
+@swag_from({
+    'tags': ['Dispositivos'],
+    'summary': 'Gerar nova chave',
+    'description': 'Substituir a chave de API do dispositivo; a anterior deixa de valer '
+                   '(apenas administradores)',
+    'security': [{'Bearer': []}],
+    'parameters': [{'name': 'dispositivo_id', 'in': 'path', 'type': 'integer', 'required': True}],
+    'responses': {
+        200: {'description': 'Nova chave em "chave", exibida apenas nesta resposta'},
+        404: {'description': 'Dispositivo não encontrado'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_rotacionar_chave_dispositivo(current_user, dispositivo_id):
+    """Gerar nova chave de API para o dispositivo"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    dispositivo = db.session.get(Dispositivo, dispositivo_id)
+    if not dispositivo:
+        return jsonify({'message': 'Dispositivo não encontrado'}), 404
+    
+    chave = gerar_chave()
+    dispositivo.prefixo_chave = chave[:12]
+    dispositivo.chave_hash = indice_dispositivos.hash_chave(chave)
+    incrementar_versao('dispositivos')
+    db.session.commit()
+    indice_dispositivos.invalidar()
+    
+    log_crud_operation(current_user, 'dispositivos', 'ROTATE_KEY', dispositivo_id,
+                      dados={'nome': dispositivo.nome})
+    
+    return jsonify(dict(dispositivo.to_dict(), chave=chave)), 200
+
+@app.route('/api/dispositivos/<int:dispositivo_id>', methods=['DELETE'])
+@token_required
+@log_activity("EXCLUIR_DISPOSITIVO")
+@swag_from({
+    'tags': ['Dispositivos'],
+    'summary': 'Excluir dispositivo',
+    'description': 'Excluir o dispositivo e a chave dele (apenas administradores)',
+    'security': [{'Bearer': []}],
+    'parameters': [{'name': 'dispositivo_id', 'in': 'path', 'type': 'integer', 'required': True}],
+    'responses': {
+        200: {'description': 'Dispositivo excluído'},
+        404: {'description': 'Dispositivo não encontrado'},
+        403: {'description': 'Acesso negado (apenas administradores)'},
+        401: {'description': 'Token inválido ou ausente'}
+    }
+})
+def api_excluir_dispositivo(current_user, dispositivo_id):
+    """Excluir dispositivo"""
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acesso negado!'}), 403
+    
+    dispositivo = db.session.get(Dispositivo, dispositivo_id)
+    if not dispositivo:
+        return jsonify({'message': 'Dispositivo não encontrado'}), 404
+    
+    nome = dispositivo.nome
+    db.session.delete(dispositivo)
+    incrementar_versao('dispositivos')
+    db.session.commit()
+    indice_dispositivos.invalidar()
+    
+    log_crud_operation(current_user, 'dispositivos', 'DELETE', dispositivo_id, dados={'nome': nome})
+    
+    return jsonify({'message': 'Dispositivo excluído com sucesso'}), 200
+
 @app.route('/api/relatorio/usuarios/pdf', methods=['GET'])
 @token_required
 @log_activity("EXPORTAR_USUARIOS_PDF")
@@ -1386,86 +2105,12 @@ def api_exportar_usuarios_pdf(current_user):
         return jsonify({'message': 'Acesso negado!'}), 403
     
     try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib import colors
-        from reportlab.lib.units import cm
-        import io
-        
-        tipo_usuario = request.args.get('tipo')
-        usuarios = User.query.all()
-        
-        if tipo_usuario == 'admin':
-            usuarios = [u for u in usuarios if u.is_admin]
-        elif tipo_usuario == 'user':
-            usuarios = [u for u in usuarios if not u.is_admin]
-        
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=cm, leftMargin=cm, 
-                               topMargin=cm, bottomMargin=cm)
-        
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'TitleStyle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            textColor=colors.HexColor('#25691b'),
-            alignment=1,
-            spaceAfter=20
-        )
+        from relatorios_pdf import relatorio_usuarios
         
-        elements = []
+        arquivo = relatorio_usuarios(tipo=request.args.get('tipo'))
         
-        title = Paragraph("Relatório de Usuários - Embryotech", title_style)
-        elements.append(title)
-        
-        info_text = f"Gerado em: {datetime.datetime.now().strftime('%d/%m/%Y às %H:%M')}<br/>"
-        info_text += f"Total de registros: {len(usuarios)}<br/>"
-        if tipo_usuario:
-            tipo_desc = 'Administradores' if tipo_usuario == 'admin' else 'Usuários Comuns'
-            info_text += f"Filtrado por tipo: {tipo_desc}<br/>"
-        
-        info_para = Paragraph(info_text, styles['Normal'])
-        elements.append(info_para)
-        elements.append(Spacer(1, 20))
-        
-        if usuarios:
-            data = [['ID', 'Nome de Usuário', 'Email', 'Tipo']]
-            
-            for usuario in usuarios:
-                data.append([
-                    str(usuario.id),
-                    usuario.username,
-                    usuario.email,
-                    'Administrador' if usuario.is_admin else 'Usuário Comum'
-                ])
-            
-            table = Table(data, colWidths=[2*cm, 4*cm, 6*cm, 3*cm])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#25691b')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            elements.append(table)
-        else:
-            elements.append(Paragraph("Nenhum usuário encontrado para os filtros selecionados.", styles['Normal']))
-        
-        doc.build(elements)
-        buffer.seek(0)
-        
-        return buffer.getvalue(), 200, {
-            'Content-Type': 'application/pdf',
-            'Content-Disposition': 'attachment; filename="usuarios_embryotech.pdf"'
-        }
+        return send_file(arquivo, mimetype='application/pdf', as_attachment=True,
+                         download_name='usuarios_embryotech.pdf')
         
     except ImportError:
         return jsonify({'message': 'Biblioteca reportlab não instalada. Execute: pip install reportlab'}), 500
@@ -1492,6 +2137,17 @@ def internal_error(error):
         'error': 'Internal Server Error'
     }), 500
 
+# ==================== COMANDOS CLI ====================
+
+@app.cli.command('rollups-reconstruir')
+@click.option('--lote', default=None, help='Reconstrói apenas os rollups deste lote')
+def cli_reconstruir_rollups(lote):
+    """Recria a tabela de rollups a partir das leituras (carga inicial ou reparo)"""
+    total = reconstruir_rollups(lote)
+    db.session.commit()
+    cache.invalidar(*tags_alteracao_leituras([lote]))
+    click.echo(f'{total} intervalos de rollup gravados')
+
 # ==================== EXECUÇÃO ====================
 
 if __name__ == '__main__':
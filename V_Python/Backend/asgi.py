@@ -0,0 +1,9 @@
+# asgi.py - Ponto de entrada do modo ASGI (ver api_assincrona.py)
+#
+#   uvicorn asgi:application --host 0.0.0.0 --port 5001
+#   gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:application
+
+from app import app
+from api_assincrona import criar_app_asgi
+
+application = criar_app_asgi(app)
@@ -0,0 +1,172 @@
+# auth_cache.py - Cache por processo de tokens JWT já verificados
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import jwt
+from sqlalchemy import select
+
+from cache import cache
+from extensions import db
+from models import User
+
+# Representação leve do usuário autenticado, usada no lugar do objeto ORM
+# pelas rotas protegidas por token_required (id, username e is_admin)
+UsuarioAutenticado = namedtuple('UsuarioAutenticado', ['id', 'username', 'is_admin'])
+
+
+class TokenCache:
+    """
+    Cache LRU com TTL: token JWT → UsuarioAutenticado.
+
+    Evita o jwt.decode + SELECT em users a cada requisição autenticada. Uma
+    entrada vale até o menor entre `ttl` segundos e o `exp` do próprio token.
+    As alterações de senha/privilégios chamam invalidar_usuario(); como o
+    cache é por processo, os demais workers do gunicorn enxergam a mudança
+    em no máximo `ttl` segundos.
+    """
+
+    def __init__(self, tamanho_maximo=10000, ttl=60):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._tokens_por_usuario = {}
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def configurar(self, app):
+        self.tamanho_maximo = app.config.get('AUTH_CACHE_TAMANHO', self.tamanho_maximo)
+        self.ttl = app.config.get('AUTH_CACHE_TTL', self.ttl)
+
+    def obter(self, token):
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(token)
+            if entrada is None:
+                self.falhas += 1
+                return None
+            usuario, expira_em = entrada
+            if expira_em <= agora:
+                self._remover(token)
+                self.falhas += 1
+                return None
+            self._entradas.move_to_end(token)
+            self.acertos += 1
+            return usuario
+
+    def guardar(self, token, usuario, validade):
+        """Guarda o usuário por `validade` segundos (limitado ao ttl)"""
+        validade = min(validade, self.ttl)
+        if validade <= 0 or self.tamanho_maximo <= 0:
+            return
+        with self._lock:
+            self._remover(token)
+            self._entradas[token] = (usuario, time.monotonic() + validade)
+            self._tokens_por_usuario.setdefault(usuario.id, set()).add(token)
+            while len(self._entradas) > self.tamanho_maximo:
+                antigo = next(iter(self._entradas))
+                self._remover(antigo)
+
+    def invalidar_usuario(self, usuario_id):
+        with self._lock:
+            for token in list(self._tokens_por_usuario.get(usuario_id, ())):
+                self._remover(token)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._tokens_por_usuario.clear()
+
+    def _remover(self, token):
+        entrada = self._entradas.pop(token, None)
+        if entrada is not None:
+            tokens = self._tokens_por_usuario.get(entrada[0].id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_por_usuario[entrada[0].id]
+
+    def estatisticas(self):
+        return {
+            'entradas': len(self._entradas),
+            'acertos': self.acertos,
+            'falhas': self.falhas
+        }
+
+
+token_cache = TokenCache()
+
+
+def _decodificar(token, secret_key):
+    """Payload do JWT com 'id', ou None se inválido/expirado"""
+    try:
+        dados = jwt.decode(token, secret_key, algorithms=['HS256'])
+    except jwt.PyJWTError:
+        return None
+    return dados if dados.get('id') is not None else None
+
+
+def _guardar(token, dados, principal):
+    usuario = UsuarioAutenticado(*principal)
+    validade = dados['exp'] - time.time() if 'exp' in dados else token_cache.ttl
+    token_cache.guardar(token, usuario, validade)
+    return usuario
+
+
+def verificar_token(token, secret_key):
+    """
+    Equivalente a User.verify_auth_token, mas devolve um UsuarioAutenticado
+    e consulta o cache antes de decodificar o JWT e buscar o usuário.
+    Retorna None para token inválido, expirado ou de usuário inexistente.
+    """
+    usuario = token_cache.obter(token)
+    if usuario is not None:
+        return usuario
+
+    dados = _decodificar(token, secret_key)
+    if dados is None:
+        return None
+
+    # Principal compartilhado entre workers: um token novo (ex.: após login
+    # em outro worker) também não precisa consultar a tabela users
+    principal = cache.get(f"principal:{dados['id']}")
+    if principal is None:
+        user = db.session.get(User, dados['id'])
+        if user is None:
+            return None
+        principal = [user.id, user.username, bool(user.is_admin)]
+        cache.set(f"principal:{user.id}", principal, ttl=token_cache.ttl)
+
+    return _guardar(token, dados, principal)
+
+
+async def verificar_token_assincrono(token, secret_key, engine):
+    """verificar_token para o modo ASGI: busca o usuário pelo AsyncEngine `engine`"""
+    usuario = token_cache.obter(token)
+    if usuario is not None:
+        return usuario
+
+    dados = _decodificar(token, secret_key)
+    if dados is None:
+        return None
+
+    principal = cache.get(f"principal:{dados['id']}")
+    if principal is None:
+        async with engine.connect() as conexao:
+            linha = (await conexao.execute(
+                select(User.id, User.username, User.is_admin).where(User.id == dados['id'])
+            )).first()
+        if linha is None:
+            return None
+        principal = [linha.id, linha.username, bool(linha.is_admin)]
+        cache.set(f"principal:{linha.id}", principal, ttl=token_cache.ttl)
+
+    return _guardar(token, dados, principal)
+
+
+def invalidar_usuario(usuario_id):
+    """Descarta os tokens e o principal em cache do usuário (alteração de senha/privilégios)"""
+    token_cache.invalidar_usuario(usuario_id)
+    cache.delete(f'principal:{usuario_id}')
@@ -0,0 +1,149 @@
+# banco.py - Opções do engine (pool, timeouts, modo pgbouncer) e ganchos de fork dos workers
+
+import uuid
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+from extensions import db
+
+_apps = []
+
+
+def opcoes_engine(pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=1800,
+                  pre_ping=True, statement_timeout_ms=0, pgbouncer=False):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS a partir das variáveis DB_* (ver config.py).
+
+    Cada worker do gunicorn tem o próprio pool: o total de conexões no
+    PostgreSQL é workers × (pool_size + max_overflow), mais os processos da
+    fila de relatórios. Atrás de um pgbouncer em pool_mode=transaction o
+    pool fica a cargo dele e a aplicação usa NullPool (conexão aberta com o
+    pgbouncer a cada checkout e fechada ao devolver).
+    """
+    if pgbouncer:
+        # statement_timeout vai por SET LOCAL em cada transação (configurar_banco):
+        # parâmetros de sessão vazariam para outros clientes do pgbouncer
+        return {'poolclass': NullPool}
+
+    opcoes = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': pre_ping
+    }
+    if statement_timeout_ms:
+        opcoes['connect_args'] = {'options': f'-c statement_timeout={int(statement_timeout_ms)}'}
+    return opcoes
+
+
+def configurar_banco(app):
+    """
+    Complementa o engine criado por db.init_app: no modo pgbouncer aplica o
+    DB_STATEMENT_TIMEOUT_MS por transação. Também registra o app para
+    descartar_conexoes_herdadas() (post_fork do gunicorn).
+    """
+    _apps.append(app)
+    timeout = app.config.get('DB_STATEMENT_TIMEOUT_MS', 0)
+    if not (app.config.get('DB_PGBOUNCER') and timeout):
+        return
+
+    with app.app_context():
+        _timeout_por_transacao(db.engine, timeout)
+
+
+def _timeout_por_transacao(engine, timeout):
+    if engine.dialect.name != 'postgresql':
+        return
+
+    @event.listens_for(engine, 'begin')
+    def _statement_timeout(conexao):
+        conexao.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+
+def descartar_conexoes_herdadas():
+    """
+    Chamado no processo filho logo após o fork (post_fork do gunicorn). Com
+    preload_app o engine é criado no master; o filho abandona as conexões
+    herdadas sem fechá-las (o socket é compartilhado com o master) e abre as
+    próprias sob demanda.
+    """
+    for app in _apps:
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+def criar_engine_direto(app):
+    """
+    Engine sem pool para conexões de sessão longa (LISTEN do feed SSE), fora
+    do pool das requisições. Usa DB_URL_DIRETA quando a URL principal aponta
+    para um pgbouncer em modo transação, onde LISTEN não funciona.
+    """
+    url = app.config.get('DB_URL_DIRETA') or app.config['SQLALCHEMY_DATABASE_URI']
+    return create_engine(url, poolclass=NullPool)
+
+
+def url_assincrona(url):
+    """
+    URL do SQLAlchemy com o driver assíncrono equivalente (asyncpg ou
+    aiosqlite). Retorna (url, connect_args): o connect_timeout da URL do
+    psycopg2 vira o argumento `timeout` do asyncpg.
+    """
+    url = make_url(url)
+    connect_args = {}
+    backend = url.get_backend_name()
+    if backend == 'postgresql':
+        consulta = dict(url.query)
+        timeout = consulta.pop('connect_timeout', None)
+        if timeout:
+            connect_args['timeout'] = int(timeout)
+        url = url.set(drivername='postgresql+asyncpg', query=consulta)
+    elif backend == 'sqlite':
+        url = url.set(drivername='sqlite+aiosqlite')
+    else:
+        raise ValueError(f'Banco sem driver assíncrono suportado: {backend}')
+    return url, connect_args
+
+
+def criar_engine_assincrono(config):
+    """
+    AsyncEngine do modo ASGI (asgi.py) com as mesmas variáveis DB_* do
+    engine síncrono. Cada processo cria o seu no startup do ASGI, então não
+    há conexões herdadas do fork.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url, connect_args = url_assincrona(config['SQLALCHEMY_DATABASE_URI'])
+    timeout = config.get('DB_STATEMENT_TIMEOUT_MS', 0)
+    pgbouncer = config.get('DB_PGBOUNCER', False)
+    postgresql = url.get_backend_name() == 'postgresql'
+
+    if pgbouncer:
+        opcoes = {'poolclass': NullPool}
+        if postgresql:
+            # Em pool_mode=transaction o pgbouncer troca a conexão do servidor
+            # entre transações: sem cache de prepared statements e com nomes únicos
+            connect_args.update(statement_cache_size=0,
+                                prepared_statement_name_func=lambda: f'__asyncpg_{uuid.uuid4()}__')
+            url = url.update_query_dict({'prepared_statement_cache_size': '0'})
+    elif not postgresql:
+        # aiosqlite: pool padrão do SQLAlchemy para SQLite
+        opcoes = {}
+    else:
+        opcoes = opcoes_engine(
+            pool_size=config.get('DB_POOL_SIZE', 5), max_overflow=config.get('DB_MAX_OVERFLOW', 10),
+            pool_timeout=config.get('DB_POOL_TIMEOUT', 30), pool_recycle=config.get('DB_POOL_RECYCLE', 1800),
+            pre_ping=config.get('DB_POOL_PRE_PING', True)
+        )
+        if timeout:
+            connect_args['server_settings'] = {'statement_timeout': str(int(timeout))}
+
+    if connect_args:
+        opcoes['connect_args'] = connect_args
+    engine = create_async_engine(url, **opcoes)
+    if pgbouncer and timeout:
+        _timeout_por_transacao(engine.sync_engine, timeout)
+    return engine
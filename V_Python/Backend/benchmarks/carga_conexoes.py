@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Teste de carga de conexões: N dispositivos simultâneos enviando leituras
+
+Simula `--dispositivos` placas (uma thread e uma sessão HTTP cada) fazendo
+POST /api/leituras a cada `--intervalo` segundos durante `--duracao`
+segundos, com o mesmo timeout de 15 s do firmware. Em paralelo amostra as
+conexões abertas no PostgreSQL (pg_stat_activity) e, se disponível, o
+gauge embryotech_db_pool_conexoes_em_uso do /metrics.
+
+O teste passa quando nenhuma requisição falha por timeout/5xx (pool
+esgotado aparece como TimeoutError do QueuePool → 500) e o pico de conexões
+fica abaixo de max_connections menos a reserva.
+
+Uso:
+    python benchmarks/carga_conexoes.py --url http://localhost:5001 --usuario admin --senha ...
+    python benchmarks/carga_conexoes.py --dispositivos 200 --duracao 120 \\
+        --db-url postgresql://u:s@localhost/embryotech --saida carga_pgbouncer.json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import create_engine, text
+
+PREFIXO_LOTE = 'CARGA_'
+TIMEOUT_DISPOSITIVO = 15  # http.setTimeout(15000) do CPU_Embriotech.ino
+
+
+def obter_token(url, usuario, senha):
+    resposta = requests.post(f'{url}/api/login', json={'username': usuario, 'password': senha},
+                             timeout=TIMEOUT_DISPOSITIVO)
+    resposta.raise_for_status()
+    return resposta.json()['token']
+
+
+class Resultados:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias = []
+        self.status = {}
+        self.erros = {}
+
+    def registrar(self, latencia=None, status=None, erro=None):
+        with self.lock:
+            if latencia is not None:
+                self.latencias.append(latencia)
+            if status is not None:
+                self.status[status] = self.status.get(status, 0) + 1
+            if erro is not None:
+                self.erros[erro] = self.erros.get(erro, 0) + 1
+
+
+def dispositivo(numero, url, token, intervalo, fim, resultados):
+    sessao = requests.Session()
+    sessao.headers['Authorization'] = f'Bearer {token}'
+    lote = f'{PREFIXO_LOTE}{numero:04d}'
+    # Espalha o início para não sincronizar todos os dispositivos
+    time.sleep(random.uniform(0, intervalo))
+    while time.monotonic() < fim:
+        agora = datetime.utcnow()
+        leitura = {
+            'umidade': round(random.uniform(55, 65), 2),
+            'temperatura': round(random.uniform(37, 38), 2),
+            'pressao': round(random.uniform(1000, 1020), 2),
+            'lote': lote,
+            'data_inicial': agora.isoformat(),
+            'data_final': (agora + timedelta(days=21)).isoformat()
+        }
+        inicio = time.perf_counter()
+        try:
+            resposta = sessao.post(f'{url}/api/leituras', json=leitura, timeout=TIMEOUT_DISPOSITIVO)
+            resultados.registrar(time.perf_counter() - inicio, resposta.status_code)
+        except requests.RequestException as e:
+            resultados.registrar(erro=type(e).__name__)
+        time.sleep(max(0.0, intervalo - (time.perf_counter() - inicio)))
+
+
+def amostrar_conexoes(db_url, url, fim, amostras):
+    """Conexões no banco e no pool da aplicação, uma vez por segundo"""
+    engine = create_engine(db_url) if db_url else None
+    while time.monotonic() < fim:
+        amostra = {'t': time.monotonic()}
+        if engine is not None:
+            try:
+                with engine.connect() as conexao:
+                    amostra['banco'] = conexao.execute(text(
+                        'SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()'
+                    )).scalar()
+            except Exception as e:
+                amostra['erro_banco'] = str(e)
+        try:
+            metricas = requests.get(f'{url}/metrics', timeout=5).text
+            for linha in metricas.splitlines():
+                if linha.startswith('embryotech_db_pool_conexoes_em_uso '):
+                    amostra['pool'] = float(linha.split()[1])
+        except requests.RequestException:
+            pass
+        amostras.append(amostra)
+        time.sleep(1)
+    if engine is not None:
+        engine.dispose()
+
+
+def max_connections(db_url):
+    engine = create_engine(db_url)
+    try:
+        with engine.connect() as conexao:
+            return int(conexao.execute(text('SHOW max_connections')).scalar())
+    finally:
+        engine.dispose()
+
+
+def limpar(db_url):
+    engine = create_engine(db_url)
+    try:
+        with engine.begin() as conexao:
+            conexao.execute(text('DELETE FROM leituras WHERE lote LIKE :p'), {'p': PREFIXO_LOTE + '%'})
+            conexao.execute(text('DELETE FROM leituras_rollup WHERE lote LIKE :p'), {'p': PREFIXO_LOTE + '%'})
+    finally:
+        engine.dispose()
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga de conexões com N dispositivos simultâneos')
+    parser.add_argument('--url', default='http://localhost:5001')
+    parser.add_argument('--usuario', default=os.getenv('CARGA_USUARIO', 'admin'))
+    parser.add_argument('--senha', default=os.getenv('CARGA_SENHA', ''))
+    parser.add_argument('--dispositivos', type=int, default=200)
+    parser.add_argument('--duracao', type=int, default=60)
+    parser.add_argument('--intervalo', type=float, default=1.0, help='segundos entre envios de cada dispositivo')
+    parser.add_argument('--db-url', default=os.getenv('DATABASE_URL'),
+                        help='PostgreSQL para amostrar pg_stat_activity (opcional)')
+    parser.add_argument('--reserva', type=int, default=10, help='conexões que devem sobrar no banco')
+    parser.add_argument('--saida', default='benchmark_carga_conexoes.json')
+    parser.add_argument('--manter', action='store_true', help='não apaga as leituras CARGA_ ao final')
+    args = parser.parse_args()
+
+    token = obter_token(args.url, args.usuario, args.senha)
+    limite_banco = max_connections(args.db_url) if args.db_url else None
+
+    resultados = Resultados()
+    amostras = []
+    fim = time.monotonic() + args.duracao
+    threads = [threading.Thread(target=amostrar_conexoes, args=(args.db_url, args.url, fim, amostras), daemon=True)]
+    threads += [
+        threading.Thread(target=dispositivo, args=(i, args.url, token, args.intervalo, fim, resultados), daemon=True)
+        for i in range(args.dispositivos)
+    ]
+    print(f"{args.dispositivos} dispositivos por {args.duracao}s (um POST a cada {args.intervalo}s)...")
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(args.duracao + TIMEOUT_DISPOSITIVO + 5)
+
+    try:
+        latencias = resultados.latencias
+        falhas_servidor = sum(n for status, n in resultados.status.items() if status >= 500)
+        pico_banco = max((a['banco'] for a in amostras if 'banco' in a), default=None)
+        pico_pool = max((a['pool'] for a in amostras if 'pool' in a), default=None)
+
+        relatorio = {
+            'gerado_em': datetime.now().isoformat(),
+            'dispositivos': args.dispositivos,
+            'duracao_s': args.duracao,
+            'intervalo_s': args.intervalo,
+            'requisicoes': len(latencias) + sum(resultados.erros.values()),
+            'vazao_rps': round(len(latencias) / args.duracao, 1),
+            'status': resultados.status,
+            'erros_cliente': resultados.erros,
+            'latencia_ms': {
+                'p50': round(statistics.median(latencias) * 1000, 1) if latencias else None,
+                'p95': round(percentil(latencias, 0.95) * 1000, 1) if latencias else None,
+                'p99': round(percentil(latencias, 0.99) * 1000, 1) if latencias else None,
+                'max': round(max(latencias) * 1000, 1) if latencias else None
+            },
+            'conexoes': {
+                'pico_banco': pico_banco,
+                'max_connections': limite_banco,
+                'pico_pool_aplicacao': pico_pool
+            }
+        }
+        with open(args.saida, 'w') as arquivo:
+            json.dump(relatorio, arquivo, indent=2)
+
+        print(json.dumps(relatorio, indent=2))
+        print(f"Resultados gravados em {args.saida}")
+
+        problemas = []
+        if falhas_servidor or resultados.erros:
+            problemas.append(f'{falhas_servidor} respostas 5xx e {sum(resultados.erros.values())} erros de cliente')
+        if pico_banco is not None and limite_banco is not None and pico_banco > limite_banco - args.reserva:
+            problemas.append(f'pico de {pico_banco} conexões para max_connections={limite_banco}')
+        if problemas:
+            print('FALHOU: ' + '; '.join(problemas))
+            return 2
+        return 0
+    finally:
+        if args.db_url and not args.manter:
+            limpar(args.db_url)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos índices da tabela leituras (PostgreSQL)
+
+Popula a tabela com N leituras sintéticas (lotes com prefixo BENCH_) e roda
+EXPLAIN (ANALYZE, BUFFERS) nas mesmas instruções SQL que GET /api/leituras
+(lista, primeira página, página por cursor), /api/relatorio/leituras e o PDF
+de leituras enviam, montadas pelas funções da aplicação. Compara o esquema
+sem e com a migração 4a7c2e91d5b3: "sem" remove os índices dela e "com" os
+cria como em models.py, cada estado numa transação desfeita no fim (DDL é
+transacional no PostgreSQL). A tabela fica travada durante a medição: rode
+contra uma cópia do banco, não contra produção.
+
+Uso:
+    python benchmarks/indices_leituras.py --linhas 2000000 --lotes 200
+    python benchmarks/indices_leituras.py --url postgresql://u:s@localhost/embryotech_bench --manter
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+from datetime import datetime
+
+from sqlalchemy import create_engine, select, text
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from leituras_utils import (  # noqa: E402
+    ORDENACAO, codificar_cursor, consulta_leituras, consulta_pagina, filtros_relatorio
+)
+from models import Leitura  # noqa: E402
+from relatorios_pdf import consulta_relatorio_leituras  # noqa: E402
+
+PREFIXO_LOTE = 'BENCH_'
+
+# Índices criados pela migração 4a7c2e91d5b3
+INDICES_MIGRACAO = ('ix_leituras_lote_data_inicial', 'ix_leituras_data_inicial_brin')
+
+
+def consultas(parametros):
+    """Instruções enviadas pelos endpoints de leitura, montadas pelas funções da aplicação"""
+    lote = parametros['lote']
+    cursor = codificar_cursor(parametros['linha_meio'])
+    filtros_lote = filtros_relatorio(lote, parametros['inicio'], parametros['fim'])
+    return {
+        # GET /api/leituras?lote=... (array completo)
+        'listar_por_lote': consulta_leituras(lote).order_by(*ORDENACAO),
+        # GET /api/leituras?lote=...&limite=500 e a página seguinte pelo cursor
+        'listar_por_lote_pagina': consulta_pagina(consulta_leituras(lote), 500),
+        'listar_por_lote_cursor': consulta_pagina(consulta_leituras(lote), 500, cursor),
+        # GET /api/relatorio/leituras?lote=...&data_inicio=...&data_fim=...
+        'relatorio_lote_intervalo': select(Leitura).where(*filtros_lote)
+                                                   .order_by(Leitura.data_inicial.desc().nulls_last()),
+        # PDF de leituras só com o período
+        'pdf_intervalo_sem_lote': consulta_relatorio_leituras(
+            filtros_relatorio(None, parametros['inicio'], parametros['fim']), 1000)
+    }
+
+
+def url_padrao():
+    """Monta a URL a partir das mesmas variáveis usadas por config.py"""
+    return (f"postgresql://{os.getenv('DB_USER', 'postgres')}:{os.getenv('DB_PASSWORD', '')}"
+            f"@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '5432')}"
+            f"/{os.getenv('DB_NAME', 'embryotech')}")
+
+
+def popular(engine, linhas, lotes):
+    """Insere `linhas` leituras a cada 30 s, distribuídas em `lotes` lotes"""
+    print(f"Populando {linhas} leituras em {lotes} lotes...")
+    inicio = datetime.now()
+    with engine.begin() as conexao:
+        conexao.execute(text("""
+            INSERT INTO leituras (umidade, temperatura, pressao, lote, data_inicial, data_final)
+            SELECT 55 + random() * 10,
+                   37 + random(),
+                   1000 + random() * 20,
+                   :prefixo || (g % :lotes),
+                   TIMESTAMP '2024-01-01' + (g / :lotes) * INTERVAL '30 seconds',
+                   TIMESTAMP '2024-01-22'
+            FROM generate_series(1, :linhas) AS g
+        """), {'prefixo': PREFIXO_LOTE, 'lotes': lotes, 'linhas': linhas})
+        conexao.execute(text('ANALYZE leituras'))
+    print(f"  concluído em {(datetime.now() - inicio).total_seconds():.1f}s")
+
+
+def limpar(engine):
+    with engine.begin() as conexao:
+        conexao.execute(text('DELETE FROM leituras WHERE lote LIKE :p'), {'p': PREFIXO_LOTE + '%'})
+
+
+def parametros_consulta(engine, lotes):
+    lote = f'{PREFIXO_LOTE}{lotes // 2}'
+    with engine.connect() as conexao:
+        minimo, maximo = conexao.execute(text(
+            'SELECT min(data_inicial), max(data_inicial) FROM leituras WHERE lote LIKE :p'
+        ), {'p': PREFIXO_LOTE + '%'}).one()
+        meio = minimo + (maximo - minimo) / 2
+        # Cursor no meio do lote: última linha de uma página "profunda"
+        linha_meio = conexao.execute(text(
+            'SELECT id, data_inicial FROM leituras WHERE lote = :lote AND data_inicial <= :meio '
+            'ORDER BY data_inicial DESC, id DESC LIMIT 1'
+        ), {'lote': lote, 'meio': meio}).one()
+    return {
+        'lote': lote,
+        'linha_meio': linha_meio,
+        'inicio': meio.strftime('%Y-%m-%d'),
+        'fim': (meio + (maximo - minimo) / 20).strftime('%Y-%m-%d')
+    }
+
+
+def preparar_esquema(conexao, com_migracao):
+    """Deixa a transação com ou sem os índices da migração"""
+    if com_migracao:
+        for indice in Leitura.__table__.indexes:
+            if indice.name in INDICES_MIGRACAO:
+                indice.create(conexao, checkfirst=True)
+    else:
+        for nome in INDICES_MIGRACAO:
+            conexao.execute(text(f'DROP INDEX IF EXISTS {nome}'))
+
+
+def explicar(conexao, instrucao, repeticoes):
+    """Executa EXPLAIN ANALYZE `repeticoes` vezes e devolve tempos e o plano"""
+    compilada = instrucao.compile(dialect=conexao.dialect)
+    tempos = []
+    plano = None
+    for _ in range(repeticoes):
+        resultado = conexao.exec_driver_sql(
+            'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + str(compilada), compilada.params
+        ).scalar()
+        plano = resultado[0] if isinstance(resultado, list) else json.loads(resultado)[0]
+        tempos.append(plano['Execution Time'] + plano['Planning Time'])
+    return {
+        'mediana_ms': round(statistics.median(tempos), 3),
+        'min_ms': round(min(tempos), 3),
+        'max_ms': round(max(tempos), 3),
+        'no_raiz': plano['Plan']['Node Type'],
+        'ordena': _tem_sort(plano['Plan']),
+        'indices': sorted(_indices_do_plano(plano['Plan']))
+    }
+
+
+def medir(engine, instrucoes, com_migracao, repeticoes):
+    """Mede todas as instruções num estado do esquema; a transação é desfeita no fim"""
+    conexao = engine.connect()
+    transacao = conexao.begin()
+    try:
+        preparar_esquema(conexao, com_migracao)
+        return {nome: explicar(conexao, instrucao, repeticoes) for nome, instrucao in instrucoes.items()}
+    finally:
+        transacao.rollback()
+        conexao.close()
+
+
+def _tem_sort(no):
+    return no['Node Type'] in ('Sort', 'Incremental Sort') or any(_tem_sort(f) for f in no.get('Plans', []))
+
+
+def _indices_do_plano(no):
+    indices = set()
+    if 'Index Name' in no:
+        indices.add(no['Index Name'])
+    for filho in no.get('Plans', []):
+        indices |= _indices_do_plano(filho)
+    return indices
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos índices de leituras')
+    parser.add_argument('--url', default=os.getenv('DATABASE_URL') or url_padrao())
+    parser.add_argument('--linhas', type=int, default=2_000_000)
+    parser.add_argument('--lotes', type=int, default=200)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--saida', default='benchmark_indices_leituras.json')
+    parser.add_argument('--sem-popular', action='store_true', help='usa os dados BENCH_ já existentes')
+    parser.add_argument('--manter', action='store_true', help='não apaga os dados BENCH_ ao final')
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    if engine.dialect.name != 'postgresql':
+        print('Este benchmark requer PostgreSQL (EXPLAIN ANALYZE / BRIN).')
+        return 1
+
+    try:
+        if not args.sem_popular:
+            popular(engine, args.linhas, args.lotes)
+
+        instrucoes = consultas(parametros_consulta(engine, args.lotes))
+        sem = medir(engine, instrucoes, False, args.repeticoes)
+        com = medir(engine, instrucoes, True, args.repeticoes)
+        resultados = {}
+        for nome in instrucoes:
+            antes, depois = sem[nome], com[nome]
+            resultados[nome] = {'sem_migracao': antes, 'com_migracao': depois}
+            print(f"{nome:28s} sem migração {antes['mediana_ms']:10.2f} ms | "
+                  f"com migração {depois['mediana_ms']:8.2f} ms {depois['indices']}"
+                  f"{' (Sort)' if depois['ordena'] else ''}")
+
+        relatorio = {
+            'gerado_em': datetime.now().isoformat(),
+            'linhas': args.linhas,
+            'lotes': args.lotes,
+            'repeticoes': args.repeticoes,
+            'consultas': resultados
+        }
+        with open(args.saida, 'w') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, default=str)
+        print(f"Resultados gravados em {args.saida}")
+
+        lentas = [n for n, r in resultados.items() if r['com_migracao']['mediana_ms'] > 50]
+        if lentas:
+            print(f"ATENÇÃO: acima de 50 ms com a migração: {', '.join(lentas)}")
+            return 2
+        return 0
+    finally:
+        if not args.manter:
+            limpar(engine)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+Micro-benchmarks da verificação de tokens (token_required) e do hash de senha do login
+"""
+import pytest
+
+from auth_cache import token_cache, verificar_token
+from cache import cache
+from conftest import JWT_SECRET
+
+
+@pytest.fixture
+def token(usuario):
+    return usuario.generate_auth_token(JWT_SECRET)
+
+
+def bench_verificar_token_em_cache(benchmark, token):
+    verificar_token(token, JWT_SECRET)
+    assert benchmark(verificar_token, token, JWT_SECRET) is not None
+
+
+def bench_verificar_token_novo(benchmark, token):
+    """Token fora do cache local: decodifica o JWT e lê o principal do cache compartilhado"""
+    def limpar():
+        token_cache.limpar()
+    verificar_token(token, JWT_SECRET)
+    benchmark.pedantic(verificar_token, args=(token, JWT_SECRET), setup=limpar, rounds=2000)
+
+
+def bench_verificar_token_frio(benchmark, token):
+    """Sem nenhum cache: decodifica e consulta a tabela users"""
+    def limpar():
+        token_cache.limpar()
+        cache.limpar()
+    benchmark.pedantic(verificar_token, args=(token, JWT_SECRET), setup=limpar, rounds=500)
+
+
+def bench_gerar_token(benchmark, usuario):
+    benchmark(usuario.generate_auth_token, JWT_SECRET)
+
+
+def bench_check_password(benchmark, usuario):
+    # Custo dominado pelo fator de trabalho do hash: poucas rodadas bastam
+    assert benchmark.pedantic(usuario.check_password, args=('bench123',), rounds=5)
@@ -0,0 +1,39 @@
+"""
+Micro-benchmarks da auditoria: custo na requisição (enfileirar) e gravação em lote
+"""
+from datetime import datetime
+
+import pytest
+
+from log_writer import log_writer
+from logging_utils import registrar_log_atividade
+
+
+def registro(i=0):
+    return {
+        'usuario_id': None, 'usuario_nome': 'bench', 'acao': 'BENCH_LOG', 'detalhes': f'{{"i": {i}}}',
+        'endpoint': 'listar_leituras', 'metodo_http': 'GET', 'ip_address': '127.0.0.1',
+        'user_agent': 'bench', 'status_code': 200, 'data_hora': datetime.utcnow()
+    }
+
+
+def bench_registrar_log_atividade(benchmark, app, usuario):
+    """Caminho completo dentro da requisição (captura do request + fila)"""
+    with app.test_request_context('/api/leituras', headers={'User-Agent': 'bench'}):
+        benchmark(registrar_log_atividade, usuario, 'BENCH_LOG', '{"i": 0}', 200)
+    log_writer.flush()
+
+
+def bench_enfileirar(benchmark):
+    benchmark(log_writer.enfileirar, registro())
+    log_writer.flush()
+
+
+@pytest.mark.banco
+@pytest.mark.parametrize('tamanho', [1, 200])
+def bench_gravar_lote(benchmark, app, tamanho):
+    """INSERT executemany de um lote (LOG_BATCH_SIZE = 200) contra um registro por vez"""
+    lote = [registro(i) for i in range(tamanho)]
+    falhas = log_writer.falhas
+    benchmark.pedantic(log_writer._gravar, args=(lote,), rounds=30, warmup_rounds=2)
+    assert log_writer.falhas == falhas
@@ -0,0 +1,86 @@
+"""
+Micro-benchmarks do caminho quente das leituras: validação da ingestão,
+serialização das respostas e eventos/rollups calculados em memória
+"""
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pytest
+
+from eventos_leituras import montar_eventos
+from ingestao import validar_leituras
+from ingestao_binaria import codificar_leituras, decodificar_leituras
+from leituras_utils import bloco_json, montar_pagina, serializar_leitura
+from rollups import calcular_parciais
+
+Linha = namedtuple('Linha', 'id umidade temperatura pressao lote data_inicial data_final')
+
+INICIO = datetime(2024, 5, 1)
+
+
+@pytest.fixture(scope='module')
+def itens_json():
+    """Corpo típico de POST /api/leituras vindo de 50 dispositivos (semente fixa)"""
+    aleatorio = random.Random(42)
+    return [
+        {
+            'temperatura': round(aleatorio.uniform(36.5, 38.5), 2),
+            'umidade': round(aleatorio.uniform(50, 70), 2),
+            'pressao': round(aleatorio.uniform(1000, 1020), 2),
+            'lote': f'LOTE_{i % 50:02d}',
+            'data_inicial': (INICIO + timedelta(seconds=30 * i)).isoformat(),
+            'data_final': None
+        }
+        for i in range(20000)
+    ]
+
+
+@pytest.fixture(scope='module')
+def linhas_validas(itens_json):
+    return validar_leituras(itens_json)[0]
+
+
+@pytest.fixture(scope='module')
+def linhas_banco(linhas_validas):
+    return [Linha(i, l['umidade'], l['temperatura'], l['pressao'], l['lote'], l['data_inicial'], None)
+            for i, l in enumerate(linhas_validas[:10000], start=1)]
+
+
+def bench_validar_leituras_20k(benchmark, itens_json):
+    validas, rejeitadas = benchmark(validar_leituras, itens_json)
+    assert len(validas) == 20000 and not rejeitadas
+
+
+def bench_decodificar_quadro_binario_20k(benchmark, linhas_validas):
+    # Mesmo lote de bench_validar_leituras_20k no formato compacto das placas
+    quadro = codificar_leituras(linhas_validas)
+    validas, rejeitadas = benchmark(decodificar_leituras, quadro)
+    assert len(validas) == 20000 and not rejeitadas
+
+
+def bench_serializar_leitura(benchmark, linhas_banco):
+    benchmark(serializar_leitura, linhas_banco[0])
+
+
+def bench_montar_pagina_500(benchmark, linhas_banco):
+    itens, cursor = benchmark(montar_pagina, linhas_banco[:501], 500)
+    assert len(itens) == 500 and cursor
+
+
+def bench_bloco_json_stream_1000(benchmark, linhas_banco):
+    # Um bloco do streaming (TAMANHO_LOTE_STREAM linhas)
+    benchmark(bloco_json, linhas_banco[:1000])
+
+
+def bench_montar_eventos_lote_ingestao(benchmark, linhas_validas):
+    # montar_eventos ordena os grupos no lugar: cada rodada recebe cópias
+    def copia():
+        return ([dict(l) for l in linhas_validas[:2000]],), {}
+    eventos = benchmark.pedantic(montar_eventos, setup=copia, rounds=50)
+    assert len(eventos) == 50
+
+
+def bench_calcular_parciais_20k(benchmark, linhas_validas):
+    registros = benchmark(calcular_parciais, linhas_validas)
+    assert registros
@@ -0,0 +1,64 @@
+"""
+Fixtures dos micro-benchmarks
+
+BENCH_DATABASE_URL aponta para o banco usado pelos benchmarks marcados com
+"banco" (ex.: um PostgreSQL local descartável); sem ela é usado um SQLite
+temporário, útil só para comparar versões do código na mesma máquina.
+
+Uso (a partir deste diretório):
+    python -m pytest                                   # roda e imprime a tabela
+    python -m pytest --benchmark-autosave              # grava .benchmarks/<máquina>/NNNN_<commit>.json
+    python -m pytest --benchmark-compare --benchmark-compare-fail=mean:10%
+                                                       # falha se a média piorar mais de 10%
+                                                       # em relação à última execução gravada
+    pytest-benchmark compare 0001 0002                 # diferença entre duas versões
+"""
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from cache import cache  # noqa: E402
+from extensions import db  # noqa: E402
+from log_writer import log_writer  # noqa: E402
+from models import User, Log  # noqa: E402
+
+JWT_SECRET = 'bench-jwt-secret'
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    url = os.getenv('BENCH_DATABASE_URL') or f"sqlite:///{tmp_path_factory.mktemp('bench') / 'bench.db'}"
+    flask_app = Flask('bench')
+    flask_app.config.update(
+        SQLALCHEMY_DATABASE_URI=url,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        JWT_SECRET_KEY=JWT_SECRET,
+        LOG_ASYNC=True
+    )
+    db.init_app(flask_app)
+    cache.init_app(flask_app)
+    log_writer.init_app(flask_app)
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        log_writer.parar()
+        db.session.query(Log).filter(Log.acao.like('BENCH_%')).delete(synchronize_session=False)
+        db.session.query(User).filter(User.username.like('bench_%')).delete(synchronize_session=False)
+        db.session.commit()
+        db.session.remove()
+
+
+@pytest.fixture(scope='session')
+def usuario(app):
+    user = User.query.filter_by(username='bench_usuario').first()
+    if user is None:
+        user = User(username='bench_usuario', email='bench@bench.local', is_admin=False)
+        user.set_password('bench123')
+        db.session.add(user)
+        db.session.commit()
+    return user
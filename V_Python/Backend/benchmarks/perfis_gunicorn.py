@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Comparação dos perfis do gunicorn (GUNICORN_PERFIL) sob tráfego realista
+
+Para cada perfil sobe `gunicorn -c gunicorn.conf.py` numa porta local, espera
+a primeira resposta HTTP e reproduz por `--duracao` segundos:
+
+- dispositivos: POST /api/leituras a cada `--intervalo` s (timeout de 15 s do firmware);
+- dashboards: GET /api/leituras (página), /api/leituras/agregado e /api/lotes em sequência.
+
+Cada perfil recebe exatamente a mesma carga; o relatório traz p50/p99 e
+vazão por tipo de cliente, erros e timeouts. Use o mesmo banco do ambiente
+alvo (DATABASE_URL ou DB_*) e rode na máquina/contêiner de produção, pois
+os perfis são dimensionados pelo número de CPUs.
+
+Uso:
+    python benchmarks/perfis_gunicorn.py --usuario admin --senha ...
+    python benchmarks/perfis_gunicorn.py --perfis sync,gevent,asgi --dispositivos 500 \\
+        --dashboards 20 --duracao 120 --saida perfis.json
+"""
+
+import argparse
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from carga_conexoes import (
+    Resultados, dispositivo, limpar, obter_token, percentil, TIMEOUT_DISPOSITIVO
+)
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PERFIS = ('sync', 'gthread', 'gevent', 'asgi')
+
+
+def iniciar_servidor(perfil, porta, extra_env):
+    env = dict(os.environ, GUNICORN_PERFIL=perfil, GUNICORN_BIND=f'127.0.0.1:{porta}', **extra_env)
+    # Log de acesso desligado: escrever uma linha por requisição distorce a medição.
+    # O log de erros vai para um arquivo (um pipe não lido travaria o servidor)
+    log_erros = tempfile.TemporaryFile()
+    processo = subprocess.Popen(
+        ['gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', '/dev/null'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log_erros,
+        start_new_session=True
+    )
+    processo.log_erros = log_erros
+    return processo
+
+
+def aguardar_servidor(url, processo, timeout=60):
+    fim = time.monotonic() + timeout
+    while time.monotonic() < fim:
+        if processo.poll() is not None:
+            processo.log_erros.seek(0)
+            raise RuntimeError(f'gunicorn encerrou: {processo.log_erros.read().decode()[-2000:]}')
+        try:
+            # Qualquer resposta HTTP indica que os workers já atendem
+            requests.get(f'{url}/api/', timeout=2)
+            return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError('gunicorn não respondeu a tempo')
+
+
+def parar_servidor(processo):
+    if processo.poll() is not None:
+        return
+    os.killpg(processo.pid, signal.SIGTERM)
+    try:
+        processo.wait(30)
+    except subprocess.TimeoutExpired:
+        os.killpg(processo.pid, signal.SIGKILL)
+
+
+def dashboard(numero, url, token, fim, resultados, lotes):
+    """Um usuário com o painel aberto: recarrega gráficos e listas em sequência"""
+    sessao = requests.Session()
+    sessao.headers['Authorization'] = f'Bearer {token}'
+    caminhos = (
+        '/api/leituras?lote={lote}&limite=500',
+        '/api/leituras/agregado?lote={lote}&intervalo=hora',
+        '/api/lotes'
+    )
+    while time.monotonic() < fim:
+        caminho = random.choice(caminhos).format(lote=random.choice(lotes))
+        inicio = time.perf_counter()
+        try:
+            resposta = sessao.get(url + caminho, timeout=30)
+            resultados.registrar(time.perf_counter() - inicio, resposta.status_code)
+        except requests.RequestException as e:
+            resultados.registrar(erro=type(e).__name__)
+        time.sleep(random.uniform(0.5, 1.5))
+
+
+def resumo(resultados, duracao):
+    latencias = resultados.latencias
+    return {
+        'requisicoes': len(latencias) + sum(resultados.erros.values()),
+        'vazao_rps': round(len(latencias) / duracao, 1),
+        'p50_ms': round(statistics.median(latencias) * 1000, 1) if latencias else None,
+        'p99_ms': round(percentil(latencias, 0.99) * 1000, 1) if latencias else None,
+        'status': resultados.status,
+        'erros': resultados.erros
+    }
+
+
+def medir_perfil(perfil, args, extra_env):
+    url = f'http://127.0.0.1:{args.porta}'
+    processo = iniciar_servidor(perfil, args.porta, extra_env)
+    try:
+        aguardar_servidor(url, processo)
+        token = obter_token(url, args.usuario, args.senha)
+        lotes = [f'CARGA_{i:04d}' for i in range(args.dispositivos)]
+
+        dispositivos, dashboards = Resultados(), Resultados()
+        fim = time.monotonic() + args.duracao
+        threads = [
+            threading.Thread(target=dispositivo, args=(i, url, token, args.intervalo, fim, dispositivos),
+                             daemon=True)
+            for i in range(args.dispositivos)
+        ] + [
+            threading.Thread(target=dashboard, args=(i, url, token, fim, dashboards, lotes), daemon=True)
+            for i in range(args.dashboards)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(args.duracao + TIMEOUT_DISPOSITIVO + 5)
+
+        return {'dispositivos': resumo(dispositivos, args.duracao),
+                'dashboards': resumo(dashboards, args.duracao)}
+    finally:
+        parar_servidor(processo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Comparação dos perfis do gunicorn sob carga')
+    parser.add_argument('--perfis', default=','.join(PERFIS))
+    parser.add_argument('--porta', type=int, default=5099)
+    parser.add_argument('--usuario', default=os.getenv('CARGA_USUARIO', 'admin'))
+    parser.add_argument('--senha', default=os.getenv('CARGA_SENHA', ''))
+    parser.add_argument('--dispositivos', type=int, default=200)
+    parser.add_argument('--dashboards', type=int, default=10)
+    parser.add_argument('--duracao', type=int, default=60)
+    parser.add_argument('--intervalo', type=float, default=1.0, help='segundos entre envios de cada dispositivo')
+    parser.add_argument('--workers', type=int, help='fixa GUNICORN_WORKERS em todos os perfis')
+    parser.add_argument('--db-url', default=os.getenv('DATABASE_URL'),
+                        help='banco para apagar as leituras CARGA_ ao final de cada perfil')
+    parser.add_argument('--saida', default='benchmark_perfis_gunicorn.json')
+    args = parser.parse_args()
+
+    extra_env = {'GUNICORN_WORKERS': str(args.workers)} if args.workers else {}
+    perfis = [p.strip() for p in args.perfis.split(',') if p.strip()]
+    relatorio = {'cpus': os.cpu_count(), 'dispositivos': args.dispositivos, 'dashboards': args.dashboards,
+                 'duracao_s': args.duracao, 'intervalo_s': args.intervalo, 'perfis': {}}
+
+    for perfil in perfis:
+        print(f"Perfil {perfil}...")
+        try:
+            relatorio['perfis'][perfil] = medir_perfil(perfil, args, extra_env)
+        except Exception as e:
+            relatorio['perfis'][perfil] = {'erro': str(e)}
+        finally:
+            if args.db_url:
+                limpar(args.db_url)
+
+    with open(args.saida, 'w') as arquivo:
+        json.dump(relatorio, arquivo, indent=2)
+
+    print(f"\n{'perfil':<8} {'cliente':<12} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'erros':>6}")
+    for perfil, dados in relatorio['perfis'].items():
+        if 'erro' in dados:
+            print(f"{perfil:<8} FALHOU: {dados['erro'][:200]}")
+            continue
+        for cliente, medidas in dados.items():
+            falhas = sum(medidas['erros'].values()) + sum(
+                n for status, n in medidas['status'].items() if status >= 500)
+            print(f"{perfil:<8} {cliente:<12} {medidas['vazao_rps']:>8} {medidas['p50_ms']!s:>8} "
+                  f"{medidas['p99_ms']!s:>8} {falhas:>6}")
+    print(f"Resultados gravados em {args.saida}")
+    return 1 if any('erro' in dados for dados in relatorio['perfis'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,271 @@
+# cache.py - Cache compartilhado com backends plugáveis (LRU em processo ou servidor Redis)
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+BACKENDS = ('memoria', 'redis')
+
+
+class BackendMemoria:
+    """
+    LRU em processo, limitado pelo número de entradas, com TTL por entrada e
+    índice de tags. Cada worker do gunicorn tem o seu: invalidações feitas
+    em um worker só chegam aos demais pela expiração (TTL).
+    """
+    nome = 'memoria'
+
+    def __init__(self, tamanho_maximo=10000):
+        self.tamanho_maximo = tamanho_maximo
+        self._entradas = OrderedDict()  # chave → (valor, expira_em, tags)
+        self._chaves_por_tag = {}
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        """(True, valor) ou (False, None) se ausente/expirada"""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return False, None
+            valor, expira_em, _ = entrada
+            if expira_em is not None and expira_em <= time.monotonic():
+                self._remover(chave)
+                return False, None
+            self._entradas.move_to_end(chave)
+            return True, valor
+
+    def guardar(self, chave, valor, ttl, tags):
+        if self.tamanho_maximo <= 0:
+            return
+        expira_em = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._remover(chave)
+            self._entradas[chave] = (valor, expira_em, tuple(tags))
+            for tag in tags:
+                self._chaves_por_tag.setdefault(tag, set()).add(chave)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._remover(next(iter(self._entradas)))
+
+    def remover(self, chave):
+        with self._lock:
+            self._remover(chave)
+
+    def invalidar_tags(self, tags):
+        removidas = 0
+        with self._lock:
+            for tag in tags:
+                for chave in list(self._chaves_por_tag.get(tag, ())):
+                    self._remover(chave)
+                    removidas += 1
+        return removidas
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._chaves_por_tag.clear()
+
+    def tamanho(self):
+        return len(self._entradas)
+
+    def _remover(self, chave):
+        entrada = self._entradas.pop(chave, None)
+        if entrada is None:
+            return
+        for tag in entrada[2]:
+            chaves = self._chaves_por_tag.get(tag)
+            if chaves is not None:
+                chaves.discard(chave)
+                if not chaves:
+                    del self._chaves_por_tag[tag]
+
+
+class BackendRedis:
+    """
+    Servidor compatível com o protocolo Redis (Redis, Valkey, KeyDB ou um
+    substituto local), compartilhado pelos workers: uma invalidação vale para
+    todos imediatamente. Valores são gravados em JSON; cada tag é um SET com
+    as chaves marcadas, que expira junto com a última entrada gravada nele
+    (entradas de uma mesma tag devem usar o mesmo TTL).
+
+    Requer o pacote redis (ImportError se não estiver instalado).
+    """
+    nome = 'redis'
+
+    def __init__(self, url='redis://localhost:6379/0', prefixo='embryotech:', timeout=0.5, cliente=None):
+        if cliente is None:
+            import redis
+            cliente = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.cliente = cliente
+        self.prefixo = prefixo
+
+    def _chave(self, chave):
+        return f'{self.prefixo}{chave}'
+
+    def _chave_tag(self, tag):
+        return f'{self.prefixo}tag:{tag}'
+
+    def obter(self, chave):
+        bruto = self.cliente.get(self._chave(chave))
+        if bruto is None:
+            return False, None
+        return True, json.loads(bruto)
+
+    def guardar(self, chave, valor, ttl, tags):
+        chave = self._chave(chave)
+        pipe = self.cliente.pipeline(transaction=False)
+        pipe.set(chave, json.dumps(valor), ex=ttl or None)
+        for tag in tags:
+            chave_tag = self._chave_tag(tag)
+            pipe.sadd(chave_tag, chave)
+            if ttl:
+                pipe.expire(chave_tag, ttl)
+        pipe.execute()
+
+    def remover(self, chave):
+        self.cliente.delete(self._chave(chave))
+
+    def invalidar_tags(self, tags):
+        removidas = 0
+        for tag in tags:
+            chave_tag = self._chave_tag(tag)
+            chaves = self.cliente.smembers(chave_tag)
+            # Chaves gravadas entre o SMEMBERS e o DEL escapam desta
+            # invalidação; o TTL limita o tempo em que ficam desatualizadas
+            self.cliente.delete(chave_tag, *chaves)
+            removidas += len(chaves)
+        return removidas
+
+    def limpar(self):
+        chaves = list(self.cliente.scan_iter(match=f'{self.prefixo}*', count=1000))
+        for inicio in range(0, len(chaves), 1000):
+            self.cliente.delete(*chaves[inicio:inicio + 1000])
+
+    def tamanho(self):
+        return None
+
+
+class Cache:
+    """
+    Fachada única do cache da aplicação: get/set/delete com TTL, invalidação
+    por tags e contadores de acertos/falhas por grupo (o prefixo da chave
+    antes do primeiro ":", ex.: "lotes", "agregado", "principal").
+
+    Falhas do backend (ex.: servidor Redis fora do ar) nunca chegam às rotas:
+    contam como falha de cache e o valor é recalculado.
+    """
+
+    def __init__(self, backend=None, ttl_padrao=300):
+        self.backend = backend if backend is not None else BackendMemoria()
+        self.ttl_padrao = ttl_padrao
+        self.habilitado = True
+
+        self._contadores = {}  # grupo → [acertos, falhas]
+        self._lock = threading.Lock()
+        self.erros = 0
+        self.invalidacoes = 0
+        self._backend_falhando = False
+
+        # Callback opcional (grupo, acerto) para exportar os contadores (ver metricas.py)
+        self.ao_contar = None
+
+    def init_app(self, app):
+        self.habilitado = app.config.get('CACHE_HABILITADO', True)
+        self.ttl_padrao = app.config.get('CACHE_TTL', self.ttl_padrao)
+
+        tipo = app.config.get('CACHE_BACKEND', 'memoria')
+        if tipo not in BACKENDS:
+            raise ValueError(f"CACHE_BACKEND deve ser um de: {', '.join(BACKENDS)}")
+        if tipo == 'redis':
+            try:
+                self.backend = BackendRedis(
+                    app.config.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+                    prefixo=app.config.get('CACHE_PREFIXO', 'embryotech:'),
+                    timeout=app.config.get('CACHE_REDIS_TIMEOUT', 0.5)
+                )
+            except ImportError:
+                print("CACHE_BACKEND=redis requer o pacote redis; usando o cache em memória")
+                tipo = 'memoria'
+        if tipo == 'memoria':
+            self.backend = BackendMemoria(app.config.get('CACHE_TAMANHO', 10000))
+        app.extensions['cache'] = self
+
+    # ---------------------------------------------------------------- operações
+
+    def get(self, chave, padrao=None):
+        encontrado, valor = False, None
+        if self.habilitado:
+            encontrado, valor = self._executar(self.backend.obter, chave, padrao=(False, None))
+        self._contar(chave, encontrado)
+        return valor if encontrado else padrao
+
+    def set(self, chave, valor, ttl=None, tags=()):
+        """Guarda `valor` (serializável em JSON) por `ttl` segundos (padrão CACHE_TTL)"""
+        if self.habilitado:
+            self._executar(self.backend.guardar, chave, valor, ttl or self.ttl_padrao, tuple(tags))
+
+    def delete(self, chave):
+        if self.habilitado:
+            self._executar(self.backend.remover, chave)
+
+    def invalidar(self, *tags):
+        """Remove todas as entradas marcadas com alguma das tags"""
+        if not self.habilitado or not tags:
+            return 0
+        removidas = self._executar(self.backend.invalidar_tags, tags, padrao=0)
+        with self._lock:
+            self.invalidacoes += 1
+        return removidas
+
+    def obter_ou_calcular(self, chave, calcular, ttl=None, tags=()):
+        """Valor em cache para `chave` ou o de calcular(), que passa a ser guardado"""
+        sentinela = object()
+        valor = self.get(chave, sentinela)
+        if valor is sentinela:
+            valor = calcular()
+            self.set(chave, valor, ttl, tags)
+        return valor
+
+    def limpar(self):
+        self._executar(self.backend.limpar)
+
+    # ---------------------------------------------------------------- internos
+
+    def _executar(self, operacao, *args, padrao=None):
+        try:
+            resultado = operacao(*args)
+            self._backend_falhando = False
+            return resultado
+        except Exception as e:
+            with self._lock:
+                self.erros += 1
+            if not self._backend_falhando:
+                # Só avisa na transição, para não inundar o log com o backend fora do ar
+                print(f"Erro no backend de cache ({self.backend.nome}): {str(e)}")
+                self._backend_falhando = True
+            return padrao
+
+    def _contar(self, chave, acerto):
+        grupo = chave.split(':', 1)[0]
+        with self._lock:
+            contadores = self._contadores.setdefault(grupo, [0, 0])
+            contadores[0 if acerto else 1] += 1
+        if self.ao_contar is not None:
+            self.ao_contar(grupo, acerto)
+
+    def estatisticas(self):
+        with self._lock:
+            grupos = {grupo: {'acertos': a, 'falhas': f} for grupo, (a, f) in self._contadores.items()}
+        return {
+            'backend': self.backend.nome,
+            'habilitado': self.habilitado,
+            'entradas': self.backend.tamanho(),
+            'acertos': sum(g['acertos'] for g in grupos.values()),
+            'falhas': sum(g['falhas'] for g in grupos.values()),
+            'erros': self.erros,
+            'invalidacoes': self.invalidacoes,
+            'grupos': grupos
+        }
+
+
+cache = Cache()
@@ -0,0 +1,390 @@
+# compressao.py - Compressão HTTP: corpos gzip/deflate recebidos e respostas negociadas por Accept-Encoding
+
+import io
+import json
+import zlib
+
+from flask import request, jsonify
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from werkzeug.datastructures import Accept
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_accept_header
+from werkzeug.wsgi import get_input_stream
+
+# Opcionais: entram na negociação só se instalados (pip install brotli zstandard)
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# wbits do zlib por Content-Encoding ("deflate" no HTTP é o formato zlib)
+WBITS = {'gzip': 31, 'deflate': 15}
+
+# Tipos que valem a compressão. text/event-stream fica de fora: cada evento
+# precisa chegar na hora e proxies costumam segurar SSE comprimido.
+TIPOS_COMPRESSIVEIS = {'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'}
+
+# Corpos comprimidos maiores que isso são descomprimidos fora do event loop
+LIMITE_NO_LOOP = 64 * 1024
+
+
+class CorpoExcedido(ValueError):
+    """Corpo descomprimido maior que COMPRESSAO_MAX_DESCOMPRIMIDO"""
+
+
+class CorpoRecusado(Exception):
+    """Corpo comprimido recusado no modo ASGI (415, 413 ou 400)"""
+
+    def __init__(self, mensagem, status_code):
+        super().__init__(mensagem)
+        self.status_code = status_code
+
+
+class _Zlib:
+    def __init__(self, codificacao, nivel):
+        self._compressor = zlib.compressobj(nivel, zlib.DEFLATED, WBITS[codificacao])
+
+    def comprimir(self, dados):
+        return self._compressor.compress(dados)
+
+    def descarregar(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finalizar(self):
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self, nivel):
+        self._compressor = brotli.Compressor(quality=nivel)
+
+    def comprimir(self, dados):
+        return self._compressor.process(dados)
+
+    def descarregar(self):
+        return self._compressor.flush()
+
+    def finalizar(self):
+        return self._compressor.finish()
+
+
+class _Zstd:
+    def __init__(self, nivel):
+        self._compressor = zstandard.ZstdCompressor(level=nivel).compressobj()
+
+    def comprimir(self, dados):
+        return self._compressor.compress(dados)
+
+    def descarregar(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finalizar(self):
+        return self._compressor.flush()
+
+
+def algoritmos_disponiveis(preferencia):
+    """Algoritmos de `preferencia` ("br,zstd,gzip") cujas bibliotecas estão instaladas"""
+    instalados = {'gzip': True, 'deflate': True, 'br': brotli is not None, 'zstd': zstandard is not None}
+    return tuple(nome for nome in (p.strip().lower() for p in preferencia.split(','))
+                 if instalados.get(nome))
+
+
+def escolher_codificacao(accept_encoding, disponiveis):
+    """
+    Codificação de maior q aceita pelo cliente; empates seguem a ordem de
+    `disponiveis`. None se o cliente não aceita nenhuma.
+    """
+    if not accept_encoding:
+        return None
+    aceitas = parse_accept_header(accept_encoding, Accept)
+    melhor, melhor_q = None, 0
+    for nome in disponiveis:
+        q = aceitas.quality(nome)
+        if q > melhor_q:
+            melhor, melhor_q = nome, q
+    return melhor
+
+
+def compressivel(mimetype):
+    mimetype = (mimetype or '').lower()
+    return (mimetype in TIPOS_COMPRESSIVEIS or mimetype.endswith('+json')
+            or (mimetype.startswith('text/') and mimetype != 'text/event-stream'))
+
+
+def descomprimir(corpo, codificacao, limite):
+    """
+    Corpo gzip/deflate → bytes. Para de descomprimir após `limite` bytes
+    (CorpoExcedido), sem expandir uma "bomba" inteira na memória; levanta
+    ValueError se o corpo estiver corrompido ou truncado.
+    """
+    descompressor = zlib.decompressobj(WBITS[codificacao])
+    try:
+        dados = descompressor.decompress(corpo, limite + 1)
+    except zlib.error as e:
+        raise ValueError(f'corpo {codificacao} inválido: {e}')
+    if len(dados) > limite or descompressor.unconsumed_tail:
+        raise CorpoExcedido(f'corpo descomprimido excede {limite} bytes')
+    if not descompressor.eof or descompressor.unused_data:
+        raise ValueError(f'corpo {codificacao} truncado ou com dados excedentes')
+    return dados
+
+
+class Compressao:
+    """
+    Compressão transparente para o app Flask (hooks) e para o modo ASGI
+    (CompressaoASGI, com a mesma configuração).
+
+    Requisições com Content-Encoding gzip ou deflate (lotes das placas) são
+    descomprimidas antes da rota, limitadas a COMPRESSAO_MAX_DESCOMPRIMIDO.
+    Respostas de tipos textuais são comprimidas com o algoritmo negociado
+    (COMPRESSAO_ALGORITMOS, em ordem de preferência): corpos completos a
+    partir de COMPRESSAO_MINIMO bytes, e respostas em streaming bloco a
+    bloco, com flush a cada bloco para a memória e a latência não mudarem.
+    O ETag de uma resposta comprimida vira fraco (mesmo conteúdo, bytes
+    diferentes); os 304 já comparam If-None-Match pela comparação fraca.
+    """
+
+    def __init__(self, app=None):
+        self.habilitada = True
+        self.minimo = 1024
+        self.nivel = 6
+        self.algoritmos = ('gzip',)
+        self.max_descomprimido = 32 * 1024 * 1024
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.habilitada = app.config.get('COMPRESSAO_HABILITADA', True)
+        self.minimo = app.config.get('COMPRESSAO_MINIMO', self.minimo)
+        self.nivel = app.config.get('COMPRESSAO_NIVEL', self.nivel)
+        self.algoritmos = algoritmos_disponiveis(app.config.get('COMPRESSAO_ALGORITMOS', 'gzip'))
+        self.max_descomprimido = app.config.get('COMPRESSAO_MAX_DESCOMPRIMIDO', self.max_descomprimido)
+        app.before_request(self._descomprimir_requisicao)
+        app.after_request(self._comprimir_resposta)
+        app.extensions['compressao'] = self
+
+    def criar_compressor(self, codificacao):
+        # brotli vai de 0 a 11 e zstd de 1 a 22; o nível do gzip (1-9) serve de escala
+        if codificacao == 'br':
+            return _Brotli(min(self.nivel, 11))
+        if codificacao == 'zstd':
+            return _Zstd(max(self.nivel // 2, 1))
+        return _Zlib(codificacao, self.nivel)
+
+    def codificacao_resposta(self, accept_encoding):
+        return escolher_codificacao(accept_encoding, self.algoritmos) if self.habilitada else None
+
+    # ---------------------------------------------------------------- Flask
+
+    def _descomprimir_requisicao(self):
+        codificacao = request.headers.get('Content-Encoding', '').strip().lower()
+        if not self.habilitada or codificacao in ('', 'identity'):
+            return None
+        if codificacao not in WBITS:
+            return jsonify({'message': f'Content-Encoding não suportado: {codificacao}'}), 415
+        try:
+            corpo = get_input_stream(request.environ, max_content_length=self.max_descomprimido).read()
+            dados = descomprimir(corpo, codificacao, self.max_descomprimido)
+        except RequestEntityTooLarge:
+            return jsonify({'message': f'corpo comprimido excede {self.max_descomprimido} bytes'}), 413
+        except CorpoExcedido as e:
+            return jsonify({'message': str(e)}), 413
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        # A rota lê o corpo já descomprimido (request.stream ainda não foi criado)
+        request.environ['wsgi.input'] = io.BytesIO(dados)
+        request.environ['CONTENT_LENGTH'] = str(len(dados))
+        request.environ.pop('HTTP_CONTENT_ENCODING', None)
+        request.environ.pop('wsgi.input_terminated', None)
+        return None
+
+    def _comprimir_resposta(self, resposta):
+        if (request.method == 'HEAD' or resposta.status_code < 200 or resposta.status_code in (204, 304)
+                or resposta.direct_passthrough or 'Content-Encoding' in resposta.headers
+                or not compressivel(resposta.mimetype)):
+            return resposta
+        resposta.vary.add('Accept-Encoding')
+        codificacao = self.codificacao_resposta(request.headers.get('Accept-Encoding'))
+        if codificacao is None:
+            return resposta
+
+        compressor = self.criar_compressor(codificacao)
+        if resposta.is_streamed:
+            resposta.response = _stream_comprimido(resposta.response, compressor)
+            resposta.headers.pop('Content-Length', None)
+        else:
+            corpo = resposta.get_data()
+            if len(corpo) < self.minimo:
+                return resposta
+            resposta.set_data(compressor.comprimir(corpo) + compressor.finalizar())
+        resposta.headers['Content-Encoding'] = codificacao
+        etag, fraco = resposta.get_etag()
+        if etag and not fraco:
+            resposta.set_etag(etag, weak=True)
+        return resposta
+
+
+def _stream_comprimido(corpo, compressor):
+    """Comprime um corpo em streaming bloco a bloco; fecha o gerador original (cursor do banco)"""
+    try:
+        for bloco in corpo:
+            if isinstance(bloco, str):
+                bloco = bloco.encode()
+            saida = compressor.comprimir(bloco) + compressor.descarregar()
+            if saida:
+                yield saida
+        yield compressor.finalizar()
+    finally:
+        if hasattr(corpo, 'close'):
+            corpo.close()
+
+
+class CompressaoASGI:
+    """
+    Middleware ASGI com o mesmo comportamento dos hooks do Flask, na frente
+    das rotas assíncronas e do Flask montado (que então recebe o corpo já
+    descomprimido e tem as respostas dele repassadas sem recompressão).
+    """
+
+    def __init__(self, app, compressao):
+        self.app = app
+        self.compressao = compressao
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.compressao.habilitada:
+            await self.app(scope, receive, send)
+            return
+
+        cabecalhos = Headers(scope=scope)
+        codificacao = cabecalhos.get('content-encoding', '').strip().lower()
+        if codificacao not in ('', 'identity'):
+            try:
+                scope, receive = await self._descomprimir(scope, receive, codificacao)
+            except CorpoRecusado as e:
+                await _enviar_json(send, e.status_code, {'message': str(e)})
+                return
+
+        if scope['method'] == 'HEAD':
+            await self.app(scope, receive, send)
+            return
+        codificacao_resposta = self.compressao.codificacao_resposta(cabecalhos.get('accept-encoding'))
+        await self.app(scope, receive, _RespostaComprimida(self.compressao, codificacao_resposta, send))
+
+    async def _descomprimir(self, scope, receive, codificacao):
+        """(scope, receive) com o corpo descomprimido; levanta CorpoRecusado"""
+        if codificacao not in WBITS:
+            raise CorpoRecusado(f'Content-Encoding não suportado: {codificacao}', 415)
+        limite = self.compressao.max_descomprimido
+        partes, tamanho = [], 0
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'http.disconnect':
+                raise CorpoRecusado('conexão encerrada durante o envio do corpo', 400)
+            partes.append(mensagem.get('body', b''))
+            tamanho += len(partes[-1])
+            if tamanho > limite:
+                raise CorpoRecusado(f'corpo comprimido excede {limite} bytes', 413)
+            if not mensagem.get('more_body', False):
+                break
+        corpo = b''.join(partes)
+        try:
+            if len(corpo) > LIMITE_NO_LOOP:
+                dados = await run_in_threadpool(descomprimir, corpo, codificacao, limite)
+            else:
+                dados = descomprimir(corpo, codificacao, limite)
+        except CorpoExcedido as e:
+            raise CorpoRecusado(str(e), 413)
+        except ValueError as e:
+            raise CorpoRecusado(str(e), 400)
+
+        cabecalhos = [(nome, valor) for nome, valor in scope['headers']
+                      if nome not in (b'content-encoding', b'content-length')]
+        cabecalhos.append((b'content-length', str(len(dados)).encode()))
+        entregue = False
+
+        async def receber():
+            nonlocal entregue
+            if entregue:
+                # Depois do corpo: desconexão do cliente (usada pelo streaming)
+                return await receive()
+            entregue = True
+            return {'type': 'http.request', 'body': dados, 'more_body': False}
+
+        return dict(scope, headers=cabecalhos), receber
+
+
+class _RespostaComprimida:
+    """`send` que comprime o corpo da resposta conforme a negociação"""
+
+    def __init__(self, compressao, codificacao, send):
+        self.compressao = compressao
+        self.codificacao = codificacao
+        self.send = send
+        self.inicio = None
+        self.compressor = None
+        self.repassar = False
+
+    async def __call__(self, mensagem):
+        if mensagem['type'] == 'http.response.start':
+            cabecalhos = MutableHeaders(raw=mensagem['headers'])
+            tipo = cabecalhos.get('content-type', '').split(';')[0].strip()
+            if (mensagem['status'] < 200 or mensagem['status'] in (204, 304)
+                    or 'content-encoding' in cabecalhos or not compressivel(tipo)):
+                self.repassar = True
+                await self.send(mensagem)
+                return
+            if 'accept-encoding' not in cabecalhos.get('vary', '').lower():
+                cabecalhos.add_vary_header('Accept-Encoding')
+            if self.codificacao is None:
+                self.repassar = True
+                await self.send(mensagem)
+                return
+            # Só decide ao ver o primeiro bloco: corpos pequenos seguem sem compressão
+            self.inicio = mensagem
+            return
+
+        if mensagem['type'] != 'http.response.body' or self.repassar:
+            await self.send(mensagem)
+            return
+
+        corpo = mensagem.get('body', b'')
+        mais = mensagem.get('more_body', False)
+        if self.compressor is None:
+            if not mais and len(corpo) < self.compressao.minimo:
+                await self.send(self.inicio)
+                await self.send(mensagem)
+                self.repassar = True
+                return
+            cabecalhos = MutableHeaders(raw=self.inicio['headers'])
+            cabecalhos['Content-Encoding'] = self.codificacao
+            del cabecalhos['Content-Length']
+            etag = cabecalhos.get('etag')
+            if etag and not etag.startswith('W/'):
+                cabecalhos['ETag'] = 'W/' + etag
+            self.compressor = self.compressao.criar_compressor(self.codificacao)
+            await self.send(self.inicio)
+
+        if mais:
+            saida = self.compressor.comprimir(corpo) + self.compressor.descarregar()
+        else:
+            saida = self.compressor.comprimir(corpo) + self.compressor.finalizar()
+        if saida or not mais:
+            await self.send({'type': 'http.response.body', 'body': saida, 'more_body': mais})
+
+
+async def _enviar_json(send, status, corpo):
+    conteudo = json.dumps(corpo).encode()
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(conteudo)).encode()),
+        (b'access-control-allow-origin', b'*')
+    ]})
+    await send({'type': 'http.response.body', 'body': conteudo})
+
+
+compressao = Compressao()
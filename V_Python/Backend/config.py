@@ -1,6 +1,9 @@
 import os
 from dotenv import load_dotenv
 
+from banco import opcoes_engine
+from senhas import processos_padrao
+
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
 
@@ -12,13 +15,34 @@ class Config:
     DB_PORT = os.getenv('DB_PORT', '5432')
     DB_NAME = os.getenv('DB_NAME', 'embryotech')
     
+    # URL completa opcional (ex.: apontando para o pgbouncer); substitui as variáveis DB_*
+    DATABASE_URL = os.getenv('DATABASE_URL')
+    
     # Validação de configurações críticas
-    if not DB_PASSWORD:
+    if not DB_PASSWORD and not DATABASE_URL:
         raise ValueError("DB_PASSWORD não foi definida nas variáveis de ambiente")
     
-    SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?connect_timeout=10"
+    SQLALCHEMY_DATABASE_URI = DATABASE_URL or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?connect_timeout=10"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Pool de conexões de cada worker (ver banco.py). Com DB_PGBOUNCER=true o
+    # pool fica com o pgbouncer (pool_mode=transaction) e a aplicação usa NullPool
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'True').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+    DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'False').lower() == 'true'
+    # Conexão direta ao PostgreSQL (sem pgbouncer) para o LISTEN do feed SSE
+    DB_URL_DIRETA = os.getenv('DB_URL_DIRETA')
+
+    SQLALCHEMY_ENGINE_OPTIONS = opcoes_engine(
+        pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE, pre_ping=DB_POOL_PRE_PING,
+        statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS, pgbouncer=DB_PGBOUNCER
+    )
+
     # Configurações de segurança
     SECRET_KEY = os.getenv('SECRET_KEY', 'chave-secreta-muito-segura')
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
@@ -27,4 +51,106 @@ class Config:
         raise ValueError("JWT_SECRET_KEY não foi definida nas variáveis de ambiente")
     
     # Configurações do Flask
-    DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
\ No newline at end of file
+    DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
+
+    # Cache de tokens JWT verificados (ver auth_cache.py)
+    AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', '60'))
+    AUTH_CACHE_TAMANHO = int(os.getenv('AUTH_CACHE_TAMANHO', '10000'))
+
+    # Gravação assíncrona dos logs de auditoria (ver log_writer.py)
+    LOG_ASYNC = os.getenv('LOG_ASYNC', 'True').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '200'))
+    LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '1.0'))
+    LOG_ENQUEUE_TIMEOUT = float(os.getenv('LOG_ENQUEUE_TIMEOUT', '0.05'))
+
+    # Ingestão de leituras: máximo de itens por POST /api/leituras
+    INGESTAO_MAX_ITENS = int(os.getenv('INGESTAO_MAX_ITENS', '20000'))
+
+    # Paginação por cursor de GET /api/leituras
+    LEITURAS_LIMITE_PADRAO = int(os.getenv('LEITURAS_LIMITE_PADRAO', '500'))
+    LEITURAS_LIMITE_MAXIMO = int(os.getenv('LEITURAS_LIMITE_MAXIMO', '5000'))
+
+    # Rollups por hora/dia atualizados na ingestão (ver rollups.py)
+    ROLLUPS_HABILITADOS = os.getenv('ROLLUPS_HABILITADOS', 'True').lower() == 'true'
+
+    # Relatórios PDF gerados em streaming: teto de segurança de linhas por arquivo
+    RELATORIO_PDF_MAX_LINHAS = int(os.getenv('RELATORIO_PDF_MAX_LINHAS', '1000000'))
+
+    # Fila de relatórios em segundo plano (ver relatorio_jobs.py)
+    RELATORIO_JOBS_DIR = os.getenv('RELATORIO_JOBS_DIR', 'relatorios_gerados')
+    RELATORIO_JOBS_PROCESSOS = int(os.getenv('RELATORIO_JOBS_PROCESSOS', '2'))
+    RELATORIO_JOBS_RETENCAO = int(os.getenv('RELATORIO_JOBS_RETENCAO', '86400'))
+    RELATORIO_JOBS_MAX_BYTES = int(os.getenv('RELATORIO_JOBS_MAX_BYTES', str(1024 * 1024 * 1024)))
+    RELATORIO_JOBS_TIMEOUT = int(os.getenv('RELATORIO_JOBS_TIMEOUT', '3600'))
+
+    # Feed SSE de novas leituras (ver eventos_leituras.py). Cada conexão ocupa
+    # uma unidade de concorrência do worker enquanto dura: exige os perfis
+    # gthread, gevent ou asgi do gunicorn.conf.py; no sync (1 requisição por
+    # processo) o endpoint responde 503. A conexão é encerrada antes do
+    # timeout do gunicorn (GUNICORN_TIMEOUT, exportado pelo gunicorn.conf.py)
+    SSE_HABILITADO = os.getenv('SSE_HABILITADO',
+                               str(os.getenv('GUNICORN_PERFIL', '').lower() != 'sync')).lower() == 'true'
+    SSE_MAX_CONEXOES = int(os.getenv('SSE_MAX_CONEXOES', '50'))
+    SSE_TAMANHO_FILA = int(os.getenv('SSE_TAMANHO_FILA', '100'))
+    SSE_MAX_LEITURAS_EVENTO = int(os.getenv('SSE_MAX_LEITURAS_EVENTO', '50'))
+    SSE_DURACAO_MAXIMA = min(int(os.getenv('SSE_DURACAO_MAXIMA', '300')),
+                             max(1, int(os.getenv('GUNICORN_TIMEOUT', '120')) - 10))
+    SSE_INTERVALO_PING = int(os.getenv('SSE_INTERVALO_PING', '15'))
+
+    # Cache compartilhado (ver cache.py): 'memoria' (LRU por processo) ou 'redis'
+    CACHE_HABILITADO = os.getenv('CACHE_HABILITADO', 'True').lower() == 'true'
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memoria')
+    CACHE_TAMANHO = int(os.getenv('CACHE_TAMANHO', '10000'))
+    CACHE_TTL = int(os.getenv('CACHE_TTL', '300'))
+    CACHE_TTL_AGREGADOS = int(os.getenv('CACHE_TTL_AGREGADOS', '60'))
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_REDIS_TIMEOUT = float(os.getenv('CACHE_REDIS_TIMEOUT', '0.5'))
+    CACHE_PREFIXO = os.getenv('CACHE_PREFIXO', 'embryotech:')
+
+    # Endpoint /metrics (Prometheus); com METRICAS_TOKEN exige "Authorization: Bearer <token>"
+    METRICAS_HABILITADAS = os.getenv('METRICAS_HABILITADAS', 'True').lower() == 'true'
+    METRICAS_TOKEN = os.getenv('METRICAS_TOKEN')
+
+    # Perfil de SQL por requisição (ver perfil_sql.py): X-DB-Queries/X-DB-Time
+    # em todas as respostas e detalhe de uma fração amostrada
+    PERFIL_SQL_HABILITADO = os.getenv('PERFIL_SQL_HABILITADO', 'False').lower() == 'true'
+    PERFIL_SQL_AMOSTRAGEM = float(os.getenv('PERFIL_SQL_AMOSTRAGEM', '0.01'))
+    PERFIL_SQL_LIMIAR_REPETICOES = int(os.getenv('PERFIL_SQL_LIMIAR_REPETICOES', '5'))
+    PERFIL_SQL_MAIS_LENTAS = int(os.getenv('PERFIL_SQL_MAIS_LENTAS', '20'))
+    PERFIL_SQL_MAX_COMANDOS = int(os.getenv('PERFIL_SQL_MAX_COMANDOS', '200'))
+
+    # Modo ASGI (asgi.py): threads do fallback WSGI que atende as rotas do Flask
+    ASGI_THREADS_WSGI = int(os.getenv('ASGI_THREADS_WSGI', '10'))
+
+    # Login (ver senhas.py): fator de trabalho do hash (senhas antigas são
+    # refeitas no próximo login), processos de verificação por worker (CPUs
+    # divididas pelos workers do gunicorn), verificações simultâneas por worker
+    # e admissão de tentativas por IP / falhas por usuário na janela
+    SENHA_METODO = os.getenv('SENHA_METODO', 'pbkdf2:sha256:600000')
+    SENHA_PROCESSOS = int(os.getenv('SENHA_PROCESSOS', str(processos_padrao())))
+    LOGIN_MAX_SIMULTANEOS = int(os.getenv('LOGIN_MAX_SIMULTANEOS', '0'))  # 0 = 2 × SENHA_PROCESSOS
+    LOGIN_ESPERA_MAXIMA = float(os.getenv('LOGIN_ESPERA_MAXIMA', '2.0'))
+    LOGIN_JANELA = int(os.getenv('LOGIN_JANELA', '60'))
+    LOGIN_LIMITE_IP = int(os.getenv('LOGIN_LIMITE_IP', '60'))
+    LOGIN_LIMITE_FALHAS_USUARIO = int(os.getenv('LOGIN_LIMITE_FALHAS_USUARIO', '10'))
+
+    # Chaves de API dos dispositivos (ver dispositivos.py): segredo do HMAC
+    # (padrão: SECRET_KEY; trocá-lo invalida todas as chaves) e intervalo de
+    # conferência do índice em memória
+    DISPOSITIVOS_CHAVE_HMAC = os.getenv('DISPOSITIVOS_CHAVE_HMAC')
+    DISPOSITIVOS_INTERVALO_VERIFICACAO = float(os.getenv('DISPOSITIVOS_INTERVALO_VERIFICACAO', '5'))
+
+    # Compressão HTTP (ver compressao.py): algoritmos das respostas em ordem
+    # de preferência (br e zstd só se os pacotes brotli/zstandard estiverem
+    # instalados), tamanho mínimo e nível, e limite dos corpos gzip recebidos
+    COMPRESSAO_HABILITADA = os.getenv('COMPRESSAO_HABILITADA', 'True').lower() == 'true'
+    COMPRESSAO_ALGORITMOS = os.getenv('COMPRESSAO_ALGORITMOS', 'br,zstd,gzip')
+    COMPRESSAO_MINIMO = int(os.getenv('COMPRESSAO_MINIMO', '1024'))
+    COMPRESSAO_NIVEL = int(os.getenv('COMPRESSAO_NIVEL', '6'))
+    COMPRESSAO_MAX_DESCOMPRIMIDO = int(os.getenv('COMPRESSAO_MAX_DESCOMPRIMIDO', str(32 * 1024 * 1024)))
+
+    # Reenvio idempotente de lotes (ver idempotencia.py): máximo de faixas
+    # de sequências guardadas por dispositivo; acima disso as lacunas mais
+    # antigas passam a contar como recebidas
+    IDEMPOTENCIA_MAX_FAIXAS = int(os.getenv('IDEMPOTENCIA_MAX_FAIXAS', '64'))
\ No newline at end of file
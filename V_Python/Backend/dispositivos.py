@@ -0,0 +1,170 @@
+# dispositivos.py - Chaves de API dos dispositivos verificadas por um índice em memória
+
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from extensions import db
+from models import Dispositivo, Parametro, VersaoTabela
+
+PREFIXO_CHAVE = 'emb_'
+
+# Tabelas cujas alterações mudam o índice (o escopo por sala vem dos parâmetros)
+TABELAS = ('dispositivos', 'parametros')
+
+# Principal das requisições autenticadas por chave: mesmos campos usados
+# pelas rotas e pela auditoria (id None: o log não referencia a tabela users)
+DispositivoAutenticado = namedtuple('DispositivoAutenticado',
+                                    ['id', 'username', 'is_admin', 'dispositivo_id', 'lotes'])
+
+
+def gerar_chave():
+    """Nova chave de API (256 bits aleatórios), exibida uma única vez ao administrador"""
+    return PREFIXO_CHAVE + secrets.token_urlsafe(32)
+
+
+def validar_escopo(lotes, salas):
+    """
+    (lotes, salas) normalizados do corpo das rotas de administração.
+    Levanta ValueError se não forem listas de textos / inteiros ou se ambas
+    estiverem vazias (um dispositivo sem escopo não poderia enviar leituras).
+    """
+    lotes = lotes or []
+    salas = salas or []
+    if not isinstance(lotes, list) or not all(isinstance(l, str) and 0 < len(l) <= 100 for l in lotes):
+        raise ValueError('lotes deve ser uma lista de textos (até 100 caracteres)')
+    if not isinstance(salas, list) or not all(isinstance(s, int) and not isinstance(s, bool) for s in salas):
+        raise ValueError('salas deve ser uma lista de inteiros (id_sala)')
+    if not lotes and not salas:
+        raise ValueError('Informe ao menos um lote ou uma sala')
+    return sorted(set(lotes)), sorted(set(salas))
+
+
+class IndiceDispositivos:
+    """
+    HMAC-SHA256(chave) → DispositivoAutenticado dos dispositivos ativos.
+
+    Verificar uma chave é um HMAC e uma busca no dicionário: sem JWT, sem
+    tabela users e sem hash de senha (a chave já tem entropia suficiente).
+    O índice é recarregado quando a versão de `dispositivos` ou `parametros`
+    em versoes_tabelas muda; a versão é consultada no máximo a cada
+    DISPOSITIVOS_INTERVALO_VERIFICACAO segundos por worker, que é o atraso
+    máximo para uma revogação feita em outro worker valer.
+    """
+
+    def __init__(self):
+        self.chave_hmac = b''
+        self.intervalo_verificacao = 5.0
+        self._entradas = {}
+        self._versao = None
+        self._verificado_em = 0.0
+        self._lock = threading.Lock()
+        self.recargas = 0
+
+    def configurar(self, app):
+        chave = app.config.get('DISPOSITIVOS_CHAVE_HMAC') or app.config['SECRET_KEY']
+        self.chave_hmac = chave.encode()
+        self.intervalo_verificacao = app.config.get('DISPOSITIVOS_INTERVALO_VERIFICACAO',
+                                                    self.intervalo_verificacao)
+        self.invalidar()
+
+    def hash_chave(self, chave):
+        return hmac.new(self.chave_hmac, chave.encode(), hashlib.sha256).hexdigest()
+
+    def invalidar(self):
+        """Força a conferência da versão na próxima verificação (após alterar dispositivos)"""
+        self._verificado_em = 0.0
+
+    def limpar(self):
+        """Descarta o índice; a próxima verificação recarrega do banco"""
+        self._entradas = {}
+        self._versao = None
+        self._verificado_em = 0.0
+
+    # ---------------------------------------------------------------- carga
+
+    @staticmethod
+    def consulta_versao():
+        return select(VersaoTabela.tabela, VersaoTabela.versao).where(VersaoTabela.tabela.in_(TABELAS))
+
+    @staticmethod
+    def consultas_carga():
+        return (
+            select(Dispositivo.id, Dispositivo.nome, Dispositivo.chave_hash, Dispositivo.lotes,
+                   Dispositivo.salas).where(Dispositivo.ativo.is_(True)),
+            select(Parametro.id_sala, Parametro.lote).where(Parametro.id_sala.is_not(None))
+        )
+
+    def _precisa_conferir(self):
+        return time.monotonic() - self._verificado_em >= self.intervalo_verificacao
+
+    def _montar(self, versao, dispositivos, parametros):
+        lotes_por_sala = {}
+        for parametro in parametros:
+            lotes_por_sala.setdefault(parametro.id_sala, set()).add(parametro.lote)
+
+        entradas = {}
+        for dispositivo in dispositivos:
+            lotes = set(json.loads(dispositivo.lotes) if dispositivo.lotes else ())
+            for sala in json.loads(dispositivo.salas) if dispositivo.salas else ():
+                lotes |= lotes_por_sala.get(sala, set())
+            entradas[dispositivo.chave_hash] = DispositivoAutenticado(
+                None, f'dispositivo:{dispositivo.nome}', False, dispositivo.id, frozenset(lotes))
+
+        # Troca atômica: leituras concorrentes veem o índice antigo ou o novo
+        self._entradas = entradas
+        self._versao = versao
+        self.recargas += 1
+
+    def _atualizar(self):
+        with self._lock:
+            if not self._precisa_conferir():
+                return
+            versao = tuple(sorted(db.session.execute(self.consulta_versao()).all()))
+            if versao != self._versao:
+                dispositivos, parametros = self.consultas_carga()
+                self._montar(versao, db.session.execute(dispositivos).all(),
+                             db.session.execute(parametros).all())
+            self._verificado_em = time.monotonic()
+
+    async def _atualizar_assincrono(self, engine):
+        # Sem lock: duas corrotinas podem recarregar ao mesmo tempo, com o mesmo resultado
+        async with engine.connect() as conexao:
+            versao = tuple(sorted((await conexao.execute(self.consulta_versao())).all()))
+            if versao != self._versao:
+                dispositivos, parametros = self.consultas_carga()
+                self._montar(versao, (await conexao.execute(dispositivos)).all(),
+                             (await conexao.execute(parametros)).all())
+        self._verificado_em = time.monotonic()
+
+    # ------------------------------------------------------------ verificação
+
+    def verificar(self, chave):
+        """DispositivoAutenticado da chave, ou None se inválida ou revogada"""
+        if not chave.startswith(PREFIXO_CHAVE):
+            return None
+        if self._precisa_conferir():
+            self._atualizar()
+        return self._entradas.get(self.hash_chave(chave))
+
+    async def verificar_assincrono(self, chave, engine):
+        if not chave.startswith(PREFIXO_CHAVE):
+            return None
+        if self._precisa_conferir():
+            await self._atualizar_assincrono(engine)
+        return self._entradas.get(self.hash_chave(chave))
+
+    def estatisticas(self):
+        return {
+            'dispositivos': len(self._entradas),
+            'recargas': self.recargas
+        }
+
+
+indice_dispositivos = IndiceDispositivos()
@@ -0,0 +1,342 @@
+# eventos_leituras.py - Pub/sub de novas leituras para o feed SSE (LISTEN/NOTIFY entre workers)
+
+import asyncio
+import json
+import os
+import queue
+import select
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from banco import criar_engine_direto
+from extensions import db
+
+CANAL_POSTGRES = 'leituras_novas'
+
+# O payload do NOTIFY é limitado a 8000 bytes no PostgreSQL
+TAMANHO_MAXIMO_PAYLOAD = 7900
+
+
+def _serializar(linha):
+    """Dicionário de ingestao.py → item do evento (mesmos campos da API, sem id)"""
+    return {
+        'umidade': linha.get('umidade'),
+        'temperatura': linha.get('temperatura'),
+        'pressao': linha.get('pressao'),
+        'lote': linha.get('lote'),
+        'data_inicial': linha['data_inicial'].isoformat() if linha.get('data_inicial') else None,
+        'data_final': linha['data_final'].isoformat() if linha.get('data_final') else None
+    }
+
+
+def montar_eventos(linhas, maximo_por_evento=50):
+    """
+    Agrupa as leituras ingeridas por lote. Cada evento leva as leituras mais
+    recentes do lote (até `maximo_por_evento`) e, em `omitidas`, quantas
+    ficaram de fora: nesse caso o cliente deve recarregar os agregados em vez
+    de montar o gráfico só com o delta.
+    """
+    por_lote = {}
+    for linha in linhas:
+        por_lote.setdefault(linha.get('lote'), []).append(linha)
+
+    eventos = []
+    for lote, grupo in por_lote.items():
+        # Mais recentes no fim; leituras sem data ficam antes das datadas
+        grupo.sort(key=lambda l: l.get('data_inicial') or datetime.min)
+        enviadas = [_serializar(l) for l in grupo[-maximo_por_evento:]]
+        evento = {'lote': lote, 'leituras': enviadas, 'omitidas': len(grupo) - len(enviadas)}
+        # Mantém o evento dentro do limite do NOTIFY
+        while len(json.dumps(evento)) > TAMANHO_MAXIMO_PAYLOAD and len(evento['leituras']) > 1:
+            metade = len(evento['leituras']) // 2
+            evento['omitidas'] += metade
+            evento['leituras'] = evento['leituras'][metade:]
+        eventos.append(evento)
+    return eventos
+
+
+class Assinatura:
+    """Fila de eventos de um cliente SSE (opcionalmente filtrada por lote)"""
+
+    def __init__(self, publicador, lote, tamanho_fila):
+        self.publicador = publicador
+        self.lote = lote
+        self.fila = queue.Queue(maxsize=tamanho_fila)
+        self.perdidos = 0
+
+    def entregar(self, evento):
+        if self.lote and evento['lote'] != self.lote:
+            return
+        try:
+            self.fila.put_nowait(evento)
+        except queue.Full:
+            # Cliente lento: descarta o evento e avisa no próximo envio
+            self.perdidos += 1
+
+    def proximo(self, timeout):
+        """Próximo evento ou None após `timeout` segundos"""
+        try:
+            return self.fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.publicador.cancelar(self)
+
+
+class AssinaturaAssincrona(Assinatura):
+    """
+    Assinatura de um cliente SSE do modo ASGI: a fila é um asyncio.Queue do
+    loop do cliente. entregar() pode ser chamado da thread LISTEN, então o
+    evento é repassado ao loop por call_soon_threadsafe.
+    """
+
+    def __init__(self, publicador, lote, tamanho_fila):
+        self.publicador = publicador
+        self.lote = lote
+        self.fila = asyncio.Queue(maxsize=tamanho_fila)
+        self.perdidos = 0
+        self._loop = asyncio.get_running_loop()
+
+    def entregar(self, evento):
+        if self.lote and evento['lote'] != self.lote:
+            return
+        self._loop.call_soon_threadsafe(self._colocar, evento)
+
+    def _colocar(self, evento):
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.perdidos += 1
+
+    async def proximo(self, timeout):
+        try:
+            return await asyncio.wait_for(self.fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class PublicadorLeituras:
+    """
+    Fan-out das leituras recém-ingeridas para as conexões SSE do processo.
+
+    No PostgreSQL, publicar() envia um NOTIFY e uma thread por worker do
+    gunicorn (LISTEN em conexão dedicada) repassa os eventos às assinaturas
+    locais, então um POST recebido por um worker chega aos dashboards
+    conectados em todos. Nos demais bancos a entrega é só no próprio processo.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.tamanho_fila = 100
+        self.maximo_por_evento = 50
+        self.maximo_conexoes = 50
+
+        self._assinaturas = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.publicados = 0
+        self.entregues = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.tamanho_fila = app.config.get('SSE_TAMANHO_FILA', self.tamanho_fila)
+        self.maximo_por_evento = app.config.get('SSE_MAX_LEITURAS_EVENTO', self.maximo_por_evento)
+        self.maximo_conexoes = app.config.get('SSE_MAX_CONEXOES', self.maximo_conexoes)
+        app.extensions['eventos_leituras'] = self
+
+    # ---------------------------------------------------------------- assinaturas
+
+    def assinar(self, lote=None, assincrona=False):
+        """
+        Registra uma assinatura (AssinaturaAssincrona quando chamada de dentro
+        do loop do modo ASGI). Retorna None se o processo já atingiu
+        SSE_MAX_CONEXOES (o endpoint responde 503).
+        """
+        self._garantir_ouvinte()
+        with self._lock:
+            if len(self._assinaturas) >= self.maximo_conexoes:
+                return None
+            classe = AssinaturaAssincrona if assincrona else Assinatura
+            assinatura = classe(self, lote, self.tamanho_fila)
+            self._assinaturas.add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            self._assinaturas.discard(assinatura)
+
+    def conexoes(self):
+        return len(self._assinaturas)
+
+    def _distribuir(self, evento):
+        with self._lock:
+            assinaturas = list(self._assinaturas)
+        for assinatura in assinaturas:
+            assinatura.entregar(evento)
+        self.entregues += 1
+
+    # ---------------------------------------------------------------- publicação
+
+    def publicar(self, linhas):
+        """Publica as leituras de um POST já confirmado (chamar após o commit)"""
+        eventos = montar_eventos(linhas, self.maximo_por_evento)
+        if not eventos:
+            return
+        self.publicados += len(eventos)
+
+        if db.engine.dialect.name != 'postgresql':
+            for evento in eventos:
+                self._distribuir(evento)
+            return
+
+        try:
+            with db.engine.begin() as conexao:
+                for evento in eventos:
+                    conexao.exec_driver_sql(
+                        'SELECT pg_notify(%(canal)s, %(payload)s)',
+                        {'canal': CANAL_POSTGRES, 'payload': json.dumps(evento)}
+                    )
+        except Exception as e:
+            # O feed é best-effort: a ingestão já foi confirmada
+            print(f"Erro ao publicar evento de leituras: {str(e)}")
+
+    async def publicar_assincrono(self, engine, linhas):
+        """publicar() do modo ASGI, com o NOTIFY enviado pelo AsyncEngine `engine`"""
+        eventos = montar_eventos(linhas, self.maximo_por_evento)
+        if not eventos:
+            return
+        self.publicados += len(eventos)
+
+        if engine.dialect.name != 'postgresql':
+            for evento in eventos:
+                self._distribuir(evento)
+            return
+
+        try:
+            async with engine.begin() as conexao:
+                for evento in eventos:
+                    await conexao.execute(
+                        text('SELECT pg_notify(:canal, :payload)'),
+                        {'canal': CANAL_POSTGRES, 'payload': json.dumps(evento)}
+                    )
+        except Exception as e:
+            print(f"Erro ao publicar evento de leituras: {str(e)}")
+
+    # ---------------------------------------------------------------- LISTEN
+
+    def _garantir_ouvinte(self):
+        """Inicia a thread LISTEN sob demanda, uma por processo (fork do gunicorn)"""
+        if self.app is None:
+            return
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            with self.app.app_context():
+                if db.engine.dialect.name != 'postgresql':
+                    return
+            # Conexão própria, fora do pool das requisições (e do pgbouncer, se houver)
+            engine = criar_engine_direto(self.app)
+            # A thread reconecta sozinha em caso de erro e vive até o fim do processo
+            self._thread = threading.Thread(
+                target=self._ouvir, args=(engine,), name='embryotech-sse-listen', daemon=True
+            )
+            self._thread.start()
+
+    def _ouvir(self, engine):
+        espera = 1.0
+        while True:
+            conexao = None
+            try:
+                conexao = engine.raw_connection()
+                driver = conexao.driver_connection
+                driver.set_session(autocommit=True)
+                with driver.cursor() as cursor:
+                    cursor.execute(f'LISTEN {CANAL_POSTGRES}')
+                espera = 1.0
+
+                while True:
+                    if select.select([driver], [], [], 30.0) == ([], [], []):
+                        continue
+                    driver.poll()
+                    while driver.notifies:
+                        aviso = driver.notifies.pop(0)
+                        self._distribuir(json.loads(aviso.payload))
+            except Exception as e:
+                print(f"Conexão LISTEN de leituras perdida: {str(e)}; reconectando em {espera:.0f}s")
+                time.sleep(espera)
+                espera = min(espera * 2, 60.0)
+            finally:
+                if conexao is not None:
+                    try:
+                        conexao.invalidate()
+                    except Exception:
+                        pass
+
+    def estatisticas(self):
+        return {
+            'conexoes': self.conexoes(),
+            'publicados': self.publicados,
+            'entregues': self.entregues
+        }
+
+
+eventos_leituras = PublicadorLeituras()
+
+
+def stream_sse(assinatura, duracao_maxima=300, intervalo_ping=15):
+    """
+    Corpo text/event-stream de uma assinatura. Envia comentários de ping
+    para manter proxies abertos e encerra após `duracao_maxima` segundos
+    (o EventSource/cliente reconecta), liberando o worker periodicamente.
+    """
+    with assinatura:
+        yield 'retry: 3000\n\n'
+        fim = time.monotonic() + duracao_maxima
+        while True:
+            restante = fim - time.monotonic()
+            if restante <= 0:
+                return
+            evento = assinatura.proximo(min(intervalo_ping, restante))
+            if evento is None:
+                yield ': ping\n\n'
+                continue
+            if assinatura.perdidos:
+                # Eventos descartados por fila cheia: o cliente deve recarregar
+                evento = dict(evento, perdidos=assinatura.perdidos)
+                assinatura.perdidos = 0
+            yield f'event: leituras\ndata: {json.dumps(evento)}\n\n'
+
+
+async def stream_sse_assincrono(assinatura, duracao_maxima=300, intervalo_ping=15):
+    """stream_sse para uma AssinaturaAssincrona: a espera não ocupa uma thread"""
+    with assinatura:
+        yield 'retry: 3000\n\n'
+        fim = time.monotonic() + duracao_maxima
+        while True:
+            restante = fim - time.monotonic()
+            if restante <= 0:
+                return
+            evento = await assinatura.proximo(min(intervalo_ping, restante))
+            if evento is None:
+                yield ': ping\n\n'
+                continue
+            if assinatura.perdidos:
+                evento = dict(evento, perdidos=assinatura.perdidos)
+                assinatura.perdidos = 0
+            yield f'event: leituras\ndata: {json.dumps(evento)}\n\n'
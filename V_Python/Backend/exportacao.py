@@ -0,0 +1,112 @@
+# exportacao.py - Exportação de leituras em CSV (streaming) e Parquet/Arrow (colunar)
+
+import csv
+import io
+import tempfile
+
+from sqlalchemy import select
+
+from extensions import db
+from models import Leitura
+from leituras_utils import COLUNAS
+
+# Nomes das colunas exportadas, na ordem de leituras_utils.COLUNAS
+NOMES_COLUNAS = [coluna.key for coluna in COLUNAS]
+
+# Linhas por partição do cursor do servidor: uma partição vira um bloco
+# da resposta CSV ou um RecordBatch no Parquet/Arrow
+TAMANHO_LOTE_CSV = 2000
+TAMANHO_LOTE_COLUNAR = 50000
+
+FORMATOS_COLUNARES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file'
+}
+
+
+def consulta_exportacao(filtros):
+    """SELECT das colunas exportadas, na ordem cronológica"""
+    return select(*COLUNAS).where(*filtros).order_by(Leitura.data_inicial, Leitura.id)
+
+
+def _particoes(consulta, tamanho):
+    resultado = db.session.execute(consulta.execution_options(yield_per=tamanho))
+    try:
+        yield from resultado.partitions()
+    finally:
+        resultado.close()
+
+
+def stream_leituras_csv(consulta):
+    """
+    Gera o CSV em blocos (cabeçalho + uma partição do cursor por bloco),
+    sem materializar o resultado. Datas em ISO 8601, nulos como campo vazio.
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+
+    escritor.writerow(NOMES_COLUNAS)
+    yield buffer.getvalue()
+
+    for particao in _particoes(consulta, TAMANHO_LOTE_CSV):
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows(
+            [valor.isoformat() if hasattr(valor, 'isoformat') else valor for valor in linha]
+            for linha in particao
+        )
+        yield buffer.getvalue()
+
+
+def _esquema_arrow(pa):
+    return pa.schema([
+        ('id', pa.int64()),
+        ('umidade', pa.float64()),
+        ('temperatura', pa.float64()),
+        ('pressao', pa.float64()),
+        ('lote', pa.string()),
+        ('data_inicial', pa.timestamp('us')),
+        ('data_final', pa.timestamp('us'))
+    ])
+
+
+def exportar_leituras_colunar(consulta, formato='parquet', destino=None):
+    """
+    Exporta em Parquet ou Arrow IPC (arquivo), montando um RecordBatch por
+    partição de TAMANHO_LOTE_COLUNAR linhas: a memória fica limitada a um
+    lote em formato de colunas. Grava em `destino` ou em um arquivo
+    temporário, que é devolvido posicionado no início.
+
+    Requer pyarrow (ImportError se não estiver instalado).
+    """
+    import pyarrow as pa
+
+    if formato not in FORMATOS_COLUNARES:
+        raise ValueError(f"formato deve ser um de: {', '.join(FORMATOS_COLUNARES)}")
+
+    esquema = _esquema_arrow(pa)
+    arquivo = destino if destino is not None else tempfile.TemporaryFile()
+    try:
+        if formato == 'parquet':
+            import pyarrow.parquet as pq
+            escritor = pq.ParquetWriter(arquivo, esquema, compression='zstd')
+        else:
+            opcoes = pa.ipc.IpcWriteOptions(compression='zstd')
+            escritor = pa.ipc.new_file(arquivo, esquema, options=opcoes)
+
+        with escritor:
+            for particao in _particoes(consulta, TAMANHO_LOTE_COLUNAR):
+                # Transpõe as linhas da partição em colunas
+                colunas = list(zip(*particao))
+                lote = pa.RecordBatch.from_arrays(
+                    [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)],
+                    schema=esquema
+                )
+                escritor.write_batch(lote)
+
+        arquivo.seek(0)
+        return arquivo
+    except Exception:
+        if destino is None:
+            arquivo.close()
+        raise
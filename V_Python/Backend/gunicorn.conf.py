@@ -1,12 +1,116 @@
 # gunicorn.conf.py
-bind = "0.0.0.0:5001"
-workers = 2
-timeout = 120
-keepalive = 2
+#
+# Perfis de execução (GUNICORN_PERFIL), dimensionados pelo número de CPUs:
+#
+#   sync     workers síncronos (padrão): 1 requisição por worker
+#   gthread  workers com GUNICORN_THREADS threads cada
+#   gevent   greenlets (GUNICORN_CONEXOES_WORKER por worker), psycopg2 cooperativo via psycogreen
+#   asgi     UvicornWorker servindo asgi:application (rotas quentes em asyncio, ver api_assincrona.py)
+#
+# O feed SSE (/api/leituras/stream) prende uma unidade de concorrência por
+# dashboard aberto: só é servido em gthread, gevent e asgi; no sync responde 503.
+#
+# GUNICORN_WORKERS, GUNICORN_THREADS, GUNICORN_KEEPALIVE e GUNICORN_TIMEOUT
+# substituem os valores calculados. Comparação dos perfis sob carga:
+# benchmarks/perfis_gunicorn.py
+import multiprocessing
+import os
+import shutil
+
+PERFIS = ('sync', 'gthread', 'gevent', 'asgi')
+
+perfil = os.getenv('GUNICORN_PERFIL', 'sync').lower()
+if perfil not in PERFIS:
+    raise ValueError(f"GUNICORN_PERFIL inválido: {perfil!r} (use {', '.join(PERFIS)})")
+
+cpus = multiprocessing.cpu_count()
+# Cada worker tem o próprio pool de conexões (banco.py): o teto de workers
+# evita que máquinas grandes esgotem o max_connections do PostgreSQL
+maximo_workers = int(os.getenv('GUNICORN_MAX_WORKERS', '8'))
+
+if perfil == 'sync':
+    # Espera de I/O do banco: mais processos que CPUs
+    workers_padrao = 2 * cpus + 1
+elif perfil == 'gthread':
+    workers_padrao = cpus + 1
+else:
+    # gevent/asgi: um processo por CPU atende milhares de conexões
+    workers_padrao = cpus
+
+workers = int(os.getenv('GUNICORN_WORKERS', str(min(workers_padrao, maximo_workers))))
+worker_class = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'gevent': 'gevent',
+    'asgi': 'uvicorn.workers.UvicornWorker'
+}[perfil]
+threads = int(os.getenv('GUNICORN_THREADS', '4' if perfil == 'gthread' else '1'))
+worker_connections = int(os.getenv('GUNICORN_CONEXOES_WORKER', '1000'))
+wsgi_app = 'asgi:application' if perfil == 'asgi' else 'app:app'
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5001')}")
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+# Os ESP32 reenviam a cada ciclo: manter a conexão evita um handshake por
+# leitura (ignorado pelos workers sync)
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# A aplicação (config.py) lê o perfil, os workers e o timeout efetivos:
+# desliga o feed SSE no sync, divide as CPUs entre os pools de verificação de
+# senha dos workers (senhas.py) e mantém cada conexão do feed abaixo do timeout
+os.environ['GUNICORN_PERFIL'] = perfil
+os.environ['GUNICORN_WORKERS'] = str(workers)
+os.environ['GUNICORN_TIMEOUT'] = str(timeout)
 max_requests = 1000
 max_requests_jitter = 100
-preload_app = True
+# No gevent a aplicação é importada depois do monkey patch de cada worker
+preload_app = perfil != 'gevent'
 accesslog = "-"
 errorlog = "-"
 loglevel = "info"
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
\ No newline at end of file
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+
+# Métricas Prometheus agregadas entre os workers (ver metricas.py): cada
+# processo grava em arquivos deste diretório, que precisa existir antes do
+# preload da aplicação e é esvaziado a cada início do servidor
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/embryotech_metricas')
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def conexoes_por_worker():
+    """Conexões que cada worker pode abrir no banco (pool + overflow; 1 por requisição no pgbouncer)"""
+    if os.getenv('DB_PGBOUNCER', 'False').lower() == 'true':
+        return None
+    return int(os.getenv('DB_POOL_SIZE', '5')) + int(os.getenv('DB_MAX_OVERFLOW', '10'))
+
+
+def on_starting(server):
+    diretorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.makedirs(diretorio, exist_ok=True)
+
+    por_worker = conexoes_por_worker()
+    concorrencia = {'sync': 1, 'gthread': threads}.get(perfil, worker_connections)
+    server.log.info(f"Perfil {perfil}: {workers} workers {worker_class}, "
+                    f"até {workers * concorrencia} requisições simultâneas")
+    if por_worker is not None:
+        server.log.info(f"Conexões no banco: até {workers * por_worker} ({workers} × {por_worker})")
+        if perfil == 'gthread' and threads > por_worker:
+            server.log.warning(f"GUNICORN_THREADS={threads} maior que o pool ({por_worker}): "
+                               "threads vão esperar por conexão (DB_POOL_TIMEOUT)")
+
+
+def post_fork(server, worker):
+    if perfil == 'gevent':
+        # psycopg2 é C: sem isso uma consulta bloquearia todos os greenlets do worker
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+    # Com preload_app o engine é criado no master: o worker não reaproveita
+    # conexões herdadas pelo fork e abre as próprias (ver banco.py)
+    from banco import descartar_conexoes_herdadas
+    descartar_conexoes_herdadas()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
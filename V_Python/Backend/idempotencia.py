@@ -0,0 +1,176 @@
+# idempotencia.py - Reenvio idempotente de lotes: sequência por origem e índice das faixas já recebidas
+#
+# Contrato (POST /api/leituras, JSON ou binário):
+#   X-Sequencia: número de sequência da primeira leitura do lote; as demais
+#                seguem em ordem (inicio, inicio + 1, ...). Cada dispositivo
+#                numera as leituras de forma crescente ao gravá-las localmente.
+#   X-Dispositivo: identificador do dispositivo, obrigatório com token JWT
+#                (com X-API-Key a origem é o próprio cadastro do dispositivo).
+#
+# O servidor guarda, por origem, as faixas de sequências já recebidas e
+# descarta as leituras repetidas na mesma transação do INSERT. A resposta
+# traz as faixas desta origem já gravadas no servidor ("faixas"): o
+# dispositivo pode apagar do armazenamento local tudo que estiver nelas. Um
+# backlog pode ser reenviado em qualquer tamanho de lote, em paralelo ou fora
+# de ordem, sem duplicar leituras.
+
+import bisect
+import json
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from extensions import db
+from models import SequenciaIngestao
+
+MAXIMO_SEQUENCIA = 2 ** 62
+
+
+def origem_requisicao(cabecalhos, usuario):
+    """
+    (origem, sequência inicial) do lote, ou None se não há X-Sequencia.
+    Levanta ValueError se os cabeçalhos forem inválidos.
+    """
+    sequencia = cabecalhos.get('X-Sequencia')
+    if sequencia is None:
+        return None
+    try:
+        inicio = int(sequencia)
+    except ValueError:
+        raise ValueError('X-Sequencia deve ser um inteiro')
+    if not 0 <= inicio < MAXIMO_SEQUENCIA:
+        raise ValueError('X-Sequencia fora do intervalo permitido')
+
+    dispositivo_id = getattr(usuario, 'dispositivo_id', None)
+    if dispositivo_id is not None:
+        return f'dispositivo:{dispositivo_id}', inicio
+    nome = (cabecalhos.get('X-Dispositivo') or '').strip()
+    if not nome or len(nome) > 100:
+        raise ValueError('X-Dispositivo (até 100 caracteres) é obrigatório com X-Sequencia')
+    return f'usuario:{usuario.id}:{nome}', inicio
+
+
+# ---------------------------------------------------------------- faixas
+
+def faixas_de(sequencias):
+    """Sequências em ordem crescente → [[inicio, fim], ...] com as contíguas unidas"""
+    faixas = []
+    for sequencia in sequencias:
+        if faixas and faixas[-1][1] + 1 == sequencia:
+            faixas[-1][1] = sequencia
+        else:
+            faixas.append([sequencia, sequencia])
+    return faixas
+
+
+def incorporar(faixas, inicio, fim, maximo):
+    """
+    Une [inicio, fim] às faixas (ordenadas, disjuntas, não adjacentes).
+    Acima de `maximo` faixas as mais antigas são unidas: a lacuna entre elas
+    passa a contar como recebida (leituras que nunca chegaram até lá são
+    dadas como perdidas, e o índice continua compacto).
+    """
+    resultado = []
+    for faixa in faixas:
+        if faixa[1] + 1 < inicio or faixa[0] > fim + 1:
+            resultado.append(list(faixa))
+        else:
+            inicio, fim = min(inicio, faixa[0]), max(fim, faixa[1])
+    bisect.insort(resultado, [inicio, fim])
+    while len(resultado) > maximo:
+        primeira = resultado.pop(0)
+        resultado[0][0] = primeira[0]
+    return resultado
+
+
+def repetidas(faixas, inicio, quantidade):
+    """bytearray com 1 nas posições do lote cujas sequências já estão nas faixas"""
+    marcadas = bytearray(quantidade)
+    fim = inicio + quantidade - 1
+    for faixa_inicio, faixa_fim in faixas:
+        if faixa_fim < inicio or faixa_inicio > fim:
+            continue
+        de, ate = max(faixa_inicio, inicio) - inicio, min(faixa_fim, fim) - inicio
+        marcadas[de:ate + 1] = b'\x01' * (ate - de + 1)
+    return marcadas
+
+
+def filtrar_lote(faixas, inicio, quantidade, linhas, rejeitadas, maximo):
+    """
+    (linhas, rejeitadas, faixas, resumo, duplicadas) sem o que já foi
+    recebido. `linhas` são as válidas de validar_leituras na ordem do lote e
+    `rejeitadas` as inválidas ({'indice': ...}); as inválidas também contam
+    como recebidas, pois reenviá-las não as tornaria válidas, e só são
+    informadas no primeiro envio.
+    """
+    marcadas = repetidas(faixas, inicio, quantidade)
+    invalidas = {r['indice'] for r in rejeitadas}
+    indices_validos = (i for i in range(quantidade) if i not in invalidas)
+    novas = [linha for indice, linha in zip(indices_validos, linhas) if not marcadas[indice]]
+    rejeitadas = [r for r in rejeitadas if not marcadas[r['indice']]]
+
+    if quantidade:
+        faixas = incorporar(faixas, inicio, inicio + quantidade - 1, maximo)
+    resumo = {
+        'recebidas': [[inicio, inicio + quantidade - 1]] if quantidade else [],
+        'duplicadas': faixas_de(inicio + i for i in range(quantidade) if marcadas[i]),
+        'faixas': faixas
+    }
+    return novas, rejeitadas, faixas, resumo, sum(marcadas)
+
+
+# ---------------------------------------------------------------- banco
+
+def comando_garantir_origem(dialeto):
+    """INSERT ... ON CONFLICT DO NOTHING da linha da origem (PostgreSQL e SQLite); None nos demais"""
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(SequenciaIngestao.__table__).on_conflict_do_nothing(index_elements=['origem'])
+
+
+def consulta_faixas(origem):
+    # FOR UPDATE: reenvios simultâneos da mesma origem esperam um pelo outro
+    return select(SequenciaIngestao.faixas).where(SequenciaIngestao.origem == origem).with_for_update()
+
+
+def comando_gravar_faixas(origem, faixas):
+    return update(SequenciaIngestao).where(SequenciaIngestao.origem == origem).values(
+        faixas=json.dumps(faixas, separators=(',', ':')), atualizado_em=datetime.utcnow())
+
+
+def registrar_lote(origem, inicio, quantidade, linhas, rejeitadas, maximo=64):
+    """
+    filtrar_lote() sobre o índice da origem, travado na transação atual de
+    db.session (o chamador grava as leituras e faz o commit). Retorna
+    (linhas, rejeitadas, resumo, duplicadas) sem o que já foi recebido.
+    """
+    comando = comando_garantir_origem(db.engine.dialect.name)
+    if comando is not None:
+        db.session.execute(comando, {'origem': origem, 'faixas': '[]'})
+    elif db.session.get(SequenciaIngestao, origem) is None:
+        db.session.add(SequenciaIngestao(origem=origem, faixas='[]'))
+        db.session.flush()
+    faixas = json.loads(db.session.execute(consulta_faixas(origem)).scalar_one())
+    novas, rejeitadas, faixas, resumo, duplicadas = filtrar_lote(faixas, inicio, quantidade, linhas,
+                                                                rejeitadas, maximo)
+    db.session.execute(comando_gravar_faixas(origem, faixas))
+    return novas, rejeitadas, resumo, duplicadas
+
+
+async def registrar_lote_assincrono(conexao, origem, inicio, quantidade, linhas, rejeitadas, maximo=64):
+    """registrar_lote() numa conexão assíncrona com transação aberta (api_assincrona)"""
+    comando = comando_garantir_origem(conexao.dialect.name)
+    if comando is not None:
+        await conexao.execute(comando, {'origem': origem, 'faixas': '[]'})
+    elif (await conexao.execute(select(SequenciaIngestao.origem).where(
+            SequenciaIngestao.origem == origem))).first() is None:
+        await conexao.execute(SequenciaIngestao.__table__.insert(), {'origem': origem, 'faixas': '[]'})
+    faixas = json.loads((await conexao.execute(consulta_faixas(origem))).scalar_one())
+    novas, rejeitadas, faixas, resumo, duplicadas = filtrar_lote(faixas, inicio, quantidade, linhas,
+                                                                rejeitadas, maximo)
+    await conexao.execute(comando_gravar_faixas(origem, faixas))
+    return novas, rejeitadas, resumo, duplicadas
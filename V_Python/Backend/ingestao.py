@@ -0,0 +1,143 @@
+# ingestao.py - Ingestão em lote de leituras (validação + INSERT em massa)
+
+import io
+import math
+from datetime import datetime
+
+from extensions import db
+from models import Leitura
+
+# Colunas gravadas pela ingestão, na ordem usada pelo COPY
+COLUNAS_LEITURA = ('umidade', 'temperatura', 'pressao', 'lote', 'data_inicial', 'data_final')
+CAMPOS_NUMERICOS = ('umidade', 'temperatura', 'pressao')
+CAMPOS_DATA = ('data_inicial', 'data_final')
+
+# A partir deste número de linhas o PostgreSQL usa COPY em vez de executemany
+LIMITE_COPY = 500
+
+
+def converter_data(valor):
+    """
+    Converte o valor recebido em datetime.
+    Aceita ISO 8601 (com 'T' ou espaço, com ou sem 'Z'), datetime ou vazio.
+    """
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, datetime):
+        return valor
+    if not isinstance(valor, str):
+        raise ValueError('data deve ser texto ISO 8601')
+
+    texto = valor.strip()
+    if texto.endswith('Z'):
+        texto = texto[:-1] + '+00:00'
+    data = datetime.fromisoformat(texto)
+    # As colunas são "timestamp without time zone": grava em UTC ingênuo
+    if data.tzinfo is not None:
+        try:
+            data = (data - data.utcoffset()).replace(tzinfo=None)
+        except OverflowError:
+            # Datas com fuso perto de datetime.min/max saem do intervalo em UTC
+            raise ValueError('data fora do intervalo permitido')
+    return data
+
+
+def validar_leituras(dados, lotes_permitidos=None):
+    """
+    Valida uma lista de leituras em uma única passada.
+
+    Retorna (linhas_validas, rejeitadas), onde linhas_validas é uma lista de
+    dicionários prontos para INSERT e rejeitadas é uma lista de
+    {'indice': i, 'erro': '...'} com a posição original do item.
+    Com `lotes_permitidos` (escopo de um dispositivo), leituras de outros
+    lotes são rejeitadas.
+    """
+    validas = []
+    rejeitadas = []
+
+    for indice, item in enumerate(dados):
+        if not isinstance(item, dict):
+            rejeitadas.append({'indice': indice, 'erro': 'item deve ser um objeto JSON'})
+            continue
+
+        try:
+            linha = {}
+            for campo in CAMPOS_NUMERICOS:
+                valor = item.get(campo)
+                if valor is None:
+                    linha[campo] = None
+                elif isinstance(valor, bool) or not isinstance(valor, (int, float)):
+                    raise ValueError(f'{campo} deve ser numérico')
+                else:
+                    # Inteiros JSON enormes (ex.: 10**400) estouram na conversão
+                    linha[campo] = float(valor)
+                    if not math.isfinite(linha[campo]):
+                        raise ValueError(f'{campo} deve ser um número finito')
+
+            lote = item.get('lote')
+            if lote is not None and not isinstance(lote, str):
+                lote = str(lote)
+            if lote is not None and len(lote) > 100:
+                raise ValueError('lote excede 100 caracteres')
+            if lotes_permitidos is not None and lote not in lotes_permitidos:
+                raise ValueError(f'lote fora do escopo do dispositivo: {lote!r}')
+            linha['lote'] = lote
+
+            for campo in CAMPOS_DATA:
+                try:
+                    linha[campo] = converter_data(item.get(campo))
+                except ValueError:
+                    raise ValueError(f'{campo} inválida: {item.get(campo)!r}')
+
+            validas.append(linha)
+        except OverflowError:
+            rejeitadas.append({'indice': indice, 'erro': f'{campo} fora do intervalo permitido'})
+        except ValueError as e:
+            rejeitadas.append({'indice': indice, 'erro': str(e)})
+
+    return validas, rejeitadas
+
+
+def _valor_copy(valor):
+    """Formata um valor no formato texto do COPY (\\N = NULL)"""
+    if valor is None:
+        return '\\N'
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=' ')
+    if isinstance(valor, str):
+        return (valor.replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+    return repr(valor)
+
+
+def _copy_postgresql(linhas):
+    """Grava as linhas via COPY FROM STDIN (psycopg2) na conexão da sessão"""
+    buffer = io.StringIO()
+    for linha in linhas:
+        buffer.write('\t'.join(_valor_copy(linha[c]) for c in COLUNAS_LEITURA))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    conexao = db.session.connection().connection
+    with conexao.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {Leitura.__tablename__} ({', '.join(COLUNAS_LEITURA)}) FROM STDIN",
+            buffer
+        )
+
+
+def inserir_leituras(linhas):
+    """
+    Insere as linhas já validadas sem passar pelo unit-of-work do ORM.
+    PostgreSQL com lotes grandes usa COPY; demais casos usam um único
+    INSERT executemany. Não faz commit: o chamador controla a transação.
+    """
+    if not linhas:
+        return 0
+
+    if db.engine.dialect.name == 'postgresql' and len(linhas) >= LIMITE_COPY:
+        _copy_postgresql(linhas)
+    else:
+        db.session.execute(Leitura.__table__.insert(), linhas)
+
+    return len(linhas)
@@ -0,0 +1,167 @@
+# ingestao_binaria.py - Formato binário compacto de lotes de leituras (POST /api/leituras)
+#
+# Content-Type: application/vnd.embryotech.leituras — quadro little-endian, versão 1:
+#
+#   cabeçalho (13 bytes)
+#     2  'EL'            assinatura
+#     1  uint8           versão do formato (1)
+#     1  uint8           reservado (0)
+#     4  uint32          base: segundos desde 1970-01-01 00:00:00, no mesmo relógio
+#                        (sem fuso) das datas ISO enviadas em JSON
+#     4  uint32          quantidade de leituras
+#     1  uint8           quantidade de lotes no dicionário (até 255)
+#   dicionário de lotes, para cada lote
+#     1  uint8           tamanho do nome em bytes
+#     n  UTF-8           nome do lote
+#     4  uint32          data_final do lote em segundos (0 = nula)
+#   leituras (17 bytes cada)
+#     1  uint8           índice do lote no dicionário (255 = sem lote)
+#     4  int32           data_inicial: segundos desde a leitura anterior (a primeira, desde a base)
+#     4  int32 × 3       temperatura, umidade e pressão em centésimos (-2**31 = nulo)
+#
+# Uma leitura ocupa 17 bytes contra ~150 em JSON, e o quadro é decodificado
+# numa passada (struct.iter_unpack) direto em colunas, sem parser JSON.
+
+import struct
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+TIPO_CONTEUDO = 'application/vnd.embryotech.leituras'
+ASSINATURA = b'EL'
+VERSAO = 1
+
+CABECALHO = struct.Struct('<2sBBIIB')
+DATA_FINAL = struct.Struct('<I')
+LEITURA = struct.Struct('<Biiii')
+
+SEM_LOTE = 255
+NULO = -2 ** 31
+EPOCA = datetime(1970, 1, 1)
+
+
+def _segundos(data):
+    return int((data - EPOCA).total_seconds())
+
+
+def _centesimos(valor):
+    return NULO if valor is None else round(valor * 100)
+
+
+def _valores(centesimos):
+    return [None if valor == NULO else valor / 100 for valor in centesimos]
+
+
+def codificar_leituras(leituras):
+    """
+    Monta um quadro a partir de dicionários já validados (mesmos campos da
+    API, datas como datetime). Referência do formato para o firmware e
+    usado nos testes e benchmarks.
+    """
+    lotes = {}
+    for leitura in leituras:
+        if leitura.get('lote') is not None:
+            lotes.setdefault(leitura['lote'], leitura.get('data_final'))
+
+    base = min((_segundos(l['data_inicial']) for l in leituras), default=0)
+    partes = [CABECALHO.pack(ASSINATURA, VERSAO, 0, base, len(leituras), len(lotes))]
+    indices = {}
+    for indice, (lote, data_final) in enumerate(lotes.items()):
+        nome = lote.encode()
+        partes.append(bytes([len(nome)]) + nome)
+        partes.append(DATA_FINAL.pack(_segundos(data_final) if data_final else 0))
+        indices[lote] = indice
+
+    anterior = base
+    for leitura in leituras:
+        instante = _segundos(leitura['data_inicial'])
+        partes.append(LEITURA.pack(
+            indices.get(leitura.get('lote'), SEM_LOTE), instante - anterior,
+            _centesimos(leitura.get('temperatura')), _centesimos(leitura.get('umidade')),
+            _centesimos(leitura.get('pressao'))
+        ))
+        anterior = instante
+    return b''.join(partes)
+
+
+def quantidade_leituras(corpo):
+    """Quantidade declarada no cabeçalho (para o limite antes de decodificar)"""
+    if len(corpo) < CABECALHO.size:
+        raise ValueError('quadro menor que o cabeçalho')
+    assinatura, versao, _, _, quantidade, _ = CABECALHO.unpack_from(corpo)
+    if assinatura != ASSINATURA:
+        raise ValueError('assinatura inválida')
+    if versao != VERSAO:
+        raise ValueError(f'versão {versao} não suportada (esperada {VERSAO})')
+    return quantidade
+
+
+def decodificar_leituras(corpo, lotes_permitidos=None):
+    """
+    Quadro → (linhas_validas, rejeitadas), no mesmo formato de
+    validar_leituras. Levanta ValueError se o quadro estiver malformado.
+    """
+    quantidade = quantidade_leituras(corpo)
+    _, _, _, base, _, total_lotes = CABECALHO.unpack_from(corpo)
+
+    posicao = CABECALHO.size
+    nomes, datas_finais, erros_lote = [], [], []
+    for _ in range(total_lotes):
+        if posicao >= len(corpo):
+            raise ValueError('dicionário de lotes truncado')
+        tamanho = corpo[posicao]
+        fim = posicao + 1 + tamanho
+        if fim + DATA_FINAL.size > len(corpo):
+            raise ValueError('dicionário de lotes truncado')
+        try:
+            nome = corpo[posicao + 1:fim].decode()
+        except UnicodeDecodeError:
+            raise ValueError('nome de lote não é UTF-8')
+        segundos, = DATA_FINAL.unpack_from(corpo, fim)
+        nomes.append(nome)
+        datas_finais.append(EPOCA + timedelta(seconds=segundos) if segundos else None)
+        if len(nome) > 100:
+            erros_lote.append('lote excede 100 caracteres')
+        elif lotes_permitidos is not None and nome not in lotes_permitidos:
+            erros_lote.append(f'lote fora do escopo do dispositivo: {nome!r}')
+        else:
+            erros_lote.append(None)
+        posicao = fim + DATA_FINAL.size
+
+    if len(corpo) - posicao != quantidade * LEITURA.size:
+        raise ValueError(f'esperados {quantidade * LEITURA.size} bytes de leituras, '
+                         f'recebidos {len(corpo) - posicao}')
+    if not quantidade:
+        return [], []
+
+    # Uma passada em C sobre o buffer, já separada em colunas
+    indices_lote, deltas, temperaturas, umidades, pressoes = zip(*LEITURA.iter_unpack(corpo[posicao:]))
+
+    # Datas: soma acumulada dos deltas, com um timedelta por delta distinto
+    # (as placas enviam em intervalos fixos, então quase sempre um só)
+    passos = {delta: timedelta(seconds=delta) for delta in set(deltas)}
+    datas = list(accumulate(map(passos.__getitem__, deltas), initial=EPOCA + timedelta(seconds=base)))
+    colunas = zip(_valores(umidades), _valores(temperaturas), _valores(pressoes),
+                  indices_lote, datas[1:])
+
+    # Lote, data_final e erro por índice do dicionário (255 = sem lote)
+    lotes = [(None, None, f'índice de lote inexistente: {indice}') for indice in range(SEM_LOTE + 1)]
+    lotes[:total_lotes] = zip(nomes, datas_finais, erros_lote)
+    lotes[SEM_LOTE] = (None, None, 'lote fora do escopo do dispositivo: None'
+                       if lotes_permitidos is not None else None)
+
+    if not any(lotes[indice][2] for indice in set(indices_lote)):
+        return [
+            {'umidade': umidade, 'temperatura': temperatura, 'pressao': pressao, 'lote': lotes[lote][0],
+             'data_inicial': data_inicial, 'data_final': lotes[lote][1]}
+            for umidade, temperatura, pressao, lote, data_inicial in colunas
+        ], []
+
+    validas, rejeitadas = [], []
+    for indice, (umidade, temperatura, pressao, lote, data_inicial) in enumerate(colunas):
+        nome, data_final, erro = lotes[lote]
+        if erro is not None:
+            rejeitadas.append({'indice': indice, 'erro': erro})
+            continue
+        validas.append({'umidade': umidade, 'temperatura': temperatura, 'pressao': pressao, 'lote': nome,
+                        'data_inicial': data_inicial, 'data_final': data_final})
+    return validas, rejeitadas
@@ -0,0 +1,239 @@
+# leituras_utils.py - Consultas de leituras: paginação por cursor (keyset) e streaming
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import select, and_, literal, or_, tuple_, union_all
+
+from extensions import db
+from ingestao import converter_data
+from models import Leitura
+from versoes_tabelas import incrementar_versao, incrementar_versao_assincrono
+
+# Colunas devolvidas pela API de leituras (mesmo formato do endpoint original)
+COLUNAS = (
+    Leitura.id, Leitura.umidade, Leitura.temperatura, Leitura.pressao,
+    Leitura.lote, Leitura.data_inicial, Leitura.data_final
+)
+
+# Ordenação estável usada pela paginação: data_inicial DESC (nulos no fim), id DESC
+ORDENACAO = (Leitura.data_inicial.desc().nulls_last(), Leitura.id.desc())
+
+# Linhas buscadas por vez no cursor do servidor durante o streaming
+TAMANHO_LOTE_STREAM = 1000
+
+
+def serializar_leitura(linha):
+    """Converte uma linha (Row ou Leitura) no dicionário da API"""
+    return {
+        'id': linha.id,
+        'umidade': linha.umidade,
+        'temperatura': linha.temperatura,
+        'pressao': linha.pressao,
+        'lote': linha.lote,
+        'data_inicial': linha.data_inicial.isoformat() if linha.data_inicial else None,
+        'data_final': linha.data_final.isoformat() if linha.data_final else None
+    }
+
+
+def codificar_cursor(linha):
+    """Cursor opaco com a chave (data_inicial, id) da última linha da página"""
+    chave = [linha.data_inicial.isoformat() if linha.data_inicial else None, linha.id]
+    return base64.urlsafe_b64encode(json.dumps(chave).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Inverso de codificar_cursor. Levanta ValueError se o cursor for inválido"""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data_inicial, leitura_id = json.loads(bruto)
+        data_inicial = datetime.fromisoformat(data_inicial) if data_inicial else None
+        return data_inicial, int(leitura_id)
+    except Exception:
+        raise ValueError('cursor inválido')
+
+
+def filtro_apos_cursor(data_inicial, leitura_id):
+    """
+    Condição keyset "linhas depois de (data_inicial, id)" na ORDENACAO acima,
+    restrita à fase do cursor: com data, só as leituras datadas, como
+    comparação de linha (data_inicial, id) < (:d, :id), que o índice
+    resolve como varredura de intervalo; sem data, a cauda de nulas.
+    """
+    if data_inicial is None:
+        return and_(Leitura.data_inicial.is_(None), Leitura.id < leitura_id)
+    return tuple_(Leitura.data_inicial, Leitura.id) < tuple_(
+        literal(data_inicial, Leitura.data_inicial.type), literal(leitura_id, Leitura.id.type))
+
+
+def filtros_relatorio(lote=None, data_inicio=None, data_fim=None):
+    """
+    Filtros dos relatórios de leituras (JSON, CSV, Parquet e PDF): data_fim
+    no formato AAAA-MM-DD inclui o dia inteiro.
+    """
+    filtros = []
+    if lote:
+        filtros.append(Leitura.lote == lote)
+    if data_inicio:
+        filtros.append(Leitura.data_inicial >= data_inicio)
+    if data_fim:
+        data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d')
+        data_fim_obj = data_fim_obj.replace(hour=23, minute=59, second=59)
+        filtros.append(Leitura.data_inicial <= data_fim_obj)
+    return filtros
+
+
+def tag_cache_leituras(lote=None):
+    """Tag de cache dos resultados derivados das leituras de um lote (None = de todos os lotes)"""
+    return f'leituras:{lote}' if lote else 'leituras:*'
+
+
+def tags_alteracao_leituras(lotes):
+    """Tags a invalidar quando leituras dos `lotes` mudam: as dos lotes e a do conjunto"""
+    return (tag_cache_leituras(),) + tuple(tag_cache_leituras(lote) for lote in set(lotes) if lote)
+
+
+def incrementar_versoes_leituras(lotes):
+    """
+    Incrementa, na transação corrente, os contadores de versoes_tabelas das
+    leituras dos `lotes` e do conjunto (mesmos nomes das tags de cache): são
+    o ETag/Last-Modified de GET /api/leituras. Ordem fixa, para que escritas
+    simultâneas travem as linhas sempre na mesma sequência.
+    """
+    for chave in sorted(tags_alteracao_leituras(lotes)):
+        incrementar_versao(chave)
+
+
+async def incrementar_versoes_leituras_assincrono(conexao, lotes):
+    """incrementar_versoes_leituras() numa conexão assíncrona com transação aberta"""
+    for chave in sorted(tags_alteracao_leituras(lotes)):
+        await incrementar_versao_assincrono(conexao, chave)
+
+
+def consulta_leituras(lote=None):
+    """SELECT base das leituras (apenas colunas, sem objetos ORM)"""
+    consulta = select(*COLUNAS)
+    if lote:
+        consulta = consulta.where(Leitura.lote == lote)
+    return consulta
+
+
+def consulta_pagina(consulta, limite, cursor=None):
+    """SELECT de uma página ordenada por (data_inicial, id), com uma linha a mais"""
+    # A linha a mais indica se existe próxima página
+    if not cursor:
+        return consulta.order_by(*ORDENACAO).limit(limite + 1)
+    data_inicial, leitura_id = decodificar_cursor(cursor)
+    pagina = consulta.where(filtro_apos_cursor(data_inicial, leitura_id)).order_by(*ORDENACAO).limit(limite + 1)
+    if data_inicial is None:
+        return pagina
+
+    # Fim da fase datada: a página é completada com o início da cauda de
+    # nulas. Cada ramo é uma varredura de intervalo no índice, com seu LIMIT
+    nulas = consulta.where(Leitura.data_inicial.is_(None)).order_by(Leitura.id.desc()).limit(limite + 1)
+    ramos = union_all(select(pagina.subquery()), select(nulas.subquery())).subquery()
+    return (select(ramos).order_by(ramos.c.data_inicial.desc().nulls_last(), ramos.c.id.desc())
+            .limit(limite + 1))
+
+
+def montar_pagina(linhas, limite):
+    """Resultado de consulta_pagina → (itens, proximo_cursor)"""
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = codificar_cursor(linhas[-1])
+    return [serializar_leitura(l) for l in linhas], proximo_cursor
+
+
+def pagina_leituras(consulta, limite, cursor=None):
+    """
+    Busca uma página ordenada por (data_inicial, id).
+    Retorna (itens, proximo_cursor); proximo_cursor é None na última página.
+    """
+    linhas = db.session.execute(consulta_pagina(consulta, limite, cursor)).all()
+    return montar_pagina(linhas, limite)
+
+
+def decodificar_watermark(since):
+    """
+    Parâmetro `since` → (data_inicial, id). Na primeira chamada é uma data
+    ISO 8601 (id None: leituras posteriores a ela); nas seguintes, o
+    watermark devolvido pela anterior, "<data_inicial>|<id>". Levanta
+    ValueError se o valor for inválido.
+    """
+    data_inicial, _, leitura_id = since.partition('|')
+    data_inicial = converter_data(data_inicial)
+    if data_inicial is None:
+        raise ValueError('since inválido')
+    return data_inicial, int(leitura_id) if leitura_id else None
+
+
+def consulta_desde(consulta, limite, since_id=None, since=None):
+    """SELECT do delta (ver leituras_desde), com uma linha a mais"""
+    if since_id is not None:
+        consulta = consulta.where(Leitura.id > since_id).order_by(Leitura.id)
+    else:
+        data_inicial, leitura_id = since
+        filtro = Leitura.data_inicial > data_inicial
+        if leitura_id is not None:
+            # Keyset em (data_inicial, id): leituras com a mesma data do watermark não se perdem
+            filtro = or_(filtro, and_(Leitura.data_inicial == data_inicial, Leitura.id > leitura_id))
+        consulta = consulta.where(filtro).order_by(Leitura.data_inicial, Leitura.id)
+    return consulta.limit(limite + 1)
+
+
+def montar_desde(linhas, limite, since_id=None, since=None):
+    """Resultado de consulta_desde → (itens, watermark, mais)"""
+    mais = len(linhas) > limite
+    linhas = linhas[:limite]
+
+    if since_id is not None:
+        watermark = linhas[-1].id if linhas else since_id
+    else:
+        data_inicial, leitura_id = (linhas[-1].data_inicial, linhas[-1].id) if linhas else since
+        watermark = data_inicial.isoformat()
+        if leitura_id is not None:
+            watermark = f'{watermark}|{leitura_id}'
+    return [serializar_leitura(l) for l in linhas], watermark, mais
+
+
+def leituras_desde(consulta, limite, since_id=None, since=None):
+    """
+    Delta incremental: leituras com id > since_id (ordem de id) ou depois de
+    since = (data_inicial, id) na ordem (data_inicial, id) (ver
+    decodificar_watermark). Retorna (itens, watermark, mais); o cliente
+    guarda o watermark e o envia na próxima chamada. `mais` indica que o
+    limite foi atingido e ainda há linhas depois do watermark.
+    O watermark de since leva o id da última linha, então várias leituras
+    com a mesma data_inicial podem ser divididas entre páginas. Ainda assim,
+    uma leitura gravada depois com data_inicial anterior ao watermark não é
+    vista; since_id é exato também nesse caso.
+    """
+    linhas = db.session.execute(consulta_desde(consulta, limite, since_id, since)).all()
+    return montar_desde(linhas, limite, since_id, since)
+
+
+def bloco_json(linhas):
+    """Linhas serializadas como elementos de um array JSON (sem os colchetes)"""
+    return ','.join(json.dumps(serializar_leitura(l)) for l in linhas)
+
+
+def stream_leituras_json(consulta):
+    """
+    Gera um array JSON linha a linha a partir de um cursor do servidor
+    (yield_per/stream_results), sem materializar o resultado inteiro.
+    """
+    resultado = db.session.execute(
+        consulta.order_by(*ORDENACAO).execution_options(yield_per=TAMANHO_LOTE_STREAM)
+    )
+    try:
+        yield '['
+        separador = ''
+        # Cada partição do cursor vira um único bloco da resposta
+        for particao in resultado.partitions():
+            yield separador + bloco_json(particao)
+            separador = ','
+        yield ']'
+    finally:
+        resultado.close()
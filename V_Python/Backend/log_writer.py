@@ -0,0 +1,185 @@
+# log_writer.py - Gravação assíncrona e em lote dos logs de auditoria
+
+import atexit
+import os
+import queue
+import threading
+import time
+
+from extensions import db
+from models import Log
+
+
+class AsyncLogWriter:
+    """
+    Fila limitada + thread gravadora para os registros da tabela `logs`.
+
+    As requisições apenas enfileiram um dicionário com as colunas do log; a
+    thread gravadora esvazia a fila em lotes (INSERT executemany) quando o
+    lote atinge LOG_BATCH_SIZE ou quando LOG_FLUSH_INTERVAL segundos passam.
+    Com a fila cheia, a requisição espera no máximo LOG_ENQUEUE_TIMEOUT
+    segundos e então descarta o registro (contabilizado em `descartados`).
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.habilitado = False
+        self.tamanho_fila = 10000
+        self.tamanho_lote = 200
+        self.intervalo_flush = 1.0
+        self.timeout_enfileirar = 0.05
+
+        self._fila = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.enfileirados = 0
+        self.gravados = 0
+        self.descartados = 0
+        self.falhas = 0
+        self.lotes = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.habilitado = app.config.get('LOG_ASYNC', True)
+        self.tamanho_fila = app.config.get('LOG_QUEUE_SIZE', self.tamanho_fila)
+        self.tamanho_lote = app.config.get('LOG_BATCH_SIZE', self.tamanho_lote)
+        self.intervalo_flush = app.config.get('LOG_FLUSH_INTERVAL', self.intervalo_flush)
+        self.timeout_enfileirar = app.config.get('LOG_ENQUEUE_TIMEOUT', self.timeout_enfileirar)
+        app.extensions['log_writer'] = self
+        atexit.register(self.parar)
+
+    # ---------------------------------------------------------------- fila
+
+    def _garantir_thread(self):
+        """
+        Inicia a thread gravadora sob demanda. Com `preload_app = True` o
+        gunicorn faz fork depois da importação, então cada worker precisa da
+        sua própria fila/thread (detectado pela troca de PID).
+        """
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._fila = queue.Queue(maxsize=self.tamanho_fila)
+            self._pid = pid
+            self._thread = threading.Thread(
+                target=self._executar, name='embryotech-log-writer', daemon=True
+            )
+            self._thread.start()
+
+    def enfileirar(self, registro):
+        """
+        Enfileira um registro de log. Retorna False se a gravação assíncrona
+        estiver desabilitada (o chamador deve gravar de forma síncrona).
+        """
+        if not self.habilitado or self.app is None:
+            return False
+
+        self._garantir_thread()
+        try:
+            self._fila.put(registro, timeout=self.timeout_enfileirar)
+            self.enfileirados += 1
+        except queue.Full:
+            self.descartados += 1
+        return True
+
+    def profundidade(self):
+        """Quantidade de registros aguardando gravação"""
+        return self._fila.qsize() if self._fila is not None else 0
+
+    # ------------------------------------------------------------ gravação
+
+    def _executar(self):
+        fila = self._fila
+        lote = []
+        prazo = time.monotonic() + self.intervalo_flush
+
+        while True:
+            restante = max(0.0, prazo - time.monotonic())
+            aviso_flush = None
+            try:
+                registro = fila.get(timeout=restante)
+                if registro is None:
+                    break
+                if isinstance(registro, threading.Event):
+                    aviso_flush = registro
+                else:
+                    lote.append(registro)
+            except queue.Empty:
+                pass
+
+            if aviso_flush or len(lote) >= self.tamanho_lote or time.monotonic() >= prazo:
+                if lote:
+                    self._gravar(lote)
+                    lote = []
+                prazo = time.monotonic() + self.intervalo_flush
+            if aviso_flush:
+                aviso_flush.set()
+
+        # Drena o que sobrou na fila antes de encerrar
+        while True:
+            try:
+                registro = fila.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(registro, threading.Event):
+                registro.set()
+            elif registro is not None:
+                lote.append(registro)
+        if lote:
+            self._gravar(lote)
+
+    def _gravar(self, lote):
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conexao:
+                    conexao.execute(Log.__table__.insert(), lote)
+            self.gravados += len(lote)
+            self.lotes += 1
+        except Exception as e:
+            self.falhas += len(lote)
+            print(f"Erro ao gravar lote de logs ({len(lote)} registros): {str(e)}")
+
+    def flush(self, timeout=5.0):
+        """Força a gravação do lote pendente e aguarda (testes e encerramento)"""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        concluido = threading.Event()
+        try:
+            self._fila.put(concluido, timeout=timeout)
+        except queue.Full:
+            return
+        concluido.wait(timeout)
+
+    def parar(self, timeout=5.0):
+        """Sinaliza o fim da thread e grava os registros pendentes"""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            self._fila.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def estatisticas(self):
+        return {
+            'habilitado': self.habilitado,
+            'fila_profundidade': self.profundidade(),
+            'fila_capacidade': self.tamanho_fila,
+            'enfileirados': self.enfileirados,
+            'gravados': self.gravados,
+            'descartados': self.descartados,
+            'falhas': self.falhas,
+            'lotes': self.lotes
+        }
+
+
+log_writer = AsyncLogWriter()
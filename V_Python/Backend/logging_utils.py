@@ -4,6 +4,8 @@ from functools import wraps
 from flask import request, g
 from models import Log, User
 from extensions import db
+from log_writer import log_writer
+from ingestao_binaria import TIPO_CONTEUDO as TIPO_LEITURAS_BINARIO, quantidade_leituras
 import json
 from datetime import datetime
 
@@ -81,11 +83,20 @@ def capturar_detalhes_requisicao(func_name, args, kwargs):
     }
     
     # Adiciona dados do JSON se houver
-    if request.is_json and request.get_json():
-        dados = request.get_json()
-        # Remove senhas dos logs por segurança
-        dados_seguros = {k: v for k, v in dados.items() if 'password' not in k.lower()}
-        detalhes['dados_requisicao'] = dados_seguros
+    if request.is_json and request.get_json(silent=True):
+        dados = request.get_json(silent=True)
+        if isinstance(dados, list):
+            # Lotes de leituras: registra apenas o tamanho, não o corpo inteiro
+            detalhes['quantidade_itens'] = len(dados)
+        elif isinstance(dados, dict):
+            # Remove senhas dos logs por segurança
+            dados_seguros = {k: v for k, v in dados.items() if 'password' not in k.lower()}
+            detalhes['dados_requisicao'] = dados_seguros
+    elif request.mimetype == TIPO_LEITURAS_BINARIO:
+        try:
+            detalhes['quantidade_itens'] = quantidade_leituras(request.get_data())
+        except ValueError:
+            pass
     
     # Adiciona parâmetros da URL
     if request.args:
@@ -97,9 +108,14 @@ def capturar_detalhes_requisicao(func_name, args, kwargs):
     
     return json.dumps(detalhes, default=str)
 
-def registrar_log_atividade(usuario=None, acao='', detalhes=None, status_code=200, duracao=None):
+def registrar_log_atividade(usuario=None, acao='', detalhes=None, status_code=200, duracao=None,
+                            requisicao=None):
     """
-    Registra atividade no banco de dados
+    Registra atividade no banco de dados.
+    Com LOG_ASYNC habilitado o registro vai para a fila do log_writer e é
+    gravado em lote fora da requisição; caso contrário, grava na hora.
+    `requisicao` (endpoint, metodo_http, ip_address, user_agent) substitui os
+    dados do request do Flask nas rotas do modo ASGI.
     """
     try:
         # Adiciona duração aos detalhes se fornecida
@@ -108,18 +124,27 @@ def registrar_log_atividade(usuario=None, acao='', detalhes=None, status_code=20
             detalhes_dict['duracao_ms'] = int(duracao.total_seconds() * 1000)
             detalhes = json.dumps(detalhes_dict, default=str)
         
-        log = Log(
-            usuario_id=usuario.id if usuario else None,
-            usuario_nome=usuario.username if usuario else 'Anônimo',
-            acao=acao,
-            detalhes=detalhes,
-            endpoint=request.endpoint if request else None,
-            metodo_http=request.method if request else None,
-            ip_address=request.environ.get('HTTP_X_REAL_IP', request.remote_addr) if request else None,
-            user_agent=request.headers.get('User-Agent', '') if request else None,
-            status_code=status_code
-        )
+        # Dados da requisição são capturados aqui, ainda na thread da requisição
+        registro = {
+            'usuario_id': usuario.id if usuario else None,
+            'usuario_nome': usuario.username if usuario else 'Anônimo',
+            'acao': acao,
+            'detalhes': detalhes,
+            'endpoint': request.endpoint if request else None,
+            'metodo_http': request.method if request else None,
+            'ip_address': request.environ.get('HTTP_X_REAL_IP', request.remote_addr) if request else None,
+            'user_agent': request.headers.get('User-Agent', '') if request else None,
+            'status_code': status_code,
+            'data_hora': datetime.utcnow()
+        }
+        if requisicao:
+            registro.update(requisicao)
         
+        # Caminho padrão: fila em memória gravada em lote por log_writer
+        if log_writer.enfileirar(registro):
+            return
+        
+        log = Log(**registro)
         db.session.add(log)
         db.session.commit()
         
@@ -130,7 +155,7 @@ def registrar_log_atividade(usuario=None, acao='', detalhes=None, status_code=20
         except:
             pass
 
-def log_login_attempt(username, sucesso=True, motivo=None):
+def log_login_attempt(username, sucesso=True, motivo=None, requisicao=None):
     """
     Log específico para tentativas de login
     """
@@ -147,7 +172,8 @@ def log_login_attempt(username, sucesso=True, motivo=None):
         usuario=None,
         acao=acao,
         detalhes=json.dumps(detalhes, default=str),
-        status_code=200 if sucesso else 401
+        status_code=200 if sucesso else 401,
+        requisicao=requisicao
     )
 
 def log_logout(usuario):
@@ -206,7 +232,7 @@ def log_acesso_tela(usuario, tela, detalhes_adicionais=None):
         status_code=200
     )
 
-def log_crud_operation(usuario, tabela, operacao, registro_id=None, dados=None):
+def log_crud_operation(usuario, tabela, operacao, registro_id=None, dados=None, requisicao=None):
     """
     Log específico para operações CRUD
     """
@@ -228,5 +254,6 @@ def log_crud_operation(usuario, tabela, operacao, registro_id=None, dados=None):
         usuario=usuario,
         acao=acao,
         detalhes=json.dumps(detalhes, default=str),
-        status_code=200
+        status_code=200,
+        requisicao=requisicao
     )
\ No newline at end of file
@@ -0,0 +1,216 @@
+# metricas.py - Métricas no formato Prometheus (requisições, banco, ingestão, fila de logs, cache)
+
+import hmac
+import os
+import time
+
+from flask import request, g, has_request_context, Response
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+# Com PROMETHEUS_MULTIPROC_DIR definido (gunicorn.conf.py) cada worker grava
+# os valores em arquivos mmap desse diretório e /metrics soma todos os workers
+MULTIPROCESSO = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+REQUISICOES = Counter(
+    'embryotech_http_requisicoes_total', 'Requisições HTTP atendidas',
+    ['endpoint', 'metodo', 'status']
+)
+LATENCIA = Histogram(
+    'embryotech_http_duracao_segundos', 'Tempo até a resposta (sem o corpo em streaming)',
+    ['endpoint', 'metodo', 'status'], buckets=BUCKETS_LATENCIA
+)
+CONSULTAS_POR_REQUISICAO = Histogram(
+    'embryotech_db_consultas_por_requisicao', 'Comandos SQL executados por requisição',
+    ['endpoint'], buckets=BUCKETS_CONSULTAS
+)
+TEMPO_DB_POR_REQUISICAO = Histogram(
+    'embryotech_db_tempo_por_requisicao_segundos', 'Tempo em comandos SQL por requisição',
+    ['endpoint'], buckets=BUCKETS_LATENCIA
+)
+DURACAO_CONSULTA = Histogram(
+    'embryotech_db_consulta_duracao_segundos', 'Duração de cada comando SQL (inclui threads auxiliares)',
+    buckets=BUCKETS_LATENCIA
+)
+POOL_EM_USO = Gauge(
+    'embryotech_db_pool_conexoes_em_uso', 'Conexões do pool emprestadas no momento',
+    multiprocess_mode='livesum'
+)
+POOL_TAMANHO = Gauge(
+    'embryotech_db_pool_tamanho', 'Tamanho configurado do pool de conexões',
+    multiprocess_mode='livesum'
+)
+LEITURAS_INGERIDAS = Counter(
+    'embryotech_leituras_ingeridas_total', 'Leituras gravadas pela ingestão (rate() = linhas/s)'
+)
+LEITURAS_REJEITADAS = Counter(
+    'embryotech_leituras_rejeitadas_total', 'Leituras rejeitadas pela validação da ingestão'
+)
+LEITURAS_DUPLICADAS = Counter(
+    'embryotech_leituras_duplicadas_total', 'Leituras descartadas por já terem sido recebidas (reenvio)'
+)
+LOG_FILA = Gauge(
+    'embryotech_log_fila_profundidade', 'Registros de auditoria aguardando gravação',
+    multiprocess_mode='livesum'
+)
+LOG_DESCARTADOS = Gauge(
+    'embryotech_log_descartados', 'Registros de auditoria descartados com a fila cheia (desde o início do worker)',
+    multiprocess_mode='livesum'
+)
+CACHE_OPERACOES = Counter(
+    'embryotech_cache_operacoes_total', 'Consultas ao cache compartilhado por grupo de chave',
+    ['grupo', 'resultado']
+)
+
+SEM_ROTA = '<sem_rota>'
+
+
+# ------------------------------------------------------------------ eventos do SQLAlchemy
+# Registrados nas classes Engine/Pool: valem para qualquer engine do processo
+
+def _antes_do_comando(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metricas_inicio', []).append(time.perf_counter())
+
+
+def _depois_do_comando(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get('metricas_inicio')
+    if not inicios:
+        return
+    duracao = time.perf_counter() - inicios.pop()
+    DURACAO_CONSULTA.observe(duracao)
+    if has_request_context():
+        g.metricas_db_consultas = g.get('metricas_db_consultas', 0) + 1
+        g.metricas_db_tempo = g.get('metricas_db_tempo', 0.0) + duracao
+
+
+def _conexao_emprestada(dbapi_connection, connection_record, connection_proxy):
+    POOL_EM_USO.inc()
+
+
+def _conexao_devolvida(dbapi_connection, connection_record):
+    POOL_EM_USO.dec()
+
+
+def _registrar_eventos():
+    if event.contains(Engine, 'before_cursor_execute', _antes_do_comando):
+        return
+    event.listen(Engine, 'before_cursor_execute', _antes_do_comando)
+    event.listen(Engine, 'after_cursor_execute', _depois_do_comando)
+    event.listen(Pool, 'checkout', _conexao_emprestada)
+    event.listen(Pool, 'checkin', _conexao_devolvida)
+
+
+class MetricasApp:
+    """
+    Instrumentação da aplicação: tempo e contagem das requisições por rota
+    e status, comandos SQL por requisição, uso do pool, ingestão, fila do
+    log_writer e acertos do cache. Exposta em /metrics.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.habilitado = True
+        self.token = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.habilitado = app.config.get('METRICAS_HABILITADAS', True)
+        self.token = app.config.get('METRICAS_TOKEN')
+        app.extensions['metricas'] = self
+        if not self.habilitado:
+            return
+
+        app.before_request(self._inicio_requisicao)
+        app.after_request(self._fim_requisicao)
+        app.add_url_rule('/metrics', 'metricas', self.expor)
+
+        _registrar_eventos()
+
+        # Acertos/falhas do cache compartilhado (ver cache.py)
+        cache = app.extensions.get('cache')
+        if cache is not None:
+            cache.ao_contar = self.registrar_cache
+
+    # ---------------------------------------------------------------- requisições
+
+    def _inicio_requisicao(self):
+        g.metricas_inicio = time.perf_counter()
+
+    def _fim_requisicao(self, response):
+        inicio = g.pop('metricas_inicio', None)
+        if inicio is None or request.endpoint == 'metricas':
+            return response
+
+        # Rota (modelo da URL) em vez do caminho, para limitar a cardinalidade
+        endpoint = request.url_rule.rule if request.url_rule is not None else SEM_ROTA
+        self.registrar_requisicao(endpoint, request.method, response.status_code,
+                                  time.perf_counter() - inicio)
+        CONSULTAS_POR_REQUISICAO.labels(endpoint).observe(g.get('metricas_db_consultas', 0))
+        TEMPO_DB_POR_REQUISICAO.labels(endpoint).observe(g.get('metricas_db_tempo', 0.0))
+
+        # Medidas do processo atualizadas a cada requisição: assim o /metrics
+        # atendido por um worker enxerga valores recentes de todos
+        self._atualizar_medidas()
+        return response
+
+    def _atualizar_medidas(self):
+        log_writer = self.app.extensions.get('log_writer')
+        if log_writer is not None:
+            LOG_FILA.set(log_writer.profundidade())
+            LOG_DESCARTADOS.set(log_writer.descartados)
+
+        db = self.app.extensions.get('sqlalchemy')
+        if db is not None:
+            tamanho = getattr(db.engine.pool, 'size', None)
+            if callable(tamanho):
+                POOL_TAMANHO.set(tamanho())
+
+    # ---------------------------------------------------------------- contadores
+
+    def registrar_requisicao(self, endpoint, metodo, status, duracao):
+        """Requisição atendida (também chamado pelas rotas do modo ASGI)"""
+        if self.habilitado:
+            REQUISICOES.labels(endpoint, metodo, str(status)).inc()
+            LATENCIA.labels(endpoint, metodo, str(status)).observe(duracao)
+
+    def registrar_ingestao(self, aceitas, rejeitadas=0, duplicadas=0):
+        if self.habilitado:
+            LEITURAS_INGERIDAS.inc(aceitas)
+            LEITURAS_REJEITADAS.inc(rejeitadas)
+            LEITURAS_DUPLICADAS.inc(duplicadas)
+
+    def registrar_cache(self, grupo, acerto):
+        CACHE_OPERACOES.labels(grupo, 'acerto' if acerto else 'falha').inc()
+
+    # ---------------------------------------------------------------- exposição
+
+    def _registro(self):
+        if not MULTIPROCESSO:
+            return REGISTRY
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        return registro
+
+    def expor(self):
+        """GET /metrics no formato texto do Prometheus (Bearer METRICAS_TOKEN, se definido)"""
+        if self.token:
+            recebido = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(recebido.encode(), f'Bearer {self.token}'.encode()):
+                return Response('Token de métricas inválido\n', status=401, mimetype='text/plain')
+
+        self._atualizar_medidas()
+        return Response(generate_latest(self._registro()), content_type=CONTENT_TYPE_LATEST)
+
+
+metricas = MetricasApp()
@@ -0,0 +1,51 @@
+"""Índices da tabela leituras
+
+Revision ID: 4a7c2e91d5b3
+Revises: bc5938929fc5
+Create Date: 2026-10-17 09:12:41.218305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a7c2e91d5b3'
+down_revision = 'bc5938929fc5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Atende filtro por lote + ordenação/intervalo por data_inicial
+    # (listagem, paginação por cursor, relatórios e PDF). A ordem é a de
+    # leituras_utils.ORDENACAO: sem o NULLS LAST (o padrão de DESC é NULLS
+    # FIRST) nenhum sentido de varredura a atende e o lote inteiro é
+    # ordenado. O id no fim cobre o desempate da paginação keyset. SQLite
+    # não aceita NULLS LAST em índices; lá NULL é o menor valor e DESC já
+    # deixa os nulos no fim.
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    op.create_index(
+        'ix_leituras_lote_data_inicial',
+        'leituras',
+        ['lote', sa.text('data_inicial DESC NULLS LAST' if postgresql else 'data_inicial DESC'),
+         sa.text('id DESC')],
+        unique=False
+    )
+
+    # BRIN é minúsculo e eficiente para intervalos de data em tabelas
+    # append-only como leituras; só existe no PostgreSQL
+    if postgresql:
+        op.create_index(
+            'ix_leituras_data_inicial_brin',
+            'leituras',
+            ['data_inicial'],
+            unique=False,
+            postgresql_using='brin'
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_leituras_data_inicial_brin', table_name='leituras')
+    op.drop_index('ix_leituras_lote_data_inicial', table_name='leituras')
@@ -0,0 +1,46 @@
+"""Tabela de rollups de leituras
+
+Revision ID: 7e3f0b6c28a4
+Revises: 4a7c2e91d5b3
+Create Date: 2026-10-17 10:04:18.553102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e3f0b6c28a4'
+down_revision = '4a7c2e91d5b3'
+branch_labels = None
+depends_on = None
+
+
+def _colunas_sensor(sensor):
+    return [
+        sa.Column(f'{sensor}_n', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column(f'{sensor}_soma', sa.Float(), nullable=False, server_default='0'),
+        sa.Column(f'{sensor}_soma_q', sa.Float(), nullable=False, server_default='0'),
+        sa.Column(f'{sensor}_min', sa.Float(), nullable=True),
+        sa.Column(f'{sensor}_max', sa.Float(), nullable=True),
+    ]
+
+
+def upgrade():
+    op.create_table('leituras_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('granularidade', sa.String(length=10), nullable=False),
+    sa.Column('lote', sa.String(length=100), nullable=False, server_default=''),
+    sa.Column('inicio', sa.DateTime(), nullable=False),
+    sa.Column('quantidade', sa.Integer(), nullable=False, server_default='0'),
+    *_colunas_sensor('temperatura'),
+    *_colunas_sensor('umidade'),
+    *_colunas_sensor('pressao'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('granularidade', 'lote', 'inicio', name='uq_leituras_rollup_intervalo')
+    )
+    # Os dados existentes são carregados com: flask rollups-reconstruir
+
+
+def downgrade():
+    op.drop_table('leituras_rollup')
@@ -0,0 +1,40 @@
+"""Tabela de jobs de relatório
+
+Revision ID: 9c1d5e7a3f20
+Revises: 7e3f0b6c28a4
+Create Date: 2026-10-17 11:26:07.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1d5e7a3f20'
+down_revision = '7e3f0b6c28a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('relatorio_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('tipo', sa.String(length=20), nullable=False),
+    sa.Column('parametros', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=True),
+    sa.Column('arquivo', sa.String(length=255), nullable=True),
+    sa.Column('tamanho', sa.Integer(), nullable=True),
+    sa.Column('erro', sa.Text(), nullable=True),
+    sa.Column('criado_em', sa.DateTime(), nullable=True),
+    sa.Column('iniciado_em', sa.DateTime(), nullable=True),
+    sa.Column('concluido_em', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['usuario_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_relatorio_jobs_criado_em'), 'relatorio_jobs', ['criado_em'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_relatorio_jobs_criado_em'), table_name='relatorio_jobs')
+    op.drop_table('relatorio_jobs')
@@ -0,0 +1,31 @@
+"""Chave de versoes_tabelas com espaço para as versões por lote das leituras
+
+Revision ID: a7c3e5f91d28
+Revises: f3a6d9c2b184
+Create Date: 2026-10-17 21:06:32.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e5f91d28'
+down_revision = 'f3a6d9c2b184'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('versoes_tabelas', 'tabela',
+               existing_type=sa.VARCHAR(length=50),
+               type_=sa.String(length=150),
+               existing_nullable=False)
+
+
+def downgrade():
+    op.execute("DELETE FROM versoes_tabelas WHERE tabela LIKE 'leituras:%'")
+    op.alter_column('versoes_tabelas', 'tabela',
+               existing_type=sa.String(length=150),
+               type_=sa.VARCHAR(length=50),
+               existing_nullable=False)
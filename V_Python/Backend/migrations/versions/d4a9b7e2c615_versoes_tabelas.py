@@ -0,0 +1,31 @@
+"""Tabela de versões por tabela (GET condicional das consultas de apoio)
+
+Revision ID: d4a9b7e2c615
+Revises: 9c1d5e7a3f20
+Create Date: 2026-10-17 14:12:41.307218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a9b7e2c615'
+down_revision = '9c1d5e7a3f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    versoes = op.create_table('versoes_tabelas',
+    sa.Column('tabela', sa.String(length=50), nullable=False),
+    sa.Column('versao', sa.Integer(), nullable=False),
+    sa.Column('alterado_em', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('tabela')
+    )
+    # Linha inicial: os workers só fazem UPDATE, sem disputar o INSERT
+    op.bulk_insert(versoes, [{'tabela': 'parametros', 'versao': 1, 'alterado_em': None}])
+
+
+def downgrade():
+    op.drop_table('versoes_tabelas')
@@ -0,0 +1,38 @@
+"""Dispositivos (controladores de incubadora) autenticados por chave de API
+
+Revision ID: e8b2c4f1a937
+Revises: d4a9b7e2c615
+Create Date: 2026-10-17 16:02:18.514203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b2c4f1a937'
+down_revision = 'd4a9b7e2c615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('dispositivos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nome', sa.String(length=80), nullable=False),
+    sa.Column('prefixo_chave', sa.String(length=16), nullable=False),
+    sa.Column('chave_hash', sa.String(length=64), nullable=False),
+    sa.Column('lotes', sa.Text(), nullable=True),
+    sa.Column('salas', sa.Text(), nullable=True),
+    sa.Column('ativo', sa.Boolean(), nullable=False),
+    sa.Column('criado_por', sa.Integer(), nullable=True),
+    sa.Column('criado_em', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['criado_por'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('chave_hash'),
+    sa.UniqueConstraint('nome')
+    )
+
+
+def downgrade():
+    op.drop_table('dispositivos')
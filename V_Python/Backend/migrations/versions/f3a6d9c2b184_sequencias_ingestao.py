@@ -0,0 +1,29 @@
+"""Faixas de sequências recebidas por origem (reenvio idempotente de lotes)
+
+Revision ID: f3a6d9c2b184
+Revises: e8b2c4f1a937
+Create Date: 2026-10-17 18:41:07.228163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a6d9c2b184'
+down_revision = 'e8b2c4f1a937'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sequencias_ingestao',
+    sa.Column('origem', sa.String(length=150), nullable=False),
+    sa.Column('faixas', sa.Text(), nullable=False),
+    sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('origem')
+    )
+
+
+def downgrade():
+    op.drop_table('sequencias_ingestao')
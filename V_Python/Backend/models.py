@@ -2,9 +2,11 @@
 
 from extensions import db
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 import jwt
+import json
 from flask import current_app, request
+from senhas import verificador_senhas
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -16,7 +18,8 @@ class User(db.Model):
     is_admin = db.Column(db.Boolean, default=False)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Fator de trabalho de SENHA_METODO (ver senhas.py)
+        self.password_hash = verificador_senhas.gerar_hash(password)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -59,6 +62,107 @@ class Leitura(db.Model):
     data_inicial = db.Column(db.DateTime, nullable=True)
     data_final = db.Column(db.DateTime, nullable=True)
 
+# Índices de leituras (migração 4a7c2e91d5b3): lote + data_inicial DESC NULLS LAST
+# na mesma ordem de leituras_utils.ORDENACAO para as listagens/relatórios e BRIN
+# em data_inicial para intervalos no PostgreSQL. SQLite não aceita NULLS LAST em
+# índices, mas lá NULL é o menor valor e DESC já deixa os nulos no fim
+db.Index('ix_leituras_lote_data_inicial', Leitura.lote, Leitura.data_inicial.desc().nulls_last(),
+         Leitura.id.desc()).ddl_if(dialect='postgresql')
+db.Index('ix_leituras_lote_data_inicial', Leitura.lote, Leitura.data_inicial.desc(),
+         Leitura.id.desc()).ddl_if(callable_=lambda ddl, alvo, bind, dialect, **kw: dialect.name != 'postgresql')
+db.Index('ix_leituras_data_inicial_brin', Leitura.data_inicial, postgresql_using='brin')
+
+class LeituraRollup(db.Model):
+    """
+    Agregados de leituras por lote e intervalo (hora/dia), mantidos de forma
+    incremental na ingestão (ver rollups.py). Guarda contagem, soma, soma dos
+    quadrados, mínimo e máximo de cada sensor para derivar média e desvio.
+    """
+    __tablename__ = 'leituras_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('granularidade', 'lote', 'inicio', name='uq_leituras_rollup_intervalo'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularidade = db.Column(db.String(10), nullable=False)  # 'hora' ou 'dia'
+    lote = db.Column(db.String(100), nullable=False, default='')  # '' = leituras sem lote
+    inicio = db.Column(db.DateTime, nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+    temperatura_n = db.Column(db.Integer, nullable=False, default=0)
+    temperatura_soma = db.Column(db.Float, nullable=False, default=0.0)
+    temperatura_soma_q = db.Column(db.Float, nullable=False, default=0.0)
+    temperatura_min = db.Column(db.Float, nullable=True)
+    temperatura_max = db.Column(db.Float, nullable=True)
+
+    umidade_n = db.Column(db.Integer, nullable=False, default=0)
+    umidade_soma = db.Column(db.Float, nullable=False, default=0.0)
+    umidade_soma_q = db.Column(db.Float, nullable=False, default=0.0)
+    umidade_min = db.Column(db.Float, nullable=True)
+    umidade_max = db.Column(db.Float, nullable=True)
+
+    pressao_n = db.Column(db.Integer, nullable=False, default=0)
+    pressao_soma = db.Column(db.Float, nullable=False, default=0.0)
+    pressao_soma_q = db.Column(db.Float, nullable=False, default=0.0)
+    pressao_min = db.Column(db.Float, nullable=True)
+    pressao_max = db.Column(db.Float, nullable=True)
+
+class VersaoTabela(db.Model):
+    """
+    Contador de alterações por tabela (ver versoes_tabelas.py). Incrementado
+    na mesma transação das escritas, serve de ETag/Last-Modified para as
+    consultas de apoio e de chave para o cache delas em todos os workers.
+    As leituras têm um contador por lote ('leituras:<lote>') e um do
+    conjunto ('leituras:*').
+    """
+    __tablename__ = 'versoes_tabelas'
+
+    tabela = db.Column(db.String(150), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    alterado_em = db.Column(db.DateTime, nullable=True)
+
+class Dispositivo(db.Model):
+    """
+    Controlador de incubadora autenticado por chave de API (ver dispositivos.py).
+    Só o HMAC-SHA256 da chave é guardado; o escopo de ingestão são os lotes
+    listados mais os lotes dos parâmetros das salas listadas.
+    """
+    __tablename__ = 'dispositivos'
+
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(80), unique=True, nullable=False)
+    prefixo_chave = db.Column(db.String(16), nullable=False)  # início da chave, para identificá-la
+    chave_hash = db.Column(db.String(64), unique=True, nullable=False)
+    lotes = db.Column(db.Text, nullable=True)  # JSON: lista de lotes
+    salas = db.Column(db.Text, nullable=True)  # JSON: lista de id_sala
+    ativo = db.Column(db.Boolean, nullable=False, default=True)
+    criado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'nome': self.nome,
+            'prefixo_chave': self.prefixo_chave,
+            'lotes': json.loads(self.lotes) if self.lotes else [],
+            'salas': json.loads(self.salas) if self.salas else [],
+            'ativo': self.ativo,
+            'criado_por': self.criado_por,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None
+        }
+
+class SequenciaIngestao(db.Model):
+    """
+    Faixas de números de sequência já recebidas de cada origem de leituras
+    (ver idempotencia.py). Uma linha por dispositivo: reenvios contíguos
+    mantêm uma única faixa.
+    """
+    __tablename__ = 'sequencias_ingestao'
+
+    origem = db.Column(db.String(150), primary_key=True)
+    faixas = db.Column(db.Text, nullable=False, default='[]')  # JSON: [[inicio, fim], ...] inclusivas
+    atualizado_em = db.Column(db.DateTime, nullable=True)
+
 class Parametro(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     empresa = db.Column(db.String(100), nullable=False)
@@ -143,4 +247,38 @@ class Log(db.Model):
             try:
                 db.session.rollback()
             except:
-                pass
\ No newline at end of file
+                pass
+
+class RelatorioJob(db.Model):
+    """
+    Relatório gerado em segundo plano pela fila de jobs (ver relatorio_jobs.py).
+    O estado fica no banco para que qualquer worker do gunicorn responda à
+    consulta; o PDF fica em RELATORIO_JOBS_DIR até expirar.
+    """
+    __tablename__ = 'relatorio_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 em hexadecimal
+    tipo = db.Column(db.String(20), nullable=False)  # leituras, auditoria ou usuarios
+    parametros = db.Column(db.Text, nullable=True)  # JSON com os filtros do relatório
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    usuario_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    arquivo = db.Column(db.String(255), nullable=True)
+    tamanho = db.Column(db.Integer, nullable=True)
+    erro = db.Column(db.Text, nullable=True)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    iniciado_em = db.Column(db.DateTime, nullable=True)
+    concluido_em = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'parametros': json.loads(self.parametros) if self.parametros else {},
+            'status': self.status,
+            'usuario_id': self.usuario_id,
+            'tamanho': self.tamanho,
+            'erro': self.erro,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'iniciado_em': self.iniciado_em.isoformat() if self.iniciado_em else None,
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None
+        }
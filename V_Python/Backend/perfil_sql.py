@@ -0,0 +1,210 @@
+# perfil_sql.py - Perfil de SQL por requisição (comandos, tempo, local de chamada e detecção de N+1)
+
+import heapq
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import request, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DIRETORIO_APP = os.path.dirname(os.path.abspath(__file__))
+
+# Tamanho máximo do SQL guardado por comando
+TAMANHO_MAXIMO_SQL = 500
+
+
+def _local_chamada():
+    """
+    Primeiro quadro da pilha que pertence ao código da aplicação (fora deste
+    módulo e de bibliotecas instaladas), ex.: "app.py:812 (api_listar_leituras)".
+    Percorre os quadros diretamente, sem montar o traceback.
+    """
+    quadro = sys._getframe(2)
+    while quadro is not None:
+        arquivo = quadro.f_code.co_filename
+        if (arquivo.startswith(DIRETORIO_APP) and arquivo != __file__
+                and 'site-packages' not in arquivo):
+            return f'{os.path.relpath(arquivo, DIRETORIO_APP)}:{quadro.f_lineno} ({quadro.f_code.co_name})'
+        quadro = quadro.f_back
+    return None
+
+
+class PerfilRequisicao:
+    """Comandos de uma requisição; só guarda o detalhe quando ela foi amostrada"""
+
+    __slots__ = ('detalhado', 'maximo_comandos', 'consultas', 'tempo', 'comandos')
+
+    def __init__(self, detalhado, maximo_comandos=200):
+        self.detalhado = detalhado
+        self.maximo_comandos = maximo_comandos
+        self.consultas = 0
+        self.tempo = 0.0
+        self.comandos = []  # (sql, duracao, local)
+
+    def registrar(self, sql, duracao, local=None):
+        self.consultas += 1
+        self.tempo += duracao
+        if self.detalhado and len(self.comandos) < self.maximo_comandos:
+            self.comandos.append((sql[:TAMANHO_MAXIMO_SQL], duracao, local))
+
+    def repetidos(self, limiar):
+        """Comandos idênticos executados `limiar` vezes ou mais (suspeitos de N+1)"""
+        grupos = {}
+        for sql, duracao, local in self.comandos:
+            grupo = grupos.setdefault(sql, {'sql': sql, 'vezes': 0, 'tempo_ms': 0.0, 'locais': set()})
+            grupo['vezes'] += 1
+            grupo['tempo_ms'] += duracao * 1000
+            if local:
+                grupo['locais'].add(local)
+        suspeitos = [dict(grupo, tempo_ms=round(grupo['tempo_ms'], 2), locais=sorted(grupo['locais']))
+                     for grupo in grupos.values() if grupo['vezes'] >= limiar]
+        return sorted(suspeitos, key=lambda grupo: grupo['vezes'], reverse=True)
+
+
+# ------------------------------------------------------------------ eventos do SQLAlchemy
+# Atuam só nas requisições com g.perfil_sql (criado por PerfilSQL._inicio_requisicao)
+
+def _antes_do_comando(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and g.get('perfil_sql') is not None:
+        conn.info.setdefault('perfil_sql_inicio', []).append(time.perf_counter())
+
+
+def _depois_do_comando(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    perfil = g.get('perfil_sql')
+    inicios = conn.info.get('perfil_sql_inicio')
+    if perfil is None or not inicios:
+        return
+    duracao = time.perf_counter() - inicios.pop()
+    # O local de chamada (percorrer a pilha) só é calculado nas amostradas
+    perfil.registrar(statement, duracao, _local_chamada() if perfil.detalhado else None)
+
+
+class PerfilSQL:
+    """
+    Perfil opcional (PERFIL_SQL_HABILITADO) dos comandos SQL de cada requisição.
+
+    Com o perfil ligado, toda resposta leva X-DB-Queries e X-DB-Time (ms),
+    o que custa só um contador por comando. Uma fração PERFIL_SQL_AMOSTRAGEM
+    das requisições (ou as que enviam "X-Perfil-SQL: 1") guarda também o SQL,
+    a duração e o local de chamada de cada comando; comandos idênticos
+    repetidos PERFIL_SQL_LIMIAR_REPETICOES vezes ou mais são apontados como
+    N+1 e as PERFIL_SQL_MAIS_LENTAS requisições amostradas mais lentas ficam
+    disponíveis em mais_lentas() (por worker).
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.habilitado = False
+        self.amostragem = 0.01
+        self.limiar_repeticoes = 5
+        self.maximo_lentas = 20
+        self.maximo_comandos = 200
+
+        self._lentas = []  # heap mínimo de (duracao, sequencia, resumo)
+        self._sequencia = itertools.count()
+        self._lock = threading.Lock()
+        self.amostradas = 0
+        self.suspeitas_n_mais_1 = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.habilitado = app.config.get('PERFIL_SQL_HABILITADO', False)
+        self.amostragem = app.config.get('PERFIL_SQL_AMOSTRAGEM', self.amostragem)
+        self.limiar_repeticoes = app.config.get('PERFIL_SQL_LIMIAR_REPETICOES', self.limiar_repeticoes)
+        self.maximo_lentas = app.config.get('PERFIL_SQL_MAIS_LENTAS', self.maximo_lentas)
+        self.maximo_comandos = app.config.get('PERFIL_SQL_MAX_COMANDOS', self.maximo_comandos)
+        app.extensions['perfil_sql'] = self
+        if not self.habilitado:
+            return
+
+        app.before_request(self._inicio_requisicao)
+        app.after_request(self._fim_requisicao)
+        if not event.contains(Engine, 'before_cursor_execute', _antes_do_comando):
+            event.listen(Engine, 'before_cursor_execute', _antes_do_comando)
+            event.listen(Engine, 'after_cursor_execute', _depois_do_comando)
+
+    # ---------------------------------------------------------------- requisições
+
+    def _inicio_requisicao(self):
+        forcado = request.headers.get('X-Perfil-SQL') == '1'
+        g.perfil_sql = PerfilRequisicao(forcado or random.random() < self.amostragem, self.maximo_comandos)
+        g.perfil_sql_inicio = time.perf_counter()
+
+    def _fim_requisicao(self, response):
+        perfil = g.pop('perfil_sql', None)
+        if perfil is None:
+            return response
+        duracao = time.perf_counter() - g.pop('perfil_sql_inicio')
+
+        response.headers['X-DB-Queries'] = str(perfil.consultas)
+        response.headers['X-DB-Time'] = f'{perfil.tempo * 1000:.1f}'
+        if perfil.detalhado:
+            self._registrar_amostra(perfil, duracao, response.status_code)
+        return response
+
+    def _registrar_amostra(self, perfil, duracao, status):
+        repetidos = perfil.repetidos(self.limiar_repeticoes)
+        resumo = {
+            'endpoint': request.url_rule.rule if request.url_rule is not None else None,
+            'metodo': request.method,
+            'caminho': request.full_path.rstrip('?'),
+            'status': status,
+            'data_hora': datetime.utcnow().isoformat(),
+            'duracao_ms': round(duracao * 1000, 2),
+            'consultas': perfil.consultas,
+            'tempo_db_ms': round(perfil.tempo * 1000, 2),
+            'repetidos': repetidos,
+            'comandos': [
+                {'sql': sql, 'duracao_ms': round(d * 1000, 3), 'local': local}
+                for sql, d, local in perfil.comandos
+            ]
+        }
+        if repetidos:
+            mais_repetido = repetidos[0]
+            print(f"Possível N+1 em {request.method} {resumo['endpoint']}: "
+                  f"{mais_repetido['vezes']}x {mais_repetido['sql'][:120]!r} "
+                  f"({', '.join(mais_repetido['locais']) or 'local desconhecido'})")
+
+        with self._lock:
+            self.amostradas += 1
+            if repetidos:
+                self.suspeitas_n_mais_1 += 1
+            item = (duracao, next(self._sequencia), resumo)
+            if len(self._lentas) < self.maximo_lentas:
+                heapq.heappush(self._lentas, item)
+            elif self._lentas and duracao > self._lentas[0][0]:
+                heapq.heapreplace(self._lentas, item)
+
+    # ---------------------------------------------------------------- consulta
+
+    def mais_lentas(self, limite=None):
+        """Resumos das requisições amostradas mais lentas deste worker, da mais lenta à menos"""
+        with self._lock:
+            itens = sorted(self._lentas, key=lambda item: item[0], reverse=True)
+        return [resumo for _, _, resumo in itens[:limite]]
+
+    def limpar(self):
+        with self._lock:
+            self._lentas.clear()
+
+    def estatisticas(self):
+        return {
+            'habilitado': self.habilitado,
+            'amostragem': self.amostragem,
+            'amostradas': self.amostradas,
+            'suspeitas_n_mais_1': self.suspeitas_n_mais_1
+        }
+
+
+perfil_sql = PerfilSQL()
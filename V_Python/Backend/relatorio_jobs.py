@@ -0,0 +1,259 @@
+# relatorio_jobs.py - Fila de relatórios PDF gerados em segundo plano (pool de processos local)
+
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+from extensions import db
+from models import RelatorioJob
+
+# Tipo de relatório → filtros aceitos (mesmos nomes das query strings dos endpoints PDF)
+PARAMETROS = {
+    'leituras': ('lote', 'data_inicio', 'data_fim'),
+    'auditoria': ('usuario_id', 'data_inicio', 'data_fim'),
+    'usuarios': ('tipo',)
+}
+
+STATUS_FINAIS = ('concluido', 'erro', 'expirado')
+
+
+class FilaRelatorios:
+    """
+    Enfileira relatórios para um ProcessPoolExecutor local, sem broker externo.
+
+    O estado de cada job fica na tabela relatorio_jobs (qualquer worker do
+    gunicorn responde à consulta) e o PDF é gravado em RELATORIO_JOBS_DIR,
+    que deve ser compartilhado pelos workers. Os processos do pool usam
+    "spawn" e abrem a própria conexão com o banco, então um relatório grande
+    não ocupa o worker HTTP nem herda o estado dele após o fork do gunicorn.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.diretorio = 'relatorios_gerados'
+        self.processos = 2
+        self.retencao = 86400
+        self.tamanho_maximo = 1024 * 1024 * 1024
+        self.timeout = 3600
+
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.diretorio = os.path.abspath(app.config.get('RELATORIO_JOBS_DIR', self.diretorio))
+        self.processos = app.config.get('RELATORIO_JOBS_PROCESSOS', self.processos)
+        self.retencao = app.config.get('RELATORIO_JOBS_RETENCAO', self.retencao)
+        self.tamanho_maximo = app.config.get('RELATORIO_JOBS_MAX_BYTES', self.tamanho_maximo)
+        self.timeout = app.config.get('RELATORIO_JOBS_TIMEOUT', self.timeout)
+        app.extensions['relatorio_jobs'] = self
+
+    # ---------------------------------------------------------------- pool
+
+    def _configuracao_processo(self):
+        """Configuração mínima repassada aos processos do pool"""
+        return {
+            chave: valor for chave, valor in self.app.config.items()
+            if chave.startswith(('SQLALCHEMY_', 'DB_', 'RELATORIO_'))
+        }
+
+    def _garantir_pool(self):
+        """Cria o pool sob demanda, um por processo (o gunicorn faz fork após preload_app)"""
+        pid = os.getpid()
+        if self._pool is not None and self._pid == pid:
+            return self._pool
+        with self._lock:
+            if self._pool is None or self._pid != pid:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processos,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_inicializar_processo,
+                    initargs=(self._configuracao_processo(),)
+                )
+                self._pid = pid
+        return self._pool
+
+    def parar(self, aguardar=True):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=aguardar, cancel_futures=not aguardar)
+        self._pool = None
+
+    # ---------------------------------------------------------------- jobs
+
+    def enfileirar(self, tipo, parametros=None, usuario_id=None):
+        """
+        Cria o job e o envia ao pool. Levanta ValueError para tipo ou
+        parâmetros desconhecidos.
+        """
+        if tipo not in PARAMETROS:
+            raise ValueError(f"tipo deve ser um de: {', '.join(PARAMETROS)}")
+        parametros = {k: v for k, v in (parametros or {}).items() if v not in (None, '')}
+        desconhecidos = set(parametros) - set(PARAMETROS[tipo])
+        if desconhecidos:
+            raise ValueError(f"parâmetros inválidos para {tipo}: {', '.join(sorted(desconhecidos))}")
+
+        self.limpar_expirados()
+
+        job = RelatorioJob(id=uuid.uuid4().hex, tipo=tipo, status='pendente',
+                           parametros=json.dumps(parametros), usuario_id=usuario_id,
+                           criado_em=datetime.utcnow())
+        db.session.add(job)
+        db.session.commit()
+
+        futuro = self._garantir_pool().submit(_executar_job, job.id, self.diretorio)
+        futuro.add_done_callback(lambda f, job_id=job.id: self._job_encerrado(job_id, f))
+        return job
+
+    def _job_encerrado(self, job_id, futuro):
+        """
+        Chamado na thread do pool ao fim do job. _executar_job já grava o
+        próprio resultado; aqui só tratamos a morte do processo (ex.: OOM),
+        em que o job ficaria "processando" para sempre.
+        """
+        erro = futuro.exception() if not futuro.cancelled() else 'cancelado'
+        if erro is None:
+            return
+        try:
+            with self.app.app_context():
+                job = db.session.get(RelatorioJob, job_id)
+                if job is not None and job.status not in STATUS_FINAIS:
+                    job.status = 'erro'
+                    job.erro = f'Falha no processo de geração: {erro}'
+                    job.concluido_em = datetime.utcnow()
+                    db.session.commit()
+        except Exception as e:
+            print(f"Erro ao registrar falha do job {job_id}: {str(e)}")
+
+    def caminho_arquivo(self, job):
+        return os.path.join(self.diretorio, job.arquivo) if job.arquivo else None
+
+    def limpar_expirados(self):
+        """
+        Retenção dos artefatos: apaga os PDFs mais antigos que
+        RELATORIO_JOBS_RETENCAO segundos e, se o total ainda passar de
+        RELATORIO_JOBS_MAX_BYTES, os mais antigos até caber. Jobs parados além
+        de RELATORIO_JOBS_TIMEOUT (worker reiniciado no meio) viram erro.
+        """
+        agora = datetime.utcnow()
+        expirados = db.session.execute(
+            select(RelatorioJob).where(
+                RelatorioJob.status == 'concluido',
+                RelatorioJob.concluido_em < agora - timedelta(seconds=self.retencao)
+            )
+        ).scalars().all()
+
+        total = db.session.execute(
+            select(func.coalesce(func.sum(RelatorioJob.tamanho), 0))
+            .where(RelatorioJob.status == 'concluido')
+        ).scalar()
+        total -= sum(job.tamanho or 0 for job in expirados)
+        if total > self.tamanho_maximo:
+            ids_expirados = [job.id for job in expirados]
+            antigos = db.session.execute(
+                select(RelatorioJob).where(
+                    RelatorioJob.status == 'concluido',
+                    RelatorioJob.id.notin_(ids_expirados)
+                ).order_by(RelatorioJob.concluido_em)
+            ).scalars()
+            for job in antigos:
+                if total <= self.tamanho_maximo:
+                    break
+                expirados.append(job)
+                total -= job.tamanho or 0
+
+        for job in expirados:
+            caminho = self.caminho_arquivo(job)
+            if caminho and os.path.exists(caminho):
+                os.remove(caminho)
+            job.status = 'expirado'
+            job.arquivo = None
+
+        parados = db.session.execute(
+            select(RelatorioJob).where(
+                RelatorioJob.status.in_(('pendente', 'processando')),
+                RelatorioJob.criado_em < agora - timedelta(seconds=self.timeout)
+            )
+        ).scalars().all()
+        for job in parados:
+            job.status = 'erro'
+            job.erro = 'Tempo limite excedido'
+            job.concluido_em = agora
+
+        if expirados or parados:
+            db.session.commit()
+        return len(expirados)
+
+
+fila_relatorios = FilaRelatorios()
+
+
+# ------------------------------------------------------------------ processos do pool
+
+def _inicializar_processo(configuracao):
+    """Cria, em cada processo do pool, uma aplicação mínima com o banco configurado"""
+    from flask import Flask
+
+    from banco import configurar_banco
+
+    app = Flask('embryotech_relatorios')
+    app.config.update(configuracao)
+    db.init_app(app)
+    configurar_banco(app)
+    app.app_context().push()
+
+
+def _executar_job(job_id, diretorio):
+    """
+    Gera o PDF do job (roda no processo do pool, ou direto em testes com um
+    app context ativo). Grava em arquivo temporário e renomeia ao final, para
+    que um download nunca veja um PDF pela metade.
+    """
+    from flask import current_app
+    from relatorios_pdf import relatorio_leituras, relatorio_auditoria, relatorio_usuarios, MAXIMO_LINHAS
+
+    geradores = {
+        'leituras': relatorio_leituras,
+        'auditoria': relatorio_auditoria,
+        'usuarios': relatorio_usuarios
+    }
+
+    job = db.session.get(RelatorioJob, job_id)
+    if job is None:
+        return
+    job.status = 'processando'
+    job.iniciado_em = datetime.utcnow()
+    db.session.commit()
+
+    nome = f'{job.tipo}_{job.id}.pdf'
+    destino = os.path.join(diretorio, nome)
+    temporario = destino + '.parcial'
+    try:
+        os.makedirs(diretorio, exist_ok=True)
+        parametros = json.loads(job.parametros) if job.parametros else {}
+        maximo = current_app.config.get('RELATORIO_PDF_MAX_LINHAS', MAXIMO_LINHAS)
+        with open(temporario, 'wb') as arquivo:
+            geradores[job.tipo](maximo=maximo, destino=arquivo, **parametros)
+        os.replace(temporario, destino)
+
+        job.status = 'concluido'
+        job.arquivo = nome
+        job.tamanho = os.path.getsize(destino)
+    except Exception as e:
+        db.session.rollback()
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        job = db.session.get(RelatorioJob, job_id)
+        job.status = 'erro'
+        job.erro = str(e)
+    job.concluido_em = datetime.utcnow()
+    db.session.commit()
@@ -0,0 +1,260 @@
+# relatorios_pdf.py - Relatórios PDF gerados em streaming (tabelas por página, cursor do servidor)
+
+import datetime
+import tempfile
+from itertools import islice
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+from sqlalchemy import select, func
+
+from extensions import db
+from models import User, Leitura, Log
+from leituras_utils import filtros_relatorio
+
+# Linhas por tabela: cada bloco cabe em uma página A4 (paisagem/retrato),
+# então o reportlab nunca precisa dividir (split) uma tabela grande
+LINHAS_POR_PAGINA = 27
+LINHAS_POR_PAGINA_RETRATO = 40
+
+# Teto padrão de linhas por relatório (RELATORIO_PDF_MAX_LINHAS)
+MAXIMO_LINHAS = 1000000
+
+# Linhas buscadas por vez no cursor do servidor
+TAMANHO_LOTE_CURSOR = 1000
+
+COR_PRINCIPAL = colors.HexColor('#25691b')
+
+
+def estilo_tabela(tamanho_fonte):
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), COR_PRINCIPAL),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), tamanho_fonte),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+
+
+class _FlowablesSobDemanda(list):
+    """
+    Lista de flowables abastecida aos poucos a partir de um iterador.
+
+    O doc.build() do reportlab só consome a lista pela frente (len, [0],
+    del [0]); reabastecendo quando ela fica curta, apenas alguns blocos de
+    tabela existem em memória ao mesmo tempo, e os já desenhados são liberados.
+    """
+
+    def __init__(self, iniciais, restantes, minimo=2):
+        super().__init__(iniciais)
+        self._restantes = iter(restantes)
+        self._minimo = minimo
+
+    def __len__(self):
+        while self._restantes is not None and list.__len__(self) < self._minimo:
+            try:
+                self.append(next(self._restantes))
+            except StopIteration:
+                self._restantes = None
+        return list.__len__(self)
+
+
+def iterar_linhas(consulta):
+    """Executa a consulta com cursor do servidor, devolvendo as linhas uma a uma"""
+    resultado = db.session.execute(consulta.execution_options(yield_per=TAMANHO_LOTE_CURSOR))
+    try:
+        for linha in resultado:
+            yield linha
+    finally:
+        resultado.close()
+
+
+def _blocos_tabela(linhas, cabecalho, larguras, tamanho_fonte, linhas_por_pagina):
+    linhas = iter(linhas)
+    estilo = estilo_tabela(tamanho_fonte)
+    while True:
+        bloco = list(islice(linhas, linhas_por_pagina))
+        if not bloco:
+            return
+        tabela = Table([cabecalho] + bloco, colWidths=larguras)
+        tabela.setStyle(estilo)
+        yield tabela
+
+
+def gerar_pdf_tabela(titulo, informacoes, cabecalho, larguras, linhas, tamanho_fonte=9,
+                     retrato=False, vazio="Nenhum registro encontrado para os filtros selecionados.",
+                     destino=None):
+    """
+    Gera o PDF (título, bloco de informações e tabela) em `destino` (arquivo
+    aberto em modo binário) ou, se omitido, em um arquivo temporário. Devolve
+    o arquivo posicionado no início, pronto para send_file.
+
+    `linhas` é um iterável de listas já formatadas (normalmente um gerador
+    sobre iterar_linhas); ele é consumido uma página por vez enquanto o
+    documento é montado, então o uso de memória não cresce com o número de
+    registros.
+    """
+    arquivo = destino if destino is not None else tempfile.TemporaryFile()
+    try:
+        doc = SimpleDocTemplate(arquivo, pagesize=A4 if retrato else landscape(A4),
+                                rightMargin=cm, leftMargin=cm, topMargin=cm, bottomMargin=cm)
+
+        styles = getSampleStyleSheet()
+        title_style = ParagraphStyle(
+            'TitleStyle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            textColor=COR_PRINCIPAL,
+            alignment=1,
+            spaceAfter=20
+        )
+
+        info_text = f"Gerado em: {datetime.datetime.now().strftime('%d/%m/%Y às %H:%M')}<br/>"
+        info_text += ''.join(f"{linha}<br/>" for linha in informacoes)
+
+        iniciais = [
+            Paragraph(titulo, title_style),
+            Paragraph(info_text, styles['Normal']),
+            Spacer(1, 20)
+        ]
+
+        linhas_por_pagina = LINHAS_POR_PAGINA_RETRATO if retrato else LINHAS_POR_PAGINA
+        blocos = _blocos_tabela(linhas, cabecalho, larguras, tamanho_fonte, linhas_por_pagina)
+        primeiro = next(blocos, None)
+        if primeiro is None:
+            iniciais.append(Paragraph(vazio, styles['Normal']))
+        else:
+            iniciais.append(primeiro)
+
+        doc.build(_FlowablesSobDemanda(iniciais, blocos))
+        arquivo.seek(0)
+        return arquivo
+    except Exception:
+        if destino is None:
+            arquivo.close()
+        raise
+
+
+# ------------------------------------------------------------------ relatórios
+# Os parâmetros são os mesmos (texto) das query strings dos endpoints, para
+# que os relatórios possam ser gerados tanto na requisição quanto pela fila
+# de jobs (relatorio_jobs.py).
+
+def consulta_relatorio_leituras(filtros, maximo):
+    """SELECT das linhas do PDF de leituras: as `maximo` mais recentes"""
+    return (select(Leitura.data_inicial, Leitura.lote, Leitura.temperatura,
+                   Leitura.umidade, Leitura.pressao)
+            .where(*filtros).order_by(Leitura.data_inicial.desc().nulls_last()).limit(maximo))
+
+
+def relatorio_leituras(lote=None, data_inicio=None, data_fim=None,
+                       maximo=MAXIMO_LINHAS, destino=None):
+    filtros = filtros_relatorio(lote, data_inicio, data_fim)
+
+    total = db.session.execute(select(func.count(Leitura.id)).where(*filtros)).scalar()
+
+    informacoes = [f"Total de registros: {total}"]
+    if total > maximo:
+        informacoes.append(f"Exibindo os {maximo} registros mais recentes")
+    if lote:
+        informacoes.append(f"Filtrado por lote: {lote}")
+    if data_inicio:
+        informacoes.append(f"Data início: {data_inicio}")
+    if data_fim:
+        informacoes.append(f"Data fim: {data_fim}")
+
+    consulta = consulta_relatorio_leituras(filtros, maximo)
+    linhas = ([
+        leitura.data_inicial.strftime('%d/%m/%Y %H:%M') if leitura.data_inicial else '-',
+        leitura.lote or '-',
+        f"{leitura.temperatura:.1f}" if leitura.temperatura else '-',
+        f"{leitura.umidade:.1f}" if leitura.umidade else '-',
+        f"{leitura.pressao:.1f}" if leitura.pressao else '-'
+    ] for leitura in iterar_linhas(consulta))
+
+    return gerar_pdf_tabela(
+        "Relatório de Leituras - Embryotech", informacoes,
+        ['Data/Hora', 'Lote', 'Temp.(°C)', 'Umid.(%)', 'Pressão(hPa)'],
+        [3*cm, 3*cm, 2*cm, 2*cm, 2*cm], linhas, destino=destino
+    )
+
+
+def relatorio_auditoria(usuario_id=None, data_inicio=None, data_fim=None,
+                        maximo=MAXIMO_LINHAS, destino=None):
+    usuario_id = int(usuario_id) if usuario_id else None
+    filtros = []
+    if usuario_id:
+        filtros.append(Log.usuario_id == usuario_id)
+    if data_inicio:
+        filtros.append(Log.data_hora >= data_inicio)
+    if data_fim:
+        filtros.append(Log.data_hora <= data_fim)
+
+    total = db.session.execute(select(func.count(Log.id)).where(*filtros)).scalar()
+
+    informacoes = [f"Total de registros: {total}"]
+    if total > maximo:
+        informacoes.append(f"Exibindo os {maximo} registros mais recentes")
+    if usuario_id:
+        usuario = db.session.get(User, usuario_id)
+        informacoes.append(f"Filtrado por usuário: {usuario.username if usuario else 'N/A'}")
+    if data_inicio:
+        informacoes.append(f"Data início: {data_inicio}")
+    if data_fim:
+        informacoes.append(f"Data fim: {data_fim}")
+
+    consulta = (select(Log.data_hora, Log.usuario_nome, Log.acao, Log.ip_address, Log.status_code)
+                .where(*filtros).order_by(Log.data_hora.desc()).limit(maximo))
+    linhas = ([
+        log.data_hora.strftime('%d/%m/%Y %H:%M') if log.data_hora else '-',
+        log.usuario_nome or 'Anônimo',
+        log.acao[:50] + ('...' if len(log.acao) > 50 else ''),
+        log.ip_address or '-',
+        str(log.status_code) if log.status_code else '-'
+    ] for log in iterar_linhas(consulta))
+
+    return gerar_pdf_tabela(
+        "Relatório de Auditoria - Embryotech", informacoes,
+        ['Data/Hora', 'Usuário', 'Ação', 'IP', 'Status'],
+        [3*cm, 2.5*cm, 4*cm, 2.5*cm, 1.5*cm], linhas, tamanho_fonte=8, destino=destino
+    )
+
+
+def relatorio_usuarios(tipo=None, maximo=MAXIMO_LINHAS, destino=None):
+    filtros = []
+    if tipo == 'admin':
+        filtros.append(User.is_admin.is_(True))
+    elif tipo == 'user':
+        filtros.append(User.is_admin.isnot(True))
+
+    total = db.session.execute(select(func.count(User.id)).where(*filtros)).scalar()
+
+    informacoes = [f"Total de registros: {total}"]
+    if tipo:
+        tipo_desc = 'Administradores' if tipo == 'admin' else 'Usuários Comuns'
+        informacoes.append(f"Filtrado por tipo: {tipo_desc}")
+
+    consulta = (select(User.id, User.username, User.email, User.is_admin)
+                .where(*filtros).order_by(User.id).limit(maximo))
+    linhas = ([
+        str(usuario.id),
+        usuario.username,
+        usuario.email,
+        'Administrador' if usuario.is_admin else 'Usuário Comum'
+    ] for usuario in iterar_linhas(consulta))
+
+    return gerar_pdf_tabela(
+        "Relatório de Usuários - Embryotech", informacoes,
+        ['ID', 'Nome de Usuário', 'Email', 'Tipo'],
+        [2*cm, 4*cm, 6*cm, 3*cm], linhas, retrato=True,
+        vazio="Nenhum usuário encontrado para os filtros selecionados.", destino=destino
+    )
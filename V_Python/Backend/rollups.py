@@ -0,0 +1,352 @@
+# rollups.py - Agregados incrementais de leituras por hora e por dia
+
+import math
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func, or_
+
+from extensions import db
+from models import Leitura, LeituraRollup
+from agregacao import (
+    SENSORES, agregar_leituras, expressao_truncamento, truncar_data, _filtros, _ponto
+)
+
+GRANULARIDADES = ('hora', 'dia')
+DURACAO = {'hora': timedelta(hours=1), 'dia': timedelta(days=1)}
+
+
+def _acumulador():
+    estado = {'quantidade': 0}
+    for sensor in SENSORES:
+        estado[f'{sensor}_n'] = 0
+        estado[f'{sensor}_soma'] = 0.0
+        estado[f'{sensor}_soma_q'] = 0.0
+        estado[f'{sensor}_min'] = None
+        estado[f'{sensor}_max'] = None
+    return estado
+
+
+def calcular_parciais(linhas):
+    """
+    Agrega em memória as linhas recém-ingeridas (dicionários de ingestao.py)
+    por (granularidade, lote, inicio). Linhas sem data_inicial são ignoradas,
+    como na agregação sobre as leituras brutas. Os registros saem ordenados
+    pela chave, para que ingestões simultâneas travem os intervalos sempre na
+    mesma sequência (sem deadlock entre lotes que se cruzam).
+    """
+    parciais = {}
+    for linha in linhas:
+        data = linha.get('data_inicial')
+        if data is None:
+            continue
+        lote = linha.get('lote') or ''
+        for granularidade in GRANULARIDADES:
+            chave = (granularidade, lote, truncar_data(data, granularidade))
+            estado = parciais.get(chave)
+            if estado is None:
+                estado = parciais[chave] = _acumulador()
+            estado['quantidade'] += 1
+            for sensor in SENSORES:
+                valor = linha.get(sensor)
+                if valor is None:
+                    continue
+                estado[f'{sensor}_n'] += 1
+                estado[f'{sensor}_soma'] += valor
+                estado[f'{sensor}_soma_q'] += valor * valor
+                minimo, maximo = estado[f'{sensor}_min'], estado[f'{sensor}_max']
+                estado[f'{sensor}_min'] = valor if minimo is None else min(minimo, valor)
+                estado[f'{sensor}_max'] = valor if maximo is None else max(maximo, valor)
+
+    registros = []
+    for (granularidade, lote, inicio), estado in sorted(parciais.items(), key=lambda item: item[0]):
+        estado.update(granularidade=granularidade, lote=lote, inicio=inicio)
+        registros.append(estado)
+    return registros
+
+
+def comando_upsert_rollups(dialeto):
+    """
+    INSERT ... ON CONFLICT DO UPDATE que soma os parciais de
+    calcular_parciais() nos rollups existentes (PostgreSQL e SQLite),
+    atômico por intervalo. None nos demais bancos.
+    """
+    tabela = LeituraRollup.__table__
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        menor, maior = func.least, func.greatest
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        menor, maior = func.min, func.max
+    else:
+        return None
+
+    comando = insert(tabela)
+    novo = comando.excluded
+    atualizar = {'quantidade': tabela.c.quantidade + novo.quantidade}
+    for sensor in SENSORES:
+        for sufixo in ('n', 'soma', 'soma_q'):
+            coluna = f'{sensor}_{sufixo}'
+            atualizar[coluna] = tabela.c[coluna] + novo[coluna]
+        for sufixo, funcao in (('min', menor), ('max', maior)):
+            coluna = f'{sensor}_{sufixo}'
+            # coalesce dos dois lados: NULL significa "sem valor" e não deve vencer
+            atualizar[coluna] = funcao(
+                func.coalesce(tabela.c[coluna], novo[coluna]),
+                func.coalesce(novo[coluna], tabela.c[coluna])
+            )
+
+    return comando.on_conflict_do_update(
+        index_elements=['granularidade', 'lote', 'inicio'], set_=atualizar
+    )
+
+
+def _upsert(registros):
+    comando = comando_upsert_rollups(db.engine.dialect.name)
+    if comando is None:
+        for registro in registros:
+            _mesclar_registro(registro)
+        return
+    db.session.execute(comando, registros)
+
+
+def _mesclar_registro(registro):
+    """Fallback genérico (SELECT + UPDATE/INSERT) para outros bancos"""
+    existente = db.session.execute(
+        select(LeituraRollup).where(
+            LeituraRollup.granularidade == registro['granularidade'],
+            LeituraRollup.lote == registro['lote'],
+            LeituraRollup.inicio == registro['inicio']
+        ).with_for_update()
+    ).scalar_one_or_none()
+    if existente is None:
+        db.session.add(LeituraRollup(**registro))
+        return
+    existente.quantidade += registro['quantidade']
+    for sensor in SENSORES:
+        for sufixo in ('n', 'soma', 'soma_q'):
+            coluna = f'{sensor}_{sufixo}'
+            setattr(existente, coluna, getattr(existente, coluna) + registro[coluna])
+        for sufixo, funcao in (('min', min), ('max', max)):
+            coluna = f'{sensor}_{sufixo}'
+            valores = [v for v in (getattr(existente, coluna), registro[coluna]) if v is not None]
+            setattr(existente, coluna, funcao(valores) if valores else None)
+
+
+def atualizar_rollups(linhas):
+    """
+    Incorpora leituras recém-inseridas aos rollups. Deve rodar na mesma
+    transação do INSERT das leituras (o chamador faz o commit).
+    """
+    registros = calcular_parciais(linhas)
+    if registros:
+        _upsert(registros)
+    return len(registros)
+
+
+def _filtro_lote(lote):
+    """Leituras do lote do rollup ('' agrupa as leituras sem lote)"""
+    if lote:
+        return Leitura.lote == lote
+    return or_(Leitura.lote.is_(None), Leitura.lote == '')
+
+
+def _agregar_intervalos(granularidade, filtros):
+    """
+    Agrega as leituras brutas por intervalo no formato das colunas de
+    LeituraRollup (usado na reconstrução e no recálculo de um intervalo).
+    """
+    expressao = expressao_truncamento(granularidade)
+    lote = func.coalesce(Leitura.lote, '')
+    colunas = [lote.label('lote'), expressao.label('inicio'), func.count().label('quantidade')]
+    for sensor in SENSORES:
+        coluna = getattr(Leitura, sensor)
+        colunas += [
+            func.count(coluna).label(f'{sensor}_n'),
+            func.coalesce(func.sum(coluna), 0.0).label(f'{sensor}_soma'),
+            func.coalesce(func.sum(coluna * coluna), 0.0).label(f'{sensor}_soma_q'),
+            func.min(coluna).label(f'{sensor}_min'),
+            func.max(coluna).label(f'{sensor}_max')
+        ]
+    consulta = select(*colunas).where(*filtros).group_by(lote, expressao)
+
+    registros = []
+    for linha in db.session.execute(consulta).mappings():
+        registro = dict(linha)
+        if isinstance(registro['inicio'], str):
+            registro['inicio'] = datetime.fromisoformat(registro['inicio'])
+        registro['granularidade'] = granularidade
+        registros.append(registro)
+    return registros
+
+
+def recalcular_intervalo(lote, data):
+    """
+    Recalcula, a partir das leituras brutas, os rollups (hora e dia) que
+    contêm `data` para o lote. Usado após atualizar ou apagar uma leitura.
+    """
+    if data is None:
+        return
+    lote = lote or ''
+    for granularidade in GRANULARIDADES:
+        inicio = truncar_data(data, granularidade)
+        db.session.execute(delete(LeituraRollup).where(
+            LeituraRollup.granularidade == granularidade,
+            LeituraRollup.lote == lote,
+            LeituraRollup.inicio == inicio
+        ))
+        filtros = [
+            _filtro_lote(lote),
+            Leitura.data_inicial >= inicio,
+            Leitura.data_inicial < inicio + DURACAO[granularidade]
+        ]
+        registros = _agregar_intervalos(granularidade, filtros)
+        if registros:
+            db.session.execute(LeituraRollup.__table__.insert(), registros)
+
+
+def reconstruir_rollups(lote=None):
+    """
+    Compactação completa: apaga e recria os rollups a partir das leituras
+    brutas (carga inicial, reparo ou bancos sem atualização incremental).
+    Retorna o número de intervalos gravados.
+    """
+    total = 0
+    for granularidade in GRANULARIDADES:
+        apagar = delete(LeituraRollup).where(LeituraRollup.granularidade == granularidade)
+        filtros = [Leitura.data_inicial.isnot(None)]
+        if lote is not None:
+            apagar = apagar.where(LeituraRollup.lote == lote)
+            filtros.append(_filtro_lote(lote))
+        db.session.execute(apagar)
+
+        registros = _agregar_intervalos(granularidade, filtros)
+        if registros:
+            db.session.execute(LeituraRollup.__table__.insert(), registros)
+        total += len(registros)
+    return total
+
+
+# ------------------------------------------------------------------ consultas
+
+def _consulta_rollups(granularidade, lote, inicio=None, fim=None):
+    """Soma os rollups por intervalo em [inicio, fim) (todos os lotes se lote for vazio)"""
+    colunas = [LeituraRollup.inicio, func.sum(LeituraRollup.quantidade).label('quantidade')]
+    for sensor in SENSORES:
+        colunas += [
+            func.sum(getattr(LeituraRollup, f'{sensor}_n')).label(f'{sensor}_n'),
+            func.sum(getattr(LeituraRollup, f'{sensor}_soma')).label(f'{sensor}_soma'),
+            func.sum(getattr(LeituraRollup, f'{sensor}_soma_q')).label(f'{sensor}_soma_q'),
+            func.min(getattr(LeituraRollup, f'{sensor}_min')).label(f'{sensor}_min'),
+            func.max(getattr(LeituraRollup, f'{sensor}_max')).label(f'{sensor}_max')
+        ]
+    filtros = [LeituraRollup.granularidade == granularidade]
+    if lote:
+        filtros.append(LeituraRollup.lote == lote)
+    if inicio is not None:
+        filtros.append(LeituraRollup.inicio >= inicio)
+    if fim is not None:
+        filtros.append(LeituraRollup.inicio < fim)
+    return select(*colunas).where(*filtros).group_by(LeituraRollup.inicio)
+
+
+def _somar_registro(destino, origem):
+    destino['quantidade'] += origem['quantidade']
+    for sensor in SENSORES:
+        for sufixo in ('n', 'soma', 'soma_q'):
+            destino[f'{sensor}_{sufixo}'] += origem[f'{sensor}_{sufixo}']
+        for sufixo, funcao in (('min', min), ('max', max)):
+            valores = [v for v in (destino[f'{sensor}_{sufixo}'], origem[f'{sensor}_{sufixo}'])
+                       if v is not None]
+            destino[f'{sensor}_{sufixo}'] = funcao(valores) if valores else None
+
+
+def _registros_periodo(granularidade, lote, data_inicio, data_fim):
+    """
+    Registros no formato de LeituraRollup, um por intervalo, cobrindo
+    [data_inicio, data_fim]. Os intervalos inteiramente dentro do período vêm
+    da tabela de rollups; os das pontas (parciais) são calculados sobre as
+    leituras brutas, o que limita o trabalho a no máximo dois intervalos.
+    """
+    duracao = DURACAO[granularidade]
+    inicio_completo = None
+    if data_inicio is not None:
+        inicio_completo = truncar_data(data_inicio, granularidade)
+        if inicio_completo < data_inicio:
+            inicio_completo += duracao
+    # data_fim é inclusivo: o intervalo que o contém é sempre tratado como parcial
+    fim_completo = truncar_data(data_fim, granularidade) if data_fim is not None else None
+
+    trechos_brutos = []
+    if inicio_completo is not None and fim_completo is not None and inicio_completo > fim_completo:
+        # Período menor que um intervalo: tudo direto das leituras brutas
+        trechos_brutos.append(_filtros(lote, data_inicio, data_fim))
+        registros = []
+    else:
+        consulta = _consulta_rollups(granularidade, lote, inicio_completo, fim_completo)
+        registros = [dict(l) for l in db.session.execute(consulta).mappings()]
+        if data_inicio is not None and inicio_completo > data_inicio:
+            trechos_brutos.append(_filtros(lote, data_inicio, None)
+                                  + [Leitura.data_inicial < inicio_completo])
+        if data_fim is not None:
+            trechos_brutos.append(_filtros(lote, fim_completo, data_fim))
+
+    por_inicio = {}
+    for registro in registros:
+        por_inicio[registro['inicio']] = registro
+    for filtros in trechos_brutos:
+        for registro in _agregar_intervalos(granularidade, filtros):
+            existente = por_inicio.get(registro['inicio'])
+            if existente is None:
+                por_inicio[registro['inicio']] = registro
+            else:
+                # Sem filtro de lote o SQL devolve um registro por lote
+                _somar_registro(existente, registro)
+    return [por_inicio[inicio] for inicio in sorted(por_inicio)]
+
+
+def _ponto_rollup(registro):
+    valores = []
+    for sensor in SENSORES:
+        n = registro[f'{sensor}_n']
+        media = registro[f'{sensor}_soma'] / n if n else None
+        valores.append((registro[f'{sensor}_min'], media, registro[f'{sensor}_max']))
+    return _ponto(registro['inicio'], registro['quantidade'], valores)
+
+
+def agregar_por_rollups(lote=None, granularidade='hora', data_inicio=None, data_fim=None):
+    """
+    Mesmo resultado de agregacao.agregar_leituras para hora/dia, lido da
+    tabela de rollups em vez de varrer as leituras do período.
+    """
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"granularidade deve ser uma de: {', '.join(GRANULARIDADES)}")
+    if expressao_truncamento(granularidade) is None:
+        return agregar_leituras(lote, granularidade, data_inicio, data_fim)[1]
+    return [_ponto_rollup(r) for r in _registros_periodo(granularidade, lote, data_inicio, data_fim)]
+
+
+def resumo_leituras(lote=None, data_inicio=None, data_fim=None):
+    """
+    Estatísticas do período (quantidade, média, desvio padrão populacional,
+    mínimo e máximo de cada sensor) a partir dos rollups diários.
+    """
+    total = _acumulador()
+    for registro in _registros_periodo('dia', lote, data_inicio, data_fim):
+        _somar_registro(total, registro)
+
+    resumo = {'quantidade': total['quantidade']}
+    for sensor in SENSORES:
+        n = total[f'{sensor}_n']
+        media = desvio = None
+        if n:
+            media = total[f'{sensor}_soma'] / n
+            variancia = total[f'{sensor}_soma_q'] / n - media * media
+            desvio = math.sqrt(max(variancia, 0.0))  # evita -0.0000001 por arredondamento
+        resumo[sensor] = {
+            'n': n,
+            'media': round(media, 3) if media is not None else None,
+            'desvio': round(desvio, 3) if desvio is not None else None,
+            'min': total[f'{sensor}_min'],
+            'max': total[f'{sensor}_max']
+        }
+    return resumo
@@ -0,0 +1,263 @@
+# senhas.py - Hash de senhas: verificação em pool de processos, rehash no login e admissão de logins
+
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# Parâmetros padrão do scrypt no werkzeug (n=2**15, r=8, p=1)
+PADRAO_SCRYPT = ('32768', '8', '1')
+
+
+def normalizar_metodo(metodo):
+    """
+    Forma completa do método do werkzeug, igual ao prefixo gravado no hash
+    ("pbkdf2" → "pbkdf2:sha256:600000"). Levanta ValueError se desconhecido.
+    """
+    partes = metodo.split(':')
+    if partes[0] == 'pbkdf2' and len(partes) <= 3:
+        algoritmo = partes[1] if len(partes) > 1 else 'sha256'
+        iteracoes = int(partes[2]) if len(partes) > 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{algoritmo}:{iteracoes}'
+    if partes[0] == 'scrypt' and len(partes) <= 4:
+        n, r, p = (partes[1:] + list(PADRAO_SCRYPT[len(partes) - 1:]))
+        return f'scrypt:{int(n)}:{int(r)}:{int(p)}'
+    raise ValueError(f"SENHA_METODO inválido: {metodo!r} (use pbkdf2[:algoritmo[:iterações]] "
+                     "ou scrypt[:n[:r[:p]]])")
+
+
+def metodo_do_hash(hash_senha):
+    return hash_senha.split('$', 1)[0]
+
+
+def verificar_e_atualizar(hash_senha, senha, metodo):
+    """
+    Executado nos processos do pool: (senha_correta, novo_hash). novo_hash
+    só é calculado quando a senha confere e o hash gravado usa outro fator
+    de trabalho; caso contrário é None.
+    """
+    if not check_password_hash(hash_senha, senha):
+        return False, None
+    if metodo_do_hash(hash_senha) == metodo:
+        return True, None
+    return True, generate_password_hash(senha, method=metodo)
+
+
+def processos_padrao():
+    """
+    Processos de verificação por worker: as CPUs divididas entre os workers
+    do gunicorn (GUNICORN_WORKERS, exportado pelo gunicorn.conf.py), para que
+    uma rajada de logins em todos os workers não passe de um PBKDF2 por CPU
+    """
+    workers = max(1, int(os.getenv('GUNICORN_WORKERS', '1')))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+class LoginRecusado(Exception):
+    """Login não admitido: limite de tentativas (429) ou verificações esgotadas (503)"""
+
+    def __init__(self, mensagem, status_code, retry_after, motivo):
+        super().__init__(mensagem)
+        self.mensagem = mensagem
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.motivo = motivo
+
+
+class LimiteTentativas:
+    """Janela deslizante por chave: no máximo `limite` eventos em `janela` segundos"""
+
+    def __init__(self, limite, janela):
+        self.limite = limite
+        self.janela = janela
+        self._eventos = {}  # chave → deque de instantes
+        self._lock = threading.Lock()
+
+    def _vigentes(self, chave, agora):
+        eventos = self._eventos.get(chave)
+        if eventos is None:
+            return None
+        while eventos and eventos[0] <= agora - self.janela:
+            eventos.popleft()
+        if not eventos:
+            del self._eventos[chave]
+            return None
+        return eventos
+
+    def espera(self, chave):
+        """Segundos até a chave voltar a ser admitida (0 se já é)"""
+        if self.limite <= 0:
+            return 0
+        agora = time.monotonic()
+        with self._lock:
+            eventos = self._vigentes(chave, agora)
+            if eventos is None or len(eventos) < self.limite:
+                return 0
+            return max(1, math.ceil(eventos[0] + self.janela - agora))
+
+    def registrar(self, chave):
+        if self.limite <= 0:
+            return
+        agora = time.monotonic()
+        with self._lock:
+            eventos = self._vigentes(chave, agora)
+            if eventos is None:
+                eventos = self._eventos[chave] = deque()
+            eventos.append(agora)
+            # Descarta o excedente: só os `limite` mais recentes decidem a espera
+            while len(eventos) > self.limite:
+                eventos.popleft()
+
+    def limpar(self):
+        with self._lock:
+            self._eventos.clear()
+
+
+class VerificadorSenhas:
+    """
+    Pipeline de login: admissão por IP/usuário, verificação do hash fora da
+    thread da requisição e rehash transparente para SENHA_METODO.
+
+    A verificação roda num ProcessPoolExecutor ("spawn", criado sob demanda
+    em cada worker do gunicorn) com SENHA_PROCESSOS processos (padrão: CPUs
+    divididas pelos workers, ver processos_padrao); com 0 roda na
+    própria thread. No máximo LOGIN_MAX_SIMULTANEOS verificações ficam em
+    andamento por worker: as demais esperam até LOGIN_ESPERA_MAXIMA segundos
+    e então recebem 503 com Retry-After aleatório, espalhando as novas
+    tentativas da frota em vez de ocupar o worker até o timeout.
+
+    Os limites por IP (todas as tentativas) e por usuário (só as falhas, já
+    que as placas compartilham credenciais) valem por processo, como o
+    cache de tokens: o limite efetivo do servidor é multiplicado pelo
+    número de workers.
+    """
+
+    def __init__(self, app=None):
+        self.metodo = normalizar_metodo('pbkdf2')
+        self.processos = processos_padrao()
+        self.max_simultaneos = 2 * self.processos
+        self.espera_maxima = 2.0
+        self.por_ip = LimiteTentativas(60, 60)
+        self.falhas_por_usuario = LimiteTentativas(10, 60)
+
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._vagas = threading.BoundedSemaphore(self.max_simultaneos)
+
+        self.verificacoes = 0
+        self.rehashes = 0
+        self.recusados = {'ip': 0, 'usuario': 0, 'sobrecarga': 0}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.metodo = normalizar_metodo(app.config.get('SENHA_METODO', self.metodo))
+        self.processos = app.config.get('SENHA_PROCESSOS', self.processos)
+        self.max_simultaneos = (app.config.get('LOGIN_MAX_SIMULTANEOS')
+                                or 2 * max(1, self.processos))
+        self.espera_maxima = app.config.get('LOGIN_ESPERA_MAXIMA', self.espera_maxima)
+        janela = app.config.get('LOGIN_JANELA', 60)
+        self.por_ip = LimiteTentativas(app.config.get('LOGIN_LIMITE_IP', 60), janela)
+        self.falhas_por_usuario = LimiteTentativas(app.config.get('LOGIN_LIMITE_FALHAS_USUARIO', 10), janela)
+        self._vagas = threading.BoundedSemaphore(self.max_simultaneos)
+        app.extensions['senhas'] = self
+
+    # ---------------------------------------------------------------- pool
+
+    def _garantir_pool(self):
+        """Cria o pool sob demanda, um por processo (o gunicorn faz fork após preload_app)"""
+        pid = os.getpid()
+        if self._pool is not None and self._pid == pid:
+            return self._pool
+        with self._lock:
+            if self._pool is None or self._pid != pid:
+                # Com "spawn" os processos só são criados quando há demanda
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processos,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pid = pid
+        return self._pool
+
+    def parar(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    # ------------------------------------------------------------- operações
+
+    def gerar_hash(self, senha):
+        return generate_password_hash(senha, method=self.metodo)
+
+    def admitir(self, ip, username):
+        """Levanta LoginRecusado (429) se o IP ou o usuário excedeu o limite da janela"""
+        espera = self.falhas_por_usuario.espera(username)
+        if espera:
+            self.recusados['usuario'] += 1
+            raise LoginRecusado('Muitas tentativas de login para este usuário. Tente novamente mais tarde.',
+                                429, espera, 'limite_usuario')
+        espera = self.por_ip.espera(ip)
+        if espera:
+            self.recusados['ip'] += 1
+            raise LoginRecusado('Muitas tentativas de login. Tente novamente mais tarde.',
+                                429, espera, 'limite_ip')
+        self.por_ip.registrar(ip)
+
+    def registrar_falha(self, username):
+        self.falhas_por_usuario.registrar(username)
+
+    def verificar(self, hash_senha, senha):
+        """
+        (senha_correta, novo_hash) — ver verificar_e_atualizar. Bloqueia a
+        thread chamadora, mas não a CPU do worker. Levanta LoginRecusado
+        (503) se nenhuma vaga abrir em LOGIN_ESPERA_MAXIMA segundos.
+        """
+        if not self._vagas.acquire(timeout=self.espera_maxima):
+            self.recusados['sobrecarga'] += 1
+            raise LoginRecusado('Servidor ocupado com outros logins. Tente novamente em instantes.',
+                                503, random.randint(1, 5), 'sobrecarga')
+        try:
+            self.verificacoes += 1
+            if self.processos > 0:
+                try:
+                    resultado = self._garantir_pool().submit(
+                        verificar_e_atualizar, hash_senha, senha, self.metodo).result()
+                except BrokenProcessPool:
+                    # Um processo do pool morreu: recria na próxima chamada e verifica aqui
+                    self.parar()
+                    resultado = verificar_e_atualizar(hash_senha, senha, self.metodo)
+            else:
+                resultado = verificar_e_atualizar(hash_senha, senha, self.metodo)
+        finally:
+            self._vagas.release()
+
+        if resultado[1] is not None:
+            self.rehashes += 1
+        return resultado
+
+    def limpar(self):
+        """Zera os limites de tentativas (testes)"""
+        self.por_ip.limpar()
+        self.falhas_por_usuario.limpar()
+
+    def estatisticas(self):
+        return {
+            'metodo': self.metodo,
+            'processos': self.processos,
+            'max_simultaneos': self.max_simultaneos,
+            'verificacoes': self.verificacoes,
+            'rehashes': self.rehashes,
+            'recusados': dict(self.recusados)
+        }
+
+
+verificador_senhas = VerificadorSenhas()
@@ -0,0 +1,5 @@
+"""
+Pacote de testes para Embryotech (V_Python)
+
+Este pacote contém os testes automatizados da aplicação.
+"""
@@ -0,0 +1,166 @@
+"""
+Fixtures e configurações compartilhadas para todos os testes
+"""
+import importlib
+import json
+import pytest
+import sys
+import os
+
+# Adicionar o diretório pai (Backend) ao path para importar os módulos
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from flask import Flask
+from extensions import db
+from cache import cache
+from senhas import verificador_senhas
+from versoes_tabelas import incrementar_versao
+from dispositivos import gerar_chave, indice_dispositivos
+from models import (
+    User, Parametro, Leitura, LeituraRollup, Log, RelatorioJob, VersaoTabela, Dispositivo, SequenciaIngestao
+)
+from datetime import datetime
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """
+    Aplicação Flask mínima para testar os módulos de suporte.
+    Usa SQLite em arquivo para que threads auxiliares (ex.: log_writer)
+    enxerguem o mesmo banco da thread de teste.
+    """
+    banco = tmp_path_factory.mktemp('db') / 'embryotech_test.db'
+
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{banco}',
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        TESTING=True,
+        SECRET_KEY='test-secret-key-123',
+        JWT_SECRET_KEY='test-jwt-secret-key-456',
+        LOG_ASYNC=False,
+        # Verificação de senha na própria thread: sem processos "spawn" nos testes
+        SENHA_PROCESSOS=0
+    )
+    db.init_app(flask_app)
+    verificador_senhas.init_app(flask_app)
+    indice_dispositivos.configurar(flask_app)
+
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture(scope='session')
+def app_completo(app):
+    """
+    A aplicação real (app.py), sobre o mesmo banco SQLite, para testar as
+    rotas. config.py lê o ambiente na importação; os singletons que app.py
+    reconfigura recebem os mesmos valores da aplicação mínima.
+    """
+    ambiente = {
+        'DATABASE_URL': app.config['SQLALCHEMY_DATABASE_URI'],
+        'SECRET_KEY': app.config['SECRET_KEY'],
+        'JWT_SECRET_KEY': app.config['JWT_SECRET_KEY'],
+        'LOG_ASYNC': 'False',
+        'SENHA_PROCESSOS': '0'
+    }
+    anteriores = {chave: os.environ.get(chave) for chave in ambiente}
+    os.environ.update(ambiente)
+    try:
+        aplicacao = importlib.import_module('app').app
+    finally:
+        for chave, valor in anteriores.items():
+            if valor is None:
+                os.environ.pop(chave, None)
+            else:
+                os.environ[chave] = valor
+    aplicacao.config['TESTING'] = True
+    return aplicacao
+
+
+@pytest.fixture(scope='function')
+def db_session(app):
+    """Sessão de banco de dados limpa para cada teste"""
+    with app.app_context():
+        db.session.query(Log).delete()
+        db.session.query(RelatorioJob).delete()
+        db.session.query(Leitura).delete()
+        db.session.query(LeituraRollup).delete()
+        db.session.query(Parametro).delete()
+        db.session.query(VersaoTabela).delete()
+        db.session.query(Dispositivo).delete()
+        db.session.query(SequenciaIngestao).delete()
+        db.session.query(User).delete()
+        db.session.commit()
+        cache.limpar()
+        verificador_senhas.limpar()
+        indice_dispositivos.limpar()
+
+        yield db.session
+
+        db.session.rollback()
+
+
+@pytest.fixture
+def usuario_comum(db_session):
+    """Cria um usuário comum para testes"""
+    user = User(
+        username='usuario_teste',
+        email='usuario@teste.com',
+        is_admin=False
+    )
+    user.set_password('senha123')
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def usuario_admin(db_session):
+    """Cria um usuário administrador para testes"""
+    admin = User(
+        username='admin_teste',
+        email='admin@teste.com',
+        is_admin=True
+    )
+    admin.set_password('admin123')
+    db_session.add(admin)
+    db_session.commit()
+    return admin
+
+
+@pytest.fixture
+def cadastrar_dispositivo(db_session):
+    """Cadastra dispositivos com chave de API; retorna (dispositivo, chave)"""
+    def cadastrar(nome='incubadora-01', lotes=('LOTE_A',), salas=(), ativo=True):
+        chave = gerar_chave()
+        dispositivo = Dispositivo(nome=nome, prefixo_chave=chave[:12],
+                                  chave_hash=indice_dispositivos.hash_chave(chave),
+                                  lotes=json.dumps(list(lotes)), salas=json.dumps(list(salas)), ativo=ativo)
+        db_session.add(dispositivo)
+        incrementar_versao('dispositivos')
+        db_session.commit()
+        indice_dispositivos.invalidar()
+        return dispositivo, chave
+    return cadastrar
+
+
+@pytest.fixture
+def multiplas_leituras(db_session):
+    """Cria múltiplas leituras para testes"""
+    leituras = [
+        Leitura(umidade=58.5, temperatura=37.2, pressao=1012.5, lote='LOTE001',
+                data_inicial=datetime(2024, 1, 1), data_final=datetime(2024, 1, 21)),
+        Leitura(umidade=60.0, temperatura=37.5, pressao=1013.0, lote='LOTE001',
+                data_inicial=datetime(2024, 2, 1), data_final=datetime(2024, 2, 21)),
+        Leitura(umidade=59.2, temperatura=37.4, pressao=1012.8, lote='LOTE002',
+                data_inicial=datetime(2024, 3, 1), data_final=datetime(2024, 3, 21))
+    ]
+    db_session.add_all(leituras)
+    db_session.commit()
+    return leituras
@@ -0,0 +1,76 @@
+"""
+Testes para a agregação de leituras por intervalo
+"""
+import pytest
+from datetime import datetime, timedelta
+from models import Leitura
+from agregacao import agregar_leituras, agregar_em_python, truncar_data, escolher_intervalo
+
+
+@pytest.fixture
+def leituras_30s(db_session):
+    """Duas horas de leituras a cada 30 s no lote AGR (240 leituras)"""
+    inicio = datetime(2024, 6, 1, 10, 0, 0)
+    leituras = [
+        Leitura(lote='AGR', temperatura=37.0 + (i % 2), umidade=60.0, pressao=None,
+                data_inicial=inicio + timedelta(seconds=30 * i))
+        for i in range(240)
+    ]
+    leituras.append(Leitura(lote='AGR', temperatura=99.0, data_inicial=None))
+    db_session.add_all(leituras)
+    db_session.commit()
+    return leituras
+
+
+@pytest.mark.unit
+class TestAgregacaoPython:
+
+    def test_truncar_data(self):
+        data = datetime(2024, 6, 1, 10, 37, 45, 123)
+        assert truncar_data(data, 'minuto') == datetime(2024, 6, 1, 10, 37)
+        assert truncar_data(data, 'hora') == datetime(2024, 6, 1, 10)
+        assert truncar_data(data, 'dia') == datetime(2024, 6, 1)
+
+    def test_agregar_em_python(self):
+        linhas = [
+            (datetime(2024, 1, 1, 10, 5), 37.0, 60.0, None),
+            (datetime(2024, 1, 1, 10, 50), 38.0, 62.0, None),
+            (datetime(2024, 1, 1, 11, 1), 36.0, None, 1010.0)
+        ]
+        pontos = agregar_em_python(linhas, 'hora')
+
+        assert len(pontos) == 2
+        assert pontos[0]['inicio'] == '2024-01-01T10:00:00'
+        assert pontos[0]['quantidade'] == 2
+        assert pontos[0]['temperatura'] == {'min': 37.0, 'media': 37.5, 'max': 38.0}
+        assert pontos[0]['pressao'] == {'min': None, 'media': None, 'max': None}
+        assert pontos[1]['pressao']['media'] == 1010.0
+
+
+@pytest.mark.integration
+class TestAgregacaoBanco:
+
+    def test_por_hora(self, app, db_session, leituras_30s):
+        intervalo, pontos = agregar_leituras('AGR', 'hora')
+        assert intervalo == 'hora'
+        assert [p['quantidade'] for p in pontos] == [120, 120]
+        assert pontos[0]['temperatura'] == {'min': 37.0, 'media': 37.5, 'max': 38.0}
+
+    def test_sql_igual_ao_python(self, app, db_session, leituras_30s):
+        _, pelo_banco = agregar_leituras('AGR', 'minuto')
+        linhas = [(l.data_inicial, l.temperatura, l.umidade, l.pressao)
+                  for l in sorted(leituras_30s[:-1], key=lambda l: l.data_inicial)]
+        assert pelo_banco == agregar_em_python(linhas, 'minuto')
+
+    def test_filtro_de_periodo(self, app, db_session, leituras_30s):
+        _, pontos = agregar_leituras('AGR', 'hora', data_inicio=datetime(2024, 6, 1, 11))
+        assert len(pontos) == 1
+
+    def test_auto(self, app, db_session, leituras_30s):
+        # 2 horas → 120 pontos por minuto, dentro do limite
+        assert escolher_intervalo('AGR') == 'minuto'
+        assert agregar_leituras('LOTE_VAZIO')[1] == []
+
+    def test_intervalo_invalido(self, app, db_session):
+        with pytest.raises(ValueError):
+            agregar_leituras('AGR', 'semana')
@@ -0,0 +1,122 @@
+"""
+Testes para as rotas do modo ASGI (login e leituras em asyncio)
+"""
+import json
+import pytest
+from starlette.testclient import TestClient
+
+from api_assincrona import criar_app_asgi
+from models import Leitura, LeituraRollup, Log
+
+
+@pytest.fixture
+def cliente(app, db_session):
+    with TestClient(criar_app_asgi(app)) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def token(cliente, usuario_comum):
+    resposta = cliente.post('/api/login', json={'username': 'usuario_teste', 'password': 'senha123'})
+    return resposta.json()['token']
+
+
+def leitura(lote='LOTE_ASGI', dia=1, **campos):
+    return dict({'temperatura': 37.5, 'umidade': 60.0, 'pressao': 1013.0, 'lote': lote,
+                 'data_inicial': f'2024-05-{dia:02d}T10:00:00', 'data_final': None}, **campos)
+
+
+@pytest.mark.integration
+@pytest.mark.auth
+class TestLoginAssincrono:
+
+    def test_login_valido(self, cliente, usuario_comum):
+        resposta = cliente.post('/api/login', json={'username': 'usuario_teste', 'password': 'senha123'})
+        assert resposta.status_code == 200
+        assert resposta.json()['user'] == {'id': usuario_comum.id, 'username': 'usuario_teste',
+                                           'is_admin': False}
+        assert resposta.headers['Access-Control-Allow-Origin'] == '*'
+
+    def test_credenciais_invalidas(self, cliente, usuario_comum, db_session):
+        assert cliente.post('/api/login', json={'username': 'usuario_teste', 'password': 'x'}).status_code == 401
+        assert cliente.post('/api/login', json={'username': 'usuario_teste'}).status_code == 400
+        acoes = [log.acao for log in db_session.query(Log).all()]
+        assert acoes == ['LOGIN_FALHOU', 'LOGIN_FALHOU']
+
+    def test_token_obrigatorio(self, cliente):
+        assert cliente.get('/api/leituras').json() == {'message': 'Token is missing!'}
+        resposta = cliente.get('/api/leituras', headers={'Authorization': 'Bearer invalido'})
+        assert resposta.status_code == 401
+
+
+@pytest.mark.integration
+class TestLeiturasAssincronas:
+
+    def test_criar_leituras(self, cliente, token, db_session):
+        resposta = cliente.post('/api/leituras', headers={'Authorization': f'Bearer {token}'},
+                                json=[leitura(dia=1), leitura(dia=2), {'temperatura': 'quente'}])
+        assert resposta.status_code == 201
+        assert resposta.json()['aceitas'] == 2
+        assert resposta.json()['erros'][0]['indice'] == 2
+
+        assert db_session.query(Leitura).filter_by(lote='LOTE_ASGI').count() == 2
+        # Rollups atualizados na mesma transação
+        dia = db_session.query(LeituraRollup).filter_by(lote='LOTE_ASGI', granularidade='dia').all()
+        assert sum(r.quantidade for r in dia) == 2
+        acoes = {log.acao for log in db_session.query(Log).all()}
+        assert {'CREATE_BATCH_LEITURAS', 'CRIAR_LEITURAS'} <= acoes
+
+    def test_limites_e_corpo_invalido(self, cliente, token, app, monkeypatch):
+        cabecalhos = {'Authorization': f'Bearer {token}'}
+        monkeypatch.setitem(app.config, 'INGESTAO_MAX_ITENS', 1)
+        assert cliente.post('/api/leituras', headers=cabecalhos,
+                            json=[leitura(), leitura()]).status_code == 413
+        assert cliente.post('/api/leituras', headers=cabecalhos, content='x').status_code == 400
+        resposta = cliente.post('/api/leituras', headers=dict(cabecalhos, **{'Content-Type': 'application/json'}),
+                                content='{')
+        assert resposta.status_code == 400
+
+    def test_listar_paginar_e_delta(self, cliente, token):
+        cabecalhos = {'Authorization': f'Bearer {token}'}
+        cliente.post('/api/leituras', headers=cabecalhos, json=[leitura(dia=d) for d in (1, 2, 3)])
+
+        todas = cliente.get('/api/leituras?lote=LOTE_ASGI', headers=cabecalhos).json()
+        assert [l['data_inicial'][:10] for l in todas] == ['2024-05-03', '2024-05-02', '2024-05-01']
+
+        pagina = cliente.get('/api/leituras?lote=LOTE_ASGI&limite=2', headers=cabecalhos).json()
+        assert len(pagina['itens']) == 2 and pagina['proximo_cursor']
+        resto = cliente.get(f"/api/leituras?lote=LOTE_ASGI&limite=2&cursor={pagina['proximo_cursor']}",
+                            headers=cabecalhos).json()
+        assert [l['id'] for l in resto['itens']] == [todas[2]['id']]
+
+        delta = cliente.get(f"/api/leituras?since_id={todas[1]['id']}", headers=cabecalhos).json()
+        assert delta['watermark'] == todas[0]['id'] and not delta['mais']
+        delta = cliente.get('/api/leituras', params={'lote': 'LOTE_ASGI', 'since': '2024-05-02T10:00:00',
+                                                     'limite': 1}, headers=cabecalhos).json()
+        assert delta['watermark'] == f"2024-05-03T10:00:00|{todas[0]['id']}" and not delta['mais']
+
+        stream = cliente.get('/api/leituras?lote=LOTE_ASGI&stream=true', headers=cabecalhos)
+        assert json.loads(stream.text) == todas
+
+    def test_etag_e_304(self, cliente, token):
+        cabecalhos = {'Authorization': f'Bearer {token}'}
+        cliente.post('/api/leituras', headers=cabecalhos, json=[leitura()])
+        primeira = cliente.get('/api/leituras?lote=LOTE_ASGI', headers=cabecalhos)
+        etag = primeira.headers['ETag']
+
+        assert cliente.get('/api/leituras?lote=LOTE_ASGI',
+                           headers=dict(cabecalhos, **{'If-None-Match': etag})).status_code == 304
+        assert cliente.get('/api/leituras?lote=LOTE_ASGI', headers=dict(
+            cabecalhos, **{'If-Modified-Since': primeira.headers['Last-Modified']})).status_code == 304
+        # Contador por lote: escrever em outro lote não muda o ETag deste
+        cliente.post('/api/leituras', headers=cabecalhos, json=[leitura(lote='OUTRO')])
+        assert cliente.get('/api/leituras?lote=LOTE_ASGI', headers=cabecalhos).headers['ETag'] == etag
+        cliente.post('/api/leituras', headers=cabecalhos, json=[leitura(dia=9)])
+        assert cliente.get('/api/leituras?lote=LOTE_ASGI',
+                           headers=dict(cabecalhos, **{'If-None-Match': etag})).status_code == 200
+
+    def test_demais_rotas_no_flask(self, cliente):
+        # O app Flask dos testes não tem rotas: o 404 vem dele
+        resposta = cliente.get('/api/empresas')
+        assert resposta.status_code == 404
+        assert 'text/html' in resposta.headers['content-type']
@@ -0,0 +1,112 @@
+"""
+Testes das rotas de leituras na aplicação real (app.py)
+"""
+import pytest
+
+from models import Leitura
+
+
+def leitura(minuto, lote='LOTE_A', **campos):
+    return dict({'temperatura': 37.5, 'umidade': 60.0, 'pressao': 1013.0, 'lote': lote,
+                 'data_inicial': f'2024-05-01T10:{minuto:02d}:00'}, **campos)
+
+
+@pytest.mark.integration
+class TestLeiturasApp:
+
+    @pytest.fixture
+    def cliente(self, app_completo, db_session):
+        return app_completo.test_client()
+
+    @pytest.fixture
+    def cabecalhos(self, cliente, usuario_admin):
+        resposta = cliente.post('/api/login', json={'username': 'admin_teste', 'password': 'admin123'})
+        return {'Authorization': f"Bearer {resposta.json['token']}"}
+
+    def quantidades(self, cliente, cabecalhos, lote):
+        agregado = cliente.get(f'/api/leituras/agregado?lote={lote}&intervalo=hora', headers=cabecalhos).json
+        resumo = cliente.get(f'/api/relatorio/leituras/resumo?lote={lote}', headers=cabecalhos).json
+        return [p['quantidade'] for p in agregado['pontos']], resumo['quantidade']
+
+    def test_mover_leitura_de_lote(self, cliente, cabecalhos, db_session):
+        resposta = cliente.post('/api/leituras', json=[leitura(15), leitura(20)], headers=cabecalhos)
+        assert resposta.status_code == 201
+        leitura_id = db_session.query(Leitura.id).filter_by(lote='LOTE_A').order_by(Leitura.id).first()[0]
+
+        resposta = cliente.put(f'/api/leituras/{leitura_id}', headers=cabecalhos,
+                               json={'lote': 'LOTE_B', 'data_inicial': '2024-05-03T08:30:00'})
+        assert resposta.status_code == 200
+
+        # Origem e destino recalculados, por hora e por dia
+        assert self.quantidades(cliente, cabecalhos, 'LOTE_A') == ([1], 1)
+        assert self.quantidades(cliente, cabecalhos, 'LOTE_B') == ([1], 1)
+        agregado = cliente.get('/api/leituras/agregado?lote=LOTE_B&intervalo=hora', headers=cabecalhos).json
+        assert agregado['pontos'][0]['inicio'].startswith('2024-05-03T08:00')
+
+    def test_atualizar_com_data_invalida(self, cliente, cabecalhos, db_session):
+        cliente.post('/api/leituras', json=[leitura(0)], headers=cabecalhos)
+        leitura_id = db_session.query(Leitura.id).scalar()
+        resposta = cliente.put(f'/api/leituras/{leitura_id}', json={'data_inicial': 'ontem'}, headers=cabecalhos)
+        assert resposta.status_code == 400
+
+    def test_mover_leitura_invalida_cache_da_origem(self, cliente, cabecalhos, app_completo, db_session,
+                                                   monkeypatch):
+        # Sem rollups o agregado vem das leituras brutas: só o cache pode ficar velho
+        monkeypatch.setitem(app_completo.config, 'ROLLUPS_HABILITADOS', False)
+        cliente.post('/api/leituras', json=[leitura(15), leitura(20)], headers=cabecalhos)
+        assert self.quantidades(cliente, cabecalhos, 'LOTE_A')[0] == [2]
+        assert self.quantidades(cliente, cabecalhos, 'LOTE_B')[0] == []
+
+        leitura_id = db_session.query(Leitura.id).order_by(Leitura.id).first()[0]
+        cliente.put(f'/api/leituras/{leitura_id}', json={'lote': 'LOTE_B'}, headers=cabecalhos)
+        assert self.quantidades(cliente, cabecalhos, 'LOTE_A')[0] == [1]
+        assert self.quantidades(cliente, cabecalhos, 'LOTE_B')[0] == [1]
+
+    def test_since_com_mesma_data(self, cliente, cabecalhos):
+        cliente.post('/api/leituras', json=[leitura(30, temperatura=37.0 + i / 10) for i in range(5)],
+                     headers=cabecalhos)
+        watermark, vistas, mais = '2024-05-01T10:00:00', [], True
+        while mais:
+            resposta = cliente.get('/api/leituras', query_string={'since': watermark, 'limite': 2},
+                                   headers=cabecalhos)
+            assert resposta.status_code == 200
+            watermark, mais = resposta.json['watermark'], resposta.json['mais']
+            vistas += [i['temperatura'] for i in resposta.json['itens']]
+        assert vistas == [37.0, 37.1, 37.2, 37.3, 37.4]
+        assert cliente.get('/api/leituras?since=ontem', headers=cabecalhos).status_code == 400
+
+    def test_etag_e_304(self, cliente, cabecalhos, app_completo, monkeypatch):
+        monkeypatch.setitem(app_completo.config, 'ROLLUPS_HABILITADOS', False)
+        cliente.post('/api/leituras', json=[leitura(0), leitura(1, lote='LOTE_B')], headers=cabecalhos)
+
+        resposta = cliente.get('/api/leituras?lote=LOTE_A', headers=cabecalhos)
+        etag, ultima_alteracao = resposta.headers['ETag'], resposta.headers['Last-Modified']
+        leitura_id = resposta.json[0]['id']
+        assert cliente.get('/api/leituras?lote=LOTE_A', headers=dict(cabecalhos, **{'If-None-Match': etag})
+                           ).status_code == 304
+        assert cliente.get('/api/leituras?lote=LOTE_A', headers=dict(
+            cabecalhos, **{'If-Modified-Since': ultima_alteracao})).status_code == 304
+        # Outros parâmetros, outro ETag
+        assert cliente.get('/api/leituras?lote=LOTE_A&limite=1', headers=cabecalhos).headers['ETag'] != etag
+
+        # Escritas em outro lote não mudam a versão deste, só a do conjunto
+        etag_todas = cliente.get('/api/leituras', headers=cabecalhos).headers['ETag']
+        cliente.post('/api/leituras', json=[leitura(2, lote='LOTE_B')], headers=cabecalhos)
+        assert cliente.get('/api/leituras?lote=LOTE_A', headers=cabecalhos).headers['ETag'] == etag
+        assert cliente.get('/api/leituras', headers=cabecalhos).headers['ETag'] != etag_todas
+
+        # Qualquer alteração conta, inclusive só de data_final
+        cliente.put(f'/api/leituras/{leitura_id}', json={'data_final': '2024-05-22T00:00:00'}, headers=cabecalhos)
+        resposta = cliente.get('/api/leituras?lote=LOTE_A', headers=dict(cabecalhos, **{'If-None-Match': etag}))
+        assert resposta.status_code == 200 and resposta.headers['ETag'] != etag
+        etag = resposta.headers['ETag']
+
+        cliente.delete(f'/api/leituras/{leitura_id}', headers=cabecalhos)
+        assert cliente.get('/api/leituras?lote=LOTE_A', headers=dict(cabecalhos, **{'If-None-Match': etag})
+                           ).json == []
+
+    def test_feed_desligado_no_perfil_sync(self, cliente, cabecalhos, app_completo, monkeypatch):
+        monkeypatch.setitem(app_completo.config, 'SSE_HABILITADO', False)
+        resposta = cliente.get('/api/leituras/stream?lote=LOTE_A', headers=cabecalhos)
+        assert resposta.status_code == 503
+        assert resposta.json['feed_desabilitado'] is True
@@ -0,0 +1,88 @@
+"""
+Testes para o cache de tokens JWT verificados
+"""
+import pytest
+from extensions import db
+from auth_cache import TokenCache, UsuarioAutenticado, token_cache, verificar_token, invalidar_usuario
+
+SECRET = 'test-jwt-secret-key-456'
+
+
+@pytest.fixture(autouse=True)
+def cache_limpo():
+    token_cache.limpar()
+    yield
+    token_cache.limpar()
+
+
+@pytest.mark.unit
+class TestTokenCache:
+
+    def test_lru_descarta_mais_antigo(self):
+        cache = TokenCache(tamanho_maximo=2, ttl=60)
+        for i in range(3):
+            cache.guardar(f't{i}', UsuarioAutenticado(i, f'u{i}', False), 60)
+        assert cache.obter('t0') is None
+        assert cache.obter('t2').id == 2
+
+    def test_expira_pelo_ttl(self):
+        cache = TokenCache(ttl=0)
+        cache.guardar('t', UsuarioAutenticado(1, 'u', False), 60)
+        assert cache.obter('t') is None
+
+    def test_invalidar_usuario(self):
+        cache = TokenCache()
+        cache.guardar('a', UsuarioAutenticado(1, 'u', False), 60)
+        cache.guardar('b', UsuarioAutenticado(1, 'u', False), 60)
+        cache.guardar('c', UsuarioAutenticado(2, 'v', False), 60)
+        cache.invalidar_usuario(1)
+        assert cache.obter('a') is None
+        assert cache.obter('b') is None
+        assert cache.obter('c') is not None
+
+
+@pytest.mark.auth
+class TestVerificarToken:
+
+    def test_segunda_verificacao_nao_consulta_banco(self, app, db_session, usuario_admin, monkeypatch):
+        token = usuario_admin.generate_auth_token(SECRET)
+        usuario = verificar_token(token, SECRET)
+        assert usuario == UsuarioAutenticado(usuario_admin.id, 'admin_teste', True)
+
+        def falhar(*args, **kwargs):
+            raise AssertionError('não deveria consultar o banco')
+        monkeypatch.setattr(db.session, 'get', falhar)
+
+        acertos = token_cache.estatisticas()['acertos']
+        assert verificar_token(token, SECRET).id == usuario_admin.id
+        assert token_cache.estatisticas()['acertos'] == acertos + 1
+
+    def test_token_novo_usa_principal_em_cache(self, app, db_session, usuario_admin, monkeypatch):
+        verificar_token(usuario_admin.generate_auth_token(SECRET), SECRET)
+
+        def falhar(*args, **kwargs):
+            raise AssertionError('não deveria consultar o banco')
+        monkeypatch.setattr(db.session, 'get', falhar)
+
+        # Outro token (ex.: novo login) do mesmo usuário
+        token = usuario_admin.generate_auth_token(SECRET, expires_in=7200)
+        assert verificar_token(token, SECRET) == UsuarioAutenticado(usuario_admin.id, 'admin_teste', True)
+
+    def test_invalidacao_reflete_alteracao_de_admin(self, app, db_session, usuario_admin):
+        token = usuario_admin.generate_auth_token(SECRET)
+        assert verificar_token(token, SECRET).is_admin is True
+
+        usuario_admin.is_admin = False
+        db_session.commit()
+        invalidar_usuario(usuario_admin.id)
+
+        assert verificar_token(token, SECRET).is_admin is False
+
+    def test_token_invalido(self, app, db_session, usuario_comum):
+        token = usuario_comum.generate_auth_token('outra-chave')
+        assert verificar_token(token, SECRET) is None
+        assert verificar_token('nao.e.jwt', SECRET) is None
+
+    def test_token_expirado(self, app, db_session, usuario_comum):
+        token = usuario_comum.generate_auth_token(SECRET, expires_in=-10)
+        assert verificar_token(token, SECRET) is None
@@ -0,0 +1,60 @@
+"""
+Testes para as opções do engine e o descarte de conexões após o fork
+"""
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+
+from banco import opcoes_engine, configurar_banco, descartar_conexoes_herdadas, criar_engine_direto
+from extensions import db
+
+
+@pytest.mark.unit
+class TestOpcoesEngine:
+
+    def test_pool_configuravel(self):
+        opcoes = opcoes_engine(pool_size=8, max_overflow=2, pool_timeout=5, pool_recycle=600,
+                               pre_ping=False)
+        assert opcoes == {'pool_size': 8, 'max_overflow': 2, 'pool_timeout': 5,
+                          'pool_recycle': 600, 'pool_pre_ping': False}
+
+    def test_statement_timeout_na_conexao(self):
+        opcoes = opcoes_engine(statement_timeout_ms=15000)
+        assert opcoes['connect_args'] == {'options': '-c statement_timeout=15000'}
+
+    def test_modo_pgbouncer_usa_nullpool(self):
+        assert opcoes_engine(pool_size=50, statement_timeout_ms=15000, pgbouncer=True) == {'poolclass': NullPool}
+
+
+@pytest.mark.integration
+class TestEngine:
+
+    @pytest.fixture
+    def app_banco(self, tmp_path):
+        flask_app = Flask('teste_banco')
+        flask_app.config.update(
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'banco.db'}",
+            SQLALCHEMY_ENGINE_OPTIONS=opcoes_engine(pool_size=2, max_overflow=0),
+            DB_URL_DIRETA=f"sqlite:///{tmp_path / 'direto.db'}"
+        )
+        db.init_app(flask_app)
+        configurar_banco(flask_app)
+        return flask_app
+
+    def test_descartar_conexoes_herdadas(self, app_banco):
+        with app_banco.app_context():
+            with db.engine.connect() as conexao:
+                conexao.execute(text('SELECT 1'))
+            pool = db.engine.pool
+            assert pool.checkedin() == 1
+
+            descartar_conexoes_herdadas()
+            # Pool novo: a conexão "herdada" não volta a ser usada
+            assert db.engine.pool is not pool
+            assert db.engine.pool.checkedin() == 0
+
+    def test_engine_direto_fora_do_pool(self, app_banco):
+        engine = criar_engine_direto(app_banco)
+        assert isinstance(engine.pool, NullPool)
+        assert str(engine.url).endswith('direto.db')
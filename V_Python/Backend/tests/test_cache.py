@@ -0,0 +1,111 @@
+"""
+Testes para o cache compartilhado (backends em memória e Redis)
+"""
+import pytest
+from cache import Cache, BackendMemoria, BackendRedis
+
+
+def _backend_redis():
+    fakeredis = pytest.importorskip('fakeredis')
+    return BackendRedis(prefixo='teste:', cliente=fakeredis.FakeRedis())
+
+
+@pytest.fixture(params=['memoria', 'redis'])
+def cache_teste(request):
+    backend = BackendMemoria() if request.param == 'memoria' else _backend_redis()
+    return Cache(backend=backend, ttl_padrao=60)
+
+
+class BackendQuebrado(BackendMemoria):
+    nome = 'quebrado'
+
+    def obter(self, chave):
+        raise ConnectionError('servidor fora do ar')
+
+    def guardar(self, chave, valor, ttl, tags):
+        raise ConnectionError('servidor fora do ar')
+
+
+@pytest.mark.unit
+class TestCache:
+
+    def test_get_set_delete(self, cache_teste):
+        assert cache_teste.get('lotes:a') is None
+        cache_teste.set('lotes:a', ['L1', 'L2'])
+        assert cache_teste.get('lotes:a') == ['L1', 'L2']
+        cache_teste.delete('lotes:a')
+        assert cache_teste.get('lotes:a', 'padrao') == 'padrao'
+
+    def test_guarda_none(self, cache_teste):
+        cache_teste.set('principal:1', None)
+        assert cache_teste.get('principal:1', 'padrao') is None
+
+    def test_invalidar_por_tag(self, cache_teste):
+        cache_teste.set('agregado:1', {'pontos': []}, tags=('leituras:L1',))
+        cache_teste.set('agregado:2', {'pontos': []}, tags=('leituras:L2',))
+        cache_teste.set('agregado:3', {'pontos': []}, tags=('leituras:*', 'leituras:L1'))
+
+        assert cache_teste.invalidar('leituras:L1') == 2
+        assert cache_teste.get('agregado:1') is None
+        assert cache_teste.get('agregado:3') is None
+        assert cache_teste.get('agregado:2') == {'pontos': []}
+
+    def test_obter_ou_calcular(self, cache_teste):
+        chamadas = []
+
+        def calcular():
+            chamadas.append(1)
+            return {'intervalo': 'hora'}
+
+        for _ in range(3):
+            assert cache_teste.obter_ou_calcular('agregado:x', calcular) == {'intervalo': 'hora'}
+        assert len(chamadas) == 1
+
+        estatisticas = cache_teste.estatisticas()
+        assert estatisticas['grupos']['agregado'] == {'acertos': 2, 'falhas': 1}
+        assert (estatisticas['acertos'], estatisticas['falhas']) == (2, 1)
+
+    def test_desabilitado_sempre_recalcula(self, cache_teste):
+        cache_teste.habilitado = False
+        cache_teste.set('lotes:a', ['L1'])
+        assert cache_teste.get('lotes:a') is None
+
+
+@pytest.mark.unit
+class TestBackendMemoria:
+
+    def test_lru_descarta_mais_antigo(self):
+        backend = BackendMemoria(tamanho_maximo=2)
+        for i in range(3):
+            backend.guardar(f'k{i}', i, None, ('t',))
+        assert backend.obter('k0') == (False, None)
+        assert backend.obter('k2') == (True, 2)
+        # O índice de tags não guarda chaves já descartadas
+        assert backend.invalidar_tags(['t']) == 2
+
+    def test_expira_pelo_ttl(self, monkeypatch):
+        import cache as modulo
+        agora = [1000.0]
+        monkeypatch.setattr(modulo.time, 'monotonic', lambda: agora[0])
+
+        backend = BackendMemoria()
+        backend.guardar('k', 'v', 10, ())
+        assert backend.obter('k') == (True, 'v')
+        agora[0] += 11
+        assert backend.obter('k') == (False, None)
+        assert backend.tamanho() == 0
+
+
+@pytest.mark.unit
+class TestFalhaDoBackend:
+
+    def test_erro_vira_falha_de_cache(self, capsys):
+        cache_teste = Cache(backend=BackendQuebrado())
+        assert cache_teste.obter_ou_calcular('lotes:a', lambda: ['L1']) == ['L1']
+        assert cache_teste.get('lotes:a') is None
+
+        estatisticas = cache_teste.estatisticas()
+        assert estatisticas['erros'] == 3
+        assert estatisticas['falhas'] == 2
+        # Avisa uma vez só enquanto o backend continuar falhando
+        assert capsys.readouterr().out.count('Erro no backend de cache') == 1
@@ -0,0 +1,156 @@
+"""
+Testes para a compressão HTTP (compressao.py): corpos gzip recebidos e respostas negociadas
+"""
+import gzip
+import json
+import zlib
+
+import pytest
+from flask import Flask, Response, jsonify, request
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from api_assincrona import criar_app_asgi
+from compressao import (
+    Compressao, CompressaoASGI, CorpoExcedido, compressivel, descomprimir, escolher_codificacao
+)
+from models import Leitura
+
+GRANDE = {'itens': ['leitura'] * 500}
+
+
+@pytest.mark.unit
+class TestNegociacao:
+
+    def test_escolher_codificacao(self):
+        disponiveis = ('br', 'gzip', 'deflate')
+        assert escolher_codificacao('gzip, deflate, br', disponiveis) == 'br'
+        assert escolher_codificacao('gzip;q=1, br;q=0.5', disponiveis) == 'gzip'
+        assert escolher_codificacao('*', ('gzip',)) == 'gzip'
+        assert escolher_codificacao('gzip;q=0, identity', ('gzip',)) is None
+        assert escolher_codificacao(None, ('gzip',)) is None
+
+    def test_compressivel(self):
+        assert compressivel('application/json') and compressivel('text/csv')
+        assert not compressivel('text/event-stream')
+        assert not compressivel('application/vnd.apache.parquet') and not compressivel('application/pdf')
+
+    def test_descomprimir_com_limite(self):
+        assert descomprimir(gzip.compress(b'abc'), 'gzip', 10) == b'abc'
+        assert descomprimir(zlib.compress(b'abc'), 'deflate', 10) == b'abc'
+        # "Bomba": 1 MB de zeros cabe em ~1 KB comprimido
+        with pytest.raises(CorpoExcedido):
+            descomprimir(gzip.compress(bytes(1024 * 1024)), 'gzip', 1000)
+        for invalido in (b'nao-e-gzip', gzip.compress(b'abc')[:-4]):
+            with pytest.raises(ValueError):
+                descomprimir(invalido, 'gzip', 10)
+
+
+@pytest.mark.unit
+class TestCompressaoFlask:
+
+    @pytest.fixture
+    def cliente(self):
+        app = Flask('compressao')
+        Compressao(app)
+
+        @app.route('/grande')
+        def grande():
+            resposta = jsonify(GRANDE)
+            resposta.set_etag('v1')
+            return resposta
+
+        @app.route('/pequena')
+        def pequena():
+            return jsonify({'ok': True})
+
+        @app.route('/stream')
+        def stream():
+            return Response((f'linha {i}\n' for i in range(3000)), mimetype='text/csv')
+
+        @app.route('/eco', methods=['POST'])
+        def eco():
+            return jsonify({'itens': len(request.get_json())})
+
+        return app.test_client()
+
+    def test_resposta_negociada(self, cliente):
+        resposta = cliente.get('/grande', headers={'Accept-Encoding': 'gzip'})
+        assert resposta.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in resposta.headers['Vary']
+        assert resposta.headers['ETag'] == 'W/"v1"'
+        assert json.loads(gzip.decompress(resposta.data)) == GRANDE
+
+        assert 'Content-Encoding' not in cliente.get('/grande').headers
+        # Abaixo de COMPRESSAO_MINIMO não compensa
+        assert 'Content-Encoding' not in cliente.get('/pequena', headers={'Accept-Encoding': 'gzip'}).headers
+
+    def test_stream_comprimido_em_blocos(self, cliente):
+        resposta = cliente.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+        assert resposta.headers['Content-Encoding'] == 'gzip'
+        blocos = list(resposta.response)
+        assert len(blocos) > 1
+        assert gzip.decompress(b''.join(blocos)) == ''.join(f'linha {i}\n' for i in range(3000)).encode()
+
+    def test_requisicao_gzip(self, cliente):
+        corpo = gzip.compress(json.dumps([{'lote': 'A'}] * 100).encode())
+        resposta = cliente.post('/eco', data=corpo, content_type='application/json',
+                                headers={'Content-Encoding': 'gzip'})
+        assert resposta.json == {'itens': 100}
+
+        assert cliente.post('/eco', data=corpo[:20], content_type='application/json',
+                            headers={'Content-Encoding': 'gzip'}).status_code == 400
+        assert cliente.post('/eco', data=corpo, content_type='application/json',
+                            headers={'Content-Encoding': 'compress'}).status_code == 415
+
+
+@pytest.mark.integration
+class TestCompressaoAsgi:
+
+    @pytest.fixture
+    def cliente(self, app, db_session):
+        with TestClient(criar_app_asgi(app)) as cliente:
+            yield cliente
+
+    @pytest.fixture
+    def cabecalhos(self, cliente, usuario_comum):
+        resposta = cliente.post('/api/login', json={'username': 'usuario_teste', 'password': 'senha123'})
+        return {'Authorization': f"Bearer {resposta.json()['token']}"}
+
+    def test_lote_gzip_e_listagem_comprimida(self, cliente, cabecalhos, db_session):
+        leituras = [{'temperatura': 37.5, 'umidade': 60.0, 'lote': 'LOTE_GZ',
+                     'data_inicial': f'2024-05-01T10:{i % 60:02d}:00'} for i in range(50)]
+        resposta = cliente.post('/api/leituras', content=gzip.compress(json.dumps(leituras).encode()),
+                                headers=dict(cabecalhos, **{'Content-Type': 'application/json',
+                                                            'Content-Encoding': 'gzip'}))
+        assert resposta.status_code == 201 and resposta.json()['aceitas'] == 50
+        assert db_session.query(Leitura).filter_by(lote='LOTE_GZ').count() == 50
+
+        resposta = cliente.get('/api/leituras?lote=LOTE_GZ', headers=dict(cabecalhos, **{'Accept-Encoding': 'gzip'}))
+        assert resposta.headers['Content-Encoding'] == 'gzip'
+        assert len(resposta.json()) == 50
+        etag = resposta.headers['ETag']
+        assert etag.startswith('W/')
+        assert cliente.get('/api/leituras?lote=LOTE_GZ',
+                           headers=dict(cabecalhos, **{'If-None-Match': etag})).status_code == 304
+
+    def test_stream_asgi_e_bomba(self):
+        async def blocos():
+            for i in range(100):
+                yield json.dumps({'i': i}).encode() * 20
+
+        aplicacao = Starlette(routes=[Route('/stream', lambda request: StreamingResponse(
+            blocos(), media_type='application/json'))])
+        compressao = Compressao()
+        compressao.max_descomprimido = 1000
+        with TestClient(CompressaoASGI(aplicacao, compressao)) as cliente:
+            resposta = cliente.get('/stream', headers={'Accept-Encoding': 'gzip'})
+            assert resposta.headers['Content-Encoding'] == 'gzip'
+            assert 'content-length' not in resposta.headers
+            assert resposta.content.startswith(b'{"i": 0}')
+
+            resposta = cliente.post('/stream', content=gzip.compress(bytes(100000)),
+                                    headers={'Content-Encoding': 'gzip'})
+            assert resposta.status_code == 413
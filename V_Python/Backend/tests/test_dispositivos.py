@@ -0,0 +1,103 @@
+"""
+Testes para as chaves de API dos dispositivos e o índice em memória
+"""
+import pytest
+from starlette.testclient import TestClient
+
+from api_assincrona import criar_app_asgi
+from dispositivos import gerar_chave, indice_dispositivos, validar_escopo
+from extensions import db
+from ingestao import validar_leituras
+from models import Leitura, Log, Parametro
+from versoes_tabelas import incrementar_versao
+
+
+def leitura(lote):
+    return {'temperatura': 37.5, 'umidade': 60.0, 'lote': lote, 'data_inicial': '2024-05-01T10:00:00'}
+
+
+@pytest.mark.unit
+class TestEscopo:
+
+    def test_validar_escopo(self):
+        assert validar_escopo(['B', 'A', 'A'], None) == (['A', 'B'], [])
+        assert validar_escopo(None, [3]) == ([], [3])
+        for lotes, salas in ((None, None), ('A', None), ([1], None), (None, ['3']), (None, [True])):
+            with pytest.raises(ValueError):
+                validar_escopo(lotes, salas)
+
+    def test_leituras_fora_do_escopo_rejeitadas(self):
+        linhas, rejeitadas = validar_leituras([leitura('A'), leitura('B'), leitura(None)],
+                                              frozenset({'A'}))
+        assert [l['lote'] for l in linhas] == ['A']
+        assert [r['indice'] for r in rejeitadas] == [1, 2]
+        assert 'escopo' in rejeitadas[0]['erro']
+
+
+@pytest.mark.integration
+@pytest.mark.auth
+class TestIndiceDispositivos:
+
+    def test_verificar_chave(self, app, db_session, cadastrar_dispositivo):
+        dispositivo, chave = cadastrar_dispositivo()
+        principal = indice_dispositivos.verificar(chave)
+        assert principal.dispositivo_id == dispositivo.id
+        assert principal.id is None and principal.is_admin is False
+        assert principal.lotes == frozenset({'LOTE_A'})
+
+        assert indice_dispositivos.verificar(gerar_chave()) is None
+        assert indice_dispositivos.verificar('sem-prefixo') is None
+        # Só o HMAC é guardado
+        assert chave not in dispositivo.chave_hash
+
+    def test_verificacao_nao_consulta_banco_no_intervalo(self, app, db_session, monkeypatch,
+                                                         cadastrar_dispositivo):
+        _, chave = cadastrar_dispositivo()
+        indice_dispositivos.verificar(chave)
+
+        def falhar(*args, **kwargs):
+            raise AssertionError('não deveria consultar o banco')
+        monkeypatch.setattr(db.session, 'execute', falhar)
+        assert indice_dispositivos.verificar(chave) is not None
+
+    def test_revogacao_e_lotes_das_salas(self, app, db_session, monkeypatch, cadastrar_dispositivo):
+        db_session.add(Parametro(empresa='E', lote='LOTE_SALA_3', temp_ideal=37.5, umid_ideal=60.0, id_sala=3))
+        incrementar_versao('parametros')
+        dispositivo, chave = cadastrar_dispositivo(lotes=(), salas=(3,))
+        assert indice_dispositivos.verificar(chave).lotes == frozenset({'LOTE_SALA_3'})
+
+        # Revogação feita em "outro worker": vale após o intervalo de conferência
+        dispositivo.ativo = False
+        incrementar_versao('dispositivos')
+        db_session.commit()
+        assert indice_dispositivos.verificar(chave) is not None
+        monkeypatch.setattr(indice_dispositivos, 'intervalo_verificacao', 0)
+        assert indice_dispositivos.verificar(chave) is None
+
+
+@pytest.mark.integration
+class TestIngestaoPorChave:
+
+    @pytest.fixture
+    def cliente(self, app, db_session):
+        with TestClient(criar_app_asgi(app)) as cliente:
+            yield cliente
+
+    def test_post_com_chave(self, cliente, db_session, cadastrar_dispositivo):
+        _, chave = cadastrar_dispositivo()
+        resposta = cliente.post('/api/leituras', headers={'X-API-Key': chave},
+                                json=[leitura('LOTE_A'), leitura('LOTE_B')])
+        assert resposta.status_code == 201
+        assert resposta.json()['aceitas'] == 1
+        assert resposta.json()['erros'][0]['indice'] == 1
+        assert db_session.query(Leitura).filter_by(lote='LOTE_A').count() == 1
+
+        log = db_session.query(Log).filter_by(acao='CRIAR_LEITURAS').one()
+        assert (log.usuario_id, log.usuario_nome) == (None, 'dispositivo:incubadora-01')
+
+    def test_chave_invalida_ou_fora_da_ingestao(self, cliente, db_session, cadastrar_dispositivo):
+        _, chave = cadastrar_dispositivo()
+        assert cliente.post('/api/leituras', headers={'X-API-Key': 'emb_x'},
+                            json=leitura('LOTE_A')).status_code == 401
+        # A chave só vale para POST /api/leituras
+        assert cliente.get('/api/leituras', headers={'X-API-Key': chave}).status_code == 401
@@ -0,0 +1,100 @@
+"""
+Testes para o pub/sub de novas leituras (feed SSE)
+"""
+import asyncio
+import json
+import threading
+import pytest
+from datetime import datetime, timedelta
+from eventos_leituras import (
+    PublicadorLeituras, montar_eventos, stream_sse, stream_sse_assincrono, TAMANHO_MAXIMO_PAYLOAD
+)
+
+
+def linhas(lote, quantidade, inicio=datetime(2024, 7, 1)):
+    return [{'lote': lote, 'temperatura': 37.0, 'umidade': 60.0, 'pressao': 1013.0,
+             'data_inicial': inicio + timedelta(seconds=i), 'data_final': None}
+            for i in range(quantidade)]
+
+
+@pytest.fixture
+def publicador(app):
+    publicador = PublicadorLeituras()
+    publicador.init_app(app)
+    publicador.tamanho_fila = 3
+    publicador.maximo_conexoes = 2
+    return publicador
+
+
+@pytest.mark.unit
+class TestMontarEventos:
+
+    def test_agrupa_por_lote_e_limita(self):
+        eventos = {e['lote']: e for e in montar_eventos(linhas('A', 80) + linhas('B', 2), 50)}
+        assert eventos['A']['omitidas'] == 30
+        assert len(eventos['A']['leituras']) == 50
+        # As mais recentes são mantidas, em ordem cronológica
+        assert eventos['A']['leituras'][-1]['data_inicial'] == '2024-07-01T00:01:19'
+        assert eventos['B'] == {'lote': 'B', 'leituras': eventos['B']['leituras'], 'omitidas': 0}
+
+    def test_respeita_limite_do_notify(self):
+        evento, = montar_eventos(linhas('L' * 90, 500), 500)
+        assert len(json.dumps(evento)) <= TAMANHO_MAXIMO_PAYLOAD
+        assert evento['omitidas'] + len(evento['leituras']) == 500
+
+
+@pytest.mark.integration
+class TestPublicador:
+
+    def test_fan_out_com_filtro_de_lote(self, app, publicador):
+        with publicador.assinar('A') as so_a, publicador.assinar() as todos:
+            publicador.publicar(linhas('A', 1) + linhas('B', 1))
+
+            assert so_a.proximo(0.1)['lote'] == 'A'
+            assert so_a.proximo(0.01) is None
+            assert {todos.proximo(0.1)['lote'], todos.proximo(0.1)['lote']} == {'A', 'B'}
+        assert publicador.conexoes() == 0
+
+    def test_limite_de_conexoes(self, app, publicador):
+        with publicador.assinar(), publicador.assinar():
+            assert publicador.assinar() is None
+
+    def test_cliente_lento_perde_eventos(self, app, publicador):
+        with publicador.assinar() as assinatura:
+            for i in range(5):
+                publicador.publicar(linhas(f'L{i}', 1))
+            assert assinatura.fila.qsize() == 3
+            assert assinatura.perdidos == 2
+
+    def test_stream_sse(self, app, publicador):
+        assinatura = publicador.assinar('A')
+        publicador.publicar(linhas('A', 2))
+        corpo = stream_sse(assinatura, duracao_maxima=0.3, intervalo_ping=0.1)
+
+        assert next(corpo) == 'retry: 3000\n\n'
+        evento = next(corpo)
+        assert evento.startswith('event: leituras\ndata: ')
+        assert len(json.loads(evento.split('data: ', 1)[1])['leituras']) == 2
+        restantes = list(corpo)
+        assert restantes and all(parte == ': ping\n\n' for parte in restantes)
+        assert publicador.conexoes() == 0
+
+    def test_stream_sse_assincrono(self, app, publicador):
+        async def consumir():
+            assinatura = publicador.assinar('A', assincrona=True)
+            # Entrega feita por outra thread, como a thread LISTEN
+            def publicar():
+                with app.app_context():
+                    publicador.publicar(linhas('A', 1) + linhas('B', 1))
+
+            thread = threading.Thread(target=publicar)
+            thread.start()
+            thread.join()
+            return [parte async for parte in stream_sse_assincrono(assinatura, duracao_maxima=0.3,
+                                                                   intervalo_ping=0.1)]
+
+        partes = asyncio.run(consumir())
+        assert partes[0] == 'retry: 3000\n\n'
+        assert json.loads(partes[1].split('data: ', 1)[1])['lote'] == 'A'
+        assert partes[2:] and all(parte == ': ping\n\n' for parte in partes[2:])
+        assert publicador.conexoes() == 0
@@ -0,0 +1,82 @@
+"""
+Testes para a exportação de leituras em CSV e Parquet/Arrow
+"""
+import csv
+import io
+import json
+import pytest
+from datetime import datetime, timedelta
+from models import Leitura
+from leituras_utils import filtros_relatorio, serializar_leitura
+from exportacao import consulta_exportacao, stream_leituras_csv, exportar_leituras_colunar, NOMES_COLUNAS
+
+
+@pytest.fixture
+def leituras_exportacao(db_session):
+    inicio = datetime(2024, 5, 1)
+    leituras = [
+        Leitura(lote='EXP' if i % 2 else 'OUTRO', temperatura=37.0 + (i % 10) / 10,
+                umidade=60.0, pressao=None if i % 7 == 0 else 1013.25,
+                data_inicial=inicio + timedelta(minutes=i), data_final=None)
+        for i in range(5000)
+    ]
+    db_session.add_all(leituras)
+    db_session.commit()
+    return leituras
+
+
+@pytest.mark.integration
+class TestExportacaoCsv:
+
+    def test_stream_csv(self, app, db_session, leituras_exportacao):
+        consulta = consulta_exportacao(filtros_relatorio('EXP', None, '2024-05-02'))
+        blocos = list(stream_leituras_csv(consulta))
+        assert len(blocos) > 1  # cabeçalho + partições
+
+        linhas = list(csv.reader(io.StringIO(''.join(blocos))))
+        assert linhas[0] == NOMES_COLUNAS
+        esperadas = [l for l in leituras_exportacao
+                     if l.lote == 'EXP' and l.data_inicial <= datetime(2024, 5, 2, 23, 59, 59)]
+        assert len(linhas) - 1 == len(esperadas)
+
+        primeira = dict(zip(linhas[0], linhas[1]))
+        assert primeira['data_inicial'] == esperadas[0].data_inicial.isoformat()
+        assert primeira['data_final'] == ''
+        assert float(primeira['temperatura']) == esperadas[0].temperatura
+
+
+@pytest.mark.integration
+class TestExportacaoColunar:
+
+    @pytest.mark.parametrize('formato', ['parquet', 'arrow'])
+    def test_ida_e_volta(self, app, db_session, leituras_exportacao, formato):
+        pa = pytest.importorskip('pyarrow')
+        consulta = consulta_exportacao(filtros_relatorio('EXP'))
+
+        with exportar_leituras_colunar(consulta, formato) as arquivo:
+            if formato == 'parquet':
+                import pyarrow.parquet as pq
+                tabela = pq.read_table(arquivo)
+            else:
+                tabela = pa.ipc.open_file(arquivo).read_all()
+
+        assert tabela.column_names == NOMES_COLUNAS
+        assert tabela.num_rows == 2500
+        assert tabela.column('lote').unique().to_pylist() == ['EXP']
+        assert tabela.column('pressao').null_count == sum(
+            1 for l in leituras_exportacao if l.lote == 'EXP' and l.pressao is None)
+        assert tabela.column('data_inicial')[0].as_py() == datetime(2024, 5, 1, 0, 1)
+
+    def test_parquet_menor_que_json(self, app, db_session, leituras_exportacao):
+        pytest.importorskip('pyarrow')
+        consulta = consulta_exportacao([])
+        with exportar_leituras_colunar(consulta, 'parquet') as arquivo:
+            tamanho_parquet = len(arquivo.read())
+
+        tamanho_json = len(json.dumps([serializar_leitura(l) for l in leituras_exportacao]))
+        assert tamanho_parquet * 10 < tamanho_json
+
+    def test_formato_invalido(self, app, db_session):
+        pytest.importorskip('pyarrow')
+        with pytest.raises(ValueError):
+            exportar_leituras_colunar(consulta_exportacao([]), 'xlsx')
@@ -0,0 +1,93 @@
+"""
+Testes para os perfis do gunicorn.conf.py
+"""
+import os
+import runpy
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONF = os.path.join(BACKEND, 'gunicorn.conf.py')
+
+
+def carregar(monkeypatch, cpus=4, **ambiente):
+    # O arquivo exporta variáveis para a aplicação: o ambiente é uma cópia
+    # descartada ao fim do teste
+    monkeypatch.setattr(os, 'environ', dict(os.environ))
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', '/tmp/embryotech_metricas_teste')
+    for variavel in ('GUNICORN_PERFIL', 'GUNICORN_WORKERS', 'GUNICORN_THREADS', 'GUNICORN_MAX_WORKERS',
+                     'GUNICORN_TIMEOUT', 'SSE_HABILITADO', 'SSE_DURACAO_MAXIMA'):
+        monkeypatch.delenv(variavel, raising=False)
+    for variavel, valor in ambiente.items():
+        monkeypatch.setenv(variavel, valor)
+    monkeypatch.setattr('multiprocessing.cpu_count', lambda: cpus)
+    return runpy.run_path(CONF)
+
+
+@pytest.mark.unit
+class TestPerfisGunicorn:
+
+    def test_sync_padrao_limitado_pelo_teto(self, monkeypatch):
+        conf = carregar(monkeypatch, cpus=2)
+        assert (conf['worker_class'], conf['workers'], conf['wsgi_app']) == ('sync', 5, 'app:app')
+        assert carregar(monkeypatch, cpus=16)['workers'] == 8
+        assert conf['preload_app'] is True
+
+    def test_gthread_e_gevent(self, monkeypatch):
+        conf = carregar(monkeypatch, cpus=4, GUNICORN_PERFIL='gthread')
+        assert (conf['workers'], conf['threads']) == (5, 4)
+
+        conf = carregar(monkeypatch, cpus=4, GUNICORN_PERFIL='gevent')
+        assert (conf['worker_class'], conf['workers']) == ('gevent', 4)
+        # A aplicação é importada depois do monkey patch do gevent
+        assert conf['preload_app'] is False
+
+    def test_asgi_usa_uvicorn(self, monkeypatch):
+        conf = carregar(monkeypatch, GUNICORN_PERFIL='asgi')
+        assert conf['worker_class'] == 'uvicorn.workers.UvicornWorker'
+        assert conf['wsgi_app'] == 'asgi:application'
+
+    def test_variaveis_substituem_calculo(self, monkeypatch):
+        conf = carregar(monkeypatch, GUNICORN_PERFIL='gthread', GUNICORN_WORKERS='3', GUNICORN_THREADS='16')
+        assert (conf['workers'], conf['threads']) == (3, 16)
+
+    def test_perfil_invalido(self, monkeypatch):
+        with pytest.raises(ValueError):
+            carregar(monkeypatch, GUNICORN_PERFIL='eventlet')
+
+
+def carregar_config(monkeypatch):
+    """Config como a aplicação a veria depois do gunicorn.conf.py"""
+    monkeypatch.setenv('DATABASE_URL', 'sqlite://')
+    return runpy.run_path(os.path.join(BACKEND, 'config.py'))['Config']
+
+
+@pytest.mark.unit
+class TestConfigPorPerfil:
+
+    def test_sync_desliga_feed(self, monkeypatch):
+        carregar(monkeypatch)
+        assert carregar_config(monkeypatch).SSE_HABILITADO is False
+
+    @pytest.mark.parametrize('perfil', ['gthread', 'gevent', 'asgi'])
+    def test_perfis_concorrentes_servem_feed(self, monkeypatch, perfil):
+        carregar(monkeypatch, GUNICORN_PERFIL=perfil.upper())
+        assert os.environ['GUNICORN_PERFIL'] == perfil
+        assert carregar_config(monkeypatch).SSE_HABILITADO is True
+
+    def test_duracao_abaixo_do_timeout(self, monkeypatch):
+        carregar(monkeypatch, GUNICORN_PERFIL='gthread', GUNICORN_TIMEOUT='60')
+        assert carregar_config(monkeypatch).SSE_DURACAO_MAXIMA == 50
+
+        carregar(monkeypatch, GUNICORN_PERFIL='gthread', SSE_DURACAO_MAXIMA='30')
+        assert carregar_config(monkeypatch).SSE_DURACAO_MAXIMA == 30
+
+    def test_processos_de_senha_divididos_entre_workers(self, monkeypatch):
+        # 16 CPUs, sync: 8 workers (teto) com 2 processos de verificação cada
+        monkeypatch.setattr('os.cpu_count', lambda: 16)
+        monkeypatch.delenv('SENHA_PROCESSOS', raising=False)
+        carregar(monkeypatch, cpus=16)
+        assert os.environ['GUNICORN_WORKERS'] == '8'
+        assert carregar_config(monkeypatch).SENHA_PROCESSOS == 2
+
+        carregar(monkeypatch, cpus=16, GUNICORN_PERFIL='gevent', GUNICORN_MAX_WORKERS='16')
+        assert carregar_config(monkeypatch).SENHA_PROCESSOS == 1
@@ -0,0 +1,116 @@
+"""
+Testes para o reenvio idempotente de lotes (idempotencia.py)
+"""
+import pytest
+from starlette.testclient import TestClient
+
+from api_assincrona import criar_app_asgi
+from idempotencia import filtrar_lote, incorporar, origem_requisicao, repetidas
+from ingestao_binaria import TIPO_CONTEUDO, codificar_leituras
+from ingestao import validar_leituras
+from models import Leitura, SequenciaIngestao
+
+
+def leitura(minuto, lote='LOTE_SEQ', **campos):
+    return dict({'temperatura': 37.5, 'umidade': 60.0, 'lote': lote,
+                 'data_inicial': f'2024-05-01T10:{minuto:02d}:00'}, **campos)
+
+
+class Usuario:
+    id = 7
+
+
+@pytest.mark.unit
+class TestFaixas:
+
+    def test_origem_requisicao(self):
+        assert origem_requisicao({}, Usuario()) is None
+        assert origem_requisicao({'X-Sequencia': '10', 'X-Dispositivo': 'placa-1'}, Usuario()) == \
+            ('usuario:7:placa-1', 10)
+        for cabecalhos in ({'X-Sequencia': 'dez', 'X-Dispositivo': 'p'}, {'X-Sequencia': '-1', 'X-Dispositivo': 'p'},
+                           {'X-Sequencia': '1'}):
+            with pytest.raises(ValueError):
+                origem_requisicao(cabecalhos, Usuario())
+
+    def test_incorporar(self):
+        assert incorporar([], 10, 19, 64) == [[10, 19]]
+        # Adjacentes e sobrepostas viram uma faixa só
+        assert incorporar([[0, 9], [20, 29]], 10, 19, 64) == [[0, 29]]
+        assert incorporar([[0, 9]], 5, 14, 64) == [[0, 14]]
+        assert incorporar([[20, 29]], 0, 9, 64) == [[0, 9], [20, 29]]
+        # Acima do máximo, a lacuna mais antiga é dada como recebida
+        assert incorporar([[0, 9], [20, 29]], 40, 49, 2) == [[0, 29], [40, 49]]
+
+    def test_filtrar_lote(self):
+        assert list(repetidas([[0, 4], [8, 8]], 3, 7)) == [1, 1, 0, 0, 0, 1, 0]
+        linhas, rejeitadas = validar_leituras([leitura(i) for i in range(3)] + [{'temperatura': 'x'}]
+                                              + [leitura(4)])
+        novas, invalidas, faixas, resumo, duplicadas = filtrar_lote([[0, 101]], 100, 5, linhas, rejeitadas, 64)
+        # 100 e 101 já recebidas; 103 inválida
+        assert [l['data_inicial'].minute for l in novas] == [2, 4]
+        assert [r['indice'] for r in invalidas] == [3]
+        # No reenvio a inválida também é duplicada e não é informada de novo
+        assert filtrar_lote(faixas, 100, 5, linhas, rejeitadas, 64)[:2] == ([], [])
+        assert duplicadas == 2
+        assert faixas == [[0, 104]]
+        assert resumo == {'recebidas': [[100, 104]], 'duplicadas': [[100, 101]], 'faixas': [[0, 104]]}
+
+
+@pytest.mark.integration
+class TestReenvio:
+
+    @pytest.fixture
+    def cliente(self, app, db_session):
+        with TestClient(criar_app_asgi(app)) as cliente:
+            yield cliente
+
+    @pytest.fixture
+    def cabecalhos(self, cliente, usuario_comum):
+        resposta = cliente.post('/api/login', json={'username': 'usuario_teste', 'password': 'senha123'})
+        return {'Authorization': f"Bearer {resposta.json()['token']}", 'X-Dispositivo': 'placa-01'}
+
+    def test_reenvio_nao_duplica(self, cliente, cabecalhos, usuario_comum, db_session):
+        lote = [leitura(i) for i in range(10)]
+        resposta = cliente.post('/api/leituras', json=lote, headers=dict(cabecalhos, **{'X-Sequencia': '0'}))
+        assert resposta.status_code == 201
+        assert resposta.json()['sequencias']['faixas'] == [[0, 9]]
+
+        # Reenvio após timeout, agora com lotes de tamanhos diferentes
+        resposta = cliente.post('/api/leituras', json=lote, headers=dict(cabecalhos, **{'X-Sequencia': '0'}))
+        assert resposta.status_code == 200
+        assert resposta.json()['duplicadas'] == 10
+        resposta = cliente.post('/api/leituras', json=lote[5:] + [leitura(10), leitura(11)],
+                                headers=dict(cabecalhos, **{'X-Sequencia': '5'}))
+        assert resposta.status_code == 201
+        assert (resposta.json()['aceitas'], resposta.json()['duplicadas']) == (2, 5)
+        assert resposta.json()['sequencias']['duplicadas'] == [[5, 9]]
+
+        assert db_session.query(Leitura).filter_by(lote='LOTE_SEQ').count() == 12
+        assert db_session.get(SequenciaIngestao, f'usuario:{usuario_comum.id}:placa-01').faixas == '[[0,11]]'
+
+        # Outra placa com as mesmas sequências é outra origem
+        resposta = cliente.post('/api/leituras', json=lote[:2],
+                                headers=dict(cabecalhos, **{'X-Sequencia': '0', 'X-Dispositivo': 'placa-02'}))
+        assert resposta.json()['aceitas'] == 2
+
+    def test_fora_de_ordem_e_binario_com_chave(self, cliente, db_session, cadastrar_dispositivo):
+        _, chave = cadastrar_dispositivo(lotes=('LOTE_SEQ',))
+        linhas = validar_leituras([leitura(i) for i in range(6)])[0]
+        cabecalhos = {'X-API-Key': chave, 'Content-Type': TIPO_CONTEUDO}
+
+        # Segunda metade do backlog chega antes da primeira
+        faixas = []
+        for inicio in (1003, 1000, 1003):
+            resposta = cliente.post('/api/leituras', content=codificar_leituras(linhas[inicio - 1000:][:3]),
+                                    headers=dict(cabecalhos, **{'X-Sequencia': str(inicio)}))
+            assert resposta.status_code in (200, 201)
+            faixas.append(resposta.json()['sequencias']['faixas'])
+        assert faixas == [[[1003, 1005]], [[1000, 1005]], [[1000, 1005]]]
+        assert db_session.query(Leitura).filter_by(lote='LOTE_SEQ').count() == 6
+
+    def test_cabecalhos_invalidos(self, cliente, cabecalhos):
+        sem_dispositivo = {'Authorization': cabecalhos['Authorization'], 'X-Sequencia': '1'}
+        assert cliente.post('/api/leituras', json=[leitura(0)], headers=sem_dispositivo).status_code == 400
+        assert cliente.post('/api/leituras', json=[leitura(0)],
+                            headers=dict(cabecalhos, **{'X-Sequencia': 'x'})).status_code == 400
+
@@ -0,0 +1,81 @@
+"""
+Testes para a ingestão em lote de leituras
+"""
+import pytest
+from datetime import datetime
+from models import Leitura
+from ingestao import converter_data, validar_leituras, inserir_leituras, _valor_copy
+
+
+@pytest.mark.unit
+class TestValidacao:
+    """Validação das leituras recebidas"""
+
+    def test_converter_data_formatos(self):
+        assert converter_data('2024-01-01T10:00:00') == datetime(2024, 1, 1, 10, 0, 0)
+        assert converter_data('2024-01-01 10:00:00') == datetime(2024, 1, 1, 10, 0, 0)
+        assert converter_data('2024-01-01T13:00:00Z') == datetime(2024, 1, 1, 13, 0, 0)
+        assert converter_data('2024-01-01T10:00:00-03:00') == datetime(2024, 1, 1, 13, 0, 0)
+        assert converter_data('') is None
+        assert converter_data(None) is None
+
+    def test_converter_data_invalida(self):
+        with pytest.raises(ValueError):
+            converter_data('01/01/2024')
+        with pytest.raises(ValueError):
+            converter_data(12345)
+        # Fuso que leva a data para antes de datetime.min em UTC
+        with pytest.raises(ValueError):
+            converter_data('0001-01-01T00:00:00+05:00')
+
+    def test_validar_numeros_fora_do_intervalo(self):
+        validas, rejeitadas = validar_leituras([
+            {'temperatura': 10 ** 400},
+            {'umidade': 60, 'data_inicial': '0001-01-01T00:00:00+05:00'},
+            {'temperatura': 37.5}
+        ])
+        assert validas == [{'umidade': None, 'temperatura': 37.5, 'pressao': None, 'lote': None,
+                            'data_inicial': None, 'data_final': None}]
+        assert rejeitadas[0] == {'indice': 0, 'erro': 'temperatura fora do intervalo permitido'}
+        assert rejeitadas[1]['indice'] == 1
+
+    def test_validar_aceita_e_rejeita_por_linha(self):
+        dados = [
+            {'temperatura': 37.5, 'umidade': 60, 'lote': 'L1', 'data_inicial': '2024-01-01T10:00:00'},
+            {'temperatura': 'quente', 'lote': 'L1'},
+            'não é objeto',
+            {'temperatura': 37.1, 'data_final': 'ontem'},
+            {'umidade': float('nan')},
+            {'lote': 123}
+        ]
+        validas, rejeitadas = validar_leituras(dados)
+
+        assert len(validas) == 2
+        assert validas[0]['umidade'] == 60.0
+        assert validas[0]['data_inicial'] == datetime(2024, 1, 1, 10, 0, 0)
+        assert validas[1]['lote'] == '123'
+        assert [r['indice'] for r in rejeitadas] == [1, 2, 3, 4]
+
+    def test_valor_copy(self):
+        assert _valor_copy(None) == '\\N'
+        assert _valor_copy('a\tb') == 'a\\tb'
+        assert _valor_copy(datetime(2024, 1, 1, 10)) == '2024-01-01 10:00:00'
+
+
+@pytest.mark.integration
+class TestInsercao:
+    """Gravação em massa"""
+
+    def test_inserir_leituras(self, app, db_session):
+        dados = [{'temperatura': 37.0 + i / 100, 'lote': 'BULK', 'data_inicial': '2024-01-01T10:00:00'}
+                 for i in range(1000)]
+        validas, rejeitadas = validar_leituras(dados)
+        assert rejeitadas == []
+
+        assert inserir_leituras(validas) == 1000
+        db_session.commit()
+
+        assert Leitura.query.filter_by(lote='BULK').count() == 1000
+
+    def test_inserir_lista_vazia(self, app, db_session):
+        assert inserir_leituras([]) == 0
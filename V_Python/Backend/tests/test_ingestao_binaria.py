@@ -0,0 +1,99 @@
+"""
+Testes para o formato binário compacto de ingestão (ingestao_binaria.py)
+"""
+import struct
+from datetime import datetime
+
+import pytest
+from starlette.testclient import TestClient
+
+from api_assincrona import criar_app_asgi
+from ingestao import validar_leituras
+from ingestao_binaria import (
+    CABECALHO, LEITURA, TIPO_CONTEUDO, codificar_leituras, decodificar_leituras, quantidade_leituras
+)
+from models import Leitura, Log
+
+
+def leituras(quantidade=3, lote='LOTE_BIN', **campos):
+    itens = [dict({'temperatura': 37.5 + i / 100, 'umidade': 60.25, 'pressao': 1013.0, 'lote': lote,
+                   'data_inicial': f'2024-05-01T10:{i:02d}:30', 'data_final': '2024-05-22T00:00:00'}, **campos)
+             for i in range(quantidade)]
+    return validar_leituras(itens)[0]
+
+
+@pytest.mark.unit
+class TestQuadro:
+
+    def test_ida_e_volta_igual_ao_json(self):
+        linhas = leituras() + leituras(2, lote=None, pressao=None, data_final=None)
+        quadro = codificar_leituras(linhas)
+        assert decodificar_leituras(quadro) == (linhas, [])
+        assert quantidade_leituras(quadro) == 5
+        # Cabeçalho + dicionário com um lote + 17 bytes por leitura
+        assert len(quadro) == CABECALHO.size + 1 + len('LOTE_BIN') + 4 + 5 * LEITURA.size
+
+    def test_datas_por_delta(self):
+        linhas = leituras(2)
+        # Fora de ordem: delta negativo
+        linhas[0]['data_inicial'], linhas[1]['data_inicial'] = datetime(2024, 5, 2), datetime(2024, 5, 1)
+        validas, _ = decodificar_leituras(codificar_leituras(linhas))
+        assert [l['data_inicial'] for l in validas] == [datetime(2024, 5, 2), datetime(2024, 5, 1)]
+
+    def test_escopo_e_indice_inexistente(self):
+        quadro = bytearray(codificar_leituras(leituras(2) + leituras(1, lote=None)))
+        validas, rejeitadas = decodificar_leituras(bytes(quadro), frozenset({'OUTRO'}))
+        assert validas == [] and [r['indice'] for r in rejeitadas] == [0, 1, 2]
+        assert 'escopo' in rejeitadas[0]['erro']
+
+        # Índice do lote da primeira leitura apontando para fora do dicionário
+        quadro[-3 * LEITURA.size] = 7
+        validas, rejeitadas = decodificar_leituras(bytes(quadro))
+        assert len(validas) == 2
+        assert rejeitadas == [{'indice': 0, 'erro': 'índice de lote inexistente: 7'}]
+
+    def test_quadro_malformado(self):
+        quadro = codificar_leituras(leituras(2))
+        for invalido in (b'', b'XX' + quadro[2:], quadro[:2] + b'\x09' + quadro[3:], quadro[:-1],
+                         quadro + b'\x00', CABECALHO.pack(b'EL', 1, 0, 0, 0, 1)):
+            with pytest.raises(ValueError):
+                decodificar_leituras(invalido)
+        assert decodificar_leituras(CABECALHO.pack(b'EL', 1, 0, 0, 0, 0)) == ([], [])
+
+
+@pytest.mark.integration
+class TestIngestaoBinaria:
+
+    @pytest.fixture
+    def cliente(self, app, db_session):
+        with TestClient(criar_app_asgi(app)) as cliente:
+            yield cliente
+
+    @pytest.fixture
+    def cabecalhos(self, cliente, usuario_comum):
+        resposta = cliente.post('/api/login', json={'username': 'usuario_teste', 'password': 'senha123'})
+        return {'Authorization': f"Bearer {resposta.json()['token']}", 'Content-Type': TIPO_CONTEUDO}
+
+    def test_post_binario(self, cliente, cabecalhos, db_session):
+        resposta = cliente.post('/api/leituras', headers=cabecalhos, content=codificar_leituras(leituras(3)))
+        assert resposta.status_code == 201
+        assert resposta.json()['aceitas'] == 3
+
+        gravadas = db_session.query(Leitura).filter_by(lote='LOTE_BIN').order_by(Leitura.data_inicial).all()
+        assert [l.temperatura for l in gravadas] == [37.5, 37.51, 37.52]
+        assert gravadas[0].data_final == datetime(2024, 5, 22)
+        log = db_session.query(Log).filter_by(acao='CRIAR_LEITURAS').one()
+        assert '"quantidade_itens": 3' in log.detalhes
+
+    def test_limite_e_quadro_invalido(self, cliente, cabecalhos, app, monkeypatch):
+        monkeypatch.setitem(app.config, 'INGESTAO_MAX_ITENS', 2)
+        resposta = cliente.post('/api/leituras', headers=cabecalhos, content=codificar_leituras(leituras(3)))
+        assert resposta.status_code == 413
+
+        resposta = cliente.post('/api/leituras', headers=cabecalhos,
+                                content=codificar_leituras(leituras(1)) + struct.pack('<B', 0))
+        assert resposta.status_code == 400
+
+        resposta = cliente.post('/api/leituras', headers=dict(cabecalhos, **{'Content-Type': 'text/plain'}),
+                                content=b'37.5')
+        assert resposta.status_code == 400
@@ -0,0 +1,154 @@
+"""
+Testes para paginação por cursor e streaming de leituras
+"""
+import json
+import pytest
+from datetime import datetime
+from sqlalchemy import create_mock_engine
+from sqlalchemy.dialects import postgresql
+from models import Leitura
+from leituras_utils import (
+    consulta_leituras, pagina_leituras, stream_leituras_json,
+    codificar_cursor, decodificar_cursor, filtro_apos_cursor, leituras_desde, decodificar_watermark
+)
+
+
+@pytest.fixture
+def muitas_leituras(db_session):
+    """25 leituras com datas repetidas (empates) e duas sem data"""
+    leituras = []
+    for i in range(23):
+        leituras.append(Leitura(temperatura=37.0, lote='PAG',
+                                data_inicial=datetime(2024, 1, 1 + i // 3)))
+    leituras.append(Leitura(temperatura=37.0, lote='PAG', data_inicial=None))
+    leituras.append(Leitura(temperatura=37.0, lote='PAG', data_inicial=None))
+    leituras.append(Leitura(temperatura=37.0, lote='OUTRO', data_inicial=datetime(2024, 1, 1)))
+    db_session.add_all(leituras)
+    db_session.commit()
+    return leituras
+
+
+@pytest.mark.unit
+class TestCursor:
+
+    def test_ida_e_volta(self):
+        class Linha:
+            id = 42
+            data_inicial = datetime(2024, 5, 1, 12, 30)
+        assert decodificar_cursor(codificar_cursor(Linha)) == (datetime(2024, 5, 1, 12, 30), 42)
+
+    def test_cursor_invalido(self):
+        with pytest.raises(ValueError):
+            decodificar_cursor('lixo!!')
+
+
+@pytest.mark.integration
+class TestPaginacao:
+
+    def test_percorre_todas_as_paginas_sem_repetir(self, app, db_session, muitas_leituras):
+        vistos = []
+        cursor = None
+        paginas = 0
+        while True:
+            itens, cursor = pagina_leituras(consulta_leituras('PAG'), 7, cursor)
+            vistos.extend(i['id'] for i in itens)
+            paginas += 1
+            if cursor is None:
+                break
+
+        assert paginas == 4
+        assert len(vistos) == 25
+        assert len(set(vistos)) == 25
+        # Leituras sem data ficam no fim
+        assert all(i is not None for i in vistos)
+        ultimos = Leitura.query.filter(Leitura.id.in_(vistos[-2:])).all()
+        assert all(l.data_inicial is None for l in ultimos)
+
+    def test_paginas_de_qualquer_tamanho_seguem_a_ordenacao(self, app, db_session, muitas_leituras):
+        todas = [i['id'] for i in pagina_leituras(consulta_leituras('PAG'), 100)[0]]
+        for limite in (1, 2, 3, 5, 8):
+            vistos, cursor = [], None
+            while True:
+                itens, cursor = pagina_leituras(consulta_leituras('PAG'), limite, cursor)
+                vistos.extend(i['id'] for i in itens)
+                if cursor is None:
+                    break
+            assert vistos == todas
+
+    def test_indice_na_ordem_da_paginacao(self):
+        # O índice precisa da mesma posição dos nulos que ORDENACAO
+        comandos = []
+        engine = create_mock_engine('postgresql://', lambda sql, *a, **k: comandos.append(
+            str(sql.compile(dialect=engine.dialect))))
+        Leitura.__table__.create(engine, checkfirst=False)
+        assert [c for c in comandos if 'ix_leituras_lote_data_inicial' in c] == [
+            'CREATE INDEX ix_leituras_lote_data_inicial ON leituras (lote, data_inicial DESC NULLS LAST, id DESC)']
+
+    def test_fase_datada_sem_or(self):
+        # Só a comparação de linha, resolvida como intervalo no índice
+        sql = str(filtro_apos_cursor(datetime(2024, 1, 5), 10).compile(dialect=postgresql.dialect()))
+        assert ' OR ' not in sql and 'IS NULL' not in sql
+        assert sql.startswith('(leituras.data_inicial, leituras.id) <')
+
+    def test_ordem_decrescente(self, app, db_session, muitas_leituras):
+        itens, _ = pagina_leituras(consulta_leituras('PAG'), 30)
+        datas = [i['data_inicial'] for i in itens if i['data_inicial']]
+        assert datas == sorted(datas, reverse=True)
+
+
+@pytest.mark.integration
+class TestStream:
+
+    def test_stream_gera_json_valido(self, app, db_session, muitas_leituras):
+        corpo = ''.join(stream_leituras_json(consulta_leituras('PAG')))
+        dados = json.loads(corpo)
+        assert len(dados) == 25
+        assert set(dados[0]) == {'id', 'umidade', 'temperatura', 'pressao', 'lote',
+                                 'data_inicial', 'data_final'}
+
+    def test_stream_vazio(self, app, db_session):
+        assert json.loads(''.join(stream_leituras_json(consulta_leituras('NADA')))) == []
+
+
+@pytest.mark.integration
+class TestDelta:
+
+    def test_since_id(self, app, db_session, muitas_leituras):
+        consulta = consulta_leituras('PAG')
+        ids_pag = sorted(l.id for l in muitas_leituras if l.lote == 'PAG')
+
+        itens, watermark, mais = leituras_desde(consulta, 10, since_id=ids_pag[4])
+        assert [i['id'] for i in itens] == ids_pag[5:15]
+        assert watermark == ids_pag[14] and mais
+
+        itens, watermark, mais = leituras_desde(consulta, 100, since_id=watermark)
+        assert [i['id'] for i in itens] == ids_pag[15:]
+        assert not mais
+
+        # Sem novidades: mesmo watermark, nenhuma linha
+        assert leituras_desde(consulta, 100, since_id=watermark) == ([], watermark, False)
+
+    def test_since_data(self, app, db_session, muitas_leituras):
+        itens, watermark, mais = leituras_desde(consulta_leituras('PAG'), 100,
+                                                since=decodificar_watermark('2024-01-06'))
+        assert [i['data_inicial'] for i in itens] == ['2024-01-07T00:00:00'] * 3 + ['2024-01-08T00:00:00'] * 2
+        assert watermark == f"2024-01-08T00:00:00|{itens[-1]['id']}"
+        assert not mais
+
+    def test_since_data_com_empates(self, app, db_session, muitas_leituras):
+        # Páginas de 2 cortam grupos de 3 leituras com a mesma data_inicial
+        consulta = consulta_leituras('PAG')
+        watermark, vistas, mais = '2024-01-03', [], True
+        while mais:
+            itens, watermark, mais = leituras_desde(consulta, 2, since=decodificar_watermark(watermark))
+            vistas += [i['id'] for i in itens]
+        esperadas = sorted((l.data_inicial, l.id) for l in muitas_leituras
+                           if l.lote == 'PAG' and l.data_inicial and l.data_inicial > datetime(2024, 1, 3))
+        assert vistas == [leitura_id for _, leitura_id in esperadas]
+        assert leituras_desde(consulta, 2, since=decodificar_watermark(watermark)) == ([], watermark, False)
+
+    def test_watermark_invalido(self):
+        assert decodificar_watermark('2024-01-08T00:00:00|7') == (datetime(2024, 1, 8), 7)
+        for invalido in ('', 'ontem', '2024-01-08|x', '|7'):
+            with pytest.raises(ValueError):
+                decodificar_watermark(invalido)
@@ -0,0 +1,92 @@
+"""
+Testes para a gravação assíncrona de logs (log_writer)
+"""
+import pytest
+from models import Log
+from log_writer import AsyncLogWriter, log_writer
+from logging_utils import registrar_log_atividade
+
+
+@pytest.fixture
+def writer(app):
+    """Gravador assíncrono isolado, encerrado ao final do teste"""
+    app.config.update(LOG_ASYNC=True, LOG_BATCH_SIZE=10, LOG_FLUSH_INTERVAL=0.05)
+    w = AsyncLogWriter(app)
+    yield w
+    w.parar()
+    app.config['LOG_ASYNC'] = False
+
+
+def _registro(acao):
+    return {'acao': acao, 'usuario_nome': 'Anônimo', 'status_code': 200}
+
+
+@pytest.mark.logging
+class TestAsyncLogWriter:
+    """Testes da fila e da gravação em lote"""
+
+    def test_desabilitado_nao_enfileira(self, app):
+        app.config['LOG_ASYNC'] = False
+        w = AsyncLogWriter(app)
+        assert w.enfileirar(_registro('X')) is False
+        assert w.estatisticas()['enfileirados'] == 0
+
+    def test_grava_em_lote(self, app, db_session, writer):
+        for i in range(25):
+            assert writer.enfileirar(_registro(f'LOTE_{i}'))
+        writer.flush()
+
+        assert Log.query.filter(Log.acao.like('LOTE_%')).count() == 25
+        stats = writer.estatisticas()
+        assert stats['gravados'] == 25
+        # 25 registros com lote de 10 → pelo menos 3 INSERTs
+        assert stats['lotes'] >= 3
+        assert stats['descartados'] == 0
+
+    def test_fila_cheia_descarta(self, app, db_session):
+        app.config.update(LOG_ASYNC=True, LOG_QUEUE_SIZE=1, LOG_ENQUEUE_TIMEOUT=0.0,
+                          LOG_FLUSH_INTERVAL=5.0, LOG_BATCH_SIZE=1000)
+        w = AsyncLogWriter(app)
+        try:
+            for i in range(50):
+                w.enfileirar(_registro('CHEIA'))
+            stats = w.estatisticas()
+            assert stats['descartados'] > 0
+            assert stats['enfileirados'] + stats['descartados'] == 50
+        finally:
+            w.parar()
+            app.config.update(LOG_ASYNC=False, LOG_QUEUE_SIZE=10000, LOG_ENQUEUE_TIMEOUT=0.05)
+
+    def test_parar_grava_pendentes(self, app, db_session):
+        app.config.update(LOG_ASYNC=True, LOG_FLUSH_INTERVAL=60.0, LOG_BATCH_SIZE=1000)
+        w = AsyncLogWriter(app)
+        for i in range(5):
+            w.enfileirar(_registro('PENDENTE'))
+        w.parar()
+        app.config['LOG_ASYNC'] = False
+
+        assert Log.query.filter_by(acao='PENDENTE').count() == 5
+
+    def test_registrar_log_atividade_usa_fila(self, app, db_session, usuario_comum, writer, monkeypatch):
+        import logging_utils
+        monkeypatch.setattr(logging_utils, 'log_writer', writer)
+
+        with app.test_request_context('/api/leituras', method='POST',
+                                      environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+            registrar_log_atividade(usuario=usuario_comum, acao='VIA_FILA', status_code=201)
+
+        # Nada gravado de forma síncrona
+        assert Log.query.filter_by(acao='VIA_FILA').count() == 0
+        writer.flush()
+
+        log = Log.query.filter_by(acao='VIA_FILA').one()
+        assert log.usuario_id == usuario_comum.id
+        assert log.metodo_http == 'POST'
+        assert log.ip_address == '10.0.0.1'
+        assert log.data_hora is not None
+
+    def test_registrar_log_atividade_sincrono(self, app, db_session):
+        assert log_writer.habilitado is False
+        with app.test_request_context('/test', method='GET'):
+            registrar_log_atividade(acao='SINCRONO', status_code=200)
+        assert Log.query.filter_by(acao='SINCRONO').count() == 1
@@ -0,0 +1,82 @@
+"""
+Testes para o endpoint /metrics e a instrumentação das requisições
+"""
+import pytest
+from flask import Flask, jsonify
+from prometheus_client import REGISTRY
+
+from cache import Cache
+from extensions import db
+from metricas import MetricasApp
+from models import Parametro
+
+
+def _valor(nome, **rotulos):
+    return REGISTRY.get_sample_value(nome, rotulos) or 0
+
+
+@pytest.fixture
+def app_metricas(app, tmp_path):
+    """Aplicação separada (mesmo banco dos testes) com a instrumentação ligada"""
+    flask_app = Flask('teste_metricas')
+    flask_app.config.update(
+        SQLALCHEMY_DATABASE_URI=app.config['SQLALCHEMY_DATABASE_URI'],
+        TESTING=True,
+        METRICAS_TOKEN='segredo'
+    )
+    db.init_app(flask_app)
+    cache_teste = Cache()
+    flask_app.extensions['cache'] = cache_teste
+    MetricasApp(flask_app)
+
+    @flask_app.route('/parametros/<int:quantidade>')
+    def listar(quantidade):
+        for _ in range(quantidade):
+            db.session.query(Parametro).all()
+        cache_teste.get('lotes:x')
+        return jsonify([])
+
+    return flask_app
+
+
+@pytest.mark.integration
+class TestMetricas:
+
+    def test_conta_requisicoes_e_consultas(self, app_metricas, db_session):
+        rotulos = {'endpoint': '/parametros/<int:quantidade>', 'metodo': 'GET', 'status': '200'}
+        antes = _valor('embryotech_http_requisicoes_total', **rotulos)
+        consultas_antes = _valor('embryotech_db_consultas_por_requisicao_sum',
+                                 endpoint='/parametros/<int:quantidade>')
+
+        cliente = app_metricas.test_client()
+        assert cliente.get('/parametros/3').status_code == 200
+        assert cliente.get('/parametros/2').status_code == 200
+
+        assert _valor('embryotech_http_requisicoes_total', **rotulos) - antes == 2
+        assert _valor('embryotech_http_duracao_segundos_count', **rotulos) >= 2
+        consultas = _valor('embryotech_db_consultas_por_requisicao_sum',
+                           endpoint='/parametros/<int:quantidade>') - consultas_antes
+        assert consultas == 5
+
+    def test_rota_inexistente_usa_rotulo_fixo(self, app_metricas, db_session):
+        cliente = app_metricas.test_client()
+        cliente.get('/nao/existe/123')
+        assert _valor('embryotech_http_requisicoes_total',
+                      endpoint='<sem_rota>', metodo='GET', status='404') >= 1
+
+    def test_cache_exportado(self, app_metricas, db_session):
+        antes = _valor('embryotech_cache_operacoes_total', grupo='lotes', resultado='falha')
+        app_metricas.test_client().get('/parametros/0')
+        assert _valor('embryotech_cache_operacoes_total', grupo='lotes', resultado='falha') - antes == 1
+
+    def test_exposicao_exige_token(self, app_metricas, db_session):
+        cliente = app_metricas.test_client()
+        assert cliente.get('/metrics').status_code == 401
+
+        resposta = cliente.get('/metrics', headers={'Authorization': 'Bearer segredo'})
+        assert resposta.status_code == 200
+        assert resposta.content_type.startswith('text/plain')
+        texto = resposta.get_data(as_text=True)
+        assert 'embryotech_http_duracao_segundos_bucket' in texto
+        assert 'embryotech_db_pool_conexoes_em_uso' in texto
+        assert 'embryotech_leituras_ingeridas_total' in texto
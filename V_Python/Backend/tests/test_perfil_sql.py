@@ -0,0 +1,88 @@
+"""
+Testes para o perfil de SQL por requisição e a detecção de N+1
+"""
+import pytest
+from flask import Flask, jsonify
+
+from extensions import db
+from models import Parametro
+from perfil_sql import PerfilSQL, PerfilRequisicao
+
+
+@pytest.fixture
+def app_perfil(app):
+    """Aplicação separada (mesmo banco dos testes) com o perfil ligado"""
+    flask_app = Flask('teste_perfil_sql')
+    flask_app.config.update(
+        SQLALCHEMY_DATABASE_URI=app.config['SQLALCHEMY_DATABASE_URI'],
+        TESTING=True,
+        PERFIL_SQL_HABILITADO=True,
+        PERFIL_SQL_AMOSTRAGEM=0.0,
+        PERFIL_SQL_LIMIAR_REPETICOES=3,
+        PERFIL_SQL_MAIS_LENTAS=2
+    )
+    db.init_app(flask_app)
+    perfil = PerfilSQL(flask_app)
+
+    @flask_app.route('/parametros/<int:quantidade>')
+    def listar(quantidade):
+        # Um SELECT por iteração, como um N+1
+        for i in range(quantidade):
+            db.session.execute(db.select(Parametro).where(Parametro.id == i)).all()
+        return jsonify([])
+
+    return flask_app, perfil
+
+
+@pytest.mark.unit
+class TestPerfilRequisicao:
+
+    def test_repetidos_acima_do_limiar(self):
+        perfil = PerfilRequisicao(detalhado=True)
+        for _ in range(3):
+            perfil.registrar('SELECT a', 0.001, 'app.py:10 (f)')
+        perfil.registrar('SELECT b', 0.002, 'app.py:20 (g)')
+
+        repetidos = perfil.repetidos(3)
+        assert [r['sql'] for r in repetidos] == ['SELECT a']
+        assert repetidos[0]['vezes'] == 3
+        assert repetidos[0]['locais'] == ['app.py:10 (f)']
+        assert perfil.consultas == 4
+
+
+@pytest.mark.integration
+class TestPerfilSQL:
+
+    def test_cabecalhos_em_toda_resposta(self, app_perfil, db_session):
+        flask_app, perfil = app_perfil
+        resposta = flask_app.test_client().get('/parametros/2')
+        assert resposta.headers['X-DB-Queries'] == '2'
+        assert float(resposta.headers['X-DB-Time']) >= 0
+        # Sem amostragem nada é detalhado
+        assert perfil.mais_lentas() == []
+
+    def test_requisicao_forcada_detecta_n_mais_1(self, app_perfil, db_session, capsys):
+        flask_app, perfil = app_perfil
+        resposta = flask_app.test_client().get('/parametros/4', headers={'X-Perfil-SQL': '1'})
+        assert resposta.headers['X-DB-Queries'] == '4'
+
+        amostra = perfil.mais_lentas()[0]
+        assert amostra['endpoint'] == '/parametros/<int:quantidade>'
+        assert amostra['consultas'] == 4
+        assert len(amostra['comandos']) == 4
+        assert amostra['repetidos'][0]['vezes'] == 4
+        # O local de chamada aponta para o código da aplicação (aqui, o teste)
+        assert amostra['repetidos'][0]['locais'][0].startswith('tests/test_perfil_sql.py:')
+        assert 'Possível N+1' in capsys.readouterr().out
+        assert perfil.estatisticas()['suspeitas_n_mais_1'] == 1
+
+    def test_mantem_apenas_as_mais_lentas(self, app_perfil, db_session):
+        flask_app, perfil = app_perfil
+        cliente = flask_app.test_client()
+        for quantidade in (1, 30, 2, 60):
+            cliente.get(f'/parametros/{quantidade}', headers={'X-Perfil-SQL': '1'})
+
+        lentas = perfil.mais_lentas()
+        assert len(lentas) == 2
+        assert lentas[0]['duracao_ms'] >= lentas[1]['duracao_ms']
+        assert {amostra['consultas'] for amostra in lentas} == {30, 60}
@@ -0,0 +1,100 @@
+"""
+Testes para a fila de relatórios em segundo plano
+"""
+import json
+import os
+import time
+import pytest
+from datetime import datetime, timedelta
+from models import RelatorioJob
+from relatorio_jobs import FilaRelatorios, _executar_job
+
+
+@pytest.fixture
+def fila(app, tmp_path):
+    fila = FilaRelatorios()
+    fila.init_app(app)
+    fila.diretorio = str(tmp_path)
+    fila.processos = 1
+    yield fila
+    fila.parar(aguardar=False)
+
+
+def criar_job(db_session, tipo='leituras', parametros=None, **campos):
+    job = RelatorioJob(id=os.urandom(16).hex(), tipo=tipo,
+                       parametros=json.dumps(parametros or {}), **campos)
+    db_session.add(job)
+    db_session.commit()
+    return job
+
+
+@pytest.mark.integration
+class TestExecucaoJob:
+
+    def test_gera_pdf(self, app, db_session, multiplas_leituras, tmp_path):
+        job = criar_job(db_session, parametros={'lote': 'LOTE_001'})
+        _executar_job(job.id, str(tmp_path))
+
+        job = db_session.get(RelatorioJob, job.id)
+        assert job.status == 'concluido'
+        assert job.erro is None
+        caminho = tmp_path / job.arquivo
+        assert caminho.read_bytes().startswith(b'%PDF')
+        assert job.tamanho == caminho.stat().st_size
+        assert not list(tmp_path.glob('*.parcial'))
+
+    def test_erro_registrado(self, app, db_session, tmp_path):
+        job = criar_job(db_session, parametros={'data_fim': 'nao-e-data'})
+        _executar_job(job.id, str(tmp_path))
+
+        job = db_session.get(RelatorioJob, job.id)
+        assert job.status == 'erro'
+        assert job.erro
+        assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.integration
+class TestFila:
+
+    def test_valida_tipo_e_parametros(self, fila, db_session):
+        with pytest.raises(ValueError):
+            fila.enfileirar('inexistente')
+        with pytest.raises(ValueError):
+            fila.enfileirar('usuarios', {'lote': 'X'})
+        assert db_session.query(RelatorioJob).count() == 0
+
+    def test_retencao_e_limite_de_tamanho(self, fila, db_session, tmp_path):
+        agora = datetime.utcnow()
+        jobs = []
+        for i, idade in enumerate((timedelta(days=2), timedelta(hours=3), timedelta(hours=2),
+                                   timedelta(hours=1))):
+            nome = f'job{i}.pdf'
+            (tmp_path / nome).write_bytes(b'x' * 100)
+            jobs.append(criar_job(db_session, status='concluido', arquivo=nome, tamanho=100,
+                                  criado_em=agora - idade, concluido_em=agora - idade))
+        parado = criar_job(db_session, status='processando', criado_em=agora - timedelta(hours=5))
+
+        fila.retencao = 86400
+        fila.tamanho_maximo = 200
+        assert fila.limpar_expirados() == 2
+
+        status = [db_session.get(RelatorioJob, j.id).status for j in jobs]
+        assert status == ['expirado', 'expirado', 'concluido', 'concluido']
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['job2.pdf', 'job3.pdf']
+        assert db_session.get(RelatorioJob, parado.id).status == 'erro'
+
+    @pytest.mark.slow
+    def test_pool_de_processos(self, fila, db_session, usuario_admin):
+        job = fila.enfileirar('usuarios', {'tipo': 'admin'}, usuario_admin.id)
+        assert job.status == 'pendente'
+
+        prazo = time.monotonic() + 60
+        while time.monotonic() < prazo:
+            db_session.expire_all()
+            job = db_session.get(RelatorioJob, job.id)
+            if job.status in ('concluido', 'erro'):
+                break
+            time.sleep(0.2)
+
+        assert job.status == 'concluido', job.erro
+        assert os.path.exists(fila.caminho_arquivo(job))
@@ -0,0 +1,69 @@
+"""
+Testes para a geração de relatórios PDF em streaming
+"""
+import re
+import pytest
+from datetime import datetime, timedelta
+from reportlab.lib.units import cm
+from sqlalchemy import select
+from models import Leitura
+from relatorios_pdf import gerar_pdf_tabela, iterar_linhas, _FlowablesSobDemanda, LINHAS_POR_PAGINA
+
+CABECALHO = ['Data/Hora', 'Lote', 'Temp.(°C)', 'Umid.(%)', 'Pressão(hPa)']
+LARGURAS = [3*cm, 3*cm, 2*cm, 2*cm, 2*cm]
+
+
+def contar_paginas(conteudo):
+    return len(re.findall(rb'/Type /Page\b', conteudo))
+
+
+@pytest.mark.unit
+class TestGeracaoPdf:
+
+    def test_flowables_sob_demanda(self):
+        gerados = []
+
+        def gerador():
+            for i in range(10):
+                gerados.append(i)
+                yield i
+
+        fila = _FlowablesSobDemanda(['a'], gerador())
+        assert len(fila) == 2
+        assert gerados == [0]
+        consumidos = []
+        while len(fila):
+            consumidos.append(fila[0])
+            del fila[0]
+        assert consumidos == ['a'] + list(range(10))
+
+    def test_gera_paginas_sem_split_de_tabela_gigante(self):
+        linhas = (['01/01/2024 10:00', 'L1', '37.5', '60.0', '1013.2'] for _ in range(LINHAS_POR_PAGINA * 20))
+        with gerar_pdf_tabela('Teste', ['Total de registros: 600'], CABECALHO, LARGURAS, linhas) as arquivo:
+            conteudo = arquivo.read()
+
+        assert conteudo.startswith(b'%PDF')
+        # Um bloco por página (mais uma pela parte que não coube abaixo do título)
+        assert 20 <= contar_paginas(conteudo) <= 22
+
+    def test_sem_registros(self):
+        with gerar_pdf_tabela('Teste', [], CABECALHO, LARGURAS, iter(())) as arquivo:
+            conteudo = arquivo.read()
+        assert contar_paginas(conteudo) == 1
+
+
+@pytest.mark.integration
+def test_iterar_linhas_do_banco(app, db_session):
+    inicio = datetime(2024, 1, 1)
+    db_session.add_all([Leitura(lote='PDF', temperatura=37.0, data_inicial=inicio + timedelta(minutes=i))
+                        for i in range(2500)])
+    db_session.commit()
+
+    consulta = (select(Leitura.data_inicial, Leitura.temperatura)
+                .where(Leitura.lote == 'PDF').order_by(Leitura.data_inicial.desc()))
+    linhas = [[l.data_inicial.isoformat(), f'{l.temperatura:.1f}'] for l in iterar_linhas(consulta)]
+    assert len(linhas) == 2500
+    assert linhas[0][0] == (inicio + timedelta(minutes=2499)).isoformat()
+
+    with gerar_pdf_tabela('Leituras', [], ['Data', 'Temp'], [4*cm, 2*cm], iter(linhas)) as arquivo:
+        assert arquivo.read(4) == b'%PDF'
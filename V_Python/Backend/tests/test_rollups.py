@@ -0,0 +1,133 @@
+"""
+Testes para os rollups incrementais de leituras
+"""
+import pytest
+from datetime import datetime, timedelta
+from models import Leitura, LeituraRollup
+from agregacao import agregar_leituras
+from ingestao import inserir_leituras
+from rollups import (
+    calcular_parciais, atualizar_rollups, recalcular_intervalo, reconstruir_rollups,
+    agregar_por_rollups, resumo_leituras
+)
+
+
+def gerar_linhas(lote, inicio, quantidade, passo=timedelta(minutes=7)):
+    return [
+        {'lote': lote, 'temperatura': 36.0 + (i % 5) * 0.5, 'umidade': 55.0 + i % 3,
+         'pressao': None if i % 4 == 0 else 1000.0 + i, 'data_inicial': inicio + passo * i,
+         'data_final': None}
+        for i in range(quantidade)
+    ]
+
+
+def ingerir(db_session, linhas):
+    """Mesmo caminho de POST /api/leituras: INSERT + rollups na mesma transação"""
+    inserir_leituras(linhas)
+    atualizar_rollups(linhas)
+    db_session.commit()
+
+
+@pytest.mark.unit
+def test_calcular_parciais():
+    linhas = [
+        {'lote': None, 'temperatura': 37.0, 'umidade': None, 'pressao': None,
+         'data_inicial': datetime(2024, 1, 1, 10, 5)},
+        {'lote': None, 'temperatura': 39.0, 'umidade': 60.0, 'pressao': None,
+         'data_inicial': datetime(2024, 1, 1, 10, 55)},
+        {'lote': 'X', 'temperatura': 1.0, 'umidade': None, 'pressao': None, 'data_inicial': None}
+    ]
+    registros = {(r['granularidade'], r['lote']): r for r in calcular_parciais(linhas)}
+
+    assert set(registros) == {('hora', ''), ('dia', '')}
+    hora = registros[('hora', '')]
+    assert hora['inicio'] == datetime(2024, 1, 1, 10)
+    assert hora['quantidade'] == 2
+    assert hora['temperatura_n'] == 2
+    assert hora['temperatura_soma_q'] == 37.0 ** 2 + 39.0 ** 2
+    assert (hora['temperatura_min'], hora['temperatura_max']) == (37.0, 39.0)
+    assert hora['umidade_n'] == 1
+    assert hora['pressao_min'] is None
+
+
+@pytest.mark.unit
+def test_calcular_parciais_em_ordem_de_chave():
+    # Mesma ordem de travamento em qualquer ingestão, seja qual for a ordem das linhas
+    linhas = (gerar_linhas('B', datetime(2024, 1, 2, 23), 5, timedelta(hours=1))
+              + gerar_linhas('A', datetime(2024, 1, 3, 5), 3, timedelta(hours=-2)))
+    chaves = [(r['granularidade'], r['lote'], r['inicio']) for r in calcular_parciais(linhas)]
+    assert chaves == sorted(chaves)
+    assert len(chaves) == len(set(chaves)) == 11
+
+
+@pytest.mark.integration
+class TestRollupsBanco:
+
+    def test_ingestao_incremental_igual_a_reconstrucao(self, app, db_session):
+        inicio = datetime(2024, 3, 1, 22, 13)
+        # Dois POSTs que caem nos mesmos intervalos exercitam o ON CONFLICT
+        ingerir(db_session, gerar_linhas('R1', inicio, 40))
+        ingerir(db_session, gerar_linhas('R1', inicio + timedelta(minutes=3), 40))
+
+        incremental = agregar_por_rollups('R1', 'hora')
+        reconstruir_rollups()
+        db_session.commit()
+        assert agregar_por_rollups('R1', 'hora') == incremental
+
+    @pytest.mark.parametrize('granularidade', ['hora', 'dia'])
+    def test_igual_a_agregacao_bruta(self, app, db_session, granularidade):
+        ingerir(db_session, gerar_linhas('R2', datetime(2024, 3, 1, 5, 41), 600))
+        ingerir(db_session, gerar_linhas('R3', datetime(2024, 3, 1, 6, 2), 100))
+
+        periodos = [
+            (None, None),
+            (datetime(2024, 3, 1, 9, 30), datetime(2024, 3, 3, 14, 10)),
+            (datetime(2024, 3, 2, 0, 0), datetime(2024, 3, 2, 23, 59, 59)),
+            (datetime(2024, 3, 1, 9, 10), datetime(2024, 3, 1, 9, 50))
+        ]
+        for lote in ('R2', None):
+            for data_inicio, data_fim in periodos:
+                _, esperado = agregar_leituras(lote, granularidade, data_inicio, data_fim)
+                obtido = agregar_por_rollups(lote, granularidade, data_inicio, data_fim)
+                assert obtido == esperado, (lote, data_inicio, data_fim)
+
+    def test_recalcular_apos_delete(self, app, db_session):
+        ingerir(db_session, gerar_linhas('R4', datetime(2024, 3, 1, 10, 0), 8))
+        leitura = db_session.query(Leitura).filter_by(lote='R4').first()
+        data = leitura.data_inicial
+
+        db_session.delete(leitura)
+        db_session.flush()
+        recalcular_intervalo('R4', data)
+        db_session.commit()
+
+        _, esperado = agregar_leituras('R4', 'hora')
+        assert agregar_por_rollups('R4', 'hora') == esperado
+        assert sum(p['quantidade'] for p in esperado) == 7
+
+    def test_reconstruir_por_lote(self, app, db_session):
+        ingerir(db_session, gerar_linhas('R5', datetime(2024, 3, 1), 10))
+        ingerir(db_session, gerar_linhas('R6', datetime(2024, 3, 1), 10))
+        db_session.query(LeituraRollup).filter_by(lote='R5').delete()
+
+        reconstruir_rollups('R5')
+        db_session.commit()
+        assert db_session.query(LeituraRollup).filter_by(lote='R5').count() == 3
+        assert db_session.query(LeituraRollup).filter_by(lote='R6').count() == 3
+
+    def test_resumo(self, app, db_session):
+        linhas = gerar_linhas('R7', datetime(2024, 3, 1, 12), 300)
+        ingerir(db_session, linhas)
+
+        resumo = resumo_leituras('R7', datetime(2024, 3, 1, 18), datetime(2024, 3, 2, 6))
+        selecionadas = [l for l in linhas
+                        if datetime(2024, 3, 1, 18) <= l['data_inicial'] <= datetime(2024, 3, 2, 6)]
+        temperaturas = [l['temperatura'] for l in selecionadas]
+        media = sum(temperaturas) / len(temperaturas)
+        desvio = (sum((t - media) ** 2 for t in temperaturas) / len(temperaturas)) ** 0.5
+
+        assert resumo['quantidade'] == len(selecionadas)
+        assert resumo['temperatura']['media'] == round(media, 3)
+        assert resumo['temperatura']['desvio'] == round(desvio, 3)
+        assert resumo['temperatura']['min'] == min(temperaturas)
+        assert resumo['pressao']['n'] == sum(1 for l in selecionadas if l['pressao'] is not None)
@@ -0,0 +1,161 @@
+"""
+Testes para o pipeline de login (senhas.py): rehash, pool de verificação e admissão
+"""
+import threading
+
+import pytest
+from flask import Flask
+from starlette.testclient import TestClient
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from api_assincrona import criar_app_asgi
+from models import Log
+from senhas import (
+    LimiteTentativas, LoginRecusado, VerificadorSenhas, normalizar_metodo, processos_padrao, verificador_senhas
+)
+
+BARATO = 'pbkdf2:sha256:1000'
+
+
+def verificador(**config):
+    app = Flask('senhas')
+    app.config.update(dict({'SENHA_METODO': BARATO, 'SENHA_PROCESSOS': 0}, **config))
+    return VerificadorSenhas(app)
+
+
+@pytest.mark.unit
+class TestMetodo:
+
+    def test_normalizar_metodo(self):
+        assert normalizar_metodo('pbkdf2') == 'pbkdf2:sha256:600000'
+        assert normalizar_metodo('pbkdf2:sha512:1000') == 'pbkdf2:sha512:1000'
+        assert normalizar_metodo('scrypt') == 'scrypt:32768:8:1'
+        assert normalizar_metodo('scrypt:16384') == 'scrypt:16384:8:1'
+        # Mesmo prefixo que o werkzeug grava no hash
+        assert generate_password_hash('x', method='scrypt').startswith(normalizar_metodo('scrypt') + '$')
+        assert generate_password_hash('x', method='pbkdf2').startswith(normalizar_metodo('pbkdf2') + '$')
+        with pytest.raises(ValueError):
+            normalizar_metodo('md5')
+
+    def test_rehash_so_quando_o_fator_muda(self):
+        atual = verificador()
+        assert atual.verificar(atual.gerar_hash('s3nha'), 's3nha') == (True, None)
+        assert atual.verificar(atual.gerar_hash('s3nha'), 'errada') == (False, None)
+
+        antigo = generate_password_hash('s3nha', method='pbkdf2:sha256:500')
+        correta, novo_hash = atual.verificar(antigo, 's3nha')
+        assert correta and novo_hash.startswith(BARATO + '$')
+        assert check_password_hash(novo_hash, 's3nha')
+        assert atual.estatisticas()['rehashes'] == 1
+
+
+@pytest.mark.unit
+class TestAdmissao:
+
+    def test_janela_deslizante(self, monkeypatch):
+        agora = [100.0]
+        monkeypatch.setattr('senhas.time.monotonic', lambda: agora[0])
+        limite = LimiteTentativas(2, 60)
+        limite.registrar('a')
+        limite.registrar('a')
+        assert limite.espera('a') == 60
+        assert limite.espera('b') == 0
+
+        agora[0] += 59.5
+        assert limite.espera('a') == 1
+        agora[0] += 1
+        assert limite.espera('a') == 0
+
+    def test_limite_por_ip_e_falhas_por_usuario(self):
+        senhas = verificador(LOGIN_LIMITE_IP=3, LOGIN_LIMITE_FALHAS_USUARIO=1)
+        for _ in range(3):
+            senhas.admitir('10.0.0.1', 'placa')
+        with pytest.raises(LoginRecusado) as erro:
+            senhas.admitir('10.0.0.1', 'placa')
+        assert (erro.value.status_code, erro.value.motivo) == (429, 'limite_ip')
+        assert erro.value.retry_after > 0
+
+        # Sucessos não contam para o usuário; uma falha sim
+        senhas.admitir('10.0.0.2', 'placa')
+        senhas.registrar_falha('placa')
+        with pytest.raises(LoginRecusado) as erro:
+            senhas.admitir('10.0.0.3', 'placa')
+        assert erro.value.motivo == 'limite_usuario'
+
+    def test_sobrecarga_responde_503(self):
+        senhas = verificador(LOGIN_MAX_SIMULTANEOS=1, LOGIN_ESPERA_MAXIMA=0.05)
+        hash_senha = senhas.gerar_hash('s3nha')
+        # Ocupa a única vaga como se outro login estivesse em verificação
+        senhas._vagas.acquire()
+        try:
+            with pytest.raises(LoginRecusado) as erro:
+                senhas.verificar(hash_senha, 's3nha')
+            assert erro.value.status_code == 503 and 1 <= erro.value.retry_after <= 5
+        finally:
+            senhas._vagas.release()
+        assert senhas.verificar(hash_senha, 's3nha') == (True, None)
+
+
+@pytest.mark.unit
+def test_processos_divididos_entre_workers(monkeypatch):
+    monkeypatch.setattr('os.cpu_count', lambda: 16)
+    monkeypatch.delenv('GUNICORN_WORKERS', raising=False)
+    assert processos_padrao() == 16
+    monkeypatch.setenv('GUNICORN_WORKERS', '8')
+    assert processos_padrao() == 2
+    monkeypatch.setenv('GUNICORN_WORKERS', '33')
+    assert processos_padrao() == 1
+
+    # Verificações simultâneas acompanham os processos
+    senhas = verificador(SENHA_PROCESSOS=processos_padrao(), LOGIN_MAX_SIMULTANEOS=0)
+    assert (senhas.processos, senhas.max_simultaneos) == (1, 2)
+
+
+@pytest.mark.slow
+def test_pool_de_processos():
+    senhas = verificador(SENHA_PROCESSOS=2)
+    hash_senha = generate_password_hash('s3nha', method='pbkdf2:sha256:500')
+    try:
+        resultados = []
+        threads = [threading.Thread(target=lambda: resultados.append(senhas.verificar(hash_senha, 's3nha')))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+        assert len(resultados) == 4 and all(correta and novo for correta, novo in resultados)
+    finally:
+        senhas.parar()
+
+
+@pytest.mark.integration
+@pytest.mark.auth
+class TestLoginAssincrono:
+
+    @pytest.fixture
+    def cliente(self, app, db_session):
+        with TestClient(criar_app_asgi(app)) as cliente:
+            yield cliente
+
+    def test_login_refaz_hash_antigo(self, cliente, usuario_comum, db_session, monkeypatch):
+        monkeypatch.setattr(verificador_senhas, 'metodo', BARATO)
+        antigo = usuario_comum.password_hash
+        assert not antigo.startswith(BARATO + '$')
+
+        resposta = cliente.post('/api/login', json={'username': 'usuario_teste', 'password': 'senha123'})
+        assert resposta.status_code == 200
+        db_session.refresh(usuario_comum)
+        assert usuario_comum.password_hash.startswith(BARATO + '$')
+        assert cliente.post('/api/login', json={'username': 'usuario_teste',
+                                                'password': 'senha123'}).status_code == 200
+
+    def test_falhas_repetidas_recebem_429(self, cliente, usuario_comum, db_session, monkeypatch):
+        monkeypatch.setattr(verificador_senhas, 'falhas_por_usuario', LimiteTentativas(2, 60))
+        for _ in range(2):
+            assert cliente.post('/api/login', json={'username': 'usuario_teste',
+                                                    'password': 'x'}).status_code == 401
+        resposta = cliente.post('/api/login', json={'username': 'usuario_teste', 'password': 'senha123'})
+        assert resposta.status_code == 429
+        assert int(resposta.headers['Retry-After']) > 0
+        motivos = [log.detalhes for log in db_session.query(Log).order_by(Log.id).all()]
+        assert 'limite_usuario' in motivos[-1]
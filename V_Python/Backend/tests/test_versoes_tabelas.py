@@ -0,0 +1,123 @@
+"""
+Testes para as versões por tabela e o GET condicional das consultas de apoio
+"""
+import pytest
+from extensions import db
+from models import Parametro
+from cache import cache
+from versoes_tabelas import versao_tabela, incrementar_versao, resposta_versionada
+
+
+def _parametro(empresa, lote):
+    return Parametro(empresa=empresa, lote=lote, temp_ideal=37.5, umid_ideal=60.0)
+
+
+@pytest.mark.integration
+class TestVersaoTabela:
+
+    def test_incrementar(self, app, db_session):
+        assert versao_tabela('parametros') == (0, None)
+        incrementar_versao('parametros')
+        db_session.commit()
+        incrementar_versao('parametros')
+        db_session.commit()
+        versao, alterado_em = versao_tabela('parametros')
+        assert versao == 2
+        assert alterado_em is not None
+
+    def test_rollback_descarta_incremento(self, app, db_session):
+        incrementar_versao('parametros')
+        db_session.commit()
+        incrementar_versao('parametros')
+        db_session.rollback()
+        assert versao_tabela('parametros')[0] == 1
+
+
+@pytest.mark.integration
+class TestRespostaVersionada:
+
+    def _listar_lotes(self):
+        return [l[0] for l in db.session.query(Parametro.lote).distinct().order_by(Parametro.lote)]
+
+    def test_304_com_if_none_match(self, app, db_session):
+        db_session.add(_parametro('EMP', 'L1'))
+        incrementar_versao('parametros')
+        db_session.commit()
+
+        with app.test_request_context('/api/lotes'):
+            resposta = resposta_versionada('parametros', 'lotes', {'empresa': None}, self._listar_lotes)
+            assert resposta.status_code == 200
+            assert resposta.get_json() == ['L1']
+            assert resposta.headers['Cache-Control'] == 'private, no-cache'
+            assert resposta.last_modified is not None
+            etag = resposta.get_etag()[0]
+
+        with app.test_request_context('/api/lotes', headers={'If-None-Match': f'"{etag}"'}):
+            resposta = resposta_versionada('parametros', 'lotes', {'empresa': None}, self._listar_lotes)
+            assert resposta.status_code == 304
+            assert resposta.get_etag()[0] == etag
+
+    def test_escrita_muda_etag_e_resultado(self, app, db_session):
+        db_session.add(_parametro('EMP', 'L1'))
+        incrementar_versao('parametros')
+        db_session.commit()
+
+        with app.test_request_context('/api/lotes'):
+            primeira = resposta_versionada('parametros', 'lotes', {}, self._listar_lotes)
+            etag = primeira.get_etag()[0]
+
+        db_session.add(_parametro('EMP', 'L2'))
+        incrementar_versao('parametros')
+        db_session.commit()
+
+        with app.test_request_context('/api/lotes', headers={'If-None-Match': f'"{etag}"'}):
+            resposta = resposta_versionada('parametros', 'lotes', {}, self._listar_lotes)
+            assert resposta.status_code == 200
+            assert resposta.get_json() == ['L1', 'L2']
+            assert resposta.get_etag()[0] != etag
+
+    def test_filtros_fazem_parte_da_chave(self, app, db_session):
+        db_session.add_all([_parametro('A', 'L1'), _parametro('B', 'L2')])
+        incrementar_versao('parametros')
+        db_session.commit()
+
+        def lotes_da(empresa):
+            return lambda: [p.lote for p in Parametro.query.filter_by(empresa=empresa)]
+
+        with app.test_request_context('/api/lotes'):
+            a = resposta_versionada('parametros', 'lotes', {'empresa': 'A'}, lotes_da('A'))
+            b = resposta_versionada('parametros', 'lotes', {'empresa': 'B'}, lotes_da('B'))
+            assert a.get_json() == ['L1']
+            assert b.get_json() == ['L2']
+            assert a.get_etag() != b.get_etag()
+
+    def test_resultado_memorizado_entre_requisicoes(self, app, db_session):
+        incrementar_versao('parametros')
+        db_session.commit()
+        chamadas = []
+
+        def calcular():
+            chamadas.append(1)
+            return []
+
+        antes = cache.estatisticas()['acertos']
+        for _ in range(3):
+            with app.test_request_context('/api/empresas'):
+                resposta_versionada('parametros', 'empresas', {}, calcular)
+        assert len(chamadas) == 1
+        assert cache.estatisticas()['acertos'] - antes == 2
+
+        # A escrita libera as entradas da versão anterior
+        incrementar_versao('parametros')
+        db_session.commit()
+        assert cache.backend.tamanho() == 0
+
+    def test_304_com_if_modified_since(self, app, db_session):
+        incrementar_versao('parametros')
+        db_session.commit()
+
+        with app.test_request_context('/api/empresas'):
+            ultima = resposta_versionada('parametros', 'empresas', {}, list).headers['Last-Modified']
+
+        with app.test_request_context('/api/empresas', headers={'If-Modified-Since': ultima}):
+            assert resposta_versionada('parametros', 'empresas', {}, list).status_code == 304
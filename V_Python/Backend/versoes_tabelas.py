@@ -0,0 +1,111 @@
+# versoes_tabelas.py - Versões por tabela para GET condicional (ETag/Last-Modified) das consultas de apoio
+
+import hashlib
+from datetime import datetime, timezone
+
+from flask import request, jsonify, Response
+from sqlalchemy import select, update
+
+from cache import cache
+from extensions import db
+from models import VersaoTabela
+
+
+def consulta_versao(tabela):
+    return select(VersaoTabela.versao, VersaoTabela.alterado_em).where(VersaoTabela.tabela == tabela)
+
+
+def versao_tabela(tabela):
+    """
+    (versao, alterado_em) atuais da tabela: uma leitura pela chave primária.
+    Tabela nunca alterada → (0, None).
+    """
+    linha = db.session.execute(consulta_versao(tabela)).first()
+    return (linha.versao, linha.alterado_em) if linha else (0, None)
+
+
+def comando_incrementar_versao(dialeto, tabela, agora):
+    """
+    INSERT ... ON CONFLICT DO UPDATE que cria ou incrementa o contador
+    (PostgreSQL e SQLite), sem disputa no primeiro INSERT; None nos demais
+    """
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(VersaoTabela).values(tabela=tabela, versao=1, alterado_em=agora).on_conflict_do_update(
+        index_elements=['tabela'], set_={'versao': VersaoTabela.versao + 1, 'alterado_em': agora})
+
+
+def comando_atualizar_versao(tabela, agora):
+    return (update(VersaoTabela).where(VersaoTabela.tabela == tabela)
+            .values(versao=VersaoTabela.versao + 1, alterado_em=agora))
+
+
+def incrementar_versao(tabela):
+    """
+    Incrementa o contador da tabela na transação corrente; chamar antes do
+    commit da escrita, para que a nova versão e os dados fiquem visíveis
+    juntos em todos os workers.
+    """
+    agora = datetime.utcnow()
+    comando = comando_incrementar_versao(db.engine.dialect.name, tabela, agora)
+    if comando is not None:
+        db.session.execute(comando)
+    elif db.session.execute(comando_atualizar_versao(tabela, agora)).rowcount == 0:
+        db.session.add(VersaoTabela(tabela=tabela, versao=1, alterado_em=agora))
+    # As chaves do cache levam a versão, então isso só libera as entradas antigas
+    cache.invalidar(tabela)
+
+
+async def incrementar_versao_assincrono(conexao, tabela):
+    """incrementar_versao() numa conexão assíncrona com transação aberta (api_assincrona)"""
+    agora = datetime.utcnow()
+    comando = comando_incrementar_versao(conexao.dialect.name, tabela, agora)
+    if comando is not None:
+        await conexao.execute(comando)
+    elif (await conexao.execute(comando_atualizar_versao(tabela, agora))).rowcount == 0:
+        await conexao.execute(VersaoTabela.__table__.insert(),
+                              {'tabela': tabela, 'versao': 1, 'alterado_em': agora})
+    cache.invalidar(tabela)
+
+
+def validadores(versao, alterado_em, *chave):
+    """(ETag, Last-Modified) de uma consulta identificada por `chave` na versão dada"""
+    etag = hashlib.sha1(repr((*chave, versao)).encode()).hexdigest()
+    ultima_alteracao = alterado_em.replace(microsecond=0, tzinfo=timezone.utc) if alterado_em else None
+    return etag, ultima_alteracao
+
+
+def nao_modificado(etag, ultima_alteracao, if_none_match, if_modified_since):
+    """
+    O cliente já tem a versão atual? If-None-Match tem precedência sobre
+    If-Modified-Since, cuja resolução é de um segundo.
+    """
+    if if_none_match:
+        return if_none_match.contains_weak(etag)
+    return (ultima_alteracao is not None and if_modified_since is not None
+            and ultima_alteracao <= if_modified_since)
+
+
+def resposta_versionada(tabela, endpoint, filtros, calcular):
+    """
+    Resposta JSON de uma consulta que depende só de `tabela`, com ETag e
+    Last-Modified derivados da versão dela. Responde 304 quando o cliente já
+    tem a versão atual; caso contrário usa o resultado do cache compartilhado,
+    cuja chave leva a versão.
+    """
+    versao, alterado_em = versao_tabela(tabela)
+    etag, ultima_alteracao = validadores(versao, alterado_em, endpoint, tuple(sorted(filtros.items())))
+
+    if nao_modificado(etag, ultima_alteracao, request.if_none_match, request.if_modified_since):
+        resposta = Response(status=304)
+    else:
+        resposta = jsonify(cache.obter_ou_calcular(f'{endpoint}:{etag}', calcular, tags=(tabela,)))
+    resposta.set_etag(etag)
+    if ultima_alteracao is not None:
+        resposta.last_modified = ultima_alteracao
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta